@@ -0,0 +1,75 @@
+import statistics
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+
+class SimpleBenchmark:
+    """
+    Minimal stand-in for pytest-benchmark's ``benchmark`` fixture, used when the
+    plugin is not installed. Calls the function for a number of rounds and keeps
+    timing statistics in ``stats`` and user data in ``extra_info``.
+    """
+
+    results: List['SimpleBenchmark'] = []
+
+    def __init__(self, name: str, rounds: int = 5) -> None:
+        self.name = name
+        self.rounds = rounds
+        self.extra_info: Dict[str, Any] = {}
+        self.stats: Dict[str, float] = {}
+
+    def __call__(self, function: Callable, *args: Any, **kwargs: Any) -> Any:
+        timings = []
+
+        for _ in range(self.rounds):
+            started = time.perf_counter()
+            result = function(*args, **kwargs)
+            timings.append(time.perf_counter() - started)
+
+        self.stats = {'min': min(timings), 'mean': statistics.mean(timings), 'max': max(timings)}
+        SimpleBenchmark.results.append(self)
+        return result
+
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    @pytest.fixture
+    def benchmark(request):
+        return SimpleBenchmark(request.node.name)
+
+    def pytest_terminal_summary(terminalreporter):
+        if not SimpleBenchmark.results:
+            return
+
+        terminalreporter.section('benchmarks')
+        for result in SimpleBenchmark.results:
+            extra = ', '.join(f'{key}={value:,.0f}' for key, value in result.extra_info.items())
+            terminalreporter.write_line(f'{result.name}: mean {result.stats["mean"] * 1000:.2f}ms ({extra})')
+
+
+def measure(benchmark, function: Callable[[], Any], rows: int) -> Any:
+    """
+    Benchmark a function processing ``rows`` rows, reporting rows/sec and allocations.
+
+    Allocations are measured in a separate, traced run so tracing does not skew timings.
+    """
+    result = benchmark(function)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    function()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    allocations = sum(stat.count_diff for stat in after.compare_to(before, 'lineno') if stat.count_diff > 0)
+    mean = benchmark.stats['mean'] if isinstance(benchmark.stats, dict) else benchmark.stats.stats.mean
+
+    benchmark.extra_info['rows_per_sec'] = rows / mean
+    benchmark.extra_info['peak_bytes'] = peak
+    benchmark.extra_info['retained_blocks'] = allocations
+    return result
@@ -0,0 +1,281 @@
+import random
+import string
+import struct
+import time
+import uuid
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+
+# PostgreSQL epoch (2000-01-01) in Unix seconds
+PG_EPOCH = 946684800
+
+# Type OIDs supported by the generator
+BOOL, INT8, INT4, TEXT, FLOAT8, TIMESTAMP, UUID, NUMERIC, JSONB = 16, 20, 23, 25, 701, 1114, 2950, 1700, 3802
+
+DEFAULT_COLUMN_TYPES = (UUID, TEXT, INT4, INT8, BOOL, FLOAT8, NUMERIC, TIMESTAMP, JSONB, TEXT)
+
+
+class ReplicationMessage:
+    """
+    Stand-in for psycopg2's ReplicationMessage with the attributes pg-streamline reads.
+    """
+
+    __slots__ = ('payload', 'data_start', 'wal_end', 'send_time', 'data_size')
+
+    def __init__(self, payload: bytes, data_start: int, send_time: float = 0.0) -> None:
+        self.payload = payload
+        self.data_start = data_start
+        self.wal_end = data_start
+        self.send_time = send_time
+        self.data_size = len(payload)
+
+
+class StaticCatalogCursor:
+    """
+    Cursor answering the catalog queries issued by the parsers and the producer from
+    a fixed schema, so benchmarks measure decoding rather than a mock library.
+    """
+
+    def __init__(self, schema_rows: List[Tuple[str, int]], table_name: str = 'public.bench') -> None:
+        self.schema_rows = schema_rows
+        self.table_row = tuple(table_name.split('.', 1))
+
+    def execute(self, *args) -> None:
+        pass
+
+    def fetchall(self) -> List[Tuple[str, int]]:
+        return self.schema_rows
+
+    def fetchone(self) -> Tuple[str, str]:
+        return self.table_row
+
+    def close(self) -> None:
+        pass
+
+
+class StaticConnectionPool:
+    """
+    Connection pool whose connections hand out StaticCatalogCursor instances.
+    """
+
+    def __init__(self, cursor: StaticCatalogCursor) -> None:
+        self.cursor_instance = cursor
+
+    def getconn(self) -> 'StaticConnectionPool':
+        return self
+
+    def putconn(self, connection) -> None:
+        pass
+
+    def cursor(self) -> StaticCatalogCursor:
+        return self.cursor_instance
+
+    def closeall(self) -> None:
+        pass
+
+
+class PgOutputGenerator:
+    """
+    Generate realistic pgoutput (protocol version 1) messages for one relation.
+
+    Args:
+        relation_id (int): The relation OID.
+        namespace (str): The schema name.
+        table (str): The table name.
+        row_width (int): The number of columns, cycling through ``column_types``.
+        column_types (Sequence[int]): Type OIDs to draw columns from.
+        null_ratio (float): Probability that a non-key value is NULL.
+        toast_ratio (float): Probability that a text/jsonb column is unchanged TOAST ('u') in an update.
+        text_length (int): Average length of generated text values.
+        replica_identity (str): 'full' sends old tuples ('O'), 'default' sends key tuples ('K')
+            on delete and no old tuple on update.
+        seed (int): Random seed, so runs are reproducible.
+    """
+
+    def __init__(
+        self,
+        relation_id: int = 16384,
+        namespace: str = 'public',
+        table: str = 'bench',
+        row_width: int = 10,
+        column_types: Sequence[int] = DEFAULT_COLUMN_TYPES,
+        null_ratio: float = 0.1,
+        toast_ratio: float = 0.0,
+        text_length: int = 32,
+        replica_identity: str = 'full',
+        seed: int = 0
+    ) -> None:
+        self.relation_id = relation_id
+        self.namespace = namespace
+        self.table = table
+        self.null_ratio = null_ratio
+        self.toast_ratio = toast_ratio
+        self.text_length = text_length
+        self.replica_identity = replica_identity
+        self.random = random.Random(seed)
+
+        self.columns = [
+            (f'col_{index}' if index else 'id', column_types[index % len(column_types)])
+            for index in range(row_width)
+        ]
+        self.lsn = 0x1000000
+        self.xid = 1000
+
+    @property
+    def table_name(self) -> str:
+        return f'{self.namespace}.{self.table}'
+
+    def schema_rows(self) -> List[Tuple[str, int]]:
+        """
+        Return the (attname, atttypid) rows the parsers read from pg_attribute.
+        """
+        return list(self.columns)
+
+    def catalog_cursor(self) -> StaticCatalogCursor:
+        """
+        Return a cursor serving this relation's catalog.
+        """
+        return StaticCatalogCursor(self.schema_rows(), self.table_name)
+
+    def __value(self, type_oid: int) -> str:
+        """
+        Generate a text-format value for a type.
+        """
+        rand = self.random
+
+        if type_oid == UUID:
+            return str(uuid.UUID(int=rand.getrandbits(128)))
+        if type_oid in (INT4, INT8):
+            return str(rand.randint(-2 ** 31, 2 ** 31))
+        if type_oid == BOOL:
+            return rand.choice('tf')
+        if type_oid == FLOAT8:
+            return repr(rand.uniform(-1e6, 1e6))
+        if type_oid == NUMERIC:
+            return f'{rand.randint(0, 10 ** 8)}.{rand.randint(0, 99):02d}'
+        if type_oid == TIMESTAMP:
+            return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(rand.randint(10 ** 9, 2 * 10 ** 9))) + '.123456'
+        if type_oid == JSONB:
+            return '{"key": "%s", "count": %d}' % (self.__text(), rand.randint(0, 1000))
+
+        return self.__text()
+
+    def __text(self) -> str:
+        length = max(1, int(self.random.gauss(self.text_length, self.text_length / 4)))
+        return ''.join(self.random.choices(string.ascii_letters + ' ', k=length))
+
+    def __tuple(self, key_only: bool = False, toast: bool = False) -> bytes:
+        """
+        Encode a TupleData section.
+        """
+        parts = [struct.pack('>h', len(self.columns))]
+
+        for index, (_, type_oid) in enumerate(self.columns):
+            if key_only and index:
+                parts.append(b'n')
+            elif index and self.random.random() < self.null_ratio:
+                parts.append(b'n')
+            elif toast and type_oid in (TEXT, JSONB) and self.random.random() < self.toast_ratio:
+                parts.append(b'u')
+            else:
+                value = self.__value(type_oid).encode('utf-8')
+                parts.append(b't' + struct.pack('>i', len(value)) + value)
+
+        return b''.join(parts)
+
+    def relation(self) -> bytes:
+        """
+        Encode a Relation ('R') message. The first column is the key.
+        """
+        identity = {'full': b'f', 'default': b'd'}.get(self.replica_identity, b'd')
+        parts = [
+            b'R',
+            struct.pack('>I', self.relation_id),
+            self.namespace.encode('utf-8') + b'\x00',
+            self.table.encode('utf-8') + b'\x00',
+            identity,
+            struct.pack('>h', len(self.columns))
+        ]
+
+        for index, (name, type_oid) in enumerate(self.columns):
+            parts.append(struct.pack('>b', 0 if index else 1) + name.encode('utf-8') + b'\x00' + struct.pack('>Ii', type_oid, -1))
+
+        return b''.join(parts)
+
+    @staticmethod
+    def timestamp(epoch: Optional[float] = None) -> int:
+        """
+        Convert Unix time to a PostgreSQL timestamp (microseconds since 2000-01-01).
+        """
+        return int(((time.time() if epoch is None else epoch) - PG_EPOCH) * 1000000)
+
+    def begin(self, final_lsn: int, commit_time: int, xid: int) -> bytes:
+        """
+        Encode a Begin ('B') message.
+        """
+        return b'B' + struct.pack('>QqI', final_lsn, commit_time, xid)
+
+    def commit(self, commit_lsn: int, end_lsn: int, commit_time: int) -> bytes:
+        """
+        Encode a Commit ('C') message.
+        """
+        return b'C' + struct.pack('>bQQq', 0, commit_lsn, end_lsn, commit_time)
+
+    def insert(self) -> bytes:
+        """
+        Encode an Insert ('I') message.
+        """
+        return b'I' + struct.pack('>I', self.relation_id) + b'N' + self.__tuple()
+
+    def update(self) -> bytes:
+        """
+        Encode an Update ('U') message according to the replica identity.
+        """
+        old = b'O' + self.__tuple() if self.replica_identity == 'full' else b''
+        return b'U' + struct.pack('>I', self.relation_id) + old + b'N' + self.__tuple(toast=True)
+
+    def delete(self) -> bytes:
+        """
+        Encode a Delete ('D') message according to the replica identity.
+        """
+        if self.replica_identity == 'full':
+            return b'D' + struct.pack('>I', self.relation_id) + b'O' + self.__tuple()
+
+        return b'D' + struct.pack('>I', self.relation_id) + b'K' + self.__tuple(key_only=True)
+
+    def changes(self, count: int, mix: Tuple[float, float, float] = (0.6, 0.3, 0.1)) -> List[bytes]:
+        """
+        Generate change messages with the given insert/update/delete mix.
+        """
+        makers = self.random.choices([self.insert, self.update, self.delete], weights=mix, k=count)
+        return [maker() for maker in makers]
+
+    def stream(
+        self,
+        transactions: int,
+        changes_per_transaction: int = 10,
+        mix: Tuple[float, float, float] = (0.6, 0.3, 0.1),
+        include_relation: bool = True
+    ) -> Iterator[ReplicationMessage]:
+        """
+        Generate a full replication stream: Relation, then Begin, changes and Commit per transaction.
+        """
+        if include_relation:
+            yield ReplicationMessage(self.relation(), self.lsn)
+
+        for _ in range(transactions):
+            first_lsn = self.lsn
+            change_lsns = [first_lsn + 64 * (index + 1) for index in range(changes_per_transaction)]
+            commit_lsn = first_lsn + 64 * (changes_per_transaction + 1)
+            end_lsn = commit_lsn + 32
+            commit_time = self.timestamp()
+            self.xid += 1
+
+            yield ReplicationMessage(self.begin(commit_lsn, commit_time, self.xid), first_lsn)
+
+            for lsn, payload in zip(change_lsns, self.changes(changes_per_transaction, mix)):
+                yield ReplicationMessage(payload, lsn)
+
+            yield ReplicationMessage(self.commit(commit_lsn, end_lsn, commit_time), end_lsn)
+
+            self.lsn = end_lsn + 64
@@ -0,0 +1,51 @@
+import logging
+from unittest import mock
+
+import pytest
+
+from .conftest import measure
+from .generator import PgOutputGenerator
+from .test_pipeline import NullConsumer, NullProducer, ROWS, make_consumer, make_producer
+
+
+@pytest.fixture
+def pipeline():
+    generator = PgOutputGenerator(row_width=12, toast_ratio=0.2)
+    stream = list(generator.stream(100, 10))
+    producer = make_producer(NullProducer, generator)
+    consumer = make_consumer(NullConsumer, generator)
+
+    def process():
+        for message in stream:
+            producer._Producer__process_pgoutput_change(message)
+
+            if message.payload[:1] in (b'I', b'U', b'D'):
+                consumer.process_incoming_message(generator.table_name, message.payload)
+
+    return process
+
+
+# Test no log record nor debug rendering of parsed messages happens per change at the
+# default log level (WARNING)
+def test_no_log_records_at_default_level(pipeline):
+    with mock.patch.object(logging.Logger, 'makeRecord') as mock_make_record:
+        with mock.patch('pg_streamline.consumer.process.json.dumps') as mock_dumps:
+            pipeline()
+
+    mock_make_record.assert_not_called()
+    mock_dumps.assert_not_called()
+
+
+# Benchmark the producer and consumer hot paths at the default log level, to compare
+# with logging disabled altogether below
+def test_pipeline_default_logging(benchmark, pipeline):
+    measure(benchmark, pipeline, ROWS)
+
+
+def test_pipeline_logging_disabled(benchmark, pipeline):
+    logging.disable(logging.CRITICAL)
+
+    try:
+        measure(benchmark, pipeline, ROWS)
+    finally:
+        logging.disable(logging.NOTSET)
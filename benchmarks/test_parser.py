@@ -0,0 +1,85 @@
+from unittest import mock
+
+from pg_streamline import DeleteMessage, InsertMessage, UpdateMessage
+from pg_streamline.parser.types import TypeCatalog
+
+from .conftest import measure
+from .generator import PgOutputGenerator
+
+
+ROWS = 2000
+
+
+def decode_all(messages, cursor):
+    for payload in messages:
+        message_type = payload[:1]
+
+        if message_type == b'I':
+            InsertMessage(payload, cursor=cursor).decode_insert_message()
+        elif message_type == b'U':
+            UpdateMessage(payload, cursor=cursor).decode_update_message()
+        else:
+            DeleteMessage(payload, cursor=cursor).decode_delete_message()
+
+
+# Benchmark decode_tuple through InsertMessage for narrow and wide rows
+def test_decode_insert_narrow(benchmark):
+    generator = PgOutputGenerator(row_width=5)
+    messages = [generator.insert() for _ in range(ROWS)]
+    measure(benchmark, lambda: decode_all(messages, generator.catalog_cursor()), ROWS)
+
+
+def test_decode_insert_wide(benchmark):
+    generator = PgOutputGenerator(row_width=50, null_ratio=0.3)
+    messages = [generator.insert() for _ in range(ROWS)]
+    measure(benchmark, lambda: decode_all(messages, generator.catalog_cursor()), ROWS)
+
+
+# Benchmark UpdateMessage decoding and calculate_diff, with unchanged TOAST values
+def test_decode_update(benchmark):
+    generator = PgOutputGenerator(row_width=20, toast_ratio=0.5)
+    messages = [generator.update() for _ in range(ROWS)]
+    measure(benchmark, lambda: decode_all(messages, generator.catalog_cursor()), ROWS)
+
+
+def test_calculate_diff(benchmark):
+    generator = PgOutputGenerator(row_width=20)
+    cursor = generator.catalog_cursor()
+    updates = [UpdateMessage(generator.update(), cursor=cursor).decode_update_message() for _ in range(ROWS)]
+    pairs = [(update['old'], update['new']) for update in updates]
+
+    def diff_all():
+        for old, new in pairs:
+            UpdateMessage.calculate_diff(old, new)
+
+    measure(benchmark, diff_all, ROWS)
+
+
+# Benchmark a realistic mix of inserts, updates and deletes
+def test_decode_mixed(benchmark):
+    generator = PgOutputGenerator(row_width=12, toast_ratio=0.2)
+    messages = generator.changes(ROWS)
+    measure(benchmark, lambda: decode_all(messages, generator.catalog_cursor()), ROWS)
+
+
+# Benchmark decoding of array and composite columns through the type catalog
+def test_decode_types(benchmark):
+    catalog = TypeCatalog()
+    cursor = mock.MagicMock()
+    cursor.fetchall.return_value = [
+        (23, 'int4', 'b', 'N', 0, ',', 0, None, None, None, None),
+        (25, 'text', 'b', 'S', 0, ',', 0, None, None, None, None),
+        (1007, '_int4', 'b', 'A', 23, ',', 0, None, None, None, None),
+        (1009, '_text', 'b', 'A', 25, ',', 0, None, None, None, None),
+        (16410, 'address', 'c', 'C', 0, ',', 0, None, None, ['street', 'number'], [25, 23])
+    ]
+    catalog.preload(cursor)
+
+    columns = [{'name': 'ids', 'type': 1007}, {'name': 'tags', 'type': 1009}, {'name': 'address', 'type': 16410}]
+    row = {'ids': '{' + ','.join(str(i) for i in range(20)) + '}', 'tags': '{a,"b c",NULL,d}', 'address': '("Main St",12)'}
+
+    def decode_rows():
+        for _ in range(ROWS):
+            catalog.decode_row(columns, dict(row))
+
+    measure(benchmark, decode_rows, ROWS)
@@ -0,0 +1,132 @@
+from unittest import mock
+
+import pytest
+
+from pg_streamline import Consumer, Producer
+from pg_streamline.plugins.rabbitmq import RabbitMQConsumer, RabbitMQProducer
+
+from .conftest import measure
+from .generator import PgOutputGenerator, StaticConnectionPool
+
+
+TRANSACTIONS = 100
+CHANGES_PER_TRANSACTION = 10
+ROWS = TRANSACTIONS * CHANGES_PER_TRANSACTION
+
+
+class NullProducer(Producer):
+    def perform_action(self, table_name, bytes_message):
+        pass
+
+    def perform_termination(self):
+        pass
+
+
+class NullConsumer(Consumer):
+    def perform_action(self, message_type, table_name, parsed_message):
+        pass
+
+    def perform_termination(self):
+        pass
+
+
+class InMemoryChannel:
+    """Broker stand-in that keeps published messages in a list."""
+
+    def __init__(self):
+        self.published = []
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published.append((routing_key, body))
+
+    def basic_ack(self, delivery_tag):
+        pass
+
+    def basic_reject(self, delivery_tag, requeue):
+        pass
+
+
+class Delivery:
+    def __init__(self, routing_key):
+        self.routing_key = routing_key
+        self.delivery_tag = 1
+
+
+@pytest.fixture
+def generator():
+    return PgOutputGenerator(row_width=12, toast_ratio=0.2)
+
+
+@pytest.fixture
+def stream(generator):
+    return list(generator.stream(TRANSACTIONS, CHANGES_PER_TRANSACTION))
+
+
+def make_producer(producer_class, generator):
+    with mock.patch('psycopg2.connect'), mock.patch('pika.BlockingConnection'):
+        producer = producer_class()
+
+    producer.conn_pool = StaticConnectionPool(generator.catalog_cursor())
+    producer.replication_cursor = mock.MagicMock()
+    return producer
+
+
+def make_consumer(consumer_class, generator):
+    with mock.patch('psycopg2.connect'), mock.patch('pika.BlockingConnection'):
+        consumer = consumer_class()
+
+    consumer.conn_pool = StaticConnectionPool(generator.catalog_cursor())
+    return consumer
+
+
+# Benchmark producer dispatch, including the per-message executor used by consume_stream
+def test_producer_dispatch(benchmark, generator, stream):
+    producer = make_producer(NullProducer, generator)
+
+    def dispatch():
+        for message in stream:
+            producer._Producer__process_changes(message)
+
+    measure(benchmark, dispatch, ROWS)
+
+
+# Benchmark producer change processing without the executor
+def test_producer_process_pgoutput_change(benchmark, generator, stream):
+    producer = make_producer(NullProducer, generator)
+
+    def process():
+        for message in stream:
+            producer._Producer__process_pgoutput_change(message)
+
+    measure(benchmark, process, ROWS)
+
+
+# Benchmark consumer decoding and dispatch
+def test_consumer_process_incoming_message(benchmark, generator, stream):
+    consumer = make_consumer(NullConsumer, generator)
+    changes = [message.payload for message in stream if message.payload[:1] in (b'I', b'U', b'D')]
+
+    def process():
+        for payload in changes:
+            consumer.process_incoming_message(generator.table_name, payload)
+
+    measure(benchmark, process, ROWS)
+
+
+# Benchmark RabbitMQ producer to consumer end to end over an in-memory broker
+def test_rabbitmq_end_to_end(benchmark, generator, stream):
+    producer = make_producer(RabbitMQProducer, generator)
+    consumer = make_consumer(RabbitMQConsumer, generator)
+    consumer.perform_action = lambda message_type, table_name, parsed_message: None
+    channel = producer.channel = InMemoryChannel()
+
+    def end_to_end():
+        channel.published.clear()
+
+        for message in stream:
+            producer._Producer__process_pgoutput_change(message)
+
+        for routing_key, body in channel.published:
+            consumer.callback(channel, Delivery(routing_key), None, body)
+
+    measure(benchmark, end_to_end, ROWS)
@@ -1,5 +1,5 @@
 from .parser.insert import InsertMessage  # Importing InsertMessage class from the parser.insert module
 from .parser.update import UpdateMessage  # Importing UpdateMessage class from the parser.update module
 from .parser.delete import DeleteMessage  # Importing DeleteMessage class from the parse.delete module
-from .producer import Producer  # Importing Producer class from the producer module
-from .consumer import Consumer  # Importing Consumer class from the consumer module
+from .producer import Producer, SinkProducer, FanInRunner  # Importing Producer classes from the producer module
+from .consumer import Consumer, BatchConsumer, MaterializedTable  # Importing Consumer classes from the consumer module
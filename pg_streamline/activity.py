@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from pg_streamline.tracing import TraceSampler
+
+
+class ActivityLog:
+    """
+    Per-change log events aggregated into periodic summaries.
+
+    Logging every change at INFO formats several strings per message even when nobody
+    reads them. Instead, changes are counted per table and operation and a single INFO
+    line summarizes them every interval seconds. A sampled fraction of changes can still
+    be logged individually as structured events, and every change is logged at DEBUG
+    when that level is enabled.
+
+    Arguments of the DEBUG events are only formatted when the level is enabled, so with
+    default log levels recording a change costs a dictionary update.
+
+    Attributes:
+        logger (logging.Logger): The logger summaries and events are written to.
+        name (str): The component named in summaries, e.g. 'Producer'.
+        interval (float): Seconds between summaries, 0 disables them.
+        sampler (TraceSampler): Selects the changes logged individually at INFO.
+    """
+
+    def __init__(self, logger: logging.Logger, name: str, interval: float = 60.0, sample_rate: float = 0.0) -> None:
+        """
+        Initialize the ActivityLog.
+
+        Args:
+            logger (logging.Logger): The logger summaries and events are written to.
+            name (str): The component named in summaries, e.g. 'Producer'.
+            interval (float): Seconds between summaries, 0 disables them.
+            sample_rate (float): Fraction of changes logged individually at INFO, between 0 and 1.
+        """
+        self.logger = logger
+        self.name = name
+        self.interval = interval
+        self.sampler = TraceSampler(sample_rate)
+
+        self.__lock = threading.Lock()
+        self.__counts: Dict[Tuple[str, str], int] = {}
+        self.__started = time.monotonic()
+
+    def record(self, table_name: str, operation: str, lsn: Optional[int] = None) -> None:
+        """
+        Count a processed change, logging a summary when the interval has elapsed.
+
+        Args:
+            table_name (str): The table the change belongs to.
+            operation (str): The operation, e.g. 'INSERT' or 'I'.
+            lsn (Optional[int]): The LSN of the change, if known.
+        """
+        key = (table_name, operation)
+
+        with self.__lock:
+            self.__counts[key] = self.__counts.get(key, 0) + 1
+
+        if self.sampler.sample_rate and self.sampler.sample():
+            self.logger.info('%s change: table=%s operation=%s lsn=%s', self.name, table_name, operation, lsn)
+        else:
+            self.logger.debug('%s change: table=%s operation=%s lsn=%s', self.name, table_name, operation, lsn)
+
+        if self.interval and time.monotonic() - self.__started >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Log the summary of the changes counted since the last one, if any.
+        """
+        with self.__lock:
+            counts, self.__counts = self.__counts, {}
+            elapsed = time.monotonic() - self.__started
+            self.__started = time.monotonic()
+
+        if counts and self.logger.isEnabledFor(logging.INFO):
+            summary = ', '.join(
+                f'{table_name} {operation}={count}' for (table_name, operation), count in sorted(counts.items())
+            )
+            self.logger.info(f'{self.name} processed {sum(counts.values())} changes in {elapsed:.0f}s: {summary}')
+
+
+def create_activity_log(config: Optional[dict], logger: logging.Logger, name: str) -> ActivityLog:
+    """
+    Create the activity log described by the 'logging' section of the configuration file.
+
+    Args:
+        config (Optional[dict]): The 'logging' section, e.g. {'summary_interval': 60, 'sample_rate': 0.001}.
+        logger (logging.Logger): The logger summaries and events are written to.
+        name (str): The component named in summaries, e.g. 'Producer'.
+    """
+    config = config or {}
+
+    return ActivityLog(
+        logger,
+        name,
+        interval=float(config.get('summary_interval', 60)),
+        sample_rate=float(config.get('sample_rate', 0))
+    )
@@ -0,0 +1,421 @@
+import array
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+# Logical column kinds for PostgreSQL type OIDs, everything else is kept as text
+PG_TYPE_KINDS = {
+    16: 'bool',     # bool
+    20: 'int',      # int8
+    21: 'int',      # int2
+    23: 'int',      # int4
+    26: 'int',      # oid
+    700: 'float',   # float4
+    701: 'float',   # float8
+}
+
+
+def pg_type_kind(type_oid: Optional[int]) -> str:
+    """
+    Map a PostgreSQL type OID to a logical column kind.
+
+    Args:
+        type_oid (Optional[int]): The type OID from the relation schema.
+
+    Returns:
+        str: One of 'bool', 'int', 'float' or 'string'.
+    """
+    return PG_TYPE_KINDS.get(type_oid, 'string')
+
+
+def convert_text_value(value: Optional[str], kind: str) -> Any:
+    """
+    Convert a text-format tuple value to the Python type of its column kind.
+
+    Args:
+        value (Optional[str]): The value as decoded from the replication stream.
+        kind (str): The logical column kind.
+
+    Returns:
+        Any: The converted value.
+    """
+    if value is None or kind == 'string':
+        return value
+
+    if kind == 'bool':
+        return value == 't'
+
+    if kind == 'int':
+        return int(value)
+
+    return float(value)
+
+
+# array module type codes of the typed buffers, 64-bit integers and floats as in Arrow and NumPy
+ARRAY_TYPECODES = {'bool': 'B', 'int': 'q', 'float': 'd'}
+
+
+def pack_bits(values: bytearray) -> bytes:
+    """
+    Pack one byte per value (0 or 1) into an LSB-first bitmap, the Arrow validity and boolean layout.
+
+    Args:
+        values (bytearray): The values.
+    """
+    bitmap = bytearray((len(values) + 7) // 8)
+
+    for index, value in enumerate(values):
+        if value:
+            bitmap[index >> 3] |= 1 << (index & 7)
+
+    return bytes(bitmap)
+
+
+class ColumnBuilder:
+    """
+    Accumulate the values of one column into contiguous buffers.
+
+    Bool, int and float values go to a typed array. Text values are UTF-8 encoded into a
+    data buffer, with the end offset of each value in an int64 array. Validity holds one
+    byte per row, 0 for null, and nulls take a zero (or empty) slot in the buffers.
+
+    Attributes:
+        name (str): The column name.
+        kind (str): The logical column kind.
+        values (Optional[array.array]): The typed values, for bool, int and float columns.
+        offsets (Optional[array.array]): Value end offsets into data, starting with 0, for string columns.
+        data (Optional[bytearray]): The encoded values, for string columns.
+        validity (bytearray): One byte per row, 1 when the value is not null.
+        null_count (int): The number of null values.
+    """
+
+    def __init__(self, name: str, kind: str) -> None:
+        """
+        Initialize the ColumnBuilder.
+
+        Args:
+            name (str): The column name.
+            kind (str): The logical column kind.
+        """
+        self.name = name
+        self.kind = kind
+        self.values = array.array(ARRAY_TYPECODES[kind]) if kind in ARRAY_TYPECODES else None
+        self.offsets = array.array('q', [0]) if self.values is None else None
+        self.data = bytearray() if self.values is None else None
+        self.validity = bytearray()
+        self.null_count = 0
+
+    def append(self, value: Any) -> None:
+        """
+        Append a text-format or already converted value.
+
+        Args:
+            value (Any): The value, None for null.
+        """
+        if value is None:
+            self.validity.append(0)
+            self.null_count += 1
+
+            if self.values is not None:
+                self.values.append(0)
+            else:
+                self.offsets.append(len(self.data))
+            return
+
+        self.validity.append(1)
+
+        if self.values is not None:
+            self.values.append(convert_text_value(value, self.kind) if isinstance(value, str) else value)
+        else:
+            self.data += (value if isinstance(value, str) else str(value)).encode('utf-8')
+            self.offsets.append(len(self.data))
+
+    @property
+    def nbytes(self) -> int:
+        """The size of the buffers."""
+        if self.values is not None:
+            return len(self.values) * self.values.itemsize + len(self.validity)
+
+        return len(self.offsets) * self.offsets.itemsize + len(self.data) + len(self.validity)
+
+    def to_pylist(self) -> List[Any]:
+        """
+        Return the values as a list, with None for nulls.
+        """
+        if self.values is not None:
+            values = self.values.tolist()
+
+            if self.kind == 'bool':
+                values = [bool(value) for value in values]
+        else:
+            offsets, data = self.offsets, self.data
+            values = [data[offsets[index]:offsets[index + 1]].decode('utf-8') for index in range(len(self.validity))]
+
+        if self.null_count:
+            values = [value if valid else None for value, valid in zip(values, self.validity)]
+
+        return values
+
+
+class ColumnarBuffer:
+    """
+    Accumulate rows column by column into ColumnBuilder buffers, converting values to their
+    column kind. Used by the columnar sink for segments and by RecordBatchBuilder for batches.
+
+    Attributes:
+        columns (List[Tuple[str, str]]): (name, kind) pairs in column order.
+        builders (List[ColumnBuilder]): The buffers of each column, in column order.
+        row_count (int): The number of rows appended.
+    """
+
+    def __init__(self, columns: List[Tuple[str, str]]) -> None:
+        """
+        Initialize the ColumnarBuffer.
+
+        Args:
+            columns (List[Tuple[str, str]]): (name, kind) pairs in column order.
+        """
+        self.columns = columns
+        self.builders = [ColumnBuilder(name, kind) for name, kind in columns]
+        self.row_count = 0
+
+    @staticmethod
+    def schema_columns(schema: dict, extra_columns: List[Tuple[str, str]] = ()) -> List[Tuple[str, str]]:
+        """
+        Return the (name, kind) pairs of a relation schema as returned by ``BaseMessage.get_schema``.
+
+        Args:
+            schema (dict): The relation schema.
+            extra_columns (List[Tuple[str, str]]): Columns to put before the relation columns.
+        """
+        columns = list(extra_columns)
+        columns.extend((column['name'], pg_type_kind(column['type'])) for column in schema['columns'])
+        return columns
+
+    @classmethod
+    def from_schema(cls, schema: dict, extra_columns: List[Tuple[str, str]] = ()) -> 'ColumnarBuffer':
+        """
+        Create a buffer for a relation schema as returned by ``BaseMessage.get_schema``.
+
+        Args:
+            schema (dict): The relation schema.
+            extra_columns (List[Tuple[str, str]]): Columns to put before the relation columns.
+        """
+        return cls(cls.schema_columns(schema, extra_columns))
+
+    @property
+    def estimated_bytes(self) -> int:
+        """The size of the buffered columns."""
+        return sum(builder.nbytes for builder in self.builders)
+
+    def append(self, row: Dict[str, Any]) -> None:
+        """
+        Append a row of text-format or already converted values.
+
+        Args:
+            row (Dict[str, Any]): The row, keyed by column name. Missing columns are null.
+        """
+        for builder in self.builders:
+            builder.append(row.get(builder.name))
+
+        self.row_count += 1
+
+    def to_pydict(self) -> Dict[str, List[Any]]:
+        """
+        Return the buffered columns as a dictionary of lists.
+        """
+        return {builder.name: builder.to_pylist() for builder in self.builders}
+
+
+class RecordBatch:
+    """
+    Rows of one relation in columnar form.
+
+    Columns keep their buffers (see ColumnBuilder), so converting to NumPy or Arrow
+    does not go through Python objects for numeric columns.
+
+    Attributes:
+        table_name (str): The table the rows belong to.
+        columns (List[ColumnBuilder]): The columns, in relation order.
+        num_rows (int): The number of rows.
+    """
+
+    def __init__(self, table_name: str, columns: List[ColumnBuilder], num_rows: int) -> None:
+        """
+        Initialize the RecordBatch.
+
+        Args:
+            table_name (str): The table the rows belong to.
+            columns (List[ColumnBuilder]): The filled columns.
+            num_rows (int): The number of rows.
+        """
+        self.table_name = table_name
+        self.columns = columns
+        self.num_rows = num_rows
+        self.__columns = {column.name: column for column in columns}
+
+    @property
+    def column_names(self) -> List[str]:
+        """The column names, in relation order."""
+        return [column.name for column in self.columns]
+
+    def column(self, name: str) -> ColumnBuilder:
+        """
+        Return the buffers of a column.
+
+        Args:
+            name (str): The column name.
+        """
+        return self.__columns[name]
+
+    def to_pylist(self, name: str) -> List[Any]:
+        """
+        Return the values of a column as a list, with None for nulls.
+
+        Args:
+            name (str): The column name.
+        """
+        return self.__columns[name].to_pylist()
+
+    def to_pydict(self) -> Dict[str, List[Any]]:
+        """
+        Return the columns as a dictionary of lists.
+        """
+        return {column.name: self.to_pylist(column.name) for column in self.columns}
+
+    def to_numpy(self) -> Dict[str, Any]:
+        """
+        Return the columns as NumPy arrays. Numeric columns share the batch's buffers and
+        are masked arrays when they contain nulls; string columns are object arrays.
+        """
+        if numpy is None:
+            raise ImportError('numpy is required for to_numpy.')
+
+        arrays = {}
+
+        for column in self.columns:
+            if column.values is not None:
+                values = numpy.frombuffer(column.values, dtype=column.values.typecode)
+
+                if column.kind == 'bool':
+                    values = values.view(numpy.bool_)
+            else:
+                values = numpy.array(self.to_pylist(column.name), dtype=object)
+
+            if column.null_count:
+                mask = numpy.frombuffer(column.validity, dtype=numpy.uint8) == 0
+                values = numpy.ma.MaskedArray(values, mask=mask)
+
+            arrays[column.name] = values
+
+        return arrays
+
+    def to_arrow(self) -> Any:
+        """
+        Return the batch as a pyarrow.RecordBatch built from the column buffers.
+        """
+        if pyarrow is None:
+            raise ImportError('pyarrow is required for to_arrow.')
+
+        arrays = []
+
+        for column in self.columns:
+            validity = pyarrow.py_buffer(pack_bits(column.validity)) if column.null_count else None
+
+            if column.kind == 'bool':
+                buffers = [validity, pyarrow.py_buffer(pack_bits(column.values))]
+                arrow_type = pyarrow.bool_()
+            elif column.values is not None:
+                buffers = [validity, pyarrow.py_buffer(column.values)]
+                arrow_type = pyarrow.int64() if column.kind == 'int' else pyarrow.float64()
+            else:
+                buffers = [validity, pyarrow.py_buffer(column.offsets), pyarrow.py_buffer(bytes(column.data))]
+                arrow_type = pyarrow.large_string()
+
+            arrays.append(pyarrow.Array.from_buffers(arrow_type, self.num_rows, buffers, null_count=column.null_count))
+
+        return pyarrow.RecordBatch.from_arrays(arrays, names=self.column_names)
+
+
+class RecordBatchBuilder:
+    """
+    Accumulate rows of one relation in a ColumnarBuffer and hand them off as RecordBatches.
+
+    Attributes:
+        table_name (str): The table the rows belong to.
+        columns (List[Tuple[str, str]]): (name, kind) pairs in column order.
+        created_at (float): Monotonic time of the first row of the current batch.
+    """
+
+    def __init__(self, table_name: str, columns: List[Tuple[str, str]]) -> None:
+        """
+        Initialize the RecordBatchBuilder.
+
+        Args:
+            table_name (str): The table the rows belong to.
+            columns (List[Tuple[str, str]]): (name, kind) pairs in column order.
+        """
+        self.table_name = table_name
+        self.columns = columns
+        self.__reset()
+
+    @classmethod
+    def from_schema(
+        cls, table_name: str, schema: dict, extra_columns: List[Tuple[str, str]] = ()
+    ) -> 'RecordBatchBuilder':
+        """
+        Create a builder for a relation schema as returned by ``BaseMessage.get_schema``.
+
+        Args:
+            table_name (str): The table the rows belong to.
+            schema (dict): The relation schema.
+            extra_columns (List[Tuple[str, str]]): Columns to put before the relation columns.
+        """
+        return cls(table_name, ColumnarBuffer.schema_columns(schema, extra_columns))
+
+    def __reset(self) -> None:
+        """
+        Start a new batch.
+        """
+        self.__buffer = ColumnarBuffer(self.columns)
+        self.created_at = time.monotonic()
+
+    @property
+    def num_rows(self) -> int:
+        """The number of rows appended since the last batch."""
+        return self.__buffer.row_count
+
+    @property
+    def nbytes(self) -> int:
+        """The size of the buffered columns."""
+        return self.__buffer.estimated_bytes
+
+    def append(self, row: Dict[str, Any]) -> None:
+        """
+        Append a row of text-format values.
+
+        Args:
+            row (Dict[str, Any]): The row, keyed by column name. Missing columns are null.
+        """
+        if not self.num_rows:
+            self.created_at = time.monotonic()
+
+        self.__buffer.append(row)
+
+    def finish(self) -> RecordBatch:
+        """
+        Return the rows appended so far as a RecordBatch and start a new one.
+        """
+        batch = RecordBatch(self.table_name, self.__buffer.builders, self.num_rows)
+        self.__reset()
+        return batch
@@ -1 +1,4 @@
-from .process import Consumer  # Importing Consumer class from the process module
\ No newline at end of file
+from .process import Consumer  # Importing Consumer class from the process module
+from .batch import BatchConsumer  # Importing BatchConsumer class from the batch module
+from .materialized import MaterializedTable  # Importing MaterializedTable class from the materialized module
+from .handlers import HandlerRegistry, HandlerDispatcher  # Importing handler classes from the handlers module
@@ -0,0 +1,218 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from pg_streamline.columnar import ColumnarBuffer, RecordBatch, RecordBatchBuilder
+
+from .process import Consumer
+
+
+logger = logging.getLogger(__name__)
+
+# Columns put before the relation columns of every batch
+METADATA_COLUMNS = [('_op', 'string')]
+
+# Type OIDs of the numeric and boolean wal2json type names, other columns are kept as text
+WAL2JSON_TYPE_OIDS = {
+    'boolean': 16,
+    'bigint': 20,
+    'smallint': 21,
+    'integer': 23,
+    'real': 700,
+    'double precision': 701
+}
+
+
+class BatchConsumer(Consumer):
+    """
+    Consumer that hands off decoded changes as columnar record batches instead of rows.
+
+    Inserts and updates (and deletes, when configured) are appended to a RecordBatchBuilder
+    per table, converting values to their column type as they arrive. A batch is passed to
+    ``perform_batch`` once it holds max_rows rows or its first row is max_delay_ms old, so
+    aggregations run on whole columns: ``batch.to_numpy()`` or ``batch.to_arrow()`` when
+    NumPy or pyarrow are installed, ``batch.to_pydict()`` otherwise. Batch columns follow the
+    schema the change was decoded with. A flusher thread hands off batches of tables that
+    went idle. Batches are handed off one at a time, in order.
+
+    Delivery is at most once: changes are acknowledged once buffered, so changes still
+    buffered when the process dies are not redelivered. ``perform_termination`` flushes
+    them on a clean shutdown.
+
+    Attributes:
+        max_rows (int): Rows at which a batch is handed off.
+        max_delay_ms (int): Age of the first row at which a batch is handed off.
+        operations (Tuple[str, ...]): The message types batched, 'I' and 'U' by default.
+    """
+
+    def __init__(self, config_path: str = None) -> None:
+        """
+        Initialize the BatchConsumer class.
+
+        Args:
+            config_path (str): The path to the configuration file.
+        """
+        super().__init__(config_path=config_path)
+
+        batch_config = self.config.get('batch') or {}
+        self.max_rows = int(batch_config.get('max_rows', 10000))
+        self.max_delay_ms = int(batch_config.get('max_delay_ms', 1000))
+        self.operations = tuple(batch_config.get('operations', ('I', 'U')))
+
+        self.__builders: Dict[str, RecordBatchBuilder] = {}
+        self.__columns: Dict[str, Tuple[Optional[tuple], List[Tuple[str, str]], Set[str]]] = {}
+        # Held while batches are finished and handed off, so they reach perform_batch in order
+        self.__lock = threading.RLock()
+        self.__stopped = threading.Event()
+        self.__flusher = threading.Thread(target=self.__flush_expired, name='pg-streamline-batch-flusher', daemon=True)
+        self.__flusher.start()
+
+    def perform_batch(self, table_name: str, batch: RecordBatch) -> None:
+        """
+        Handle a batch of changes. This method should be overridden by subclass.
+
+        Args:
+            table_name (str): The table the changes belong to.
+            batch (RecordBatch): The changes, with the operation in the '_op' column.
+        """
+        raise NotImplementedError('You must implement the perform_batch method in your consumer class.')
+
+    def perform_termination(self) -> None:
+        """
+        Stop the flusher thread and hand off every buffered batch.
+        """
+        self.__stopped.set()
+        self.__flusher.join()
+        self.flush()
+
+    def __get_columns(self, table_name: str, parsed_message: dict, row: dict) -> List[Tuple[str, str]]:
+        """
+        Return the (name, kind) columns of a table's batches. pgoutput changes use the schema
+        they were decoded with, and the columns are rebuilt when it changes. wal2json changes
+        use their own column types, rebuilt when a row has a column that is not known yet.
+        Called with the lock held.
+
+        Args:
+            table_name (str): The table the change belongs to.
+            parsed_message (dict): The parsed message data.
+            row (dict): The decoded row.
+        """
+        cached = self.__columns.get(table_name)
+        schema = self.change_schema
+
+        if schema is not None:
+            signature = tuple((column['name'], column['type']) for column in schema['columns'])
+
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+        else:
+            if cached is not None and all(name in cached[2] for name in row):
+                return cached[1]
+
+            # wal2json carries type names, and values are already typed
+            signature = None
+            schema = {
+                'columns': [
+                    {'name': column['name'], 'type': WAL2JSON_TYPE_OIDS.get(column.get('type'))}
+                    for column in parsed_message.get('columns') or parsed_message.get('identity') or []
+                ]
+            }
+
+        batch_columns = ColumnarBuffer.schema_columns(schema, METADATA_COLUMNS)
+        self.__columns[table_name] = (signature, batch_columns, {name for name, _ in batch_columns})
+        return batch_columns
+
+    @staticmethod
+    def __get_row(message_type: str, parsed_message: dict) -> Optional[dict]:
+        """
+        Return the row of a change, the new row for inserts and updates and the old one for deletes.
+
+        Args:
+            message_type (str): The type of the message ('I', 'U', 'D').
+            parsed_message (dict): The parsed message data, from pgoutput or wal2json.
+        """
+        if 'columns' in parsed_message or 'identity' in parsed_message:
+            values = parsed_message.get('identity' if message_type == 'D' else 'columns') or []
+            return {column['name']: column.get('value') for column in values}
+
+        return parsed_message.get('old' if message_type == 'D' else 'new')
+
+    def perform_action(self, message_type: str, table_name: str, parsed_message: dict) -> None:
+        """
+        Append a decoded change to the batch of its table.
+
+        Args:
+            message_type (str): The type of the message ('I', 'U', 'D').
+            table_name (str): The name of the table the message is related to.
+            parsed_message (dict): The parsed message data.
+        """
+        if message_type not in self.operations:
+            return
+
+        row = self.__get_row(message_type, parsed_message)
+
+        if not row:
+            return
+
+        with self.__lock:
+            ready: List[Tuple[str, RecordBatch]] = []
+            columns = self.__get_columns(table_name, parsed_message, row)
+            builder = self.__builders.get(table_name)
+
+            if builder is not None and builder.columns is not columns:
+                # The relation changed, the batch built so far keeps the old columns
+                if builder.num_rows:
+                    ready.append((table_name, builder.finish()))
+                builder = None
+
+            if builder is None:
+                builder = self.__builders[table_name] = RecordBatchBuilder(table_name, columns)
+
+            builder.append(dict(row, _op=message_type))
+
+            if builder.num_rows >= self.max_rows:
+                ready.append((table_name, builder.finish()))
+
+            ready.extend(self.__take_expired())
+
+            for name, batch in ready:
+                self.perform_batch(name, batch)
+
+    def __flush_expired(self) -> None:
+        """
+        Hand off the batches of idle tables once their first row is max_delay_ms old, until
+        perform_termination stops the thread.
+        """
+        interval = max(self.max_delay_ms / 4000, 0.01)
+
+        while not self.__stopped.wait(interval):
+            with self.__lock:
+                for table_name, batch in self.__take_expired():
+                    try:
+                        self.perform_batch(table_name, batch)
+                    except Exception:
+                        logger.exception(f'Failed to hand off an expired batch of {table_name}')
+
+    def __take_expired(self) -> List[Tuple[str, RecordBatch]]:
+        """
+        Finish the batches whose first row is older than max_delay_ms. Called with the lock held.
+        """
+        deadline = time.monotonic() - self.max_delay_ms / 1000
+
+        return [
+            (table_name, builder.finish())
+            for table_name, builder in self.__builders.items()
+            if builder.num_rows and builder.created_at <= deadline
+        ]
+
+    def flush(self) -> None:
+        """
+        Hand off every non-empty batch.
+        """
+        with self.__lock:
+            ready = [(table_name, builder.finish()) for table_name, builder in self.__builders.items() if builder.num_rows]
+
+            for table_name, batch in ready:
+                logger.debug('Flushing batch of %s rows for %s', batch.num_rows, table_name)
+                self.perform_batch(table_name, batch)
@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# (commit_lsn, lsn): changes are streamed in this order, while lsn alone is not monotonic
+Position = Tuple[int, int]
+
+
+class DedupStore:
+    """
+    Per-table high watermarks of applied changes, kept in memory.
+
+    A change is a duplicate when its (commit_lsn, lsn) position is not above the
+    watermark of its table. Checks are a dictionary lookup, so they cost no I/O.
+    Subclasses persist the watermarks so they survive restarts.
+
+    Changes of a table must be applied in stream order for watermarks to be exact,
+    which holds for a single queue per table.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the DedupStore.
+        """
+        self.watermarks: Dict[str, Position] = {}
+        self._lock = threading.Lock()
+
+    def is_applied(self, table_name: str, position: Position) -> bool:
+        """
+        Check whether a change was already applied.
+
+        Args:
+            table_name (str): The table the change belongs to.
+            position (Position): The (commit_lsn, lsn) position of the change.
+        """
+        watermark = self.watermarks.get(table_name)
+        return watermark is not None and position <= watermark
+
+    def mark_applied(self, table_name: str, position: Position) -> None:
+        """
+        Record that a change was applied, advancing the table's watermark.
+
+        Args:
+            table_name (str): The table the change belongs to.
+            position (Position): The (commit_lsn, lsn) position of the change.
+        """
+        with self._lock:
+            watermark = self.watermarks.get(table_name)
+
+            if watermark is None or position > watermark:
+                self.watermarks[table_name] = tuple(position)
+                self.persist(table_name)
+
+    def persist(self, table_name: str) -> None:
+        """
+        Persist the watermark of a table. Called with the lock held; a no-op in memory.
+
+        Args:
+            table_name (str): The table whose watermark changed.
+        """
+
+    def close(self) -> None:
+        """
+        Release the store's resources.
+        """
+
+
+class SQLiteDedupStore(DedupStore):
+    """
+    Watermarks persisted in a SQLite database, loaded into memory on start.
+
+    Attributes:
+        path (str): The database path.
+        sync_every (int): Number of watermark updates between commits.
+    """
+
+    def __init__(self, path: str, sync_every: int = 1) -> None:
+        """
+        Initialize the SQLiteDedupStore.
+
+        Args:
+            path (str): The database path, created if missing.
+            sync_every (int): Number of watermark updates between commits. Changes applied
+                since the last commit can be applied again after a crash.
+        """
+        super().__init__()
+        self.path = path
+        self.sync_every = sync_every
+        self.__pending = 0
+
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute(
+            'create table if not exists watermarks (table_name text primary key, commit_lsn integer, lsn integer)'
+        )
+        self.__connection.commit()
+
+        for table_name, commit_lsn, lsn in self.__connection.execute('select table_name, commit_lsn, lsn from watermarks'):
+            self.watermarks[table_name] = (commit_lsn, lsn)
+
+        logger.info(f'Loaded {len(self.watermarks)} deduplication watermarks from {path}')
+
+    def persist(self, table_name: str) -> None:
+        commit_lsn, lsn = self.watermarks[table_name]
+        self.__connection.execute(
+            'insert or replace into watermarks (table_name, commit_lsn, lsn) values (?, ?, ?)',
+            (table_name, commit_lsn, lsn)
+        )
+        self.__pending += 1
+
+        if self.__pending >= self.sync_every:
+            self.__connection.commit()
+            self.__pending = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self.__connection.commit()
+            self.__connection.close()
+
+
+class FileDedupStore(DedupStore):
+    """
+    Watermarks persisted in a JSON file, replaced atomically on every sync.
+
+    Attributes:
+        path (str): The file path.
+        sync_every (int): Number of watermark updates between writes.
+    """
+
+    def __init__(self, path: str, sync_every: int = 1) -> None:
+        """
+        Initialize the FileDedupStore.
+
+        Args:
+            path (str): The file path, created on the first write.
+            sync_every (int): Number of watermark updates between writes. Changes applied
+                since the last write can be applied again after a crash.
+        """
+        super().__init__()
+        self.path = path
+        self.sync_every = sync_every
+        self.__pending = 0
+
+        if os.path.exists(path):
+            with open(path) as file:
+                self.watermarks = {table_name: tuple(position) for table_name, position in json.load(file).items()}
+
+            logger.info(f'Loaded {len(self.watermarks)} deduplication watermarks from {path}')
+
+    def __write(self) -> None:
+        """
+        Write all watermarks to a temporary file and rename it over the store.
+        """
+        temporary_path = f'{self.path}.tmp'
+
+        with open(temporary_path, 'w') as file:
+            json.dump(self.watermarks, file)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temporary_path, self.path)
+        self.__pending = 0
+
+    def persist(self, table_name: str) -> None:
+        self.__pending += 1
+
+        if self.__pending >= self.sync_every:
+            self.__write()
+
+    def close(self) -> None:
+        with self._lock:
+            if self.__pending:
+                self.__write()
+
+
+def create_dedup_store(config: Optional[dict]) -> Optional[DedupStore]:
+    """
+    Create the store described by the 'deduplication' section of the configuration file.
+
+    Args:
+        config (Optional[dict]): The 'deduplication' section, e.g. {'store': 'sqlite', 'path': 'watermarks.db'}.
+
+    Returns:
+        Optional[DedupStore]: An in-memory store by default, None when deduplication is disabled.
+    """
+    config = config or {}
+
+    if not config.get('enabled', True):
+        return None
+
+    store = config.get('store', 'memory')
+
+    if store == 'memory':
+        return DedupStore()
+
+    if store not in ('sqlite', 'file'):
+        raise ValueError(f'Deduplication store {store} is not supported.')
+
+    if 'path' not in config:
+        raise ConnectionError('path is missing from the deduplication configuration.')
+
+    store_class = SQLiteDedupStore if store == 'sqlite' else FileDedupStore
+    return store_class(config['path'], sync_every=int(config.get('sync_every', 1)))
@@ -0,0 +1,345 @@
+import copy
+import logging
+import threading
+import time
+from concurrent import futures
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from pg_streamline.metrics import MetricsRegistry, create_metrics_registry
+
+
+logger = logging.getLogger(__name__)
+
+# Message types handlers can be registered for
+OPERATIONS = ('I', 'U', 'D', 'T', 'M')
+
+HandlerFunction = Callable[[str, str, dict], None]
+
+
+class Handler(NamedTuple):
+    """
+    A function registered to handle decoded changes.
+
+    Attributes:
+        function (HandlerFunction): Called with the message type, table name and parsed message.
+        name (str): The handler name, used in logs and metrics.
+        tables (Optional[FrozenSet[str]]): The tables handled, every table if None.
+        operations (Optional[FrozenSet[str]]): The message types handled ('I', 'U', 'D', 'T', 'M'), every type if None.
+        timeout (Optional[float]): Seconds the handler may run, the dispatcher's timeout if None.
+        required (bool): Whether the change is only acknowledged once the handler has succeeded.
+    """
+    function: HandlerFunction
+    name: str
+    tables: Optional[FrozenSet[str]] = None
+    operations: Optional[FrozenSet[str]] = None
+    timeout: Optional[float] = None
+    required: bool = True
+
+    def matches(self, message_type: str, table_name: str) -> bool:
+        """
+        Return whether the handler handles a change.
+
+        Args:
+            message_type (str): The type of the message.
+            table_name (str): The name of the table the message is related to.
+        """
+        return (self.tables is None or table_name in self.tables) and (self.operations is None or message_type in self.operations)
+
+
+class HandlerRegistry:
+    """
+    Handlers of decoded changes, registered by table and operation.
+
+    Handlers are registered with ``register`` or with the decorators, e.g.
+
+        @consumer.handlers.on_table('public.users')
+        def invalidate_cache(message_type, table_name, parsed_message): ...
+
+        @consumer.handlers.on_delete('public.users', required=False, timeout=5)
+        def audit(message_type, table_name, parsed_message): ...
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the HandlerRegistry.
+        """
+        self.__handlers: List[Handler] = []
+        self.__matching: Dict[Tuple[str, str], List[Handler]] = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__handlers)
+
+    def register(
+        self,
+        function: HandlerFunction,
+        tables: Optional[List[str]] = None,
+        operations: Optional[List[str]] = None,
+        name: Optional[str] = None,
+        timeout: Optional[float] = None,
+        required: bool = True
+    ) -> Handler:
+        """
+        Register a handler.
+
+        Args:
+            function (HandlerFunction): Called with the message type, table name and parsed message.
+            tables (Optional[List[str]]): The tables handled, every table if None.
+            operations (Optional[List[str]]): The message types handled, every type if None.
+            name (Optional[str]): The handler name, the function name by default.
+            timeout (Optional[float]): Seconds the handler may run, the dispatcher's timeout if None.
+            required (bool): Whether the change is only acknowledged once the handler has succeeded.
+        """
+        unknown = set(operations or ()) - set(OPERATIONS)
+
+        if unknown:
+            raise ValueError(f'Unsupported operations: {", ".join(sorted(unknown))}, expected some of {", ".join(OPERATIONS)}.')
+
+        if timeout is not None and timeout <= 0:
+            raise ValueError('timeout must be positive.')
+
+        handler = Handler(
+            function,
+            name or getattr(function, '__name__', repr(function)),
+            tables=frozenset(tables) if tables is not None else None,
+            operations=frozenset(operations) if operations is not None else None,
+            timeout=timeout,
+            required=required
+        )
+
+        with self.__lock:
+            if any(registered.name == handler.name for registered in self.__handlers):
+                raise ValueError(f'Duplicate handler: {handler.name}, set a name to tell them apart.')
+
+            self.__handlers.append(handler)
+            self.__matching = {}
+
+        return handler
+
+    def handler(self, tables: Optional[List[str]] = None, operations: Optional[List[str]] = None, **options: Any) -> Callable[[HandlerFunction], HandlerFunction]:
+        """
+        Decorator registering a function as a handler, see ``register`` for the options.
+
+        Args:
+            tables (Optional[List[str]]): The tables handled, every table if None.
+            operations (Optional[List[str]]): The message types handled, every type if None.
+        """
+        def decorator(function: HandlerFunction) -> HandlerFunction:
+            self.register(function, tables=tables, operations=operations, **options)
+            return function
+
+        return decorator
+
+    def on_table(self, *tables: str, **options: Any) -> Callable[[HandlerFunction], HandlerFunction]:
+        """
+        Decorator registering a handler of every change of some tables.
+
+        Args:
+            tables (str): The tables handled.
+        """
+        return self.handler(tables=list(tables), **options)
+
+    def on_operation(self, *operations: str, **options: Any) -> Callable[[HandlerFunction], HandlerFunction]:
+        """
+        Decorator registering a handler of some message types, of every table unless tables is set.
+
+        Args:
+            operations (str): The message types handled, e.g. 'I', 'U'.
+        """
+        return self.handler(operations=list(operations), **options)
+
+    def on_insert(self, *tables: str, **options: Any) -> Callable[[HandlerFunction], HandlerFunction]:
+        """
+        Decorator registering a handler of inserts, of every table unless tables are given.
+
+        Args:
+            tables (str): The tables handled.
+        """
+        return self.handler(tables=list(tables) or None, operations=['I'], **options)
+
+    def on_update(self, *tables: str, **options: Any) -> Callable[[HandlerFunction], HandlerFunction]:
+        """
+        Decorator registering a handler of updates, of every table unless tables are given.
+
+        Args:
+            tables (str): The tables handled.
+        """
+        return self.handler(tables=list(tables) or None, operations=['U'], **options)
+
+    def on_delete(self, *tables: str, **options: Any) -> Callable[[HandlerFunction], HandlerFunction]:
+        """
+        Decorator registering a handler of deletes, of every table unless tables are given.
+
+        Args:
+            tables (str): The tables handled.
+        """
+        return self.handler(tables=list(tables) or None, operations=['D'], **options)
+
+    def on_truncate(self, *tables: str, **options: Any) -> Callable[[HandlerFunction], HandlerFunction]:
+        """
+        Decorator registering a handler of truncates, of every table unless tables are given.
+
+        Args:
+            tables (str): The tables handled.
+        """
+        return self.handler(tables=list(tables) or None, operations=['T'], **options)
+
+    def matching(self, message_type: str, table_name: str) -> List[Handler]:
+        """
+        Return the handlers of a change, cached per table and message type.
+
+        Args:
+            message_type (str): The type of the message.
+            table_name (str): The name of the table the message is related to.
+        """
+        handlers = self.__matching.get((message_type, table_name))
+
+        if handlers is None:
+            # Built under the lock register takes, so a list built before a registration lands
+            # in the cache that register replaces, never in the new one
+            with self.__lock:
+                handlers = [handler for handler in self.__handlers if handler.matches(message_type, table_name)]
+                self.__matching[(message_type, table_name)] = handlers
+
+        return handlers
+
+
+class HandlerDispatcher:
+    """
+    Runs the handlers of each decoded change concurrently on a thread pool.
+
+    Every matching handler gets its own copy of the parsed message, so a handler modifying
+    it does not affect the others, and an error or timeout of one handler does not stop
+    the others. ``dispatch`` returns once every required handler has finished, and raises
+    if one of them failed or ran past its timeout, so the change is retried instead of
+    acknowledged. Optional handlers keep running after ``dispatch`` returns, their failures
+    are only logged and counted.
+
+    A handler that times out cannot be interrupted and keeps its pool thread until it returns.
+    Retried changes are passed to every handler again, including those that succeeded, so
+    handlers must be idempotent.
+
+    Attributes:
+        registry (HandlerRegistry): The registered handlers.
+        timeout (Optional[float]): Seconds handlers without their own timeout may run, unlimited if None.
+    """
+
+    def __init__(
+        self,
+        registry: HandlerRegistry,
+        max_workers: int = 8,
+        timeout: Optional[float] = None,
+        metrics: Optional[MetricsRegistry] = None
+    ) -> None:
+        """
+        Initialize the HandlerDispatcher.
+
+        Args:
+            registry (HandlerRegistry): The registered handlers.
+            max_workers (int): Threads running handlers.
+            timeout (Optional[float]): Seconds handlers without their own timeout may run, unlimited if None.
+            metrics (Optional[MetricsRegistry]): Registry for handler metrics, a no-op registry by default.
+        """
+        self.registry = registry
+        self.timeout = timeout
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pg-streamline-handler')
+
+        metrics = metrics or create_metrics_registry(None)
+        self.__duration_metric = metrics.histogram(
+            'pg_streamline_consumer_handler_seconds', 'Time spent in each handler', ['handler']
+        )
+        self.__failures_metric = metrics.counter(
+            'pg_streamline_consumer_handler_failures_total', 'Handler errors and timeouts', ['handler', 'reason']
+        )
+
+    def __run(self, handler: Handler, message_type: str, table_name: str, parsed_message: dict) -> None:
+        """
+        Run a handler and record its duration.
+
+        Args:
+            handler (Handler): The handler.
+            message_type (str): The type of the message.
+            table_name (str): The name of the table the message is related to.
+            parsed_message (dict): The handler's copy of the parsed message.
+        """
+        started = time.perf_counter()
+
+        try:
+            handler.function(message_type, table_name, parsed_message)
+        finally:
+            self.__duration_metric.observe(time.perf_counter() - started, handler.name)
+
+    def __optional_done(self, handler: Handler, table_name: str, future: Future) -> None:
+        """
+        Log and count the failure of an optional handler.
+
+        Args:
+            handler (Handler): The handler.
+            table_name (str): The name of the table the message is related to.
+            future (Future): The finished handler run.
+        """
+        error = future.exception()
+
+        if error is not None:
+            logger.error(f'Optional handler {handler.name} failed on {table_name}: {error!r}')
+            self.__failures_metric.inc(1, handler.name, 'error')
+
+    def dispatch(self, message_type: str, table_name: str, parsed_message: dict) -> int:
+        """
+        Run the handlers of a change and wait for the required ones.
+
+        Args:
+            message_type (str): The type of the message.
+            table_name (str): The name of the table the message is related to.
+            parsed_message (dict): The parsed message data.
+
+        Returns:
+            int: The number of handlers started.
+
+        Raises:
+            RuntimeError: If a required handler failed or timed out, after every required handler has finished or timed out.
+        """
+        handlers = self.registry.matching(message_type, table_name)
+        required: List[Tuple[Handler, Future, float]] = []
+
+        for handler in handlers:
+            message = copy.deepcopy(parsed_message) if len(handlers) > 1 else parsed_message
+            future = self.__executor.submit(self.__run, handler, message_type, table_name, message)
+            timeout = handler.timeout if handler.timeout is not None else self.timeout
+
+            if handler.required:
+                required.append((handler, future, time.monotonic() + timeout if timeout is not None else None))
+            else:
+                future.add_done_callback(lambda done, handler=handler: self.__optional_done(handler, table_name, done))
+
+        failures: List[str] = []
+        cause: Optional[BaseException] = None
+
+        for handler, future, deadline in required:
+            try:
+                future.result(timeout=max(deadline - time.monotonic(), 0) if deadline is not None else None)
+            except futures.TimeoutError as error:
+                logger.error(f'Handler {handler.name} timed out on {table_name}')
+                self.__failures_metric.inc(1, handler.name, 'timeout')
+                failures.append(f'{handler.name} (timed out)')
+                cause = cause or error
+            except Exception as error:
+                logger.error(f'Handler {handler.name} failed on {table_name}: {error!r}')
+                self.__failures_metric.inc(1, handler.name, 'error')
+                failures.append(f'{handler.name} ({type(error).__name__}: {error})')
+                cause = cause or error
+
+        if failures:
+            raise RuntimeError(f'Handlers failed on {table_name}: {", ".join(failures)}') from cause
+
+        return len(handlers)
+
+    def close(self, wait: bool = True) -> None:
+        """
+        Stop the handler threads.
+
+        Args:
+            wait (bool): Wait for running handlers to finish.
+        """
+        self.__executor.shutdown(wait=wait)
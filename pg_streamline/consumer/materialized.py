@@ -0,0 +1,518 @@
+import bisect
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from psycopg2 import sql
+
+
+logger = logging.getLogger(__name__)
+
+# Primary key column names of a table, in index order
+KEY_COLUMNS_QUERY = '''
+SELECT ARRAY(
+    SELECT a.attname::text FROM unnest(i.indkey) WITH ORDINALITY AS k(attnum, position)
+    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+    ORDER BY k.position
+) FROM pg_index i WHERE i.indrelid = %s::regclass AND i.indisprimary;
+'''
+
+# Converters of the values of ordered indexes, which are compared as text otherwise
+INDEX_TYPES: Dict[str, Callable[[str], Any]] = {
+    'text': str,
+    'int': int,
+    'float': float
+}
+
+Key = Tuple[Any, ...]
+
+
+def as_text(value: Any) -> Optional[str]:
+    """
+    Convert a lookup value to the text representation pgoutput sends values in.
+
+    Args:
+        value (Any): The value, e.g. 42, True or 'alice'.
+    """
+    if value is None or isinstance(value, str):
+        return value
+
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+
+    return str(value)
+
+
+class SecondaryIndex:
+    """
+    Index of the rows of a MaterializedTable on one or more columns.
+
+    Values map to the primary keys of their rows. Ordered indexes also keep their distinct
+    values sorted, converted by ``key``, for range lookups; rows with a NULL indexed
+    value are left out of them.
+
+    Attributes:
+        name (str): The index name.
+        columns (List[str]): The indexed columns.
+        ordered (bool): Whether range lookups are supported.
+        key (Optional[Callable[[str], Any]]): Converts each text value before it is compared, e.g. int.
+    """
+
+    def __init__(self, name: str, columns: List[str], ordered: bool = False, key: Optional[Callable[[str], Any]] = None) -> None:
+        """
+        Initialize the SecondaryIndex.
+
+        Args:
+            name (str): The index name.
+            columns (List[str]): The indexed columns.
+            ordered (bool): Whether range lookups are supported.
+            key (Optional[Callable[[str], Any]]): Converts each text value before it is compared.
+        """
+        if not columns:
+            raise ValueError(f'Index {name} has no columns.')
+
+        self.name = name
+        self.columns = list(columns)
+        self.ordered = ordered
+        self.key = key
+        self.__entries: Dict[Key, Set[Key]] = {}
+        self.__sorted: List[Key] = []
+
+    def value_of(self, values: Iterable[Any]) -> Optional[Key]:
+        """
+        Build the index value of column values, None if it cannot be ordered.
+
+        Args:
+            values (Iterable[Any]): The values of the indexed columns, in order.
+        """
+        value = tuple(as_text(item) for item in values)
+
+        if self.ordered:
+            if None in value:
+                return None
+
+            if self.key is not None:
+                value = tuple(self.key(item) for item in value)
+
+        return value
+
+    def add(self, primary_key: Key, row: Dict[str, Any]) -> None:
+        """
+        Index a row.
+
+        Args:
+            primary_key (Key): The primary key of the row.
+            row (Dict[str, Any]): The row.
+        """
+        value = self.value_of(row.get(column) for column in self.columns)
+
+        if value is None:
+            return
+
+        primary_keys = self.__entries.get(value)
+
+        if primary_keys is None:
+            primary_keys = self.__entries[value] = set()
+
+            if self.ordered:
+                bisect.insort(self.__sorted, value)
+
+        primary_keys.add(primary_key)
+
+    def remove(self, primary_key: Key, row: Dict[str, Any]) -> None:
+        """
+        Remove a row from the index.
+
+        Args:
+            primary_key (Key): The primary key of the row.
+            row (Dict[str, Any]): The row, as it was indexed.
+        """
+        value = self.value_of(row.get(column) for column in self.columns)
+        primary_keys = self.__entries.get(value) if value is not None else None
+
+        if primary_keys is None:
+            return
+
+        primary_keys.discard(primary_key)
+
+        if not primary_keys:
+            del self.__entries[value]
+
+            if self.ordered:
+                del self.__sorted[bisect.bisect_left(self.__sorted, value)]
+
+    def find(self, value: Key) -> Set[Key]:
+        """
+        Return the primary keys of the rows with an index value.
+
+        Args:
+            value (Key): The index value.
+        """
+        return self.__entries.get(value, set())
+
+    def range(self, low: Optional[Key], high: Optional[Key]) -> List[Key]:
+        """
+        Return the primary keys of the rows with an index value between low and high
+        (inclusive), ordered by value.
+
+        Args:
+            low (Optional[Key]): The lowest value, unbounded if None.
+            high (Optional[Key]): The highest value, unbounded if None.
+        """
+        if not self.ordered:
+            raise ValueError(f'Index {self.name} is not ordered.')
+
+        start = bisect.bisect_left(self.__sorted, low) if low is not None else 0
+        end = bisect.bisect_right(self.__sorted, high) if high is not None else len(self.__sorted)
+        return [primary_key for value in self.__sorted[start:end] for primary_key in sorted(self.__entries[value])]
+
+    def clear(self) -> None:
+        """
+        Remove every row from the index.
+        """
+        self.__entries.clear()
+        self.__sorted.clear()
+
+
+class MaterializedTable:
+    """
+    In-memory copy of a table, indexed by primary key and maintained from the stream.
+
+    The table is seeded from a snapshot with ``load_snapshot``, then every decoded insert,
+    update, delete and truncate of the table is applied with ``apply``. Reads are served from
+    memory: ``get`` looks a row up by primary key, ``find`` and ``range`` use secondary
+    indexes. Values are kept as text, the way pgoutput sends them (the snapshot casts every
+    column to text), and lookup values are converted to text before they are compared.
+
+    Changes are applied as whole row images keyed by primary key, so changes committed
+    before the snapshot was read may briefly bring back older rows; the table converges
+    once the stream has caught up with the snapshot.
+
+    Subscribers registered with ``subscribe`` are called with the operation and the old and
+    new rows after each change is applied. A subscriber that raises is logged and does not
+    stop the others.
+
+    Attributes:
+        table_name (str): The fully qualified table name, e.g. 'public.users'.
+        key_columns (List[str]): The primary key columns.
+        indexes (Dict[str, SecondaryIndex]): The secondary indexes, by name.
+    """
+
+    def __init__(self, table_name: str, key_columns: Optional[List[str]] = None) -> None:
+        """
+        Initialize the MaterializedTable.
+
+        Args:
+            table_name (str): The fully qualified table name.
+            key_columns (Optional[List[str]]): The primary key columns, looked up by ``load_key_columns`` if None.
+        """
+        self.table_name = table_name
+        self.key_columns: List[str] = list(key_columns or [])
+        self.indexes: Dict[str, SecondaryIndex] = {}
+        self.__rows: Dict[Key, Dict[str, Any]] = {}
+        self.__subscribers: List[Callable[[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]], None]] = []
+        self.__lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.__rows)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'MaterializedTable':
+        """
+        Create a MaterializedTable from an entry of the 'materialized_tables' section.
+
+        Args:
+            config (Dict[str, Any]): The entry, e.g. {'table': 'public.users', 'indexes': [{'name': 'by_email', 'columns': ['email']}]}.
+        """
+        if 'table' not in config:
+            raise ConnectionError('table is missing from the materialized table configuration.')
+
+        table = cls(config['table'], key_columns=config.get('key'))
+
+        for index_config in config.get('indexes') or []:
+            if 'name' not in index_config:
+                raise ConnectionError('name is missing from the materialized table index configuration.')
+
+            index_type = index_config.get('type', 'text')
+
+            if index_type not in INDEX_TYPES:
+                raise ValueError(f'Unsupported index type: {index_type}, expected one of {", ".join(INDEX_TYPES)}.')
+
+            table.add_index(
+                index_config['name'],
+                index_config.get('columns') or [],
+                ordered=bool(index_config.get('ordered', False)),
+                key=INDEX_TYPES[index_type]
+            )
+
+        return table
+
+    def add_index(self, name: str, columns: List[str], ordered: bool = False, key: Optional[Callable[[str], Any]] = None) -> SecondaryIndex:
+        """
+        Add a secondary index, built from the rows already loaded.
+
+        Args:
+            name (str): The index name.
+            columns (List[str]): The indexed columns.
+            ordered (bool): Whether range lookups are supported.
+            key (Optional[Callable[[str], Any]]): Converts each text value of an ordered index before it is compared, e.g. int.
+        """
+        if name in self.indexes:
+            raise ValueError(f'Duplicate index {name} of {self.table_name}.')
+
+        index = SecondaryIndex(name, columns, ordered=ordered, key=key)
+
+        with self.__lock:
+            for primary_key, row in self.__rows.items():
+                index.add(primary_key, row)
+
+            self.indexes[name] = index
+
+        return index
+
+    def load_key_columns(self, cursor) -> List[str]:
+        """
+        Look up the primary key columns of the table, unless they were configured.
+
+        Args:
+            cursor (psycopg2.extensions.cursor): A cursor on the source database.
+        """
+        if not self.key_columns:
+            cursor.execute(KEY_COLUMNS_QUERY, (self.table_name,))
+            row = cursor.fetchone()
+            self.key_columns = list(row[0]) if row else []
+
+            if not self.key_columns:
+                raise ValueError(f'Table {self.table_name} has no primary key, set key in its configuration.')
+
+        return self.key_columns
+
+    def load_snapshot(self, cursor) -> int:
+        """
+        Replace the rows with the current content of the table.
+
+        Args:
+            cursor (psycopg2.extensions.cursor): A cursor on the source database, e.g. in a
+                REPEATABLE READ transaction or on an exported snapshot.
+
+        Returns:
+            int: The number of rows loaded.
+        """
+        self.load_key_columns(cursor)
+        table = sql.Identifier(*self.table_name.split('.', 1))
+
+        cursor.execute(sql.SQL('SELECT * FROM {} LIMIT 0;').format(table))
+        names = [column[0] for column in cursor.description]
+
+        # Text values, so snapshot rows compare equal to the rows of streamed changes
+        cursor.execute(sql.SQL('SELECT {} FROM {};').format(
+            sql.SQL(', ').join(sql.SQL('{}::text').format(sql.Identifier(name)) for name in names), table
+        ))
+        rows = [dict(zip(names, values)) for values in cursor.fetchall()]
+
+        with self.__lock:
+            self.__rows.clear()
+
+            for index in self.indexes.values():
+                index.clear()
+
+            for row in rows:
+                self.__store(self.__key(row), row)
+
+        logger.info(f'Loaded {len(rows)} rows of {self.table_name}')
+        return len(rows)
+
+    def __key(self, row: Optional[Dict[str, Any]]) -> Optional[Key]:
+        """
+        Return the primary key of a row image, or None if the image does not hold it.
+
+        Args:
+            row (Optional[Dict[str, Any]]): The row image.
+        """
+        if not row:
+            return None
+
+        key = tuple(row.get(column) for column in self.key_columns)
+        return None if None in key else key
+
+    def __store(self, primary_key: Key, row: Dict[str, Any]) -> None:
+        """
+        Store a row and index it. Called with the lock held.
+
+        Args:
+            primary_key (Key): The primary key of the row.
+            row (Dict[str, Any]): The row.
+        """
+        self.__rows[primary_key] = row
+
+        for index in self.indexes.values():
+            index.add(primary_key, row)
+
+    def __remove(self, primary_key: Key) -> Optional[Dict[str, Any]]:
+        """
+        Remove a row and its index entries. Called with the lock held.
+
+        Args:
+            primary_key (Key): The primary key of the row.
+
+        Returns:
+            Optional[Dict[str, Any]]: The removed row, None if it was not stored.
+        """
+        row = self.__rows.pop(primary_key, None)
+
+        if row is not None:
+            for index in self.indexes.values():
+                index.remove(primary_key, row)
+
+        return row
+
+    @staticmethod
+    def __row_images(message_type: str, parsed_message: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Return the old and new row images of a change, from pgoutput or wal2json.
+
+        Args:
+            message_type (str): The type of the message ('I', 'U', 'D').
+            parsed_message (Dict[str, Any]): The parsed message data.
+        """
+        if 'columns' in parsed_message or 'identity' in parsed_message:
+            old = {column['name']: as_text(column.get('value')) for column in parsed_message.get('identity') or []}
+            new = {column['name']: as_text(column.get('value')) for column in parsed_message.get('columns') or []}
+            return old or None, new if message_type != 'D' else None
+
+        return parsed_message.get('old'), parsed_message.get('new')
+
+    def apply(self, message_type: str, parsed_message: Dict[str, Any]) -> bool:
+        """
+        Apply a decoded change of the table and notify the subscribers.
+
+        Args:
+            message_type (str): The type of the message ('I', 'U', 'D', 'T').
+            parsed_message (Dict[str, Any]): The parsed message data, from pgoutput or wal2json.
+
+        Returns:
+            bool: Whether the change was applied, False for other message types and changes without a key.
+        """
+        if message_type == 'T':
+            with self.__lock:
+                self.__rows.clear()
+
+                for index in self.indexes.values():
+                    index.clear()
+
+            self.__notify('T', None, None)
+            return True
+
+        if message_type not in ('I', 'U', 'D'):
+            return False
+
+        old_image, new_image = self.__row_images(message_type, parsed_message)
+        new_key = self.__key(new_image)
+        # The old image only holds the key when the key changed, or with REPLICA IDENTITY FULL
+        old_key = self.__key(old_image) or new_key
+
+        if old_key is None:
+            logger.debug('Dropping a change of %s without a primary key value', self.table_name)
+            return False
+
+        with self.__lock:
+            old = self.__remove(old_key)
+
+            if message_type == 'D':
+                new = None
+            else:
+                new = dict(new_image)
+
+                for column in parsed_message.get('unchanged_toast', ()):
+                    if old is not None and new.get(column) is None:
+                        new[column] = old.get(column)
+
+                if new_key != old_key:
+                    # Another row had the new key, it is replaced
+                    self.__remove(new_key)
+
+                self.__store(new_key, new)
+
+        self.__notify(message_type, dict(old) if old is not None else None, dict(new) if new is not None else None)
+        return True
+
+    def subscribe(self, callback: Callable[[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]], None]) -> None:
+        """
+        Call a function after each change is applied.
+
+        Args:
+            callback (Callable): Called with the operation ('I', 'U', 'D', 'T'), the old row and the new row,
+                None when the row did not exist, was deleted or the table was truncated.
+        """
+        with self.__lock:
+            self.__subscribers = self.__subscribers + [callback]
+
+    def unsubscribe(self, callback: Callable[[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]], None]) -> None:
+        """
+        Stop calling a function registered with ``subscribe``.
+
+        Args:
+            callback (Callable): The subscribed function.
+        """
+        with self.__lock:
+            self.__subscribers = [subscriber for subscriber in self.__subscribers if subscriber is not callback]
+
+    def __notify(self, operation: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """
+        Call the subscribers, outside the lock so they can read the table.
+
+        Args:
+            operation (str): The operation ('I', 'U', 'D', 'T').
+            old (Optional[Dict[str, Any]]): The row before the change.
+            new (Optional[Dict[str, Any]]): The row after the change.
+        """
+        for subscriber in self.__subscribers:
+            try:
+                subscriber(operation, old, new)
+            except Exception:
+                logger.exception(f'Subscriber of {self.table_name} failed on {operation}')
+
+    def get(self, key: Any) -> Optional[Dict[str, Any]]:
+        """
+        Return a copy of the row with a primary key.
+
+        Args:
+            key (Any): The primary key value, a tuple for composite keys.
+        """
+        primary_key = tuple(as_text(value) for value in (key if isinstance(key, tuple) else (key,)))
+        row = self.__rows.get(primary_key)
+        return dict(row) if row is not None else None
+
+    def find(self, index_name: str, value: Any) -> List[Dict[str, Any]]:
+        """
+        Return copies of the rows with a value of a secondary index, ordered by primary key.
+
+        Args:
+            index_name (str): The index name.
+            value (Any): The indexed value, a tuple for indexes of several columns.
+        """
+        index = self.indexes[index_name]
+
+        with self.__lock:
+            indexed = index.value_of(value if isinstance(value, tuple) else (value,))
+            primary_keys = sorted(index.find(indexed)) if indexed is not None else []
+            return [dict(self.__rows[primary_key]) for primary_key in primary_keys]
+
+    def range(self, index_name: str, low: Any = None, high: Any = None) -> List[Dict[str, Any]]:
+        """
+        Return copies of the rows with a value of an ordered index between low and high
+        (inclusive), ordered by value.
+
+        Args:
+            index_name (str): The name of an ordered index.
+            low (Any): The lowest value, unbounded if None.
+            high (Any): The highest value, unbounded if None.
+        """
+        index = self.indexes[index_name]
+
+        with self.__lock:
+            bounds = [
+                index.value_of(bound if isinstance(bound, tuple) else (bound,)) if bound is not None else None
+                for bound in (low, high)
+            ]
+            return [dict(self.__rows[primary_key]) for primary_key in index.range(*bounds)]
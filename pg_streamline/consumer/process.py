@@ -2,7 +2,9 @@ import json
 import logging
 import signal
 import sys
-from typing import Dict
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
 import psycopg2
 
@@ -11,12 +13,28 @@ from pg_streamline import (
     UpdateMessage,
     DeleteMessage
 )
+from pg_streamline.activity import create_activity_log
+from pg_streamline.metrics import create_metrics_registry
+from pg_streamline.parser.base import BaseMessage
+from pg_streamline.parser.protocol import LogicalMessage, TruncateMessage
+from pg_streamline.parser.relation import RelationMessage
+from pg_streamline.parser.schema import SchemaRegistry, relation_id_of
+from pg_streamline.parser.toast import RowStateCache
+from pg_streamline.parser.types import TypeCatalog
+from pg_streamline.parser.wal2json import Wal2JsonMessage
+from pg_streamline.profiling import ProfilingHooks, create_profiler
+from pg_streamline.replay import ReplayDriver
+from pg_streamline.tracing import LATENCY_BUCKETS, Trace
 
 from pg_streamline.utils import (
     setup_custom_logging,
     parse_yaml_config
 )
 
+from .dedup import DedupStore, create_dedup_store
+from .handlers import HandlerDispatcher, HandlerRegistry
+from .materialized import MaterializedTable
+
 
 class Consumer:
     """
@@ -25,6 +43,26 @@ class Consumer:
     Attributes:
         params (Dict[str, str]): Connection parameters for PostgreSQL database.
         conn_pool: Connection pool for database connections.
+        activity_log (ActivityLog): Periodic summaries of the changes processed, configured by the 'logging' section.
+        hooks (ProfilingHooks): Timing callbacks for the parse, catalog_lookup, perform_action and feedback points.
+        profiler (Profiler): Profiles live traffic on demand, or on a signal when the 'profiling' section is configured.
+        metrics (MetricsRegistry): Consumer metrics, a no-op registry unless the 'metrics' section enables them.
+        dedup_store (Optional[DedupStore]): Per-table watermarks of applied changes, in memory unless the
+            'deduplication' section configures persistence or disables it.
+        replay_driver (Optional[ReplayDriver]): Serves the catalog from a recording instead of PostgreSQL
+            when the 'replay' section is configured.
+        row_cache (Optional[RowStateCache]): Restores unchanged TOAST values of updates from the last image of
+            the row when the 'row_cache' section is configured.
+        type_catalog (Optional[TypeCatalog]): Decodes array, composite, range and enum values of pgoutput changes
+            when the 'types' section enables it.
+        schema_registry (Optional[SchemaRegistry]): The relation schema versions published by the producer, used to
+            decode changes with the columns they were sent with when the 'schema_registry' section enables it.
+        materialized_tables (Dict[str, MaterializedTable]): In-memory copies of the tables of the
+            'materialized_tables' section, by table name, updated before perform_action.
+        handlers (HandlerRegistry): Handlers registered by table and operation. When any is registered,
+            changes are dispatched to them instead of perform_action.
+        dispatcher (HandlerDispatcher): Runs the handlers of each change concurrently, configured by the
+            'handlers' section.
     """
 
     def __init__(self, config_path: str = None) -> None:
@@ -41,6 +79,49 @@ class Consumer:
         self.__validate_config(config)
         
         self.config = config
+        self.__local = threading.local()
+
+        self.metrics = create_metrics_registry(config.get('metrics'))
+        self.__messages_metric = self.metrics.counter(
+            'pg_streamline_consumer_messages_total', 'Messages processed by the consumer', ['table', 'operation']
+        )
+        self.__bytes_metric = self.metrics.counter(
+            'pg_streamline_consumer_bytes_total', 'Message bytes processed by the consumer', ['table', 'operation']
+        )
+        self.__parse_metric = self.metrics.histogram(
+            'pg_streamline_consumer_parse_seconds', 'Time spent decoding messages, excluding catalog lookups', ['table']
+        )
+        self.__catalog_metric = self.metrics.histogram(
+            'pg_streamline_consumer_catalog_lookup_seconds', 'Time spent loading relation schemas', ['table']
+        )
+        self.__action_metric = self.metrics.histogram(
+            'pg_streamline_consumer_action_seconds', 'Time spent in perform_action', ['table']
+        )
+        self.__errors_metric = self.metrics.counter(
+            'pg_streamline_consumer_errors_total', 'Messages that failed to process', ['table']
+        )
+        self.__latency_metric = self.metrics.histogram(
+            'pg_streamline_consumer_commit_to_apply_seconds',
+            'Time from commit to the end of perform_action, for traced changes',
+            ['table'],
+            buckets=LATENCY_BUCKETS
+        )
+        self.__stage_metric = self.metrics.histogram(
+            'pg_streamline_consumer_trace_stage_seconds',
+            'Time spent in each stage by traced changes: capture (commit to producer), '
+            'publish (producer to publish) and deliver (publish to applied)',
+            ['table', 'stage'],
+            buckets=LATENCY_BUCKETS
+        )
+        self.__duplicates_metric = self.metrics.counter(
+            'pg_streamline_consumer_duplicates_total', 'Already applied changes that were dropped', ['table']
+        )
+
+        self.activity_log = create_activity_log(config.get('logging'), logging.getLogger(), 'Consumer')
+        self.hooks = ProfilingHooks()
+        self.profiler = create_profiler(config.get('profiling'))
+
+        self.dedup_store: Optional[DedupStore] = create_dedup_store(config.get('deduplication'))
 
         self.params: Dict[str, str] = {
             'dbname': config['database']['name'],
@@ -51,7 +132,61 @@ class Consumer:
         }
 
         pool_size = config['database']['connection_pool_size']
-        self.conn_pool = psycopg2.pool.SimpleConnectionPool(1, pool_size, **self.params)
+
+        self.replay_driver: Optional[ReplayDriver] = None
+
+        if config.get('replay'):
+            self.replay_driver = ReplayDriver.from_config(config['replay'])
+            self.conn_pool = self.replay_driver.connection_pool()
+        else:
+            self.conn_pool = psycopg2.pool.SimpleConnectionPool(1, pool_size, **self.params)
+
+        self.row_cache: Optional[RowStateCache] = None
+
+        if config.get('row_cache'):
+            self.row_cache = RowStateCache(max_bytes=int(config['row_cache'].get('max_bytes', 64 * 1024 * 1024)))
+            self.__toast_metric = self.metrics.counter(
+                'pg_streamline_consumer_unchanged_toast_total',
+                'Unchanged TOAST values in updates, by whether the row cache restored them',
+                ['table', 'result']
+            )
+            self.metrics.gauge(
+                'pg_streamline_consumer_row_cache_bytes', 'Estimated size of the row images kept to restore TOAST values'
+            ).set_function(lambda: self.row_cache.size_bytes)
+
+        self.type_catalog: Optional[TypeCatalog] = None
+        types_config = config.get('types') or {}
+
+        if types_config.get('enabled'):
+            if self.replay_driver is not None:
+                logging.warning('Type decoding is not available when replaying a recording.')
+            else:
+                self.type_catalog = TypeCatalog()
+                self.__preload_types(types_config.get('publications'))
+
+        self.schema_registry: Optional[SchemaRegistry] = None
+        registry_config = config.get('schema_registry') or {}
+
+        if registry_config.get('enabled'):
+            self.schema_registry = SchemaRegistry(path=registry_config.get('path'))
+
+        self.materialized_tables: Dict[str, MaterializedTable] = {}
+
+        for table_config in config.get('materialized_tables') or []:
+            table = MaterializedTable.from_config(table_config)
+            self.materialized_tables[table.table_name] = table
+
+        if self.materialized_tables:
+            self.__seed_materialized_tables(config['materialized_tables'])
+
+        handlers_config = config.get('handlers') or {}
+        self.handlers = HandlerRegistry()
+        self.dispatcher = HandlerDispatcher(
+            self.handlers,
+            max_workers=int(handlers_config.get('max_workers', 8)),
+            timeout=float(handlers_config['timeout']) if handlers_config.get('timeout') is not None else None,
+            metrics=self.metrics
+        )
 
         logging.info(f'Consumer initialized for database: {self.params.get("dbname")} on host: {self.params.get("host")}:{self.params.get("port")}')
         signal.signal(signal.SIGINT, self.__terminate)
@@ -80,6 +215,51 @@ class Consumer:
             if key not in database_config:
                 raise ConnectionError(f'Database {key} not found in config file.')
 
+    def __preload_types(self, publications: Optional[List[str]]) -> None:
+        """
+        Load the types of the published relations in one query.
+
+        Args:
+            publications (Optional[List[str]]): Only load the relations of these publications, all by default.
+        """
+        connection = self.conn_pool.getconn()
+        cursor = connection.cursor()
+
+        try:
+            self.type_catalog.preload(cursor, publications)
+        finally:
+            cursor.close()
+            self.conn_pool.putconn(connection)
+
+    def __seed_materialized_tables(self, table_configs: List[dict]) -> None:
+        """
+        Look up the primary keys of the materialized tables and load their snapshots,
+        except for the tables configured with 'seed: false'.
+
+        Args:
+            table_configs (List[dict]): The entries of the 'materialized_tables' section.
+        """
+        if self.replay_driver is not None:
+            logging.warning('Materialized tables are not seeded when replaying a recording.')
+
+        connection = self.conn_pool.getconn()
+        cursor = connection.cursor()
+
+        try:
+            for table_config in table_configs:
+                table = self.materialized_tables[table_config['table']]
+
+                if self.replay_driver is not None:
+                    if not table.key_columns:
+                        raise ValueError(f'Set key of materialized table {table.table_name} to replay a recording.')
+                elif table_config.get('seed', True):
+                    table.load_snapshot(cursor)
+                else:
+                    table.load_key_columns(cursor)
+        finally:
+            cursor.close()
+            self.conn_pool.putconn(connection)
+
     def perform_termination(self) -> None:
         """
         Perform termination tasks. This method should be overridden by subclass.
@@ -93,6 +273,13 @@ class Consumer:
         logging.info('Terminating consumer')
         self.conn_pool.closeall()
 
+        if self.dedup_store is not None:
+            self.dedup_store.close()
+
+        self.dispatcher.close()
+        self.metrics.stop_http_server()
+        self.activity_log.flush()
+
         self.perform_termination()
 
         # Exiting the process gracefully
@@ -104,57 +291,267 @@ class Consumer:
         This method should be overridden by subclass.
 
         Args:
-            message_type (str): The type of the message ('I', 'U', 'D').
-            table_name (str): The name of the table the message is related to.
+            message_type (str): The type of the message ('I', 'U', 'D', 'T' for truncates, 'M' for logical decoding messages).
+            table_name (str): The name of the table the message is related to, the prefix for logical decoding messages.
             parsed_message (dict): The parsed message data.
         """
-        logging.debug(f'Consumer - Parsed message: {parsed_message}')
-        logging.debug(f'Consumer - Table name: {table_name}')
-        logging.debug(f'Consumer - Message type: {message_type}')
+        logging.debug('Consumer - Parsed message: %s', parsed_message)
+        logging.debug('Consumer - Table name: %s', table_name)
+        logging.debug('Consumer - Message type: %s', message_type)
 
         raise NotImplementedError('You must implement the perform_action method in your consumer class.')
 
-    def process_incoming_message(self, table_name: str, data: bytes) -> None:
+    def __restore_unchanged_toast(self, table_name: str, parser, parsed_message: dict, cursor) -> None:
+        """
+        Fill the unchanged TOAST values of a pgoutput change from the row cache, and keep
+        its new row image. Truncates drop the cached rows of their relations.
+
+        Args:
+            table_name (str): The name of the table the message is related to.
+            parser: The parser that decoded the message.
+            parsed_message (dict): The parsed message data.
+            cursor (psycopg2.extensions.cursor): Used to look up the primary key of new relations.
+        """
+        message_type = parsed_message.get('message_type')
+
+        if message_type == 'T':
+            for relation_id in parsed_message['relation_ids']:
+                self.row_cache.forget_relation(relation_id)
+        elif message_type in ('I', 'U', 'D') and isinstance(parser, BaseMessage):
+            restored = self.row_cache.apply(parsed_message, parser.schema['columns'], cursor)
+            unchanged = len(parsed_message.get('unchanged_toast', ()))
+
+            if unchanged:
+                self.__toast_metric.inc(len(restored), table_name, 'restored')
+                self.__toast_metric.inc(unchanged - len(restored), table_name, 'missed')
+
+    def __decode_types(self, columns: List[dict], parsed_message: dict, cursor) -> None:
+        """
+        Decode the array, composite, range and enum values of a pgoutput change in place.
+
+        Args:
+            columns (List[dict]): The relation schema columns.
+            parsed_message (dict): The parsed message data.
+            cursor (psycopg2.extensions.cursor): Used to load types that were not preloaded.
+        """
+        for key in ('old', 'new'):
+            if parsed_message.get(key):
+                self.type_catalog.decode_row(columns, parsed_message[key], cursor)
+
+        for column, values in (parsed_message.get('diff') or {}).items():
+            values['old_value'] = parsed_message['old'].get(column)
+            values['new_value'] = parsed_message['new'].get(column)
+
+    def __record_trace(self, table_name: str, trace: Trace) -> None:
+        """
+        Record the end-to-end and per-stage latency of an applied change.
+
+        Timestamps come from different hosts, so latencies include their clock skew.
+
+        Args:
+            table_name (str): The table the change belongs to.
+            trace (Trace): The trace of the change.
+        """
+        applied_time = time.time()
+
+        if trace.commit_time is not None:
+            self.__latency_metric.observe(applied_time - trace.commit_time, table_name)
+            self.__stage_metric.observe(trace.capture_time - trace.commit_time, table_name, 'capture')
+
+        if trace.publish_time is not None:
+            self.__stage_metric.observe(trace.publish_time - trace.capture_time, table_name, 'publish')
+            self.__stage_metric.observe(applied_time - trace.publish_time, table_name, 'deliver')
+
+    @property
+    def change_schema(self) -> Optional[dict]:
+        """
+        The relation schema the change being handled by the current thread was decoded with.
+
+        Returns:
+            Optional[dict]: The schema, in the format of ``BaseMessage.schema``, or None outside of
+                perform_action and for wal2json changes and protocol messages.
+        """
+        return getattr(self.__local, 'change_schema', None)
+
+    def replay(self) -> int:
+        """
+        Process the changes of the recording configured in the 'replay' section.
+
+        Returns:
+            int: The number of changes processed.
+        """
+        if self.replay_driver is None:
+            raise ConnectionError('replay is missing from the configuration file.')
+
+        return self.replay_driver.replay_consumer(self)
+
+    def process_incoming_message(
+        self,
+        table_name: str,
+        data: bytes,
+        position: Optional[Tuple[int, int]] = None,
+        check_duplicate: bool = True,
+        trace: Optional[Trace] = None,
+        schema_version: Optional[int] = None
+    ) -> None:
         """
         Process incoming messages and delegate to the appropriate handler.
 
+        Changes with a position that the dedup store has already seen applied are dropped
+        before decoding, and the position is recorded once perform_action succeeds.
+
+        Relation messages published by the producer register their schema version, and
+        changes with a registered schema version are decoded with its columns, without
+        reading the catalog.
+
+        When handlers are registered, the change is decoded once and dispatched to the
+        matching ones, and this method returns once the required handlers have finished.
+
         Args:
             table_name (str): The name of the table the message is related to.
             data (bytes): The raw message data.
+            position (Optional[Tuple[int, int]]): The (commit_lsn, lsn) stream position of the change, if known.
+            check_duplicate (bool): Drop the change if it was already applied.
+            trace (Optional[Trace]): The trace of a sampled change, recorded once it is applied.
+            schema_version (Optional[int]): The version of the relation schema the change was sent with,
+                or the version carried by a Relation message.
+
+        Raises:
+            Exception: Any error raised while decoding or by perform_action, after it is logged and counted.
         """
+        if data[:1] == b'R':
+            # Registering a schema again is harmless, so Relation messages skip the duplicate check
+            if self.schema_registry is not None:
+                self.schema_registry.register(RelationMessage(data).decode_relation_message(), schema_version)
+
+            return
+
+        dedup_store = self.dedup_store if position is not None else None
+
+        if dedup_store is not None and check_duplicate and dedup_store.is_applied(table_name, position):
+            logging.debug('Dropping already applied change at %s - %s', position, table_name)
+            self.__duplicates_metric.inc(1, table_name)
+            return
+
         connection = self.conn_pool.getconn()
         cursor = connection.cursor()
+        released = False
 
         try:
-            logging.debug(f'Incoming message: {data}')
+            logging.debug('Incoming message: %s', data)
+            started = time.perf_counter()
             message_type = data[:1].decode('utf-8')
             parsed_message = {}
+            parser = None
+            schema = None
+
+            if self.schema_registry is not None and schema_version and message_type in ('I', 'U', 'D'):
+                schema = self.schema_registry.get(relation_id_of(data), schema_version)
+
+                if schema is None:
+                    logging.debug('Schema version %s of %s is not registered, reading the catalog', schema_version, table_name)
 
             if message_type == 'I':
-                logging.info(f'INSERT Message, Message Type: {message_type} - {table_name}')
-                parser = InsertMessage(data, cursor=cursor)
+                parser = InsertMessage(data, cursor=cursor, schema=schema)
                 parsed_message = parser.decode_insert_message()
 
             elif message_type == 'U':
-                logging.info(f'UPDATE Message, Message Type: {message_type} - {table_name}')
-                parser = UpdateMessage(data, cursor=cursor)
+                parser = UpdateMessage(data, cursor=cursor, schema=schema)
                 parsed_message = parser.decode_update_message()
 
             elif message_type == 'D':
-                logging.info(f'DELETE Message, Message Type: {message_type} - {table_name}')
-                parser = DeleteMessage(data, cursor=cursor)
+                parser = DeleteMessage(data, cursor=cursor, schema=schema)
                 parsed_message = parser.decode_delete_message()
 
+            elif message_type == 'T':
+                parser = TruncateMessage(data)
+                parsed_message = parser.decode_truncate_message()
+
+            elif message_type == 'M':
+                parser = LogicalMessage(data)
+                parsed_message = parser.decode_logical_message()
+
+            elif message_type == '{':
+                # wal2json format-version 2, the action takes the place of the pgoutput message type
+                parser = Wal2JsonMessage(data)
+
+                if parser.action is None:
+                    raise ValueError(
+                        f'The message of {table_name} has no action, only wal2json format-version 2 messages are supported.'
+                    )
+
+                message_type = parser.action
+                parsed_message = parser.decode()
+
+            if self.row_cache is not None and parser is not None and parsed_message:
+                self.__restore_unchanged_toast(table_name, parser, parsed_message, cursor)
+
+            # wal2json changes carry JSON values and no relation schema, only pgoutput changes are decoded
+            if self.type_catalog is not None and isinstance(parser, BaseMessage) and parsed_message:
+                self.__decode_types(parser.schema['columns'], parsed_message, cursor)
+
             cursor.close()
             self.conn_pool.putconn(connection)
+            released = True
 
-            if parsed_message:
-                logging.debug(f'Message type: {message_type}, parsed message: {json.dumps(parsed_message, indent=4)}')
-                self.perform_action(message_type, table_name, parsed_message)
+            timed = self.metrics.enabled or self.hooks.enabled
 
-            if message_type in ('I', 'U', 'D'):
-                logging.info(f'Sending feedback, Message Type: {message_type} - {table_name}')
+            if timed and parsed_message:
+                lookup_time = getattr(parser, 'schema_lookup_time', 0.0)
+                parse_time = time.perf_counter() - started - lookup_time
+
+                if self.metrics.enabled:
+                    self.__catalog_metric.observe(lookup_time, table_name)
+                    self.__parse_metric.observe(parse_time, table_name)
+                    self.__messages_metric.inc(1, table_name, message_type)
+                    self.__bytes_metric.inc(len(data), table_name, message_type)
+
+                if self.hooks.enabled:
+                    self.hooks.emit('catalog_lookup', lookup_time, table_name)
+                    self.hooks.emit('parse', parse_time, table_name)
+
+            materialized_table = self.materialized_tables.get(table_name)
+
+            if materialized_table is not None and parsed_message:
+                materialized_table.apply(message_type, parsed_message)
+
+            if parsed_message:
+                if logging.root.isEnabledFor(logging.DEBUG):
+                    logging.debug('Message type: %s, parsed message: %s', message_type, json.dumps(parsed_message, indent=4, default=str))
+
+                # Registered handlers share the decoded message instead of perform_action
+                perform_action = self.dispatcher.dispatch if len(self.handlers) else self.perform_action
+                self.__local.change_schema = parser.schema if isinstance(parser, BaseMessage) else None
+
+                try:
+                    if timed:
+                        started = time.perf_counter()
+                        perform_action(message_type, table_name, parsed_message)
+                        elapsed = time.perf_counter() - started
+                        self.__action_metric.observe(elapsed, table_name)
+
+                        if self.hooks.enabled:
+                            self.hooks.emit('perform_action', elapsed, table_name)
+                    else:
+                        perform_action(message_type, table_name, parsed_message)
+                finally:
+                    self.__local.change_schema = None
+
+            if dedup_store is not None:
+                dedup_store.mark_applied(table_name, position)
+
+            if trace is not None:
+                self.__record_trace(table_name, trace)
+
+            if message_type in ('I', 'U', 'D', 'T'):
+                self.activity_log.record(table_name, message_type, position[1] if position else None)
         except Exception as e:
             logging.exception(f'An error occurred: {e}')
-            cursor.close()
-            self.conn_pool.putconn(connection)
+            self.__errors_metric.inc(1, table_name)
+
+            if not released:
+                cursor.close()
+                self.conn_pool.putconn(connection)
+
+            # Let the caller decide whether to retry, dead-letter or drop the message
+            raise
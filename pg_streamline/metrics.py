@@ -0,0 +1,449 @@
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from 100µs to 10s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: Any) -> str:
+    """
+    Escape a label value for the Prometheus text format.
+
+    Args:
+        value (Any): The label value.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = '') -> str:
+    """
+    Format label names and values as a Prometheus label set.
+
+    Args:
+        names (Sequence[str]): The label names.
+        values (Sequence[Any]): The label values.
+        extra (str): An additional, already formatted label (e.g. le="0.1").
+    """
+    labels = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+
+    if extra:
+        labels.append(extra)
+
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+class Metric:
+    """
+    Base class for metrics. Label values are passed positionally, in the order of ``labels``.
+
+    Attributes:
+        name (str): The metric name.
+        documentation (str): The help text.
+        labels (Tuple[str, ...]): The label names.
+    """
+
+    type_name: str = None
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        """
+        Initialize the metric.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labels (Sequence[str]): The label names.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[Any, ...], Any] = {}
+
+    def render(self) -> List[str]:
+        """
+        Render the metric in the Prometheus text format.
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+
+        for label_values, value in self.collect():
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+
+        return lines
+
+    def collect(self) -> List[Tuple[Tuple[Any, ...], Any]]:
+        """
+        Return (label values, value) pairs.
+        """
+        with self._lock:
+            return list(self._values.items())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return the current values keyed by comma separated label values.
+        """
+        return {','.join(str(value) for value in label_values): value for label_values, value in self.collect()}
+
+
+class Counter(Metric):
+    """A monotonically increasing counter."""
+
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, *label_values: Any) -> None:
+        """
+        Increment the counter.
+
+        Args:
+            amount (float): The amount to add.
+            *label_values (Any): The label values.
+        """
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that can go up and down, or be computed when collected."""
+
+    type_name = 'gauge'
+
+    def set(self, value: float, *label_values: Any) -> None:
+        """
+        Set the gauge.
+
+        Args:
+            value (float): The value.
+            *label_values (Any): The label values.
+        """
+        with self._lock:
+            self._values[label_values] = value
+
+    def inc(self, amount: float = 1, *label_values: Any) -> None:
+        """
+        Increment the gauge.
+
+        Args:
+            amount (float): The amount to add, negative to decrement.
+            *label_values (Any): The label values.
+        """
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def set_function(self, function: Callable[[], float], *label_values: Any) -> None:
+        """
+        Compute the gauge with a function whenever it is collected.
+
+        Args:
+            function (Callable[[], float]): Returns the current value.
+            *label_values (Any): The label values.
+        """
+        with self._lock:
+            self._values[label_values] = function
+
+    def collect(self) -> List[Tuple[Tuple[Any, ...], Any]]:
+        """
+        Return (label values, value) pairs, evaluating function gauges.
+        """
+        return [
+            (label_values, value() if callable(value) else value)
+            for label_values, value in super().collect()
+        ]
+
+
+class Histogram(Metric):
+    """A histogram with fixed, cumulative buckets."""
+
+    type_name = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        """
+        Initialize the histogram.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labels (Sequence[str]): The label names.
+            buckets (Sequence[float]): The upper bounds of the buckets.
+        """
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *label_values: Any) -> None:
+        """
+        Record an observation.
+
+        Args:
+            value (float): The observed value.
+            *label_values (Any): The label values.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            state = self._values.get(label_values)
+
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), sum and count
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def collect(self) -> List[Tuple[Tuple[Any, ...], Any]]:
+        """
+        Return (label values, {'buckets', 'sum', 'count'}) pairs with cumulative buckets.
+        """
+        with self._lock:
+            items = [(label_values, (list(state[0]), state[1], state[2])) for label_values, state in self._values.items()]
+
+        collected = []
+
+        for label_values, (counts, total, count) in items:
+            cumulative, running = {}, 0
+
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                running += bucket_count
+                cumulative[bound] = running
+
+            collected.append((label_values, {'buckets': cumulative, 'sum': total, 'count': count}))
+
+        return collected
+
+    def render(self) -> List[str]:
+        """
+        Render the histogram in the Prometheus text format.
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+
+        for label_values, value in self.collect():
+            for bound, count in value['buckets'].items():
+                le = 'le="{}"'.format('+Inf' if bound == float('inf') else repr(bound))
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, label_values, le)} {count}')
+
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {value["sum"]}')
+            lines.append(f'{self.name}_count{labels} {value["count"]}')
+
+        return lines
+
+
+class MetricsRegistry:
+    """
+    A registry of metrics that can be rendered in the Prometheus text format.
+
+    Metrics are created with ``counter``, ``gauge`` and ``histogram``, which return the
+    existing metric when the name is already registered, so components can share them.
+
+    Attributes:
+        enabled (bool): Always True, components use it to skip timing work when disabled.
+    """
+
+    enabled = True
+
+    def __init__(self) -> None:
+        """
+        Initialize the MetricsRegistry.
+        """
+        self.__lock = threading.Lock()
+        self.__metrics: Dict[str, Metric] = {}
+        self.__server: Optional[ThreadingHTTPServer] = None
+
+    def __get_or_create(self, metric_class, name: str, documentation: str, labels: Sequence[str], **kwargs) -> Metric:
+        """
+        Return the metric registered under a name, creating it if needed.
+        """
+        with self.__lock:
+            metric = self.__metrics.get(name)
+
+            if metric is None:
+                metric = self.__metrics[name] = metric_class(name, documentation, labels, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f'Metric {name} is already registered as a {metric.type_name}.')
+
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        """
+        Get or create a counter.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labels (Sequence[str]): The label names.
+        """
+        return self.__get_or_create(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        """
+        Get or create a gauge.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labels (Sequence[str]): The label names.
+        """
+        return self.__get_or_create(Gauge, name, documentation, labels)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """
+        Get or create a histogram.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labels (Sequence[str]): The label names.
+            buckets (Sequence[float]): The upper bounds of the buckets.
+        """
+        return self.__get_or_create(Histogram, name, documentation, labels, buckets=buckets)
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text format.
+        """
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return the current value of every metric, keyed by name and label values.
+        """
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def start_http_server(self, port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+        """
+        Serve the metrics on http://host:port/metrics from a background thread.
+
+        Args:
+            port (int): The port to listen on, 0 for any free port.
+            host (str): The address to bind to.
+
+        Returns:
+            ThreadingHTTPServer: The running server.
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                logger.debug(format % args)
+
+        self.__server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.__server.daemon_threads = True
+        threading.Thread(target=self.__server.serve_forever, name='pg-streamline-metrics', daemon=True).start()
+
+        logger.info(f'Serving metrics on {host}:{self.__server.server_address[1]}/metrics')
+        return self.__server
+
+    def stop_http_server(self) -> None:
+        """
+        Stop the metrics HTTP server, if running.
+        """
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+
+class NullMetric:
+    """A metric that ignores every update."""
+
+    def inc(self, *args: Any) -> None:
+        pass
+
+    def set(self, *args: Any) -> None:
+        pass
+
+    def set_function(self, *args: Any) -> None:
+        pass
+
+    def observe(self, *args: Any) -> None:
+        pass
+
+
+class NullRegistry:
+    """
+    A registry used when metrics are disabled. Every metric is a shared no-op.
+
+    Attributes:
+        enabled (bool): Always False.
+    """
+
+    enabled = False
+
+    __metric = NullMetric()
+
+    def counter(self, *args: Any, **kwargs: Any) -> NullMetric:
+        return self.__metric
+
+    def gauge(self, *args: Any, **kwargs: Any) -> NullMetric:
+        return self.__metric
+
+    def histogram(self, *args: Any, **kwargs: Any) -> NullMetric:
+        return self.__metric
+
+    def render(self) -> str:
+        return ''
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {}
+
+    def stop_http_server(self) -> None:
+        pass
+
+
+def create_metrics_registry(config: Optional[dict]):
+    """
+    Create the registry described by the 'metrics' section of the configuration file.
+
+    Args:
+        config (Optional[dict]): The 'metrics' section, e.g. {'enabled': True, 'port': 9187}.
+
+    Returns:
+        MetricsRegistry or NullRegistry: A NullRegistry unless metrics are enabled.
+    """
+    if not config or not config.get('enabled', True):
+        return NullRegistry()
+
+    registry = MetricsRegistry()
+
+    if config.get('port') is not None:
+        registry.start_http_server(config['port'], config.get('host', '0.0.0.0'))
+
+    return registry
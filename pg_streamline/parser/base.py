@@ -1,24 +1,36 @@
 import io
 import logging
+import time
+from typing import Any, Dict, Optional, Tuple
 from ..utils import Utils
 
 
 class BaseMessage:
     """Base class for decoding PostgreSQL logical replication messages."""
 
-    def __init__(self, message: bytes, cursor) -> None:
+    def __init__(self, message: bytes, cursor, schema: Optional[Dict[str, Any]] = None) -> None:
         """
         Initialize the BaseMessage instance.
 
         :param message: The raw message payload from the replication stream.
         :param cursor: A psycopg2 cursor object for database operations.
+        :param schema: The relation schema the message was sent with, e.g. from a ``SchemaRegistry``.
+            Read from the catalog when None.
         """
         self.message = message
         self.buffer = io.BytesIO(message)
         self.message_type = self.read_string(length=1)
         self.relation_id = self.read_int32()
         self.cursor = cursor
-        self.schema = self.get_schema()
+        self.unchanged_columns = set()
+
+        if schema is not None:
+            self.schema = schema
+            self.schema_lookup_time = 0.0
+        else:
+            started = time.perf_counter()
+            self.schema = self.get_schema()
+            self.schema_lookup_time = time.perf_counter() - started
 
     def read_int16(self) -> int:
         """Read a 16-bit integer from the buffer."""
@@ -28,48 +40,79 @@ class BaseMessage:
         """Read a 32-bit integer from the buffer."""
         return Utils.convert_bytes_to_int(self.buffer.read(4))
 
+    def decode_old_tuple(self) -> Tuple[Optional[str], dict]:
+        """
+        Decode the optional old tuple of an update or delete, according to its marker.
+
+        With REPLICA IDENTITY FULL the old tuple ('O') holds the whole row, with DEFAULT or
+        USING INDEX it ('K') holds the key columns, and only when they changed for updates.
+
+        :return: The marker ('O', 'K', or None when there is no old tuple) and the old values.
+        """
+        marker = self.read_string(length=1)
+
+        if marker == 'O':
+            return marker, self.decode_tuple()
+
+        if marker == 'K':
+            return marker, self.decode_tuple(key_only=True)
+
+        # 'N' of an update without old tuple, the new tuple follows
+        self.buffer.seek(-1, io.SEEK_CUR)
+        return None, {}
+
     def read_string(self, length: int) -> str:
         """Read a string of a given length from the buffer."""
         return Utils.convert_bytes_to_utf8(self.buffer.read(length))
 
-    def decode_tuple(self) -> dict:
+    def decode_tuple(self, key_only: bool = False) -> dict:
         """
         Decode a tuple from the message.
 
+        :param key_only: Decode a key tuple ('K'), which only carries the replica identity columns.
+            The other columns are sent as NULL and are left out, key columns are never NULL.
         :return: A dictionary containing the decoded data.
         """
         n_columns = self.read_int16()
-        logging.debug(f'Number of columns: {n_columns}')
+        debug = logging.root.isEnabledFor(logging.DEBUG)
+
+        if debug:
+            logging.debug('Number of columns: %s', n_columns)
 
         data = {}
         columns = self.schema['columns']
 
         for i in range(n_columns):
             col_type = self.read_string(length=1)
-            logging.debug(f'Column type: {col_type}')
 
             if col_type == 'n':
-                logging.debug('NULL')
+                if key_only:
+                    continue
+
                 data[columns[i]['name']] = None
             elif col_type == 'u':
-                logging.debug('Unchanged TOASTed value')
+                # Unchanged TOASTed value, the value itself is not sent
                 data[columns[i]['name']] = None
+                self.unchanged_columns.add(columns[i]['name'])
             elif col_type == 't':
                 length = self.read_int32()
                 value = self.read_string(length=length)
-                logging.debug(f'Text: {value}')
                 data[columns[i]['name']] = value
 
+            if debug:
+                logging.debug('Column %s: type %s, value %r', columns[i]['name'], col_type, data[columns[i]['name']])
+
         return data
 
     def get_schema(self) -> dict:
         """
-        Retrieve the schema for the relation.
+        Retrieve the current schema of the relation from the catalog. Dropped columns are
+        not sent in tuples, so they are left out.
 
         :return: A dictionary containing the schema information.
         """
         relation_id = self.relation_id
-        logging.debug(f'Relation ID: {relation_id}')
+        logging.debug('Relation ID: %s', relation_id)
 
         schema = {
             'relation_id': relation_id,
@@ -77,7 +120,7 @@ class BaseMessage:
         }
 
         self.cursor.execute(
-            f'SELECT attname, atttypid FROM pg_attribute WHERE attrelid = {relation_id} AND attnum > 0;'
+            f'SELECT attname, atttypid FROM pg_attribute WHERE attrelid = {relation_id} AND attnum > 0 AND NOT attisdropped ORDER BY attnum;'
         )
 
         for column in self.cursor.fetchall():
@@ -14,12 +14,11 @@ class DeleteMessage(BaseMessage):
         if self.message_type == 'D':
             message_type = self.message_type
             relation_id = self.relation_id
-            old_tuple = self.read_string(length=1)
-            old_tuple_values = self.decode_tuple()
+            old_tuple, old_tuple_values = self.decode_old_tuple()
 
-            logging.debug(f'Message type: {message_type}')
-            logging.debug(f'Relation ID: {relation_id}')
-            logging.debug(f'Old tuple: {old_tuple}')
+            logging.debug('Message type: %s', message_type)
+            logging.debug('Relation ID: %s', relation_id)
+            logging.debug('Old tuple: %s', old_tuple)
 
             return {
                 'message_type': message_type,
@@ -0,0 +1,259 @@
+import io
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from ..utils import Utils
+from .delete import DeleteMessage
+from .insert import InsertMessage
+from .relation import RelationMessage
+from .update import UpdateMessage
+
+
+# Truncate option flags
+TRUNCATE_CASCADE = 1
+TRUNCATE_RESTART_IDENTITY = 2
+
+# Logical decoding message flag
+MESSAGE_TRANSACTIONAL = 1
+
+
+class ProtocolMessage:
+    """
+    Base class for pgoutput messages that do not carry a tuple, so they need no catalog lookup.
+    """
+
+    def __init__(self, message: bytes) -> None:
+        """
+        Initialize the ProtocolMessage instance.
+
+        :param message: The raw message payload from the replication stream.
+        """
+        self.message = message
+        self.buffer = io.BytesIO(message)
+        self.message_type = self.buffer.read(1).decode('utf-8')
+
+    def read_int8(self) -> int:
+        """Read an unsigned 8-bit integer from the buffer."""
+        return self.buffer.read(1)[0]
+
+    def read_int32(self) -> int:
+        """Read a 32-bit integer from the buffer."""
+        return Utils.convert_bytes_to_int(self.buffer.read(4))
+
+    def read_uint32(self) -> int:
+        """Read an unsigned 32-bit integer from the buffer, e.g. an OID or a transaction ID."""
+        return int.from_bytes(self.buffer.read(4), byteorder='big')
+
+    def read_int64(self) -> int:
+        """Read a 64-bit integer from the buffer."""
+        return Utils.convert_bytes_to_int(self.buffer.read(8))
+
+    def read_timestamp(self) -> float:
+        """Read a PostgreSQL timestamp from the buffer, as epoch seconds."""
+        return Utils.convert_pg_timestamp_to_epoch(self.read_int64())
+
+    def read_cstring(self) -> str:
+        """Read a null-terminated string from the buffer."""
+        # The buffer holds the message as bytes, also when it was given a memoryview
+        data = self.buffer.getvalue()
+        start = self.buffer.tell()
+        end = data.index(b'\x00', start)
+        self.buffer.seek(end + 1)
+        return data[start:end].decode('utf-8')
+
+    def decode(self) -> Dict[str, Any]:
+        """Placeholder for decoding the message. Should be overridden by subclass."""
+        raise NotImplementedError('This method should be overridden by subclass')
+
+
+class BeginMessage(ProtocolMessage):
+    """Class for decoding the Begin message that starts a transaction."""
+
+    def decode(self) -> Dict[str, Any]:
+        """
+        Decode a begin message from the replication stream.
+
+        :return: A dictionary with the final (commit) LSN, commit time and transaction ID.
+        """
+        return {
+            'message_type': self.message_type,
+            'final_lsn': self.read_int64(),
+            'commit_time': self.read_timestamp(),
+            'xid': self.read_uint32()
+        }
+
+
+class CommitMessage(ProtocolMessage):
+    """Class for decoding the Commit message that ends a transaction."""
+
+    def decode(self) -> Dict[str, Any]:
+        """
+        Decode a commit message from the replication stream.
+
+        :return: A dictionary with the commit LSN, end LSN and commit time.
+        """
+        flags = self.read_int8()
+
+        return {
+            'message_type': self.message_type,
+            'flags': flags,
+            'commit_lsn': self.read_int64(),
+            'end_lsn': self.read_int64(),
+            'commit_time': self.read_timestamp()
+        }
+
+
+class OriginMessage(ProtocolMessage):
+    """Class for decoding the Origin message of transactions replayed from another node."""
+
+    def decode(self) -> Dict[str, Any]:
+        """
+        Decode an origin message from the replication stream.
+
+        :return: A dictionary with the commit LSN on the origin server and the origin name.
+        """
+        return {
+            'message_type': self.message_type,
+            'origin_lsn': self.read_int64(),
+            'origin_name': self.read_cstring()
+        }
+
+
+class TypeMessage(ProtocolMessage):
+    """Class for decoding the Type message that describes a non built-in data type."""
+
+    def decode(self) -> Dict[str, Any]:
+        """
+        Decode a type message from the replication stream.
+
+        :return: A dictionary with the type OID, namespace and name.
+        """
+        return {
+            'message_type': self.message_type,
+            'type_id': self.read_uint32(),
+            'namespace': self.read_cstring(),
+            'type_name': self.read_cstring()
+        }
+
+
+class TruncateMessage(ProtocolMessage):
+    """Class for decoding the Truncate message, one for all the relations truncated by a statement."""
+
+    def decode(self) -> Dict[str, Any]:
+        """
+        Decode a truncate message from the replication stream.
+
+        :return: A dictionary with the truncated relation IDs and the statement options.
+        """
+        relation_count = self.read_int32()
+        options = self.read_int8()
+
+        return {
+            'message_type': self.message_type,
+            'relation_ids': [self.read_uint32() for _ in range(relation_count)],
+            'cascade': bool(options & TRUNCATE_CASCADE),
+            'restart_identity': bool(options & TRUNCATE_RESTART_IDENTITY)
+        }
+
+    def decode_truncate_message(self) -> Dict[str, Any]:
+        """
+        Decode a truncate message from the replication stream.
+
+        :return: A dictionary containing the decoded truncate message.
+        """
+        if self.message_type == 'T':
+            return self.decode()
+
+
+class LogicalMessage(ProtocolMessage):
+    """Class for decoding messages emitted with pg_logical_emit_message."""
+
+    def decode(self) -> Dict[str, Any]:
+        """
+        Decode a logical decoding message from the replication stream.
+
+        :return: A dictionary with the transactional flag, LSN, prefix and raw content.
+        """
+        flags = self.read_int8()
+        lsn = self.read_int64()
+        prefix = self.read_cstring()
+        length = self.read_int32()
+
+        return {
+            'message_type': self.message_type,
+            'transactional': bool(flags & MESSAGE_TRANSACTIONAL),
+            'lsn': lsn,
+            'prefix': prefix,
+            'content': self.buffer.read(length)
+        }
+
+    def decode_logical_message(self) -> Dict[str, Any]:
+        """
+        Decode a logical decoding message from the replication stream.
+
+        :return: A dictionary containing the decoded message.
+        """
+        if self.message_type == 'M':
+            return self.decode()
+
+
+# Decoders of the pgoutput (protocol version 1) message types. Insert, Update and Delete
+# need a cursor to read the relation schema from the catalog, the others ignore it.
+DECODERS: Dict[str, Callable[[bytes, Any], Dict[str, Any]]] = {
+    'B': lambda message, cursor: BeginMessage(message).decode(),
+    'C': lambda message, cursor: CommitMessage(message).decode(),
+    'O': lambda message, cursor: OriginMessage(message).decode(),
+    'R': lambda message, cursor: RelationMessage(message).decode_relation_message(),
+    'Y': lambda message, cursor: TypeMessage(message).decode(),
+    'T': lambda message, cursor: TruncateMessage(message).decode(),
+    'M': lambda message, cursor: LogicalMessage(message).decode(),
+    'I': lambda message, cursor: InsertMessage(message, cursor=cursor).decode_insert_message(),
+    'U': lambda message, cursor: UpdateMessage(message, cursor=cursor).decode_update_message(),
+    'D': lambda message, cursor: DeleteMessage(message, cursor=cursor).decode_delete_message()
+}
+
+
+def register_decoder(message_type: str, decoder: Callable[[bytes, Any], Dict[str, Any]]) -> None:
+    """
+    Register the decoder of a message type, replacing the built-in one if any.
+
+    :param message_type: The message type byte, e.g. 'S' for protocol version 2 Stream Start.
+    :param decoder: Called with the raw message and a cursor, returns the decoded message.
+    """
+    DECODERS[message_type] = decoder
+
+
+def decode_message(message: bytes, cursor=None) -> Optional[Dict[str, Any]]:
+    """
+    Decode any pgoutput message with the decoder registered for its type.
+
+    :param message: The raw message payload from the replication stream.
+    :param cursor: A psycopg2 cursor, required for Insert, Update and Delete messages.
+    :return: The decoded message, or None for message types without a decoder.
+    """
+    message_type = bytes(message[:1]).decode('utf-8')
+    decoder = DECODERS.get(message_type)
+
+    if decoder is None:
+        logging.debug('No decoder for message type %s', message_type)
+        return None
+
+    return decoder(message, cursor)
+
+
+def relation_ids(message: bytes) -> List[int]:
+    """
+    Return the relation IDs a pgoutput message refers to, without decoding its tuples.
+
+    :param message: The raw message payload from the replication stream.
+    :return: One ID for Insert, Update, Delete and Relation messages, all truncated relations for Truncate, none otherwise.
+    """
+    message_type = message[:1]
+
+    if message_type in (b'I', b'U', b'D', b'R'):
+        return [int.from_bytes(message[1:5], byteorder='big')]
+
+    if message_type == b'T':
+        return TruncateMessage(message).decode()['relation_ids']
+
+    return []
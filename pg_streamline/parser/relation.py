@@ -0,0 +1,75 @@
+import logging
+from typing import Any, Dict
+
+from .base import BaseMessage
+
+
+class RelationMessage(BaseMessage):
+    """
+    Class for decoding PostgreSQL logical replication relation messages.
+
+    A relation message describes the columns of a table, so its schema is read from
+    the message itself instead of the catalog and no cursor is needed.
+    """
+
+    def __init__(self, message: bytes, cursor=None) -> None:
+        """
+        Initialize the RelationMessage instance.
+
+        :param message: The raw message payload from the replication stream.
+        :param cursor: Unused, relation messages carry their own schema.
+        """
+        super().__init__(message, cursor)
+
+    def read_cstring(self) -> str:
+        """Read a null-terminated string from the buffer."""
+        # The buffer holds the message as bytes, also when it was given a memoryview
+        data = self.buffer.getvalue()
+        start = self.buffer.tell()
+        end = data.index(b'\x00', start)
+        self.buffer.seek(end + 1)
+        return data[start:end].decode('utf-8')
+
+    def get_schema(self) -> Dict[str, Any]:
+        """
+        Read the schema carried by the relation message.
+
+        :return: A dictionary containing the schema information.
+        """
+        schema = {
+            'relation_id': self.relation_id,
+            'namespace': self.read_cstring(),
+            'relation_name': self.read_cstring(),
+            'replica_identity': self.read_string(length=1),
+            'columns': []
+        }
+
+        for _ in range(self.read_int16()):
+            flags = self.buffer.read(1)[0]
+            name = self.read_cstring()
+            schema['columns'].append({
+                'name': name,
+                'type': self.read_int32(),
+                'type_modifier': self.read_int32(),
+                'key': bool(flags & 1)
+            })
+
+        return schema
+
+    def decode_relation_message(self) -> Dict[str, Any]:
+        """
+        Decode a relation message from the replication stream.
+
+        :return: A dictionary containing the decoded relation message.
+        """
+        if self.message_type == 'R':
+            logging.debug('Relation ID: %s', self.relation_id)
+            logging.debug('Relation: %s.%s', self.schema['namespace'], self.schema['relation_name'])
+
+            return {
+                'message_type': self.message_type,
+                'relation_id': self.relation_id,
+                'table_name': f'{self.schema["namespace"]}.{self.schema["relation_name"]}',
+                'replica_identity': self.schema['replica_identity'],
+                'columns': self.schema['columns']
+            }
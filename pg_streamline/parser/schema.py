@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import threading
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+from ..utils import Utils
+
+
+def relation_id_of(message: bytes) -> int:
+    """
+    Read the relation ID of an Insert, Update, Delete or Relation message without decoding it.
+
+    The ID is read as a signed 32-bit integer, like ``BaseMessage.read_int32`` reads it when
+    schemas are registered, so OIDs of 2^31 and above match their registry entries.
+
+    :param message: The raw message payload from the replication stream.
+    :return: The relation ID, as used by ``SchemaRegistry``.
+    """
+    return Utils.convert_bytes_to_int(message[1:5])
+
+class SchemaRegistry:
+    """
+    Versioned relation schemas, built from the Relation messages of the replication stream.
+
+    pgoutput sends a Relation message before the first change of a relation and again after
+    its schema changes, so the columns of a change are exactly those of the last Relation
+    message of its relation. The version of a schema is a positive 31-bit hash of its content,
+    so every producer, restarted or not, gives a schema the same version and never reuses the
+    version of another schema, which consumers may have stored. The producer tags every change
+    with the version of its relation, and consumers decode the change with that version's
+    columns instead of reading the current catalog, which may already have moved on (e.g. after
+    an ALTER TABLE) when queued changes are consumed.
+
+    Schemas are only known to the process that registered them, unless the registry is
+    persisted to a JSON file, in which case a restarted producer does not publish known schemas
+    again and a restarted consumer keeps decoding changes queued before it stopped.
+
+    Attributes:
+        path (Optional[str]): The JSON file the registry is persisted to, if any.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """
+        Initialize the SchemaRegistry.
+
+        :param path: The JSON file the registry is loaded from and written to, kept in memory only if None.
+        """
+        self.path = path
+        self.__versions: Dict[int, Dict[int, Dict[str, Any]]] = {}
+        self.__latest: Dict[int, int] = {}
+        self.__lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            with open(path) as file:
+                for relation_id, versions in json.load(file).items():
+                    self.__versions[int(relation_id)] = {int(version): schema for version, schema in versions.items()}
+                    # Versions are stored in registration order
+                    self.__latest[int(relation_id)] = list(self.__versions[int(relation_id)])[-1]
+
+            logging.info('Loaded schemas of %s relations from %s', len(self.__versions), path)
+
+    def __len__(self) -> int:
+        return sum(len(versions) for versions in self.__versions.values())
+
+    @staticmethod
+    def schema_of(relation: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the schema stored for a decoded Relation message.
+
+        :param relation: The message decoded by ``RelationMessage.decode_relation_message``.
+        :return: The relation ID, table name, replica identity and columns, in the format of ``BaseMessage.schema``.
+        """
+        return {
+            'relation_id': relation['relation_id'],
+            'table_name': relation['table_name'],
+            'replica_identity': relation['replica_identity'],
+            'columns': [dict(column) for column in relation['columns']]
+        }
+
+    @staticmethod
+    def version_of(schema: Dict[str, Any]) -> int:
+        """
+        Derive the version of a schema from its content.
+
+        :param schema: The schema built by ``schema_of``.
+        :return: A positive 31-bit hash of the schema, which fits the integer headers of brokers.
+        """
+        return zlib.crc32(json.dumps(schema, sort_keys=True).encode('utf-8')) & 0x7FFFFFFF or 1
+
+    def register(self, relation: Dict[str, Any], version: Optional[int] = None) -> Tuple[int, bool]:
+        """
+        Register the schema of a Relation message.
+
+        :param relation: The message decoded by ``RelationMessage.decode_relation_message``.
+        :param version: The version assigned by the producer. If None, the version is derived
+            from the schema with ``version_of``.
+        :return: The version of the schema and whether it was not known before.
+        """
+        relation_id = relation['relation_id']
+        schema = self.schema_of(relation)
+
+        with self.__lock:
+            versions = self.__versions.setdefault(relation_id, {})
+
+            if version is None:
+                version = self.version_of(schema)
+
+                # Two schemas of a relation with the same hash are told apart by the next free version
+                while versions.get(version, schema) != schema:
+                    version = version % 0x7FFFFFFF + 1
+
+            added = versions.pop(version, None) != schema
+            versions[version] = schema
+            self.__latest[relation_id] = version
+
+            if added and self.path is not None:
+                self.__write()
+
+        if added:
+            logging.info('Registered schema version %s of %s', version, schema['table_name'])
+
+        return version, added
+
+    def get(self, relation_id: int, version: int) -> Optional[Dict[str, Any]]:
+        """
+        Return a version of the schema of a relation.
+
+        :param relation_id: The relation ID.
+        :param version: The schema version.
+        :return: The schema, or None if the version is unknown.
+        """
+        return self.__versions.get(relation_id, {}).get(version)
+
+    def latest(self, relation_id: int) -> Optional[int]:
+        """
+        Return the version of the last schema registered for a relation.
+
+        :param relation_id: The relation ID.
+        :return: The version, or None if no Relation message was seen for the relation.
+        """
+        return self.__latest.get(relation_id)
+
+    def table_name(self, relation_id: int) -> Optional[str]:
+        """
+        Return the table name of the last schema registered for a relation.
+
+        :param relation_id: The relation ID.
+        :return: The fully qualified table name, or None if no Relation message was seen for the relation.
+        """
+        version = self.__latest.get(relation_id)
+        return self.__versions[relation_id][version]['table_name'] if version is not None else None
+
+    def __write(self) -> None:
+        """
+        Write the registry to a temporary file and rename it over the store. Called with the lock held.
+        """
+        temporary_path = f'{self.path}.tmp'
+
+        with open(temporary_path, 'w') as file:
+            json.dump(self.__versions, file)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temporary_path, self.path)
@@ -0,0 +1,225 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .update import UpdateMessage
+
+
+# Rough per-row and per-value bookkeeping overhead, added to the length of the values
+ROW_OVERHEAD_BYTES = 200
+VALUE_OVERHEAD_BYTES = 50
+
+# Primary key column names of a relation, in index order
+KEY_COLUMNS_QUERY = '''
+SELECT ARRAY(
+    SELECT a.attname::text FROM unnest(i.indkey) WITH ORDINALITY AS k(attnum, position)
+    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+    ORDER BY k.position
+) FROM pg_index i WHERE i.indrelid = %s AND i.indisprimary;
+'''
+
+
+def estimate_row_bytes(row: Dict[str, Any]) -> int:
+    """
+    Estimate the memory held by a cached row image.
+
+    :param row: The row, with text values as decoded by ``decode_tuple``.
+    :return: The estimated size in bytes.
+    """
+    return ROW_OVERHEAD_BYTES + sum(
+        VALUE_OVERHEAD_BYTES + (len(value) if isinstance(value, str) else 8) for value in row.values()
+    )
+
+
+class RowStateCache:
+    """
+    Bounded LRU cache of the last row image seen for each (relation, primary key).
+
+    pgoutput sends unchanged TOAST values of an update as 'u', without the value. The cache
+    fills them from the last image of the same row, seen in an earlier insert or update, so
+    no query is needed to recover them. Without REPLICA IDENTITY FULL, updates carry no old
+    image (or only its key) and deletes only the key; the cache rebuilds the old image and
+    the diff from the cached row. Images are evicted least recently used first once
+    their estimated size exceeds max_bytes. Rows of relations without a primary key are not
+    cached.
+
+    Attributes:
+        max_bytes (int): The byte budget of the cached images.
+        size_bytes (int): The estimated size of the cached images.
+        hits (int): Unchanged TOAST values restored.
+        misses (int): Unchanged TOAST values that were not cached, left as None.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        """
+        Initialize the RowStateCache.
+
+        :param max_bytes: The byte budget of the cached images.
+        """
+        if max_bytes <= 0:
+            raise ValueError('max_bytes must be positive.')
+
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.__rows: 'OrderedDict[Tuple[int, Tuple[Any, ...]], Tuple[Dict[str, Any], int]]' = OrderedDict()
+        self.__key_columns: Dict[int, List[str]] = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__rows)
+
+    def key_columns(self, relation_id: int, columns: List[Dict[str, Any]], cursor) -> List[str]:
+        """
+        Return the primary key columns of a relation, cached per relation.
+
+        :param relation_id: The relation ID.
+        :param columns: The relation schema columns.
+        :param cursor: A psycopg2 cursor used to look up the primary key once.
+        :return: The key column names, empty for relations without a primary key.
+        """
+        key_columns = self.__key_columns.get(relation_id)
+
+        if key_columns is None:
+            # Names rather than attribute numbers, which do not match column positions once a column is dropped
+            cursor.execute(KEY_COLUMNS_QUERY, (relation_id,))
+            row = cursor.fetchone()
+            names = {column['name'] for column in columns}
+            key_columns = [name for name in row[0] if name in names] if row else []
+            self.__key_columns[relation_id] = key_columns
+
+        return key_columns
+
+    @staticmethod
+    def __key(row: Optional[Dict[str, Any]], key_columns: List[str]) -> Optional[Tuple[Any, ...]]:
+        """
+        Return the primary key of a row image, or None if the image does not hold it.
+
+        :param row: The row image.
+        :param key_columns: The key column names.
+        """
+        if not row:
+            return None
+
+        key = tuple(row.get(column) for column in key_columns)
+        return None if None in key else key
+
+    def __store(self, cache_key: Tuple[int, Tuple[Any, ...]], row: Dict[str, Any]) -> None:
+        """
+        Cache a copy of a row image and evict rows over the byte budget. Called with the lock held.
+
+        :param cache_key: The (relation, primary key) of the row.
+        :param row: The row image.
+        """
+        self.__remove(cache_key)
+        size = estimate_row_bytes(row)
+
+        if size > self.max_bytes:
+            return
+
+        self.__rows[cache_key] = (dict(row), size)
+        self.size_bytes += size
+
+        while self.size_bytes > self.max_bytes:
+            _, (_, evicted_size) = self.__rows.popitem(last=False)
+            self.size_bytes -= evicted_size
+
+    def __remove(self, cache_key: Tuple[int, Tuple[Any, ...]]) -> None:
+        """
+        Drop a row image. Called with the lock held.
+
+        :param cache_key: The (relation, primary key) of the row.
+        """
+        entry = self.__rows.pop(cache_key, None)
+
+        if entry is not None:
+            self.size_bytes -= entry[1]
+
+    def apply(self, parsed_message: Dict[str, Any], columns: List[Dict[str, Any]], cursor) -> Set[str]:
+        """
+        Restore the unchanged TOAST values of a decoded change and remember its new row image.
+
+        :param parsed_message: An insert, update or delete decoded by the parser, updated in place.
+        :param columns: The relation schema columns.
+        :param cursor: A psycopg2 cursor used to look up the primary key of new relations.
+        :return: The columns whose value was restored.
+        """
+        relation_id = parsed_message['relation_id']
+        key_columns = self.key_columns(relation_id, columns, cursor)
+
+        if not key_columns:
+            return set()
+
+        message_type = parsed_message['message_type']
+        restored: Set[str] = set()
+
+        with self.__lock:
+            if message_type == 'D':
+                old = parsed_message.get('old')
+                old_key = self.__key(old, key_columns)
+
+                if old_key is not None:
+                    entry = self.__rows.get((relation_id, old_key))
+
+                    if entry is not None and len(old) < len(entry[0]):
+                        # Key-only old image, the rest of the row comes from the cache
+                        parsed_message['old'] = dict(entry[0], **old)
+
+                    self.__remove((relation_id, old_key))
+
+                return restored
+
+            new = parsed_message['new']
+            new_key = self.__key(new, key_columns)
+
+            if new_key is None:
+                return restored
+
+            if message_type == 'U':
+                # The old image only holds the key when the key changed or with REPLICA IDENTITY FULL
+                old_key = self.__key(parsed_message.get('old'), key_columns) or new_key
+                entry = self.__rows.get((relation_id, old_key))
+
+                for column in parsed_message.get('unchanged_toast', ()):
+                    if entry is not None and entry[0].get(column) is not None:
+                        new[column] = entry[0][column]
+                        restored.add(column)
+
+                        if parsed_message.get('old') and parsed_message['old'].get(column) is None:
+                            parsed_message['old'][column] = new[column]
+                    else:
+                        logging.debug('Unchanged TOAST value of %s in relation %s is not cached', column, relation_id)
+
+                self.hits += len(restored)
+                self.misses += len(parsed_message.get('unchanged_toast', ())) - len(restored)
+
+                old = parsed_message.get('old') or {}
+
+                if entry is not None and len(old) < len(new):
+                    # Without REPLICA IDENTITY FULL the old image is rebuilt from the cached row,
+                    # so the diff covers every column instead of the key at most
+                    parsed_message['old'] = dict(entry[0], **old)
+                    parsed_message['diff'] = UpdateMessage.calculate_diff(
+                        parsed_message['old'], new, parsed_message.get('unchanged_toast', ())
+                    )
+
+                if old_key != new_key:
+                    self.__remove((relation_id, old_key))
+
+            self.__store((relation_id, new_key), new)
+
+        return restored
+
+    def forget_relation(self, relation_id: int) -> None:
+        """
+        Drop the cached rows of a relation, e.g. when it is truncated.
+
+        :param relation_id: The relation ID.
+        """
+        with self.__lock:
+            for cache_key in [cache_key for cache_key in self.__rows if cache_key[0] == relation_id]:
+                self.__remove(cache_key)
+
+            self.__key_columns.pop(relation_id, None)
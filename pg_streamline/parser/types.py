@@ -0,0 +1,359 @@
+import functools
+import logging
+import re
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from pg_streamline.columnar import convert_text_value, pg_type_kind
+
+
+# Columns of the bulk type query, one row per type
+TYPE_COLUMNS = '''
+    t.oid::int, t.typname::text, t.typtype::text, t.typcategory::text, t.typelem::int, t.typdelim::text,
+    t.typbasetype::int,
+    (SELECT r.rngsubtype::int FROM pg_range r WHERE r.rngtypid = t.oid),
+    (SELECT array_agg(e.enumlabel::text ORDER BY e.enumsortorder) FROM pg_enum e WHERE e.enumtypid = t.oid),
+    (SELECT array_agg(a.attname::text ORDER BY a.attnum) FROM pg_attribute a
+        WHERE a.attrelid = t.typrelid AND t.typtype = 'c' AND a.attnum > 0 AND NOT a.attisdropped),
+    (SELECT array_agg(a.atttypid::int ORDER BY a.attnum) FROM pg_attribute a
+        WHERE a.attrelid = t.typrelid AND t.typtype = 'c' AND a.attnum > 0 AND NOT a.attisdropped)
+'''
+
+# Types reachable from a set of root types: array elements, domain bases, range subtypes and composite attributes
+TYPE_QUERY = '''
+WITH RECURSIVE types(oid) AS (
+    {roots}
+  UNION
+    SELECT sub.oid FROM types
+    JOIN pg_type t ON t.oid = types.oid
+    CROSS JOIN LATERAL (
+        SELECT t.typelem WHERE t.typelem <> 0
+        UNION ALL SELECT t.typbasetype WHERE t.typbasetype <> 0
+        UNION ALL SELECT r.rngsubtype FROM pg_range r WHERE r.rngtypid = t.oid
+        UNION ALL SELECT a.atttypid FROM pg_attribute a
+            WHERE a.attrelid = t.typrelid AND t.typtype = 'c' AND a.attnum > 0 AND NOT a.attisdropped
+    ) AS sub(oid)
+)
+SELECT {columns} FROM pg_type t WHERE t.oid IN (SELECT oid FROM types);
+'''
+
+# Column types of the published relations, of the given publications or of all of them
+PUBLISHED_ROOTS = '''
+    SELECT a.atttypid FROM pg_publication_tables p
+    JOIN pg_attribute a ON a.attrelid = (quote_ident(p.schemaname) || '.' || quote_ident(p.tablename))::regclass
+    WHERE a.attnum > 0 AND NOT a.attisdropped {publications}
+'''
+
+OID_ROOTS = 'SELECT unnest(%s::oid[])'
+
+# Escaped characters inside double quoted array elements
+ESCAPE_PATTERN = re.compile(r'\\(.)')
+
+# Escaped characters and doubled quotes inside double quoted composite fields
+COMPOSITE_ESCAPE_PATTERN = re.compile(r'\\(.)|""')
+
+# A composite field or range bound: double quoted, or unquoted up to the next comma
+COMPOSITE_FIELD_PATTERN = re.compile(r'"((?:[^"\\]|\\.|"")*)"|([^,]*)')
+
+
+class TypeInfo(NamedTuple):
+    """
+    The catalog entry of a PostgreSQL type.
+
+    Attributes:
+        oid (int): The type OID.
+        name (str): The type name.
+        type_type (str): pg_type.typtype: 'b' base, 'c' composite, 'd' domain, 'e' enum, 'r' range.
+        category (str): pg_type.typcategory, 'A' for arrays.
+        element (int): The element type of arrays, 0 otherwise.
+        delimiter (str): The array element delimiter.
+        base_type (int): The base type of domains, 0 otherwise.
+        subtype (Optional[int]): The subtype of ranges.
+        labels (Optional[List[str]]): The labels of enums, in sort order.
+        attribute_names (Optional[List[str]]): The attribute names of composites.
+        attribute_types (Optional[List[int]]): The attribute type OIDs of composites.
+    """
+    oid: int
+    name: str
+    type_type: str
+    category: str
+    element: int
+    delimiter: str
+    base_type: int
+    subtype: Optional[int] = None
+    labels: Optional[List[str]] = None
+    attribute_names: Optional[List[str]] = None
+    attribute_types: Optional[List[int]] = None
+
+
+@functools.lru_cache(maxsize=None)
+def array_token_pattern(delimiter: str) -> 're.Pattern':
+    """
+    Compile the token pattern of array literals with the given element delimiter.
+
+    :param delimiter: The element delimiter, ',' for every built-in type except box.
+    :return: A pattern matching a quoted element, a brace, or an unquoted element.
+    """
+    delimiter = re.escape(delimiter)
+    return re.compile(rf'"((?:[^"\\]|\\.)*)"|([{{}}])|([^{{}}"{delimiter}]+)')
+
+
+def parse_array(text: str, element: Callable[[str], Any] = str, delimiter: str = ',') -> Optional[list]:
+    """
+    Parse a PostgreSQL array literal such as '{1,2,NULL}' or '{{"a b",c},{d,e}}'.
+
+    :param text: The array in text format.
+    :param element: Converts each non-NULL element.
+    :param delimiter: The element delimiter.
+    :return: Nested lists of converted elements, None elements for NULL.
+    """
+    if text is None:
+        return None
+
+    if text[0] == '[':
+        # Arrays with non-default lower bounds are prefixed with their dimensions, e.g. '[0:1]={1,2}'
+        text = text[text.index('=') + 1:]
+
+    stack: List[list] = [[]]
+
+    for quoted, brace, bare in array_token_pattern(delimiter).findall(text):
+        if brace == '{':
+            nested: list = []
+            stack[-1].append(nested)
+            stack.append(nested)
+        elif brace == '}':
+            stack.pop()
+        elif bare:
+            bare = bare.strip()
+            stack[-1].append(None if bare == 'NULL' else element(bare))
+        else:
+            stack[-1].append(element(ESCAPE_PATTERN.sub(r'\1', quoted) if '\\' in quoted else quoted))
+
+    return stack[0][0] if stack[0] else []
+
+
+def split_fields(body: str) -> List[Optional[str]]:
+    """
+    Split the body of a composite or range literal into its fields. Empty unquoted
+    fields are NULL.
+
+    :param body: The literal without its enclosing parentheses or brackets.
+    :return: The unescaped fields.
+    """
+    fields: List[Optional[str]] = []
+    position = 0
+
+    while True:
+        match = COMPOSITE_FIELD_PATTERN.match(body, position)
+        quoted, bare = match.groups()
+
+        if quoted is not None:
+            fields.append(COMPOSITE_ESCAPE_PATTERN.sub(lambda escaped: escaped.group(1) or '"', quoted))
+        else:
+            fields.append(bare or None)
+
+        position = match.end()
+
+        if position >= len(body):
+            return fields
+
+        position += 1
+
+
+def parse_composite(text: str, attributes: Sequence[str], converters: Sequence[Callable[[str], Any]]) -> Optional[dict]:
+    """
+    Parse a PostgreSQL composite literal such as '(1,"a b",)'.
+
+    :param text: The composite in text format.
+    :param attributes: The attribute names, in order.
+    :param converters: Converts each non-NULL attribute value.
+    :return: A dictionary of converted attribute values.
+    """
+    if text is None:
+        return None
+
+    return {
+        name: None if value is None else convert(value)
+        for name, convert, value in zip(attributes, converters, split_fields(text[1:-1]))
+    }
+
+
+def parse_range(text: str, bound: Callable[[str], Any] = str) -> Optional[dict]:
+    """
+    Parse a PostgreSQL range literal such as '[1,5)' or 'empty'.
+
+    :param text: The range in text format.
+    :param bound: Converts each finite bound.
+    :return: A dictionary with lower, upper, lower_inc, upper_inc and empty. Infinite bounds are None.
+    """
+    if text is None:
+        return None
+
+    if text == 'empty':
+        return {'lower': None, 'upper': None, 'lower_inc': False, 'upper_inc': False, 'empty': True}
+
+    lower, upper = split_fields(text[1:-1])
+
+    return {
+        'lower': None if lower is None else bound(lower),
+        'upper': None if upper is None else bound(upper),
+        'lower_inc': text[0] == '[',
+        'upper_inc': text[-1] == ']',
+        'empty': False
+    }
+
+
+def scalar_converter(type_oid: int) -> Callable[[str], Any]:
+    """
+    Return the converter of a base type nested in an array, composite or range.
+
+    :param type_oid: The type OID.
+    :return: A function converting the text value, to bool, int or float when possible.
+    """
+    kind = pg_type_kind(type_oid)
+
+    if kind == 'string':
+        return str
+
+    return functools.partial(convert_text_value, kind=kind)
+
+
+class TypeCatalog:
+    """
+    Type information for the columns of published relations, with parsers cached per type OID.
+
+    Array, composite, range and enum columns are decoded from their text format into lists,
+    dictionaries and strings. Other columns are left as they come out of ``decode_tuple``.
+
+    Attributes:
+        types (Dict[int, TypeInfo]): The loaded types, by OID.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty TypeCatalog.
+        """
+        self.types: Dict[int, TypeInfo] = {}
+        self.__parsers: Dict[int, Optional[Callable[[str], Any]]] = {}
+
+    def __load_rows(self, rows: Iterable[tuple]) -> int:
+        """
+        Add the rows of a type query to the catalog.
+
+        :param rows: Rows with the TYPE_COLUMNS columns.
+        :return: The number of types loaded.
+        """
+        count = 0
+
+        for row in rows:
+            info = TypeInfo(*row)
+            self.types[info.oid] = info
+            count += 1
+
+        # Parsers of composites and arrays depend on the types just loaded
+        self.__parsers.clear()
+        return count
+
+    def preload(self, cursor, publications: Optional[List[str]] = None) -> int:
+        """
+        Load every type used by the published relations in a single query.
+
+        :param cursor: A psycopg2 cursor on the source database.
+        :param publications: Only load the relations of these publications, all publications by default.
+        :return: The number of types loaded.
+        """
+        roots = PUBLISHED_ROOTS.format(publications='AND p.pubname = ANY(%s)' if publications else '')
+        cursor.execute(
+            TYPE_QUERY.format(roots=roots, columns=TYPE_COLUMNS),
+            (list(publications),) if publications else None
+        )
+        count = self.__load_rows(cursor.fetchall())
+        logging.info('Preloaded %s types for published relations', count)
+        return count
+
+    def load(self, cursor, type_oids: Iterable[int]) -> int:
+        """
+        Load the given types and the types they are made of.
+
+        :param cursor: A psycopg2 cursor on the source database.
+        :param type_oids: The type OIDs to load.
+        :return: The number of types loaded.
+        """
+        cursor.execute(TYPE_QUERY.format(roots=OID_ROOTS, columns=TYPE_COLUMNS), (list(type_oids),))
+        return self.__load_rows(cursor.fetchall())
+
+    def __build(self, type_oid: int, nested: bool) -> Optional[Callable[[str], Any]]:
+        """
+        Build the parser of a type.
+
+        :param type_oid: The type OID.
+        :param nested: Whether the value is nested in an array, composite or range.
+        :return: The parser, or None for values left as text.
+        """
+        info = self.types.get(type_oid)
+
+        if info is None:
+            return scalar_converter(type_oid) if nested else None
+
+        if info.type_type == 'd':
+            return self.__build(info.base_type, nested)
+
+        if info.category == 'A' and info.element:
+            element = self.__build(info.element, True)
+            return functools.partial(parse_array, element=element, delimiter=info.delimiter or ',')
+
+        if info.type_type == 'c' and info.attribute_names:
+            converters = [self.__build(attribute_type, True) for attribute_type in info.attribute_types]
+            return functools.partial(parse_composite, attributes=info.attribute_names, converters=converters)
+
+        if info.type_type == 'r' and info.subtype:
+            return functools.partial(parse_range, bound=self.__build(info.subtype, True))
+
+        if info.type_type == 'e':
+            return str
+
+        return scalar_converter(type_oid) if nested else None
+
+    def parser(self, type_oid: int) -> Optional[Callable[[str], Any]]:
+        """
+        Return the cached parser of a column type.
+
+        :param type_oid: The type OID.
+        :return: The parser, or None for columns left as text.
+        """
+        try:
+            return self.__parsers[type_oid]
+        except KeyError:
+            parser = self.__parsers[type_oid] = self.__build(type_oid, False)
+            return parser
+
+    def decode_row(self, columns: List[Dict[str, Any]], row: Dict[str, Any], cursor=None) -> Dict[str, Any]:
+        """
+        Decode the array, composite, range and enum values of a row in place.
+
+        :param columns: The relation schema columns, with name and type.
+        :param row: The row as decoded by ``decode_tuple``.
+        :param cursor: Used to load types that were not preloaded, e.g. of relations published later.
+        :return: The row.
+        """
+        if cursor is not None:
+            missing = {column['type'] for column in columns if column['type'] not in self.types}
+
+            if missing:
+                self.load(cursor, missing)
+                # Types that do not exist any more are not looked up again
+                for type_oid in missing - self.types.keys():
+                    self.types[type_oid] = TypeInfo(type_oid, '', 'b', '', 0, ',', 0)
+
+        for column in columns:
+            name = column['name']
+            value = row.get(name)
+
+            if value is None:
+                continue
+
+            parser = self.parser(column['type'])
+
+            if parser is not None:
+                row[name] = parser(value)
+
+        return row
@@ -1,23 +1,31 @@
 import logging
 from .base import BaseMessage
-from typing import Dict, Any
+from typing import Any, Dict, Iterable
 
 
 class UpdateMessage(BaseMessage):
     """Class for decoding PostgreSQL logical replication update messages."""
 
     @staticmethod
-    def calculate_diff(old_tuple_values: Dict[str, Any], new_tuple_values: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    def calculate_diff(
+        old_tuple_values: Dict[str, Any],
+        new_tuple_values: Dict[str, Any],
+        unchanged: Iterable[str] = ()
+    ) -> Dict[str, Dict[str, Any]]:
         """
         Calculate the difference between old and new tuple values.
 
         :param old_tuple_values: Dictionary containing old tuple values.
         :param new_tuple_values: Dictionary containing new tuple values.
+        :param unchanged: Columns known to be unchanged, i.e. unchanged TOAST values sent without their value.
         :return: A dictionary containing the differences.
         """
         diff = {}
 
         for key in old_tuple_values.keys():
+            if key in unchanged:
+                continue
+
             if old_tuple_values[key] != new_tuple_values[key]:
                 diff[key] = {
                     'old_value': old_tuple_values[key],
@@ -35,23 +43,28 @@ class UpdateMessage(BaseMessage):
             message_type = self.message_type
             relation_id = self.relation_id
 
-            old_tuple = self.read_string(length=1)
-            old_tuple_values = self.decode_tuple()
+            old_tuple, old_tuple_values = self.decode_old_tuple()
             new_tuple = self.read_string(length=1)
             new_tuple_values = self.decode_tuple()
 
-            logging.debug(f'Message type: {message_type}')
-            logging.debug(f'Relation ID: {relation_id}')
-            logging.debug(f'Old tuple: {old_tuple}')
-            logging.debug(f'New tuple: {new_tuple}')
+            logging.debug('Message type: %s', message_type)
+            logging.debug('Relation ID: %s', relation_id)
+            logging.debug('Old tuple: %s', old_tuple)
+            logging.debug('New tuple: %s', new_tuple)
 
-            logging.debug(f'Old tuple values: {old_tuple_values}')
-            logging.debug(f'New tuple values: {new_tuple_values}')
+            logging.debug('Old tuple values: %s', old_tuple_values)
+            logging.debug('New tuple values: %s', new_tuple_values)
 
-            return {
+            parsed_message = {
                 'message_type': message_type,
                 'relation_id': relation_id,
                 'old': old_tuple_values,
                 'new': new_tuple_values,
-                'diff': self.calculate_diff(old_tuple_values, new_tuple_values)
+                'diff': self.calculate_diff(old_tuple_values, new_tuple_values, self.unchanged_columns)
             }
+
+            if self.unchanged_columns:
+                # Their value is None in the tuples, unless restored from a RowStateCache
+                parsed_message['unchanged_toast'] = sorted(self.unchanged_columns)
+
+            return parsed_message
@@ -0,0 +1,78 @@
+import json
+import re
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+        loads = ujson.loads
+    except ImportError:
+        loads = json.loads
+
+
+class Wal2JsonMessage:
+    """Class for decoding wal2json format-version 2 messages (one change per message)."""
+
+    # Top-level string fields that precede 'columns' / 'identity' in format-version 2 output
+    HEADER_PATTERN = re.compile(rb'"(action|schema|table)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+    HEADER_END_PATTERN = re.compile(rb'"(columns|identity|content)"\s*:')
+
+    def __init__(self, message: bytes, lazy: bool = False) -> None:
+        """
+        Initialize the Wal2JsonMessage instance.
+
+        :param message: The raw message payload from the replication stream.
+        :param lazy: Only read the header fields instead of parsing the whole message.
+        """
+        self.message = bytes(message)
+        self.__data: Optional[Dict[str, Any]] = None
+
+        if lazy:
+            header = self.read_header()
+        else:
+            header = self.decode()
+
+        self.action: Optional[str] = header.get('action')
+        self.schema: Optional[str] = header.get('schema')
+        self.table: Optional[str] = header.get('table')
+
+    @property
+    def table_name(self) -> Optional[str]:
+        """The fully qualified table name, or None for messages without a table (B, C, M)."""
+        if self.schema is None or self.table is None:
+            return None
+
+        return f'{self.schema}.{self.table}'
+
+    def read_header(self) -> Dict[str, str]:
+        """
+        Read the action, schema and table fields without parsing the rest of the message.
+
+        :return: A dictionary containing the header fields that were found.
+        """
+        end = self.HEADER_END_PATTERN.search(self.message)
+        end_position = end.start() if end else len(self.message)
+
+        header = {}
+
+        for match in self.HEADER_PATTERN.finditer(self.message, 0, end_position):
+            key, value = match.group(1).decode('utf-8'), match.group(2)
+
+            if key not in header:
+                header[key] = loads(b'"' + value + b'"') if b'\\' in value else value.decode('utf-8')
+
+        return header
+
+    def decode(self) -> Dict[str, Any]:
+        """
+        Decode the full message.
+
+        :return: A dictionary containing the decoded message.
+        """
+        if self.__data is None:
+            self.__data = loads(self.message)
+
+        return self.__data
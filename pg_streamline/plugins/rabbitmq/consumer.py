@@ -1,8 +1,12 @@
 import logging
 import json
+import time
+
 import pika
 from pg_streamline import Consumer
 
+from .headers import ATTEMPTS_HEADER, ERROR_HEADER, ROUTING_KEY_HEADER, read_position, read_schema_version, read_trace
+
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
@@ -21,6 +25,11 @@ class RabbitMQConsumer(Consumer):
         routing_keys (str): Comma-separated list of routing keys to bind to the queue.
         queue (str): The name of the RabbitMQ queue to consume messages from.
         exchange (str): The name of the RabbitMQ exchange to bind to.
+        max_attempts (int): Attempts before a failing message is dead-lettered.
+        retry_delay (int): Milliseconds a failed message waits in the retry queue.
+        retry_queue (str): The TTL queue failed messages wait in before being redelivered.
+        dead_letter_exchange (str): The exchange messages are published to after max_attempts.
+        dead_letter_queue (str): The queue bound to the dead-letter exchange.
     """
 
     def __init__(self, config_path: str = None):
@@ -52,6 +61,43 @@ class RabbitMQConsumer(Consumer):
         for routing_key in routing_keys:
             self.channel.queue_bind(exchange=rabbitmq_exchange, queue=self.queue, routing_key=routing_key.strip())
 
+        # Failed messages wait in a TTL queue, then expire back into the consumer's queue
+        retry_config = self.config['rabbitmq'].get('retry') or {}
+        self.max_attempts = int(retry_config.get('max_attempts', 5))
+        self.retry_delay = int(retry_config.get('delay', 5000))
+        self.retry_queue = retry_config.get('retry_queue', f'{self.queue}.retry')
+        self.dead_letter_exchange = retry_config.get('dead_letter_exchange', f'{rabbitmq_exchange}.dead-letter')
+        self.dead_letter_queue = retry_config.get('dead_letter_queue', f'{self.queue}.dead-letter')
+
+        self.channel.queue_declare(
+            queue=self.retry_queue,
+            durable=True,
+            arguments={
+                'x-message-ttl': self.retry_delay,
+                'x-dead-letter-exchange': '',
+                'x-dead-letter-routing-key': self.queue
+            }
+        )
+        self.channel.exchange_declare(exchange=self.dead_letter_exchange, exchange_type='topic', durable=True)
+        self.channel.queue_declare(queue=self.dead_letter_queue, durable=True)
+        self.channel.queue_bind(exchange=self.dead_letter_exchange, queue=self.dead_letter_queue, routing_key='#')
+
+        self.__failures_metric = self.metrics.counter(
+            'pg_streamline_consumer_failures_total', 'Deliveries that failed to process', ['table']
+        )
+        self.__retries_metric = self.metrics.counter(
+            'pg_streamline_consumer_retries_total', 'Failed messages sent to the retry queue', ['table']
+        )
+        self.__dead_letters_metric = self.metrics.counter(
+            'pg_streamline_consumer_dead_letters_total', 'Messages dead-lettered after max_attempts', ['table']
+        )
+        self.__ack_metric = self.metrics.histogram(
+            'pg_streamline_consumer_ack_seconds', 'Time from delivery to acknowledgement', ['table']
+        )
+        self.__inflight_metric = self.metrics.gauge(
+            'pg_streamline_consumer_inflight_messages', 'Messages delivered and not yet acknowledged'
+        )
+
     def __validate_config(self):
         """
         Validate the configuration file.
@@ -74,17 +120,87 @@ class RabbitMQConsumer(Consumer):
         """
         Callback function to process incoming messages.
 
+        A message that fails is acknowledged and republished to the retry queue with its
+        attempt count in the headers, or to the dead-letter exchange once it has failed
+        max_attempts times, so a poison message no longer blocks the queue.
+
         Args:
             channel: The channel object.
             method: The method frame.
             properties: The properties.
             body: The message body.
         """
+        started = time.perf_counter()
+        self.__inflight_metric.inc(1)
+
+        headers = (properties.headers if properties is not None else None) or {}
+        # Retried messages come back from the retry queue with the queue name as routing key
+        table_name = headers.get(ROUTING_KEY_HEADER, method.routing_key)
+
         try:
-            self.process_incoming_message(method.routing_key, body)
+            # Retried messages failed before they were applied, so they skip the duplicate check
+            self.profiler.run(
+                self.process_incoming_message,
+                table_name,
+                body,
+                position=read_position(headers),
+                check_duplicate=ATTEMPTS_HEADER not in headers,
+                trace=read_trace(headers),
+                schema_version=read_schema_version(headers)
+            )
+            acked = time.perf_counter()
             channel.basic_ack(delivery_tag=method.delivery_tag)  # Acknowledge message
+
+            if self.hooks.enabled:
+                self.hooks.emit('feedback', time.perf_counter() - acked, table_name)
+
+            self.__ack_metric.observe(time.perf_counter() - started, table_name)
         except Exception as e:
             logger.exception(f"An error occurred: {e}")
+            self.__handle_failure(channel, method, headers, table_name, body, e)
+        finally:
+            self.__inflight_metric.inc(-1)
+
+    def __handle_failure(self, channel, method, headers: dict, table_name: str, body: bytes, error: Exception) -> None:
+        """
+        Send a failed message to the retry queue or, after max_attempts, to the dead-letter exchange.
+
+        Args:
+            channel: The channel object.
+            method: The method frame.
+            headers (dict): The headers of the failed delivery.
+            table_name (str): The table the message belongs to.
+            body (bytes): The message body.
+            error (Exception): The error raised while processing the message.
+        """
+        attempts = int(headers.get(ATTEMPTS_HEADER, 0)) + 1
+        self.__failures_metric.inc(1, table_name)
+
+        properties = pika.BasicProperties(
+            delivery_mode=2,
+            headers={
+                **headers,
+                ATTEMPTS_HEADER: attempts,
+                ROUTING_KEY_HEADER: table_name,
+                ERROR_HEADER: f'{type(error).__name__}: {error}'[:1024]
+            }
+        )
+
+        try:
+            if attempts >= self.max_attempts:
+                logger.error(f'Dead-lettering message for {table_name} after {attempts} attempts')
+                channel.basic_publish(
+                    exchange=self.dead_letter_exchange, routing_key=table_name, body=body, properties=properties
+                )
+                self.__dead_letters_metric.inc(1, table_name)
+            else:
+                logger.warning(f'Retrying message for {table_name} in {self.retry_delay}ms (attempt {attempts} of {self.max_attempts})')
+                channel.basic_publish(exchange='', routing_key=self.retry_queue, body=body, properties=properties)
+                self.__retries_metric.inc(1, table_name)
+
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+        except Exception:
+            logger.exception('Failed to route message for retry, requeueing it.')
             channel.basic_reject(delivery_tag=method.delivery_tag, requeue=True)  # Reject message
 
     def perform_action(self, message_type: str, table_name: str, parsed_message: dict):
@@ -95,8 +211,11 @@ class RabbitMQConsumer(Consumer):
             message_type (str): The type of the message (Insert, Update, Delete).
             parsed_message (dict): The parsed message content.
         """
-        logger.info(f'Performing action with message: {message_type}')
-        logger.info(json.dumps(parsed_message, indent=4))
+        logger.info('Performing action with message: %s', message_type)
+
+        if logger.isEnabledFor(logging.INFO):
+            # Logical decoding messages carry their content as bytes
+            logger.info(json.dumps(parsed_message, indent=4, default=str))
 
     def perform_termination(self):
         """
@@ -0,0 +1,110 @@
+from typing import Any, Dict, Optional, Tuple
+
+from pg_streamline.tracing import Trace
+
+
+# Position of the change in the replication stream, set by the producer
+LSN_HEADER = 'x-pg-streamline-lsn'
+COMMIT_LSN_HEADER = 'x-pg-streamline-commit-lsn'
+XID_HEADER = 'x-pg-streamline-xid'
+
+# Version of the relation schema of a change, and of the schema carried by a Relation message
+SCHEMA_VERSION_HEADER = 'x-pg-streamline-schema-version'
+
+# Trace timestamps (epoch seconds), set on sampled changes only
+COMMIT_TIME_HEADER = 'x-pg-streamline-commit-time'
+CAPTURE_TIME_HEADER = 'x-pg-streamline-capture-time'
+PUBLISH_TIME_HEADER = 'x-pg-streamline-publish-time'
+
+# Set by the consumer on retried and dead-lettered messages
+ATTEMPTS_HEADER = 'x-pg-streamline-attempts'
+ROUTING_KEY_HEADER = 'x-pg-streamline-routing-key'
+ERROR_HEADER = 'x-pg-streamline-error'
+
+
+def change_headers(lsn: int, commit_lsn: int = 0, xid: int = 0, schema_version: int = 0) -> Dict[str, int]:
+    """
+    Build the headers identifying a change.
+
+    Args:
+        lsn (int): The LSN of the change.
+        commit_lsn (int): The commit LSN of its transaction, 0 if unknown.
+        xid (int): The transaction ID, 0 if unknown.
+        schema_version (int): The version of its relation schema, left out if 0.
+    """
+    headers = {LSN_HEADER: lsn, COMMIT_LSN_HEADER: commit_lsn, XID_HEADER: xid}
+
+    if schema_version:
+        headers[SCHEMA_VERSION_HEADER] = schema_version
+
+    return headers
+
+
+def read_schema_version(headers: Optional[Dict[str, Any]]) -> Optional[int]:
+    """
+    Read the relation schema version of a change from its headers.
+
+    Args:
+        headers (Optional[Dict[str, Any]]): The message headers.
+    """
+    if not headers or not headers.get(SCHEMA_VERSION_HEADER):
+        return None
+
+    return int(headers[SCHEMA_VERSION_HEADER])
+
+
+def read_position(headers: Optional[Dict[str, Any]]) -> Optional[Tuple[int, int]]:
+    """
+    Read the (commit_lsn, lsn) stream position of a change from its headers.
+
+    Changes are only totally ordered by this position when the commit LSN is known
+    (pgoutput), so None is returned for messages without one.
+
+    Args:
+        headers (Optional[Dict[str, Any]]): The message headers.
+    """
+    if not headers or not headers.get(COMMIT_LSN_HEADER) or LSN_HEADER not in headers:
+        return None
+
+    return int(headers[COMMIT_LSN_HEADER]), int(headers[LSN_HEADER])
+
+
+def trace_headers(trace: Trace) -> Dict[str, float]:
+    """
+    Build the headers carrying a trace, leaving out unknown timestamps.
+
+    Args:
+        trace (Trace): The trace of the change.
+    """
+    headers = {CAPTURE_TIME_HEADER: trace.capture_time}
+
+    if trace.commit_time is not None:
+        headers[COMMIT_TIME_HEADER] = trace.commit_time
+
+    if trace.publish_time is not None:
+        headers[PUBLISH_TIME_HEADER] = trace.publish_time
+
+    return headers
+
+
+def read_trace(headers: Optional[Dict[str, Any]]) -> Optional[Trace]:
+    """
+    Read the trace of a change from its headers.
+
+    Args:
+        headers (Optional[Dict[str, Any]]): The message headers.
+
+    Returns:
+        Optional[Trace]: The trace, or None if the change was not sampled.
+    """
+    if not headers or CAPTURE_TIME_HEADER not in headers:
+        return None
+
+    commit_time = headers.get(COMMIT_TIME_HEADER)
+    publish_time = headers.get(PUBLISH_TIME_HEADER)
+
+    return Trace(
+        float(commit_time) if commit_time is not None else None,
+        float(headers[CAPTURE_TIME_HEADER]),
+        float(publish_time) if publish_time is not None else None
+    )
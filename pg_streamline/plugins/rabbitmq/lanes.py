@@ -0,0 +1,247 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter: ``rate`` tokens are added per second, up to ``burst``.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        burst (float): The bucket capacity, the number of messages that can be sent at once.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        Initialize the TokenBucket, full.
+
+        Args:
+            rate (float): Tokens added per second.
+            burst (Optional[float]): The bucket capacity, one second of tokens (at least one) by default.
+            clock (Callable[[], float]): Returns the current time in seconds.
+        """
+        if rate <= 0:
+            raise ValueError('rate must be positive.')
+
+        self.rate = float(rate)
+        self.burst = float(burst) if burst is not None else max(self.rate, 1.0)
+        self.__clock = clock
+        self.__tokens = self.burst
+        self.__updated = clock()
+
+    def take(self) -> float:
+        """
+        Take a token if one is available.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until the next one is available.
+        """
+        now = self.__clock()
+        self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rate)
+        self.__updated = now
+
+        if self.__tokens >= 1:
+            self.__tokens -= 1
+            return 0.0
+
+        return (1 - self.__tokens) / self.rate
+
+
+class Lane:
+    """
+    A priority class of tables, published on its own channel.
+
+    Messages wait in one FIFO queue per table, so the order of a table's changes is kept,
+    and the tables of a lane take turns. Tables of rate limited lanes each get a token bucket.
+
+    Attributes:
+        name (str): The lane name.
+        tables (List[str]): The tables routed to the lane, empty for the default lane.
+        rate (Optional[float]): Messages per second allowed for each table of the lane, unlimited if None.
+        burst (Optional[float]): The token bucket capacity of each table.
+        channel: The channel the lane publishes on, set by the producer.
+    """
+
+    def __init__(self, name: str, tables: Optional[List[str]] = None, rate: Optional[float] = None, burst: Optional[float] = None) -> None:
+        """
+        Initialize the Lane.
+
+        Args:
+            name (str): The lane name.
+            tables (Optional[List[str]]): The tables routed to the lane, none for the default lane.
+            rate (Optional[float]): Messages per second allowed for each table, unlimited if None.
+            burst (Optional[float]): The token bucket capacity of each table.
+        """
+        self.name = name
+        self.tables = list(tables or [])
+        self.rate = rate
+        self.burst = burst
+        self.channel = None
+        self.queues: 'OrderedDict[str, Deque[Any]]' = OrderedDict()
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    def bucket(self, table_name: str) -> Optional[TokenBucket]:
+        """
+        Return the token bucket of a table, None if the lane is not rate limited.
+
+        Args:
+            table_name (str): The table name.
+        """
+        if self.rate is None:
+            return None
+
+        if table_name not in self.buckets:
+            self.buckets[table_name] = TokenBucket(self.rate, self.burst)
+
+        return self.buckets[table_name]
+
+
+def create_lanes(configs: List[Dict[str, Any]]) -> List[Lane]:
+    """
+    Create the lanes described by the 'lanes' list of the rabbitmq section, highest priority first.
+
+    Args:
+        configs (List[Dict[str, Any]]): The lane entries, e.g. [{'name': 'bulk', 'tables': [...], 'rate': 200}].
+    """
+    lanes = []
+    routed = set()
+
+    for config in configs:
+        if 'name' not in config:
+            raise ConnectionError('name is missing from the lane configuration.')
+
+        lane = Lane(
+            config['name'],
+            tables=config.get('tables'),
+            rate=float(config['rate']) if config.get('rate') is not None else None,
+            burst=float(config['burst']) if config.get('burst') is not None else None
+        )
+
+        for table_name in lane.tables:
+            if table_name in routed:
+                raise ValueError(f'Table {table_name} is routed to more than one lane.')
+
+            routed.add(table_name)
+
+        lanes.append(lane)
+
+    if sum(1 for lane in lanes if not lane.tables) != 1:
+        raise ValueError('Exactly one lane must have no tables, it takes the tables of no other lane.')
+
+    return lanes
+
+
+class LaneScheduler:
+    """
+    Orders the messages waiting to be published across lanes.
+
+    The next message comes from the highest priority lane with a table that has a message
+    and a token, so high priority changes overtake bulk ones while each table keeps its order.
+    ``put`` blocks while max_pending messages are waiting, which slows down replication
+    instead of buffering without bound.
+
+    Attributes:
+        lanes (List[Lane]): The lanes, highest priority first.
+        max_pending (int): The number of waiting messages above which ``put`` blocks.
+    """
+
+    def __init__(self, lanes: List[Lane], max_pending: int = 10000) -> None:
+        """
+        Initialize the LaneScheduler.
+
+        Args:
+            lanes (List[Lane]): The lanes, highest priority first, one of them without tables.
+            max_pending (int): The number of waiting messages above which ``put`` blocks.
+        """
+        self.lanes = lanes
+        self.max_pending = max_pending
+        self.__routes = {table_name: lane for lane in lanes for table_name in lane.tables}
+        self.__default = next(lane for lane in lanes if not lane.tables)
+        self.__pending = 0
+        self.__closed = False
+        self.__condition = threading.Condition()
+
+    @property
+    def pending_count(self) -> int:
+        """
+        The number of messages waiting to be published.
+        """
+        return self.__pending
+
+    def lane_for(self, table_name: str) -> Lane:
+        """
+        Return the lane of a table.
+
+        Args:
+            table_name (str): The table name.
+        """
+        return self.__routes.get(table_name, self.__default)
+
+    def put(self, table_name: str, item: Any) -> None:
+        """
+        Queue a message of a table, waiting while max_pending messages are queued.
+
+        Args:
+            table_name (str): The table name.
+            item (Any): The message to publish.
+        """
+        lane = self.lane_for(table_name)
+
+        with self.__condition:
+            while self.__pending >= self.max_pending and not self.__closed:
+                self.__condition.wait()
+
+            lane.queues.setdefault(table_name, deque()).append(item)
+            self.__pending += 1
+            self.__condition.notify_all()
+
+    def get(self) -> Optional[Tuple[Lane, str, Any]]:
+        """
+        Wait for the next message to publish. Rate limits are ignored once the scheduler is
+        closed, so the remaining messages are published right away.
+
+        Returns:
+            Optional[Tuple[Lane, str, Any]]: The lane, table name and message, or None once
+                the scheduler is closed and empty.
+        """
+        with self.__condition:
+            while True:
+                wait = None
+
+                for lane in self.lanes:
+                    for table_name in list(lane.queues):
+                        bucket = lane.bucket(table_name)
+                        delay = bucket.take() if bucket is not None and not self.__closed else 0.0
+
+                        if delay:
+                            wait = delay if wait is None else min(wait, delay)
+                            continue
+
+                        queue = lane.queues[table_name]
+                        item = queue.popleft()
+
+                        if queue:
+                            # The lane's other tables go first next time
+                            lane.queues.move_to_end(table_name)
+                        else:
+                            del lane.queues[table_name]
+
+                        self.__pending -= 1
+                        self.__condition.notify_all()
+                        return lane, table_name, item
+
+                if self.__closed and not self.__pending:
+                    return None
+
+                self.__condition.wait(wait)
+
+    def close(self) -> None:
+        """
+        Close the scheduler: ``put`` no longer blocks, and ``get`` returns None once every
+        queued message has been taken.
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
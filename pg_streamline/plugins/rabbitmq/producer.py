@@ -1,6 +1,14 @@
 import logging
+import threading
+import time
+from typing import Optional
+
 import pika
 from pg_streamline import Producer
+from pg_streamline.sinks import LsnTracker
+
+from .headers import change_headers, trace_headers
+from .lanes import LaneScheduler, create_lanes
 
 
 # Initialize logging
@@ -14,8 +22,21 @@ class RabbitMQProducer(Producer):
     This class extends the base Producer class from the pg_streamline package.
     It initializes a RabbitMQ producer that publishes messages to a specific exchange.
 
+    With 'lanes' in the rabbitmq section, tables are published by priority class instead:
+    perform_action queues the message in its table's lane and a publisher thread publishes
+    the highest priority messages first, each lane on its own channel, within the rate
+    limits of bulk lanes. Feedback then only confirms published messages. Lanes only exist
+    in the producer: every lane publishes to the same exchange and routing keys.
+
+    pika connections are not thread-safe, so the publisher thread opens its own connection
+    and the lane channels on it. A failed publish is retried on a new connection, and once
+    the retries are exhausted the publisher stops and perform_action raises, instead of
+    leaving a message that feedback can never move past.
+
     Attributes:
         rabbitmq_url (str): The URL for the RabbitMQ broker.
+        scheduler (Optional[LaneScheduler]): Orders queued messages across lanes, when 'lanes' is configured.
+        lsn_tracker (Optional[LsnTracker]): Tracks which queued messages have been published, when 'lanes' is configured.
     """
 
     def __init__(self, config_path: str = None):
@@ -36,6 +57,25 @@ class RabbitMQProducer(Producer):
         # Declare a topic exchange
         self.channel.exchange_declare(exchange=self.rabbitmq_exchange, exchange_type='topic', durable=True)
 
+        self.scheduler: Optional[LaneScheduler] = None
+        self.lsn_tracker: Optional[LsnTracker] = None
+        self.__publisher: Optional[threading.Thread] = None
+        self.__publisher_error: Optional[Exception] = None
+
+        if self.config['rabbitmq'].get('lanes'):
+            if self.worker_pool is not None or self.worker_id is not None:
+                # Workers report records complete once perform_action returns, before lanes publish them
+                raise ValueError('The workers section is not supported with rabbitmq lanes.')
+
+            lanes = create_lanes(self.config['rabbitmq']['lanes'])
+            self.max_retries = int(self.config['rabbitmq'].get('publish_max_retries', 5))
+            self.retry_backoff = float(self.config['rabbitmq'].get('publish_retry_backoff', 0.5))
+            self.scheduler = LaneScheduler(lanes, max_pending=int(self.config['rabbitmq'].get('max_pending', 10000)))
+            self.lsn_tracker = LsnTracker()
+            self.__publisher = threading.Thread(target=self.__publish_lanes, name='pg-streamline-lane-publisher', daemon=True)
+            self.__publisher.start()
+            logging.info('Publishing with lanes: %s', ', '.join(lane.name for lane in lanes))
+
     def __validate_config(self):
         """
         Validate the configuration file.
@@ -56,27 +96,160 @@ class RabbitMQProducer(Producer):
 
     def perform_action(self, table_name: str, bytes_string: dict):
         """
-        Publish a message to the RabbitMQ exchange.
+        Publish a message to the RabbitMQ exchange, with its LSN, commit LSN and
+        transaction ID in the headers so consumers can drop duplicates, its schema
+        version, and the trace timestamps of sampled changes.
 
         Args:
             table_name (str): The table name that the message pertains to.
             bytes_string (dict): The message content.
         """
-        logging.info(f'Table name: {table_name}, Bytes String: {bytes_string}')
+        logging.debug('Table name: %s, Bytes String: %s', table_name, bytes_string)
+
+        context = self.change_context
+
+        if self.__publisher_error is not None:
+            raise ConnectionError(f'The lane publisher stopped: {self.__publisher_error}') from self.__publisher_error
+
+        if self.scheduler is None:
+            self.__publish(self.channel, table_name, bytes_string, context)
+        else:
+            # The message is published by the lane publisher, feedback waits for it
+            sequence = self.lsn_tracker.track(context.lsn) if context is not None else None
+            self.scheduler.put(table_name, (bytes_string, context, sequence))
+
+    def __publish(self, channel, table_name: str, body: bytes, context) -> None:
+        """
+        Publish a message with the headers of its change context.
+
+        Args:
+            channel: The channel to publish on.
+            table_name (str): The routing key.
+            body (bytes): The message content.
+            context (Optional[ChangeContext]): The change context, None outside of the replication loop.
+        """
+        headers = None
+
+        if context is not None:
+            headers = change_headers(context.lsn, context.commit_lsn, context.xid, context.schema_version)
 
-        self.channel.basic_publish(
+            if context.trace is not None:
+                headers.update(trace_headers(context.trace._replace(publish_time=time.time())))
+
+        channel.basic_publish(
             exchange=self.rabbitmq_exchange,
             routing_key=table_name,
-            body=bytes_string,
-            properties=pika.BasicProperties(delivery_mode=2)
+            body=body,
+            properties=pika.BasicProperties(delivery_mode=2, headers=headers)
         )
 
+    def __connect_lanes(self):
+        """
+        Open the publisher thread's connection and a channel per lane.
+
+        Returns:
+            pika.BlockingConnection: The connection.
+        """
+        connection = pika.BlockingConnection(pika.URLParameters(self.config['rabbitmq']['url']))
+
+        for lane in self.scheduler.lanes:
+            lane.channel = connection.channel()
+
+        return connection
+
+    @staticmethod
+    def __close_connection(connection) -> None:
+        """
+        Close a publisher connection, ignoring errors of a connection that is already broken.
+
+        Args:
+            connection (pika.BlockingConnection): The connection.
+        """
+        try:
+            if connection.is_open:
+                connection.close()
+        except Exception:
+            logging.debug('Failed to close the lane publisher connection', exc_info=True)
+
+    def __publish_lanes(self) -> None:
+        """
+        Publish queued messages in lane priority order until the scheduler is closed.
+
+        A failed publish is retried on a new connection up to max_retries times, with
+        exponential backoff. After that the publisher stops: the message is never confirmed,
+        so it is streamed again after a restart, and perform_action raises.
+        """
+        connection = None
+
+        try:
+            while True:
+                entry = self.scheduler.get()
+
+                if entry is None:
+                    break
+
+                lane, table_name, (body, context, sequence) = entry
+                attempts = 0
+
+                while True:
+                    try:
+                        if connection is None:
+                            connection = self.__connect_lanes()
+
+                        self.__publish(lane.channel, table_name, body, context)
+                        break
+                    except Exception as error:
+                        attempts += 1
+
+                        if connection is not None:
+                            self.__close_connection(connection)
+                            connection = None
+
+                        if attempts > self.max_retries:
+                            logging.error(
+                                'Stopping the lane publisher, a change of %s at LSN %s failed to publish %s times: %s',
+                                table_name, context.lsn if context is not None else None, attempts, error
+                            )
+                            self.__publisher_error = error
+                            self.scheduler.close()
+                            return
+
+                        delay = self.retry_backoff * 2 ** (attempts - 1)
+                        logging.warning('Failed to publish a change of %s on lane %s, reconnecting in %.1fs: %s', table_name, lane.name, delay, error)
+                        time.sleep(delay)
+
+                if sequence is not None:
+                    self.lsn_tracker.complete(sequence)
+                    super().send_feedback(flush_lsn=self.lsn_tracker.flushable_lsn)
+        finally:
+            if connection is not None:
+                self.__close_connection(connection)
+
+    def send_feedback(self, flush_lsn: int) -> None:
+        """
+        Send feedback for the highest LSN published, when messages are queued in lanes.
+
+        Args:
+            flush_lsn (int): The LSN of the message that has just been processed.
+        """
+        if self.lsn_tracker is None:
+            super().send_feedback(flush_lsn=flush_lsn)
+            return
+
+        self.lsn_tracker.observe(flush_lsn)
+        super().send_feedback(flush_lsn=self.lsn_tracker.flushable_lsn)
+
     def perform_termination(self):
         """
         Close the RabbitMQ connection.
 
         This method is called to gracefully close the RabbitMQ connection and channel.
         """
+        if self.scheduler is not None:
+            # Queued messages are published before the publisher closes its connection
+            self.scheduler.close()
+            self.__publisher.join()
+
         logging.info('Closing connection to RabbitMQ')
         self.channel.close()
         self.connection.close()
@@ -1 +1,3 @@
 from .process import Producer  # Importing Producer class from the process module
+from .sink import SinkProducer  # Importing SinkProducer class from the sink module
+from .fanin import FanInRunner  # Importing FanInRunner class from the fanin module
@@ -0,0 +1,57 @@
+from typing import Optional
+
+from pg_streamline.tracing import Trace
+
+
+class ChangeContext:
+    """
+    Metadata about the change currently being handed to ``perform_action``.
+
+    The producer creates one context per replication message and exposes it through
+    ``Producer.change_context`` for the duration of the ``perform_action`` call, so
+    subclasses can read replication metadata without changing the hook signature.
+
+    Attributes:
+        lsn (int): The LSN (data_start) of the replication message.
+        table_name (Optional[str]): The fully qualified table name, if any.
+        commit_lsn (int): The commit LSN of the enclosing transaction, 0 if unknown.
+            Changes are streamed in (commit_lsn, lsn) order, while lsn alone is not
+            monotonic across transactions.
+        operation (Optional[str]): The operation name, e.g. 'INSERT'.
+        xid (int): The transaction ID of the enclosing transaction, 0 if unknown.
+        trace (Optional[Trace]): Commit and capture times, for changes sampled for tracing.
+        schema_version (int): The version of the relation schema the change was sent with, set
+            when the 'schema_registry' section is configured, 0 otherwise.
+    """
+
+    __slots__ = ('lsn', 'table_name', 'commit_lsn', 'operation', 'xid', 'trace', 'schema_version')
+
+    def __init__(
+        self,
+        lsn: int,
+        table_name: Optional[str] = None,
+        commit_lsn: int = 0,
+        operation: Optional[str] = None,
+        xid: int = 0,
+        trace: Optional[Trace] = None,
+        schema_version: int = 0
+    ) -> None:
+        """
+        Initialize the ChangeContext.
+
+        Args:
+            lsn (int): The LSN (data_start) of the replication message.
+            table_name (Optional[str]): The fully qualified table name.
+            commit_lsn (int): The commit LSN of the enclosing transaction.
+            operation (Optional[str]): The operation name, e.g. 'INSERT'.
+            xid (int): The transaction ID of the enclosing transaction.
+            trace (Optional[Trace]): Commit and capture times, if the change is traced.
+            schema_version (int): The version of the relation schema, 0 if unknown.
+        """
+        self.lsn = lsn
+        self.table_name = table_name
+        self.commit_lsn = commit_lsn
+        self.operation = operation
+        self.xid = xid
+        self.trace = trace
+        self.schema_version = schema_version
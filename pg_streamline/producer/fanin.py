@@ -0,0 +1,388 @@
+import logging
+import selectors
+import signal
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from pg_streamline.sinks import LsnTracker, SinkBatcher, SinkRecord, create_sink
+from pg_streamline.utils import parse_yaml_config
+
+from .process import Producer
+from .sink import decode_change
+
+
+logger = logging.getLogger(__name__)
+
+# Sections that would make every source write to the same place, or that need their own reader process
+UNSUPPORTED_SECTIONS = ('workers', 'spool', 'recording', 'replay')
+
+
+def source_config(config: dict, database: Dict[str, Any], index: int) -> dict:
+    """
+    Build the configuration of one database of the 'fan_in' section: its entry is merged over
+    the 'database' section, and metrics are served on the port after the previous source's.
+
+    Args:
+        config (dict): The parsed configuration file.
+        database (Dict[str, Any]): The database entry, e.g. {'name': 'tenant_1', 'replication_slot': 'tenant_1'}.
+        index (int): The position of the entry in the 'fan_in' section.
+    """
+    config = {key: value for key, value in config.items() if key != 'fan_in'}
+    config['database'] = dict(config.get('database') or {}, **{key: value for key, value in database.items() if key != 'alias'})
+    metrics_config = config.get('metrics')
+
+    if metrics_config and metrics_config.get('port') is not None:
+        config['metrics'] = dict(metrics_config, port=int(metrics_config['port']) + index)
+
+    return config
+
+
+class FanInSource(Producer):
+    """
+    Producer for one database of a FanInRunner.
+
+    Changes are handed to the runner's shared batcher, and feedback is tracked for the
+    source's own slot: the runner's loop sends it once the sink has acknowledged the changes,
+    and as a keepalive when the slot is idle.
+
+    Attributes:
+        runner (FanInRunner): The runner reading the source.
+        alias (str): The name of the source, the database name unless an alias is configured.
+        lsn_tracker (LsnTracker): Tracks which messages of the slot have been delivered.
+    """
+
+    def __init__(self, runner: 'FanInRunner', config: dict, alias: str) -> None:
+        """
+        Initialize the FanInSource.
+
+        Args:
+            runner (FanInRunner): The runner reading the source.
+            config (dict): The configuration of the source, built by ``source_config``.
+            alias (str): The name of the source.
+        """
+        super().__init__(config=config)
+        self.runner = runner
+        self.alias = alias
+        self.lsn_tracker = LsnTracker()
+        self.__feedback_due = False
+        self.__feedback_sent = time.monotonic()
+
+    def perform_action(self, table_name: str, bytes_message: bytes) -> None:
+        """
+        Buffer a change for delivery to the shared sink.
+
+        Args:
+            table_name (str): The name of the table.
+            bytes_message (bytes): The raw replication message.
+        """
+        context = self.change_context
+        change, schema = None, None
+
+        if self.runner.sink.decode_changes and self.output_plugin == 'pgoutput':
+            change, schema = decode_change(self, bytes_message, context.schema_version)
+
+        if self.runner.prefix_table_names:
+            # Tenant databases usually have the same tables, the prefix tells them apart
+            table_name = f'{self.alias}.{table_name}'
+
+        sequence = self.lsn_tracker.track(context.lsn)
+        self.runner.batcher.add(SinkRecord(
+            table_name,
+            bytes_message,
+            context.lsn,
+            sequence,
+            commit_lsn=context.commit_lsn,
+            change=change,
+            schema=schema,
+            xid=context.xid,
+            trace=context.trace,
+            schema_version=context.schema_version,
+            source=self.alias
+        ))
+
+    def acknowledge(self, records: List[SinkRecord]) -> None:
+        """
+        Mark records of this source acknowledged by the sink as delivered. Called by the
+        batcher thread, the feedback is sent by the runner's loop.
+
+        Args:
+            records (List[SinkRecord]): The acknowledged records.
+        """
+        for record in records:
+            self.lsn_tracker.complete(record.sequence)
+
+        self.__feedback_due = True
+
+    def send_feedback(self, flush_lsn: int) -> None:
+        """
+        Record a processed message. The feedback is sent by the runner's loop.
+
+        Args:
+            flush_lsn (int): The LSN of the message that has just been processed.
+        """
+        self.lsn_tracker.observe(flush_lsn)
+        self.__feedback_due = True
+
+    def flush_feedback(self, keepalive_interval: float) -> bool:
+        """
+        Send the flushable LSN of the slot if it may have moved, or as a keepalive.
+
+        Args:
+            keepalive_interval (float): Seconds after which feedback is sent even if nothing changed.
+
+        Returns:
+            bool: Whether feedback was sent.
+        """
+        now = time.monotonic()
+
+        if not self.__feedback_due and now - self.__feedback_sent < keepalive_interval:
+            return False
+
+        self.__feedback_due = False
+        self.__feedback_sent = now
+        super().send_feedback(flush_lsn=self.lsn_tracker.flushable_lsn)
+        return True
+
+    def perform_termination(self) -> None:
+        """
+        Nothing to close, the runner owns the sink.
+        """
+
+
+class FanInRunner:
+    """
+    Stream the replication slots of several databases from one process.
+
+    Each database of the 'fan_in' section gets a FanInSource, with its own replication
+    connection and slot, and all of them share one sink, configured by the 'sink' section.
+    A single loop waits on every replication connection with a selector and reads the ready
+    ones with the non-blocking ``read_message``. A turn reads at most max_messages_per_turn
+    messages or max_bytes_per_turn bytes from a source before moving on, in rotating order,
+    so a busy database cannot starve the others. Feedback is tracked per slot and only
+    covers changes the sink has acknowledged.
+
+    Attributes:
+        sources (List[FanInSource]): One source per database.
+        sink (BaseSink): The shared sink.
+        batcher (SinkBatcher): Buffers the records of every source and delivers them to the sink.
+        max_messages_per_turn (int): Messages read from a source before the next source is served.
+        max_bytes_per_turn (int): Payload bytes read from a source before the next source is served.
+        keepalive_interval (float): Seconds between feedback messages on idle slots.
+        poll_interval (float): Maximum seconds to wait for a source to become readable.
+        prefix_table_names (bool): Prefix table names with the source alias, e.g. 'tenant_1.public.users'.
+    """
+
+    def __init__(self, config_path: str = None) -> None:
+        """
+        Initialize the FanInRunner.
+
+        Args:
+            config_path (str): The path to the configuration file.
+        """
+        config = parse_yaml_config(config_file_path=config_path)
+        self.__validate_config(config)
+
+        fan_in_config = config['fan_in']
+        self.max_messages_per_turn = int(fan_in_config.get('max_messages_per_turn', 500))
+        self.max_bytes_per_turn = int(fan_in_config.get('max_bytes_per_turn', 4 * 1024 * 1024))
+        self.keepalive_interval = float(fan_in_config.get('keepalive_interval', 10.0))
+        self.poll_interval = float(fan_in_config.get('poll_interval', 1.0))
+        self.prefix_table_names = bool(fan_in_config.get('prefix_table_names', True))
+
+        sink_config = config['sink']
+        name = sink_config['name']
+        self.sink = create_sink(name, sink_config.get('options', config.get(name, {})))
+        self.sink.add_ack_callback(self.__acknowledge)
+        self.batcher = SinkBatcher(
+            self.sink,
+            batch_size=sink_config.get('batch_size', 500),
+            flush_interval=sink_config.get('flush_interval', 1.0),
+            max_retries=sink_config.get('max_retries', 5),
+            retry_backoff=sink_config.get('retry_backoff', 0.5)
+        )
+
+        self.sources: List[FanInSource] = []
+        self.__sources: Dict[str, FanInSource] = {}
+
+        for index, database in enumerate(fan_in_config['databases']):
+            alias = database.get('alias', database.get('name'))
+
+            if alias in self.__sources:
+                raise ValueError(f'Duplicate fan_in source: {alias}, set an alias to tell them apart.')
+
+            source = FanInSource(self, source_config(config, database, index), alias)
+            self.sources.append(source)
+            self.__sources[alias] = source
+
+        self.__selector = selectors.DefaultSelector()
+        # Sources stopped by the fairness limits, their connection may hold more buffered messages
+        self.__backlogged: set = set()
+        self.__turn = 0
+        self.__running = False
+        self.batcher.start()
+
+        logger.info(f'Fan-in of {len(self.sources)} databases into sink: {name}')
+        signal.signal(signal.SIGINT, self.__terminate)
+
+    @staticmethod
+    def __validate_config(config: dict) -> None:
+        """
+        Validate the fan_in and sink sections of the configuration file.
+
+        Args:
+            config (dict): The parsed configuration file.
+        """
+        if not (config.get('fan_in') or {}).get('databases'):
+            raise ConnectionError('fan_in databases are missing from the configuration file.')
+
+        if 'sink' not in config:
+            raise ConnectionError('sink is missing from the configuration file.')
+
+        if 'name' not in config['sink']:
+            raise ConnectionError('name is missing from the sink configuration.')
+
+        for section in UNSUPPORTED_SECTIONS:
+            if config.get(section):
+                raise ValueError(f'The {section} section is not supported by FanInRunner.')
+
+    def __acknowledge(self, records: List[SinkRecord]) -> None:
+        """
+        Hand acknowledged records to the sources they were read from.
+
+        Args:
+            records (List[SinkRecord]): The records the sink has made durable.
+        """
+        by_source: Dict[str, List[SinkRecord]] = {}
+
+        for record in records:
+            by_source.setdefault(record.source, []).append(record)
+
+        for alias, source_records in by_source.items():
+            self.__sources[alias].acknowledge(source_records)
+
+    def status(self) -> Dict[str, Dict[str, int]]:
+        """
+        Return the replication position of each source.
+
+        Returns:
+            Dict[str, Dict[str, int]]: The received LSN, confirmed (feedback) LSN and number of
+                undelivered changes, by source alias.
+        """
+        return {
+            source.alias: {
+                'received_lsn': source.received_lsn,
+                'feedback_lsn': source.feedback_lsn,
+                'pending': source.lsn_tracker.pending_count
+            }
+            for source in self.sources
+        }
+
+    def __serve(self, source: FanInSource) -> int:
+        """
+        Read and process the buffered messages of a source, up to the per-turn limits.
+
+        Args:
+            source (FanInSource): A readable source.
+
+        Returns:
+            int: The number of messages processed.
+        """
+        messages = 0
+        read_bytes = 0
+
+        while messages < self.max_messages_per_turn and read_bytes < self.max_bytes_per_turn:
+            data = source.replication_cursor.read_message()
+
+            if data is None:
+                self.__backlogged.discard(source)
+                return messages
+
+            source.process_message(data)
+            messages += 1
+            read_bytes += len(data.payload)
+
+        self.__backlogged.add(source)
+        return messages
+
+    def poll(self, timeout: Optional[float] = None) -> int:
+        """
+        Run one turn of the loop: wait for readable sources, serve each of them once and
+        send due feedback.
+
+        Args:
+            timeout (Optional[float]): Maximum seconds to wait, poll_interval by default. Sources
+                left with buffered messages by the previous turn are served without waiting.
+
+        Returns:
+            int: The number of messages processed.
+        """
+        ready = set(self.__backlogged)
+        wait = 0 if ready else (self.poll_interval if timeout is None else timeout)
+        ready.update(key.data for key, _ in self.__selector.select(wait))
+
+        # Rotate the starting source so none is always served first
+        count = len(self.sources)
+        self.__turn = (self.__turn + 1) % count
+        processed = 0
+
+        for offset in range(count):
+            source = self.sources[(self.__turn + offset) % count]
+
+            if source in ready:
+                processed += self.__serve(source)
+
+        for source in self.sources:
+            source.flush_feedback(self.keepalive_interval)
+
+        return processed
+
+    def start_replication(self, publication_names: list, protocol_version: str) -> None:
+        """
+        Start streaming every source and serve them until stop is called.
+
+        Args:
+            publication_names (list): The names of the publications to replicate, in every database.
+            protocol_version (str): The protocol version to use.
+        """
+        for source in self.sources:
+            source.open_stream(publication_names, protocol_version)
+            self.__selector.register(source.replication_cursor, selectors.EVENT_READ, source)
+
+        self.__running = True
+
+        while self.__running:
+            self.poll()
+
+    def stop(self) -> None:
+        """
+        Stop the loop after the current turn.
+        """
+        self.__running = False
+
+    def close(self) -> None:
+        """
+        Deliver buffered records, confirm them on every slot and close the sources.
+        """
+        self.__running = False
+        logger.info(f'Closing sink: {self.sink.name}')
+        self.batcher.close()
+
+        for source in self.sources:
+            if not source.replication_cursor.closed:
+                source.flush_feedback(0)
+
+            source.close()
+
+        self.__selector.close()
+
+    def __terminate(self, *args) -> None:
+        """
+        Close the runner on SIGINT and exit.
+
+        Args:
+            signum (int): Signal number.
+            frame (frame): Current stack frame.
+        """
+        self.close()
+        sys.exit(0)
@@ -0,0 +1,224 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import psycopg2
+
+from pg_streamline.utils import Utils
+
+
+logger = logging.getLogger(__name__)
+
+# Sampled metrics exported as gauges when the producer's metrics registry is enabled
+SLOT_GAUGES = {
+    'retained_bytes': 'pg_streamline_slot_retained_bytes',
+    'confirmed_flush_lag_bytes': 'pg_streamline_slot_confirmed_flush_lag_bytes',
+    'feedback_lag_bytes': 'pg_streamline_slot_feedback_lag_bytes',
+    'replay_delay': 'pg_streamline_slot_replay_delay_seconds',
+}
+
+SLOT_QUERY = """
+    select
+        active,
+        confirmed_flush_lsn::text,
+        restart_lsn::text,
+        pg_current_wal_lsn()::text,
+        pg_wal_lsn_diff(pg_current_wal_lsn(), restart_lsn)::bigint,
+        pg_wal_lsn_diff(pg_current_wal_lsn(), confirmed_flush_lsn)::bigint
+    from pg_replication_slots
+    where slot_name = %s;
+"""
+
+
+class SlotMonitor:
+    """
+    Periodically sample replication slot lag and WAL retention for a producer.
+
+    Every sample combines the slot state from pg_replication_slots with what the
+    producer knows locally (the last received LSN, the last LSN reported through
+    send_feedback and the delay between commit and processing), checks it against
+    the configured thresholds and calls the registered callbacks for every
+    threshold that is exceeded.
+
+    The monitor queries the slot on its own connection, opened by ``start`` or the first
+    sample and closed by ``stop``, since the producer's connection pool is not thread-safe.
+
+    Metrics:
+        active (bool): Whether a walsender is attached to the slot.
+        confirmed_flush_lsn (int): The position the server considers confirmed.
+        restart_lsn (int): The oldest WAL position the slot retains.
+        current_wal_lsn (int): The current WAL insert position.
+        retained_bytes (int): WAL retained by the slot (current - restart_lsn).
+        confirmed_flush_lag_bytes (int): current - confirmed_flush_lsn.
+        received_lsn (int): The highest LSN received by the producer.
+        feedback_lsn (int): The last flush LSN sent with send_feedback.
+        feedback_lag_bytes (int): received_lsn - feedback_lsn.
+        replay_delay (float): Seconds between the last commit and its processing.
+
+    Attributes:
+        producer (Producer): The producer being monitored.
+        interval (float): Seconds between samples.
+        thresholds (Dict[str, float]): Metric name to maximum value.
+    """
+
+    def __init__(self, producer, interval: float = 10.0, thresholds: Optional[Dict[str, float]] = None) -> None:
+        """
+        Initialize the SlotMonitor.
+
+        Args:
+            producer (Producer): The producer being monitored.
+            interval (float): Seconds between samples.
+            thresholds (Optional[Dict[str, float]]): Metric name to maximum value.
+        """
+        self.producer = producer
+        self.interval = interval
+        self.thresholds = thresholds or {}
+
+        self.__callbacks: List[Callable[[str, Any, float, Dict[str, Any]], None]] = []
+        self.__metrics: Dict[str, Any] = {}
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        self.__connection: Optional[psycopg2.extensions.connection] = None
+
+    def add_callback(self, callback: Callable[[str, Any, float, Dict[str, Any]], None]) -> None:
+        """
+        Register a callback for exceeded thresholds.
+
+        The callback is called with the metric name, its value, the threshold and the
+        full metrics snapshot.
+
+        Args:
+            callback (Callable[[str, Any, float, Dict[str, Any]], None]): The callback to register.
+        """
+        self.__callbacks.append(callback)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Return the most recent sample.
+
+        Returns:
+            Dict[str, Any]: The metrics, empty until the first sample.
+        """
+        with self.__lock:
+            return dict(self.__metrics)
+
+    def start(self) -> None:
+        """
+        Open the monitor's connection and start sampling in a background thread.
+        """
+        self.__connect()
+        self.__thread = threading.Thread(target=self.__run, name='pg-streamline-slot-monitor', daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background thread and close the monitor's connection.
+        """
+        self.__stopped.set()
+
+        if self.__thread is not None:
+            self.__thread.join()
+
+        self.__close()
+
+    def __connect(self) -> psycopg2.extensions.connection:
+        """
+        Open the monitor's connection, unless it is open.
+        """
+        if self.__connection is None:
+            self.__connection = psycopg2.connect(**self.producer.params)
+            # Each sample reads the current slot state, no transaction is kept open between samples
+            self.__connection.autocommit = True
+
+        return self.__connection
+
+    def __close(self) -> None:
+        """
+        Close the monitor's connection, if it is open.
+        """
+        if self.__connection is not None:
+            try:
+                self.__connection.close()
+            finally:
+                self.__connection = None
+
+    def __run(self) -> None:
+        """
+        Sample until stopped.
+        """
+        while not self.__stopped.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:
+                logger.exception('Failed to sample replication slot.')
+
+    def __query_slot(self) -> Dict[str, Any]:
+        """
+        Read the slot state from pg_replication_slots.
+        """
+        try:
+            with self.__connect().cursor() as cursor:
+                cursor.execute(SLOT_QUERY, (self.producer.replication_slot,))
+                row = cursor.fetchone()
+        except psycopg2.Error:
+            # Reconnect on the next sample
+            self.__close()
+            raise
+
+        if row is None:
+            logger.warning(f'Replication slot {self.producer.replication_slot} not found')
+            return {}
+
+        active, confirmed_flush_lsn, restart_lsn, current_wal_lsn, retained_bytes, flush_lag_bytes = row
+
+        return {
+            'active': active,
+            'confirmed_flush_lsn': Utils.convert_lsn_to_int(confirmed_flush_lsn) if confirmed_flush_lsn else None,
+            'restart_lsn': Utils.convert_lsn_to_int(restart_lsn) if restart_lsn else None,
+            'current_wal_lsn': Utils.convert_lsn_to_int(current_wal_lsn),
+            'retained_bytes': retained_bytes,
+            'confirmed_flush_lag_bytes': flush_lag_bytes
+        }
+
+    def sample(self) -> Dict[str, Any]:
+        """
+        Take a sample, check thresholds and call the callbacks.
+
+        Returns:
+            Dict[str, Any]: The sampled metrics.
+        """
+        metrics = self.__query_slot()
+
+        received_lsn = self.producer.received_lsn
+        feedback_lsn = self.producer.feedback_lsn
+
+        metrics.update({
+            'slot_name': self.producer.replication_slot,
+            'received_lsn': received_lsn,
+            'feedback_lsn': feedback_lsn,
+            'feedback_lag_bytes': max(received_lsn - feedback_lsn, 0),
+            'replay_delay': self.producer.replay_delay,
+            'sampled_at': time.time()
+        })
+
+        with self.__lock:
+            self.__metrics = metrics
+
+        for name, gauge_name in SLOT_GAUGES.items():
+            if metrics.get(name) is not None:
+                self.producer.metrics.gauge(gauge_name, f'Replication slot {name}', ['slot']).set(
+                    metrics[name], metrics['slot_name']
+                )
+
+        for name, threshold in self.thresholds.items():
+            value = metrics.get(name)
+
+            if value is not None and value > threshold:
+                logger.warning(f'Replication slot {metrics["slot_name"]}: {name} is {value}, above threshold {threshold}')
+
+                for callback in self.__callbacks:
+                    callback(name, value, threshold, metrics)
+
+        return metrics
@@ -1,19 +1,42 @@
 import signal
 import logging
 import sys
-from typing import Optional, Dict, Any
+import threading
+import time
+from typing import Optional, Dict, Any, List
 from concurrent.futures import ThreadPoolExecutor
 
 import psycopg2
 from psycopg2.extras import LogicalReplicationConnection
 from psycopg2 import pool, OperationalError
 
+from pg_streamline.activity import create_activity_log
+from pg_streamline.metrics import create_metrics_registry
+from pg_streamline.parser.protocol import LogicalMessage, TruncateMessage, decode_message, relation_ids
+from pg_streamline.parser.relation import RelationMessage
+from pg_streamline.parser.schema import SchemaRegistry, relation_id_of
+from pg_streamline.parser.wal2json import Wal2JsonMessage
+from pg_streamline.profiling import ProfilingHooks, create_profiler
+from pg_streamline.replay import ReplayDriver, SegmentWriter
+from pg_streamline.tracing import Trace, TraceSampler
 from pg_streamline.utils import (
     setup_custom_logging,
     Utils as parser_utils,
     parse_yaml_config
 )
 
+from .context import ChangeContext
+from .monitor import SlotMonitor
+from .spool import Spool
+from .workers import SharedRing, WorkerPool, current_worker, worker_config
+
+
+# Operation names used in logs and metric labels, keyed by message type
+OPERATION_TYPES = {'I': 'INSERT', 'U': 'UPDATE', 'D': 'DELETE'}
+
+# pgoutput messages that are published, as opposed to transaction and schema metadata
+CHANGE_TYPES = ('I', 'U', 'D', 'T', 'M')
+
 
 logger = logging.getLogger(__name__)
 
@@ -28,23 +51,74 @@ class Producer:
         conn_pool: Connection pool for database connections.
         replication_cursor: Cursor for logical replication.
         output_plugin (str): The output plugin to use ('pgoutput' or 'wal2json').
+        commit_lsn (int): Commit LSN of the transaction being streamed (pgoutput only).
+        xid (int): Transaction ID of the transaction being streamed (pgoutput only).
+        wal2json_format_version (int): The wal2json output format (1: per transaction, 2: per change).
+        wal2json_lazy (bool): Only read the routing fields of wal2json format-version 2 messages.
+        commit_timestamp (Optional[float]): Commit time (epoch seconds) of the transaction being streamed.
+        replay_delay (Optional[float]): Seconds between the last commit and its processing.
+        received_lsn (int): The highest LSN received from the server.
+        feedback_lsn (int): The highest flush LSN reported with send_feedback.
+        slot_monitor (Optional[SlotMonitor]): Samples slot lag when the 'monitor' section is configured.
+        recorder (Optional[SegmentWriter]): Records the raw stream when the 'recording' section is configured.
+        replay_driver (Optional[ReplayDriver]): Replays a recording instead of connecting to PostgreSQL
+            when the 'replay' section is configured.
+        spool (Optional[Spool]): Buffers the stream on disk between replication and perform_action
+            when the 'spool' section is configured.
+        worker_pool (Optional[WorkerPool]): Worker processes that decode and publish changes from
+            shared memory rings when the 'workers' section is configured.
+        worker_id (Optional[int]): The worker index when running in a worker process.
+        schema_registry (Optional[SchemaRegistry]): Versions the relation schemas of Relation messages, which are
+            published once per version, when the 'schema_registry' section enables it.
+        trace_sampler (TraceSampler): Picks the changes traced from commit to apply, none unless the
+            'tracing' section is configured.
+        activity_log (ActivityLog): Periodic summaries of the changes processed, configured by the 'logging' section.
+        hooks (ProfilingHooks): Timing callbacks for the read, catalog_lookup, publish and feedback points.
+        profiler (Profiler): Profiles live traffic on demand, or on a signal when the 'profiling' section is configured.
+        metrics (MetricsRegistry): Producer metrics, a no-op registry unless the 'metrics' section enables them.
     """
 
-    def __init__(self, config_path: str = None) -> None:
+    def __init__(self, config_path: str = None, config: Optional[dict] = None) -> None:
         """
         Initialize the Producer class.
 
         Args:
             config_path (str): The path to the configuration file.
+            config (Optional[dict]): An already parsed configuration, used instead of the file.
         """
         setup_custom_logging()
         
-        config = parse_yaml_config(config_file_path=config_path)
+        if config is None:
+            config = parse_yaml_config(config_file_path=config_path)
 
         self.__validate_config(config)
 
+        self.config_path = config_path
+        self.worker_id: Optional[int] = current_worker()
+
+        if self.worker_id is not None:
+            # Workers only decode and publish, replication belongs to the reader process
+            config = worker_config(config, self.worker_id)
+
         self.config = config
 
+        self.metrics = create_metrics_registry(config.get('metrics'))
+        self.__messages_metric = self.metrics.counter(
+            'pg_streamline_producer_messages_total', 'Changes handed to perform_action', ['table', 'operation']
+        )
+        self.__bytes_metric = self.metrics.counter(
+            'pg_streamline_producer_bytes_total', 'Payload bytes handed to perform_action', ['table', 'operation']
+        )
+        self.__catalog_metric = self.metrics.histogram(
+            'pg_streamline_producer_catalog_lookup_seconds', 'Time spent resolving relation IDs to table names'
+        )
+        self.__publish_metric = self.metrics.histogram(
+            'pg_streamline_producer_publish_seconds', 'Time spent in perform_action', ['table']
+        )
+        self.__feedback_metric = self.metrics.gauge(
+            'pg_streamline_producer_feedback_lsn', 'Last flush LSN reported to the server'
+        )
+
         self.params: Dict[str, str] = {
             'dbname': config['database']['name'],
             'user': config['database']['user'],
@@ -55,18 +129,160 @@ class Producer:
         }
         self.replication_slot: str = config['database']['replication_slot']
         self.output_plugin = config['database']['replication_plugin']
+
+        wal2json_config = config.get('wal2json') or {}
+        self.wal2json_format_version = int(wal2json_config.get('format_version', 1))
+        self.wal2json_lazy = bool(wal2json_config.get('lazy', False))
+        self.wal2json_options = wal2json_config.get('options') or {}
         pool_size = config['database']['connection_pool_size']
-        self.conn_pool = pool.SimpleConnectionPool(1, pool_size, **self.params)
+
+        self.replay_driver: Optional[ReplayDriver] = None
+
+        if config.get('replay'):
+            self.replay_driver = ReplayDriver.from_config(config['replay'])
+            self.conn_pool = self.replay_driver.connection_pool()
+            logger.info(f'Replaying recording from {self.replay_driver.directory}')
+        else:
+            self.conn_pool = pool.SimpleConnectionPool(1, pool_size, **self.params)
+
+        self.recorder: Optional[SegmentWriter] = None
+
+        if config.get('recording'):
+            recording_config = config['recording']
+
+            if 'directory' not in recording_config:
+                raise ConnectionError('directory is missing from the recording configuration.')
+
+            self.recorder = SegmentWriter(
+                recording_config['directory'],
+                max_segment_bytes=recording_config.get('max_segment_bytes', 64 * 1024 * 1024),
+                fsync=recording_config.get('fsync', 'segment')
+            )
+            logger.info(f'Recording replication stream to {self.recorder.directory}')
+
+        self.spool: Optional[Spool] = None
+        self.__publisher: Optional[threading.Thread] = None
+        self.__publisher_failure: Optional[str] = None
+
+        if config.get('spool'):
+            spool_config = config['spool']
+
+            if 'directory' not in spool_config:
+                raise ConnectionError('directory is missing from the spool configuration.')
+
+            self.spool = Spool(
+                spool_config['directory'],
+                max_segment_bytes=spool_config.get('max_segment_bytes', 16 * 1024 * 1024),
+                fsync=spool_config.get('fsync', 'none'),
+                high_watermark_bytes=spool_config.get('high_watermark_bytes', 256 * 1024 * 1024),
+                low_watermark_bytes=spool_config.get('low_watermark_bytes')
+            )
+            self.metrics.gauge(
+                'pg_streamline_producer_spool_bytes', 'Bytes spooled on disk and not yet published'
+            ).set_function(lambda: self.spool.pending_bytes)
+            self.metrics.gauge(
+                'pg_streamline_producer_spool_throttled', 'Whether reading is throttled by the spool high watermark'
+            ).set_function(lambda: int(self.spool.throttled))
+            logger.info(f'Spooling replication stream to {self.spool.directory}')
+
+        self.worker_pool: Optional[WorkerPool] = None
+        self.__feedback_collector: Optional[threading.Thread] = None
+
+        if config.get('workers'):
+            workers_config = config['workers']
+
+            if self.output_plugin != 'pgoutput':
+                raise ValueError('The workers section requires the pgoutput plugin.')
+
+            if self.spool is not None:
+                raise ValueError('The workers and spool sections cannot be used together.')
+
+            self.worker_pool = WorkerPool(
+                type(self),
+                config_path,
+                processes=int(workers_config.get('processes', 2)),
+                ring_bytes=int(workers_config.get('ring_bytes', 16 * 1024 * 1024)),
+                start_method=workers_config.get('start_method')
+            )
+            self.metrics.gauge(
+                'pg_streamline_producer_worker_pending_messages', 'Changes handed to worker processes and not yet processed'
+            ).set_function(lambda: self.worker_pool.lsn_tracker.pending_count)
+
+        origin_config = config.get('origin') or {}
+        self.origin_filter: Optional[str] = origin_config.get('filter')
+        self.excluded_origins = set(origin_config.get('exclude') or [])
+        self.__dropped_origin: Optional[str] = None
+
+        if origin_config:
+            if self.output_plugin != 'pgoutput':
+                raise ValueError('The origin section requires the pgoutput plugin.')
+
+            if self.origin_filter not in (None, 'none', 'any'):
+                raise ValueError(f"Invalid origin filter: {self.origin_filter}, expected 'none' or 'any'.")
+
+        self.schema_registry: Optional[SchemaRegistry] = None
+        registry_config = config.get('schema_registry') or {}
+
+        if registry_config.get('enabled'):
+            if self.output_plugin != 'pgoutput':
+                raise ValueError('The schema_registry section requires the pgoutput plugin.')
+
+            path = registry_config.get('path')
+
+            if path is not None and self.worker_id is not None:
+                # Each worker versions the relations routed to it
+                path = f'{path}.{self.worker_id}'
+
+            self.schema_registry = SchemaRegistry(path=path)
+
+        self.__origin_dropped_metric = self.metrics.counter(
+            'pg_streamline_producer_origin_dropped_total', 'Changes dropped because their transaction came from an excluded origin', ['origin']
+        )
 
         connection = self.conn_pool.getconn()
         self.replication_cursor = connection.cursor()
 
-        self.__create_replication_slot(self.replication_slot)
+        self.activity_log = create_activity_log(config.get('logging'), logger, 'Producer')
+        self.hooks = ProfilingHooks()
+        self.__metadata_handlers = {
+            'B': self.handle_begin,
+            'C': self.handle_commit,
+            'R': self.handle_relation,
+            'Y': self.handle_type,
+            'O': self.handle_origin
+        }
+        self.profiler = create_profiler(config.get('profiling'))
+        self.__read_completed: Optional[float] = None
+
+        tracing_config = config.get('tracing')
+        self.trace_sampler = TraceSampler(float((tracing_config or {}).get('sample_rate', 1.0)) if tracing_config else 0.0)
+
+        self.__local = threading.local()
+        self.commit_lsn = 0
+        self.xid = 0
+        self.commit_timestamp: Optional[float] = None
+        self.replay_delay: Optional[float] = None
+        self.received_lsn = 0
+        self.feedback_lsn = 0
+
+        if self.worker_id is None:
+            self.__create_replication_slot(self.replication_slot)
 
         logger.info(f'Producer initialized for database: {self.params.get("dbname")} on host: {self.params.get("host")}:{self.params.get("port")}')
         logger.info(f'Using replication slot: {self.replication_slot}')
         logger.info(f'Using output plugin: {self.output_plugin}')
 
+        self.slot_monitor: Optional[SlotMonitor] = None
+
+        if config.get('monitor'):
+            self.slot_monitor = SlotMonitor(
+                self,
+                interval=config['monitor'].get('interval', 10),
+                thresholds=config['monitor'].get('thresholds')
+            )
+            self.slot_monitor.start()
+            logger.info(f'Monitoring replication slot every {self.slot_monitor.interval}s')
+
         signal.signal(signal.SIGINT, self.__terminate)
 
     @staticmethod
@@ -108,16 +324,37 @@ class Producer:
             signum (int): Signal number.
             frame (frame): Current stack frame.
         """
+        self.close()
+        # Exiting the process gracefully
+        sys.exit(0)
+
+    def close(self) -> None:
+        """
+        Stop replicating and release the producer's resources, then call perform_termination.
+        """
         logger.info('Terminating replication process')
 
+        if self.slot_monitor is not None:
+            self.slot_monitor.stop()
+
+        self.metrics.stop_http_server()
+        self.activity_log.flush()
+
+        if self.recorder is not None:
+            self.recorder.close()
+
+        if self.spool is not None:
+            self.spool.close()
+
+        if self.worker_pool is not None and self.worker_pool.started:
+            self.worker_pool.close()
+
         self.replication_cursor.close()
         self.conn_pool.closeall()
 
         logger.info('Replication process terminated')
 
         self.perform_termination()
-        # Exiting the process gracefully
-        sys.exit(0)
 
     def __create_replication_slot(self, slot_name: str) -> None:
         """
@@ -174,6 +411,65 @@ class Producer:
             logger.exception("Failed to get table name.")
             raise
     
+    @property
+    def change_context(self) -> Optional[ChangeContext]:
+        """
+        The context of the change being processed by the current thread.
+
+        Returns:
+            Optional[ChangeContext]: The current change context, or None outside of perform_action.
+        """
+        return getattr(self.__local, 'change_context', None)
+
+    def __perform_action(self, table_name: str, data: Any, operation: str, schema_version: int = 0) -> None:
+        """
+        Call perform_action with the change context set for the current thread.
+
+        Args:
+            table_name (str): The name of the table (or plugin) the change belongs to.
+            data (Any): The incoming replication message.
+            operation (str): The operation name used for metrics (e.g. 'INSERT').
+            schema_version (int): The version of the relation schema, 0 if unknown.
+        """
+        trace = None
+
+        if self.trace_sampler.sample():
+            # Spooled and replayed messages carry the time they were received
+            trace = Trace(self.commit_timestamp, getattr(data, 'captured_at', None) or time.time())
+
+        self.__local.change_context = ChangeContext(
+            lsn=data.data_start,
+            table_name=table_name,
+            commit_lsn=self.commit_lsn,
+            operation=operation,
+            xid=self.xid,
+            trace=trace,
+            schema_version=schema_version
+        )
+        payload = data.payload
+
+        if isinstance(payload, memoryview):
+            # Worker payloads are views into their ring, copied here as plugins may keep them
+            payload = bytes(payload)
+
+        try:
+            if self.metrics.enabled or self.hooks.enabled:
+                started = time.perf_counter()
+                self.perform_action(table_name, payload)
+                elapsed = time.perf_counter() - started
+
+                if self.metrics.enabled:
+                    self.__publish_metric.observe(elapsed, table_name)
+                    self.__messages_metric.inc(1, table_name, operation)
+                    self.__bytes_metric.inc(len(payload), table_name, operation)
+
+                if self.hooks.enabled:
+                    self.hooks.emit('publish', elapsed, table_name)
+            else:
+                self.perform_action(table_name, payload)
+        finally:
+            self.__local.change_context = None
+
     def send_feedback(self, flush_lsn: int) -> None:
         """
         Send feedback to the PostgreSQL server.
@@ -181,7 +477,17 @@ class Producer:
         Args:
             flush_lsn (int): The LSN to send feedback for.
         """
-        self.replication_cursor.send_feedback(flush_lsn=flush_lsn)
+        # Worker processes report completed records through their ring, the reader confirms them
+        if self.worker_id is None:
+            if self.hooks.enabled:
+                started = time.perf_counter()
+                self.replication_cursor.send_feedback(flush_lsn=flush_lsn)
+                self.hooks.emit('feedback', time.perf_counter() - started)
+            else:
+                self.replication_cursor.send_feedback(flush_lsn=flush_lsn)
+
+        self.feedback_lsn = max(self.feedback_lsn, flush_lsn)
+        self.__feedback_metric.set(self.feedback_lsn)
 
     def __process_wal2json_change(self, data: Any) -> None:
         """
@@ -191,13 +497,28 @@ class Producer:
             data (Any): The incoming data to process.
         """
         try:
-            logger.info(f'Change occurred at LSN: {data.data_start}')
-            self.perform_action('wal2json', data.payload)
+            self.received_lsn = max(self.received_lsn, data.data_start)
+
+            if self.wal2json_format_version == 2:
+                # One change per message, routed by the table it belongs to
+                message = Wal2JsonMessage(data.payload, lazy=self.wal2json_lazy)
+
+                if message.table_name:
+                    operation_type = OPERATION_TYPES.get(message.action, message.action)
+                    self.__perform_action(message.table_name, data, operation_type)
+                    self.activity_log.record(message.table_name, operation_type, data.data_start)
+            else:
+                self.__perform_action('wal2json', data, 'TRANSACTION')
+                self.activity_log.record('wal2json', 'TRANSACTION', data.data_start)
+
             self.send_feedback(flush_lsn=data.data_start)
-            logger.info(f'Change processed at LSN: {data.data_start}')
         except Exception:
             logger.exception("Failed to process change.")
-            self.send_feedback(flush_lsn=data.data_start)
+
+            if self.spool is None:
+                # The spool publisher stops instead, so the server sends the change again
+                self.send_feedback(flush_lsn=data.data_start)
+
             raise Exception("Failed to process change.")
 
     def __process_pgoutput_change(self, data: Any) -> None:
@@ -211,28 +532,297 @@ class Producer:
         cursor = connection.cursor()
 
         try:
-            message_type = data.payload[:1].decode('utf-8')
-            relation_id = parser_utils.convert_bytes_to_int(data.payload[1:5])
-            if message_type in ['I', 'U', 'D']:
-                operation_type = 'INSERT' if message_type == 'I' else 'UPDATE' if message_type == 'U' else 'DELETE'
-                table_name = self.__get_table_name(relation_id, cursor)
-
-                logger.info(f'{operation_type} Change occurred on table: {table_name}')
-                logger.info(f'{operation_type} Change occurred at LSN: {data.data_start}')
-
-                self.perform_action(table_name, data.payload)
-
-                logger.info(f'{operation_type} Change processed on table: {table_name}')
-                logger.info(f'{operation_type} Change processed at LSN: {data.data_start}')
+            self.received_lsn = max(self.received_lsn, data.data_start)
+            message_type = bytes(data.payload[:1]).decode('utf-8')
+
+            if self.__dropped_origin is not None and message_type in CHANGE_TYPES:
+                self.__origin_dropped_metric.inc(1, self.__dropped_origin)
+            elif message_type in ['I', 'U', 'D']:
+                operation_type = OPERATION_TYPES[message_type]
+                relation_id = relation_id_of(data.payload)
+
+                if self.schema_registry is not None and self.schema_registry.latest(relation_id) is not None:
+                    # The Relation message sent before the change names the table, no lookup needed
+                    table_name = self.schema_registry.table_name(relation_id)
+                    self.__perform_action(table_name, data, operation_type, self.schema_registry.latest(relation_id))
+                else:
+                    table_name = self.__lookup_table_name(relation_id, cursor)
+                    self.__perform_action(table_name, data, operation_type)
+
+                self.activity_log.record(table_name, operation_type, data.data_start)
+            elif message_type == 'T':
+                truncate = TruncateMessage(data.payload).decode()
+                table_names = [
+                    self.__lookup_table_name(relation_id, cursor) for relation_id in truncate['relation_ids']
+                ]
+                self.handle_truncate(table_names, truncate, data)
+            elif message_type == 'M':
+                self.handle_message(LogicalMessage(data.payload).decode(), data)
+            elif message_type == 'R' and self.schema_registry is not None:
+                self.__publish_schema(data)
+            else:
+                self.__handle_metadata(message_type, data.payload)
 
             self.send_feedback(flush_lsn=data.data_start)
             self.__close_connection(cursor, connection)
         except Exception:
             logger.exception("Failed to process change.")
-            self.send_feedback(flush_lsn=data.data_start)
+
+            if self.spool is None:
+                # The spool publisher stops instead, so the server sends the change again
+                self.send_feedback(flush_lsn=data.data_start)
+
             self.__close_connection(cursor, connection)
             raise Exception("Failed to process change.")
 
+    def __publish_schema(self, data: Any) -> None:
+        """
+        Register the schema of a Relation message and publish the message the first time its
+        version is seen, so consumers decode the following changes with its columns.
+
+        Args:
+            data (Any): The incoming replication message.
+        """
+        relation = RelationMessage(data.payload).decode_relation_message()
+        version, added = self.schema_registry.register(relation)
+
+        if added:
+            self.__perform_action(relation['table_name'], data, 'SCHEMA', version)
+            self.activity_log.record(relation['table_name'], 'SCHEMA', data.data_start)
+
+        self.handle_relation(relation)
+
+    def __lookup_table_name(self, relation_id: int, cursor: psycopg2.extensions.cursor) -> str:
+        """
+        Get the table name of a relation, timing the catalog lookup when metrics or hooks are enabled.
+
+        Args:
+            relation_id (int): The relation ID of the table.
+            cursor (psycopg2.extensions.cursor): Database cursor.
+
+        Returns:
+            str: Full table name including schema.
+        """
+        if not (self.metrics.enabled or self.hooks.enabled):
+            return self.__get_table_name(relation_id, cursor)
+
+        started = time.perf_counter()
+        table_name = self.__get_table_name(relation_id, cursor)
+        elapsed = time.perf_counter() - started
+        self.__catalog_metric.observe(elapsed)
+
+        if self.hooks.enabled:
+            self.hooks.emit('catalog_lookup', elapsed, table_name)
+
+        return table_name
+
+    def __handle_metadata(self, message_type: str, payload: bytes) -> None:
+        """
+        Handle a message that is not published: Begin, Commit, Relation, Type and Origin.
+        Message types without a decoder are ignored.
+
+        Args:
+            message_type (str): The pgoutput message type.
+            payload (bytes): The raw message.
+        """
+        if message_type in ('B', 'C'):
+            self.__observe_transaction(message_type, payload)
+            self.__dropped_origin = None
+
+        handler = self.__metadata_handlers.get(message_type)
+
+        if handler is None:
+            logger.debug('Ignoring message of type %s', message_type)
+            return
+
+        message = decode_message(payload)
+
+        if message is None:
+            return
+
+        if message_type == 'O' and message['origin_name'] in self.excluded_origins:
+            # Origin follows Begin, the rest of the transaction is dropped until Commit
+            self.__dropped_origin = message['origin_name']
+            logger.debug('Dropping transaction %s from origin %s', self.xid, self.__dropped_origin)
+
+        handler(message)
+
+    def handle_begin(self, message: Dict[str, Any]) -> None:
+        """
+        Called for each Begin message. Does nothing by default.
+
+        Args:
+            message (Dict[str, Any]): The decoded message, with final_lsn, commit_time and xid.
+        """
+
+    def handle_commit(self, message: Dict[str, Any]) -> None:
+        """
+        Called for each Commit message. Does nothing by default.
+
+        Args:
+            message (Dict[str, Any]): The decoded message, with commit_lsn, end_lsn and commit_time.
+        """
+
+    def handle_relation(self, message: Dict[str, Any]) -> None:
+        """
+        Called for each Relation message, sent before the first change of a relation and
+        after its schema changes. Does nothing by default, Relation messages are published
+        by the producer itself when the 'schema_registry' section enables it.
+
+        Args:
+            message (Dict[str, Any]): The decoded message, with relation_id, table_name and columns.
+        """
+
+    def handle_type(self, message: Dict[str, Any]) -> None:
+        """
+        Called for each Type message, sent before the first change that uses a non built-in type.
+        Does nothing by default.
+
+        Args:
+            message (Dict[str, Any]): The decoded message, with type_id, namespace and type_name.
+        """
+
+    def handle_origin(self, message: Dict[str, Any]) -> None:
+        """
+        Called for each Origin message, sent after Begin for transactions replayed from another node.
+        Does nothing by default.
+
+        Args:
+            message (Dict[str, Any]): The decoded message, with origin_lsn and origin_name.
+        """
+
+    def handle_truncate(self, table_names: List[str], message: Dict[str, Any], data: Any) -> None:
+        """
+        Called for each Truncate message. Publishes the message once per truncated table
+        by default, so consumers of each table see it.
+
+        Args:
+            table_names (List[str]): The truncated tables, in the order of message['relation_ids'].
+            message (Dict[str, Any]): The decoded message, with relation_ids, cascade and restart_identity.
+            data (Any): The incoming replication message.
+        """
+        for table_name in table_names:
+            self.__perform_action(table_name, data, 'TRUNCATE')
+            self.activity_log.record(table_name, 'TRUNCATE', data.data_start)
+
+    def handle_message(self, message: Dict[str, Any], data: Any) -> None:
+        """
+        Called for each logical decoding message (pg_logical_emit_message). Publishes it with
+        the message prefix in place of the table name by default.
+
+        Args:
+            message (Dict[str, Any]): The decoded message, with transactional, lsn, prefix and content.
+            data (Any): The incoming replication message.
+        """
+        self.__perform_action(message['prefix'], data, 'MESSAGE')
+        self.activity_log.record(message['prefix'], 'MESSAGE', data.data_start)
+
+    def __observe_transaction(self, message_type: str, payload: bytes) -> None:
+        """
+        Track the transaction being streamed from its Begin and Commit messages.
+
+        Args:
+            message_type (str): 'B' or 'C'.
+            payload (bytes): The raw message.
+        """
+        if message_type == 'B':
+            # Begin carries the commit LSN, timestamp and xid of the transaction whose changes follow
+            self.commit_lsn = parser_utils.convert_bytes_to_int(payload[1:9])
+            self.xid = int.from_bytes(payload[17:21], byteorder='big')
+            self.commit_timestamp = parser_utils.convert_pg_timestamp_to_epoch(
+                parser_utils.convert_bytes_to_int(payload[9:17])
+            )
+        else:
+            commit_timestamp = parser_utils.convert_bytes_to_int(payload[18:26])
+            self.replay_delay = time.time() - parser_utils.convert_pg_timestamp_to_epoch(commit_timestamp)
+
+    def __dispatch_to_workers(self, data: Any) -> None:
+        """
+        Hand a change, truncate or logical message to the worker processes, and Relation messages
+        when schemas are versioned, so they reach the worker publishing the relation's changes
+        before them. Other messages are handled by the reader and complete immediately.
+
+        Args:
+            data (Any): The incoming data to process.
+        """
+        self.received_lsn = max(self.received_lsn, data.data_start)
+        message_type = data.payload[:1].decode('utf-8')
+
+        if self.__dropped_origin is not None and message_type in CHANGE_TYPES:
+            self.__origin_dropped_metric.inc(1, self.__dropped_origin)
+            self.worker_pool.observe(data.data_start)
+        elif message_type in CHANGE_TYPES or (message_type == 'R' and self.schema_registry is not None):
+            # Truncates are routed with their first relation, logical messages to the first worker
+            relations = relation_ids(data.payload)
+            relation_id = relations[0] if relations else 0
+            self.worker_pool.dispatch(relation_id, data, self.commit_lsn, self.xid, self.commit_timestamp)
+        else:
+            self.__handle_metadata(message_type, data.payload)
+            self.worker_pool.observe(data.data_start)
+
+    def __collect_worker_feedback(self) -> None:
+        """
+        Confirm the LSNs processed by the worker processes until the pool is closed.
+        """
+        while self.worker_pool.wait(0.05):
+            flushable_lsn = self.worker_pool.poll()
+
+            if flushable_lsn > self.feedback_lsn:
+                self.send_feedback(flush_lsn=flushable_lsn)
+
+    def consume_ring(self, ring: SharedRing) -> None:
+        """
+        Process the changes of a worker's ring until the reader closes it. Called in worker processes.
+
+        Changes are decoded from the ring's shared memory, their space is released once they are
+        processed. A change that fails is not completed and stops the worker, so the reader never
+        confirms its LSN and stops reading once it notices.
+
+        Args:
+            ring (SharedRing): The worker's ring.
+
+        Raises:
+            Exception: If a change could not be processed.
+        """
+        delay = 0.00001
+
+        while True:
+            record = ring.get()
+
+            if record is None:
+                if ring.closed:
+                    break
+
+                time.sleep(delay)
+                delay = min(delay * 2, 0.001)
+                continue
+
+            delay = 0.00001
+            self.commit_lsn, self.xid, self.commit_timestamp = record.commit_lsn, record.xid, record.commit_time
+
+            try:
+                self.profiler.run(self.__process_pgoutput_change, record.to_message())
+            except Exception:
+                logger.error(f'Worker {self.worker_id} stopped, the change at LSN {record.data_start} was not processed')
+                raise
+            finally:
+                record.payload.release()
+
+            ring.release()
+            ring.complete(record.sequence, record.data_start)
+
+        logger.info(f'Worker {self.worker_id} stopped')
+
+    def process_message(self, data: Any) -> None:
+        """
+        Process a replication message read by the caller, e.g. a runner reading several slots
+        with ``read_message`` instead of ``consume_stream``.
+
+        Args:
+            data (Any): The replication message.
+        """
+        self.__process_changes(data)
+
     def __process_changes(self, data: Any) -> None:
         """
         Process a single change event.
@@ -240,11 +830,56 @@ class Producer:
         Args:
             data (Any): The incoming data to process.
         """
-        with ThreadPoolExecutor() as executor:
-            if self.output_plugin == 'pgoutput':
-                executor.submit(self.__process_pgoutput_change, data)
-            elif self.output_plugin == 'wal2json':
-                executor.submit(self.__process_wal2json_change, data)
+        if self.hooks.enabled and self.__read_completed is not None:
+            # Time since the previous message was handled, spent waiting for and reading this one
+            self.hooks.emit('read', time.perf_counter() - self.__read_completed)
+
+        if self.recorder is not None:
+            self.recorder.record(data)
+
+        if self.worker_pool is not None:
+            self.__dispatch_to_workers(data)
+        elif self.spool is not None:
+            if self.__publisher_failure is not None:
+                raise RuntimeError(self.__publisher_failure)
+
+            # The publisher thread processes the message, so reading continues at full speed
+            self.spool.put(data)
+        else:
+            with ThreadPoolExecutor() as executor:
+                if self.output_plugin == 'pgoutput':
+                    executor.submit(self.profiler.run, self.__process_pgoutput_change, data)
+                elif self.output_plugin == 'wal2json':
+                    executor.submit(self.profiler.run, self.__process_wal2json_change, data)
+
+        self.__read_completed = time.perf_counter()
+
+    def __publish_spooled_changes(self) -> None:
+        """
+        Process spooled messages in order until the spool is closed. Feedback is sent
+        as messages are processed, so it only covers delivered changes: a change that
+        fails is not confirmed, and the publisher closes the spool and stops, so the
+        reader fails on its next message and the server sends the change again after
+        a restart.
+        """
+        while True:
+            data = self.spool.get()
+
+            if data is None:
+                break
+
+            try:
+                if self.output_plugin == 'pgoutput':
+                    self.profiler.run(self.__process_pgoutput_change, data)
+                elif self.output_plugin == 'wal2json':
+                    self.profiler.run(self.__process_wal2json_change, data)
+            except Exception:
+                self.__publisher_failure = f'The spool publisher stopped, the change at LSN {data.data_start} was not delivered.'
+                logger.error(self.__publisher_failure)
+                self.spool.close()
+                break
+
+        logger.info('Spool publisher stopped')
 
     def perform_action(self, table_name: str, bytes_message: dict):
         """
@@ -257,8 +892,8 @@ class Producer:
         Raises:
             NotImplementedError: This method should be overridden by subclass.
         """
-        logger.debug(f'Table name: {table_name}')
-        logger.debug(f'Byte Data: {bytes_message}')
+        logger.debug('Table name: %s', table_name)
+        logger.debug('Byte Data: %s', bytes_message)
 
         raise NotImplementedError('This method should be overridden by subclass')
 
@@ -266,6 +901,18 @@ class Producer:
         """
         Start the logical replication process.
 
+        Args:
+            publication_names (str): The names of the publications to replicate.
+            protocol_version (str): The protocol version to use.
+        """
+        self.open_stream(publication_names, protocol_version)
+        self.replication_cursor.consume_stream(self.__process_changes)
+
+    def open_stream(self, publication_names: list, protocol_version: str) -> None:
+        """
+        Start streaming from the replication slot, without consuming the stream. Messages are
+        then read with the replication cursor's ``read_message`` and handed to ``process_message``.
+
         Args:
             publication_names (str): The names of the publications to replicate.
             protocol_version (str): The protocol version to use.
@@ -277,7 +924,28 @@ class Producer:
                 'proto_version': protocol_version,
                 'publication_names': ','.join(publication_names)
             }
+
+            if self.origin_filter is not None:
+                # Requires PostgreSQL 16, 'none' only sends changes that have no origin
+                options['origin'] = self.origin_filter
+
             logger.info(f'Starting replication with publications: {publication_names} and protocol version: {protocol_version}')
+        elif self.output_plugin == 'wal2json':
+            options = {'format-version': str(self.wal2json_format_version)}
+            options.update({key: str(value) for key, value in self.wal2json_options.items()})
+            logger.info(f'Starting replication with wal2json format version: {self.wal2json_format_version}')
+
+        if self.spool is not None and self.__publisher is None:
+            self.__publisher = threading.Thread(
+                target=self.__publish_spooled_changes, name='pg-streamline-spool-publisher', daemon=True
+            )
+            self.__publisher.start()
+
+        if self.worker_pool is not None and not self.worker_pool.started:
+            self.worker_pool.start()
+            self.__feedback_collector = threading.Thread(
+                target=self.__collect_worker_feedback, name='pg-streamline-worker-feedback', daemon=True
+            )
+            self.__feedback_collector.start()
 
         self.replication_cursor.start_replication(slot_name=self.replication_slot, decode=False, options=options)
-        self.replication_cursor.consume_stream(self.__process_changes)
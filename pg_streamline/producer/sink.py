@@ -0,0 +1,197 @@
+import logging
+from typing import List, Optional, Tuple
+
+from pg_streamline.parser.delete import DeleteMessage
+from pg_streamline.parser.insert import InsertMessage
+from pg_streamline.parser.schema import relation_id_of
+from pg_streamline.parser.update import UpdateMessage
+from pg_streamline.sinks import LsnTracker, SinkBatcher, SinkRecord, create_sink
+
+from .process import Producer
+
+
+logger = logging.getLogger(__name__)
+
+
+def decode_change(producer: Producer, bytes_message: bytes, schema_version: int = 0) -> Tuple[Optional[dict], Optional[dict]]:
+    """
+    Decode a pgoutput change for sinks that consume decoded rows, with the registered
+    schema version it was sent with or else the current catalog.
+
+    Args:
+        producer (Producer): The producer that read the change, whose pool and schema registry are used.
+        bytes_message (bytes): The raw replication message.
+        schema_version (int): The version of the relation schema, 0 if unknown.
+
+    Returns:
+        Tuple[Optional[dict], Optional[dict]]: The decoded change and the relation schema.
+    """
+    message_type = bytes(bytes_message[:1]).decode('utf-8')
+
+    if message_type not in ('I', 'U', 'D'):
+        return None, None
+
+    schema = None
+
+    if producer.schema_registry is not None and schema_version:
+        schema = producer.schema_registry.get(relation_id_of(bytes_message), schema_version)
+
+    if schema is not None:
+        return _parse_change(message_type, bytes_message, None, schema)
+
+    connection = producer.conn_pool.getconn()
+    cursor = connection.cursor()
+
+    try:
+        return _parse_change(message_type, bytes_message, cursor, None)
+    finally:
+        cursor.close()
+        producer.conn_pool.putconn(connection)
+
+
+def _parse_change(message_type: str, bytes_message: bytes, cursor, schema: Optional[dict]) -> Tuple[dict, dict]:
+    """
+    Decode an insert, update or delete.
+
+    Args:
+        message_type (str): 'I', 'U' or 'D'.
+        bytes_message (bytes): The raw replication message.
+        cursor (Optional[psycopg2.extensions.cursor]): Cursor used to read the schema when none is given.
+        schema (Optional[dict]): The relation schema the change was sent with.
+
+    Returns:
+        Tuple[dict, dict]: The decoded change and the relation schema.
+    """
+    if message_type == 'I':
+        parser = InsertMessage(bytes_message, cursor=cursor, schema=schema)
+        change = parser.decode_insert_message()
+    elif message_type == 'U':
+        parser = UpdateMessage(bytes_message, cursor=cursor, schema=schema)
+        change = parser.decode_update_message()
+    else:
+        parser = DeleteMessage(bytes_message, cursor=cursor, schema=schema)
+        change = parser.decode_delete_message()
+
+    return change, parser.schema
+
+
+class SinkProducer(Producer):
+    """
+    Producer that delivers changes through a pluggable sink.
+
+    The sink is selected with the 'sink' section of the configuration file. Batching,
+    retries and LSN accounting are handled here, so feedback sent to PostgreSQL
+    never moves past a change the sink has not acknowledged as durable.
+
+    Attributes:
+        sink (BaseSink): The configured sink.
+        batcher (SinkBatcher): Buffers records and delivers them to the sink.
+        lsn_tracker (LsnTracker): Tracks which messages have been delivered.
+    """
+
+    def __init__(self, config_path: str = None) -> None:
+        """
+        Initialize the SinkProducer.
+
+        Args:
+            config_path (str): The path to the configuration file.
+        """
+        super().__init__(config_path=config_path)
+
+        self.__validate_config()
+
+        if self.worker_pool is not None:
+            # Workers report records complete once perform_action returns, before sinks acknowledge them
+            raise ValueError('The workers section is not supported by SinkProducer.')
+
+        sink_config = self.config['sink']
+        name = sink_config['name']
+
+        # Sink options default to the top-level section of the same name (e.g. 'rabbitmq')
+        options = sink_config.get('options', self.config.get(name, {}))
+
+        self.sink = create_sink(name, options)
+        self.sink.add_ack_callback(self.__acknowledge)
+        self.lsn_tracker = LsnTracker()
+        self.batcher = SinkBatcher(
+            self.sink,
+            batch_size=sink_config.get('batch_size', 500),
+            flush_interval=sink_config.get('flush_interval', 1.0),
+            max_retries=sink_config.get('max_retries', 5),
+            retry_backoff=sink_config.get('retry_backoff', 0.5)
+        )
+        self.batcher.start()
+
+        self.metrics.gauge(
+            'pg_streamline_producer_inflight_messages', 'Changes handed to the sink and not yet acknowledged'
+        ).set_function(lambda: self.lsn_tracker.pending_count)
+
+        logger.info(f'Using sink: {name}')
+
+    def __validate_config(self) -> None:
+        """
+        Validate the sink section of the configuration file.
+        """
+        if 'sink' not in self.config:
+            raise ConnectionError('sink is missing from the configuration file.')
+
+        if 'name' not in self.config['sink']:
+            raise ConnectionError('name is missing from the sink configuration.')
+
+    def __acknowledge(self, records: List[SinkRecord]) -> None:
+        """
+        Mark acknowledged records as delivered and report the new flush position.
+
+        Args:
+            records (List[SinkRecord]): The records the sink has made durable.
+        """
+        for record in records:
+            self.lsn_tracker.complete(record.sequence)
+
+        if not self.replication_cursor.closed:
+            super().send_feedback(flush_lsn=self.lsn_tracker.flushable_lsn)
+
+    def perform_action(self, table_name: str, bytes_message: bytes) -> None:
+        """
+        Buffer a change for delivery to the sink.
+
+        Args:
+            table_name (str): The name of the table.
+            bytes_message (bytes): The raw replication message.
+        """
+        context = self.change_context
+        change, schema = None, None
+
+        if self.sink.decode_changes and self.output_plugin == 'pgoutput':
+            change, schema = decode_change(self, bytes_message, context.schema_version)
+
+        sequence = self.lsn_tracker.track(context.lsn)
+        self.batcher.add(SinkRecord(
+            table_name,
+            bytes_message,
+            context.lsn,
+            sequence,
+            commit_lsn=context.commit_lsn,
+            change=change,
+            schema=schema,
+            xid=context.xid,
+            trace=context.trace,
+            schema_version=context.schema_version
+        ))
+
+    def send_feedback(self, flush_lsn: int) -> None:
+        """
+        Send feedback for the highest LSN the sink has durably delivered.
+
+        Args:
+            flush_lsn (int): The LSN of the message that has just been processed.
+        """
+        self.lsn_tracker.observe(flush_lsn)
+        super().send_feedback(flush_lsn=self.lsn_tracker.flushable_lsn)
+
+    def perform_termination(self) -> None:
+        """
+        Deliver buffered records and close the sink.
+        """
+        logger.info(f'Closing sink: {self.sink.name}')
+        self.batcher.close()
@@ -0,0 +1,243 @@
+import collections
+import logging
+import os
+import re
+import threading
+from typing import Any, Deque, Optional
+
+from pg_streamline.replay.segment import (
+    FSYNC_POLICIES,
+    RECORD_HEADER,
+    SEGMENT_MAGIC,
+    SEGMENT_SUFFIX,
+    RecordedMessage,
+    pack_record
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Names of the segments a spool writes, other files in its directory are left alone
+SEGMENT_NAME_PATTERN = re.compile(r'^\d{8}' + re.escape(SEGMENT_SUFFIX) + '$')
+
+
+class Spool:
+    """
+    An append-only, segmented on-disk queue between the replication reader and the sink.
+
+    The reader appends messages with ``put`` and a publisher takes them in order with
+    ``get``. Segments use the recording format (see pg_streamline.replay), are rotated at
+    max_segment_bytes and deleted once fully read. When the unread backlog reaches the
+    high watermark, ``put`` blocks until the publisher drains it below the low watermark,
+    which throttles reading from the server.
+
+    Feedback is only sent for delivered messages, so the server re-sends whatever was
+    spooled but not delivered when the producer restarts. Leftover segments are therefore
+    discarded on open, and fsync only matters when the spool is inspected after a crash.
+    Only files named like spool segments are deleted, other files in the directory are kept.
+
+    Attributes:
+        directory (str): The spool directory.
+        max_segment_bytes (int): Size at which a new segment is started.
+        fsync (str): 'none', 'segment' (when a segment is closed) or 'always' (every message).
+        high_watermark_bytes (int): Backlog at which put starts blocking.
+        low_watermark_bytes (int): Backlog at which blocked puts resume.
+        throttled (bool): Whether put is currently blocked by the high watermark.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_segment_bytes: int = 16 * 1024 * 1024,
+        fsync: str = 'none',
+        high_watermark_bytes: int = 256 * 1024 * 1024,
+        low_watermark_bytes: Optional[int] = None
+    ) -> None:
+        """
+        Initialize the Spool.
+
+        Args:
+            directory (str): The spool directory, created if missing. Segments left in it are deleted.
+            max_segment_bytes (int): Size at which a new segment is started.
+            fsync (str): The fsync policy, one of 'none', 'segment' or 'always'.
+            high_watermark_bytes (int): Backlog at which put starts blocking.
+            low_watermark_bytes (Optional[int]): Backlog at which blocked puts resume, half the high watermark by default.
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f'fsync must be one of {", ".join(FSYNC_POLICIES)}.')
+
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync = fsync
+        self.high_watermark_bytes = high_watermark_bytes
+        self.low_watermark_bytes = high_watermark_bytes // 2 if low_watermark_bytes is None else low_watermark_bytes
+        self.throttled = False
+
+        self.__created_directory = not os.path.isdir(directory)
+        os.makedirs(directory, exist_ok=True)
+
+        leftovers = self.__segment_files()
+
+        if leftovers:
+            logger.warning(f'Discarding {len(leftovers)} spool segments left in {directory}, the server re-sends undelivered changes')
+
+            for path in leftovers:
+                os.remove(path)
+
+        self.__condition = threading.Condition()
+        self.__closed = False
+        self.__sequence = 0
+        self.__segments: Deque[str] = collections.deque()
+        self.__writer = None
+        self.__writer_size = 0
+        self.__reader = None
+        self.__pending_bytes = 0
+        self.__pending_count = 0
+
+    def __segment_files(self) -> list:
+        """
+        Return the paths of the spool segments in the directory.
+        """
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory) if SEGMENT_NAME_PATTERN.match(name)
+        )
+
+    @property
+    def pending_bytes(self) -> int:
+        """The size of the messages spooled but not yet taken by the publisher."""
+        return self.__pending_bytes
+
+    @property
+    def pending_count(self) -> int:
+        """The number of messages spooled but not yet taken by the publisher."""
+        return self.__pending_count
+
+    def __open_segment(self) -> None:
+        """
+        Start the next segment.
+        """
+        self.__sequence += 1
+        path = os.path.join(self.directory, f'{self.__sequence:08d}{SEGMENT_SUFFIX}')
+        self.__writer = open(path, 'xb')
+        self.__writer.write(SEGMENT_MAGIC)
+        self.__writer_size = len(SEGMENT_MAGIC)
+        self.__segments.append(path)
+
+    def __close_segment(self) -> None:
+        """
+        Flush and close the segment being written.
+        """
+        self.__writer.flush()
+
+        if self.fsync != 'none':
+            os.fsync(self.__writer.fileno())
+
+        self.__writer.close()
+        self.__writer = None
+
+    def put(self, message: Any) -> None:
+        """
+        Append a replication message, blocking while the backlog is above the watermarks.
+
+        Args:
+            message (Any): A psycopg2 ReplicationMessage or any object with payload and data_start.
+        """
+        record = pack_record(message)
+
+        with self.__condition:
+            if self.__pending_bytes >= self.high_watermark_bytes and not self.__closed:
+                self.throttled = True
+                logger.warning(f'Spool backlog reached {self.__pending_bytes} bytes, throttling replication')
+
+                while self.__pending_bytes > self.low_watermark_bytes and not self.__closed:
+                    self.__condition.wait()
+
+                self.throttled = False
+                logger.info(f'Spool backlog down to {self.__pending_bytes} bytes, resuming replication')
+
+            if self.__closed:
+                raise ValueError('The spool is closed.')
+
+            if self.__writer is None:
+                self.__open_segment()
+
+            self.__writer.write(record)
+            self.__writer.flush()
+
+            if self.fsync == 'always':
+                os.fsync(self.__writer.fileno())
+
+            self.__writer_size += len(record)
+            self.__pending_bytes += len(record)
+            self.__pending_count += 1
+
+            if self.__writer_size >= self.max_segment_bytes:
+                self.__close_segment()
+
+            self.__condition.notify_all()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[RecordedMessage]:
+        """
+        Take the oldest spooled message.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait for a message, None to wait until one arrives or the spool closes.
+
+        Returns:
+            Optional[RecordedMessage]: The message, or None on timeout or once the spool is closed.
+        """
+        with self.__condition:
+            if not self.__condition.wait_for(lambda: self.__pending_count or self.__closed, timeout):
+                return None
+
+            if self.__closed:
+                return None
+
+            if self.__reader is None:
+                self.__reader = open(self.__segments[0], 'rb')
+                self.__reader.seek(len(SEGMENT_MAGIC))
+
+            header = self.__reader.read(RECORD_HEADER.size)
+
+            if not header:
+                # The segment is exhausted and closed for writing, move to the next one
+                self.__reader.close()
+                os.remove(self.__segments.popleft())
+                self.__reader = open(self.__segments[0], 'rb')
+                self.__reader.seek(len(SEGMENT_MAGIC))
+                header = self.__reader.read(RECORD_HEADER.size)
+
+            length, data_start, wal_end, send_time, captured_at = RECORD_HEADER.unpack(header)
+            payload = self.__reader.read(length)
+
+            self.__pending_bytes -= RECORD_HEADER.size + length
+            self.__pending_count -= 1
+            self.__condition.notify_all()
+
+        return RecordedMessage(payload, data_start, wal_end, send_time, captured_at)
+
+    def close(self, remove: bool = True) -> None:
+        """
+        Close the spool, waking up blocked callers.
+
+        Args:
+            remove (bool): Delete the spool segments, and the directory if the spool created it and it is empty.
+        """
+        with self.__condition:
+            self.__closed = True
+
+            if self.__writer is not None:
+                self.__close_segment()
+
+            if self.__reader is not None:
+                self.__reader.close()
+                self.__reader = None
+
+            self.__condition.notify_all()
+
+        if remove:
+            for path in self.__segment_files():
+                os.remove(path)
+
+            if self.__created_directory and not os.listdir(self.directory):
+                os.rmdir(self.directory)
@@ -0,0 +1,537 @@
+import collections
+import logging
+import math
+import multiprocessing
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Any, Deque, List, Optional
+
+from pg_streamline.replay.segment import RecordedMessage
+from pg_streamline.sinks.batcher import LsnTracker
+
+
+logger = logging.getLogger(__name__)
+
+# Ring header fields, each written by a single process and kept on its own cache line
+HEAD_OFFSET = 0                 # bytes written, by the reader
+TAIL_OFFSET = 64                # bytes released, by the worker
+COMPLETED_OFFSET = 128          # sequence + 1 and LSN of the last processed record, by the worker
+CLOSED_OFFSET = 192             # set by the reader when no more records will be written
+CAPACITY_OFFSET = 200           # size of the data area
+HEADER_SIZE = 256
+
+# length, xid, sequence, data_start, commit_lsn, commit_time (NaN if unknown), captured_at
+RECORD_HEADER = struct.Struct('<IIQQQdd')
+WRAP_MARKER = 0xFFFFFFFF
+COUNTER = struct.Struct('<Q')
+COMPLETED = struct.Struct('<QQ')
+
+# Sections handled by the reader process only, removed from the configuration of workers
+READER_SECTIONS = ('recording', 'replay', 'spool', 'monitor', 'workers')
+
+# Index of the worker running in this process, None in the reader
+_worker_id: Optional[int] = None
+
+
+def current_worker() -> Optional[int]:
+    """
+    Return the index of the worker running in this process, None outside of worker processes.
+    """
+    return _worker_id
+
+
+def worker_config(config: dict, worker_id: int) -> dict:
+    """
+    Adapt the configuration file for a worker process: sections owned by the reader are
+    removed, and metrics are served on the port after the reader's, one per worker.
+
+    Args:
+        config (dict): The parsed configuration file.
+        worker_id (int): The worker index.
+    """
+    config = {key: value for key, value in config.items() if key not in READER_SECTIONS}
+    metrics_config = config.get('metrics')
+
+    if metrics_config and metrics_config.get('port') is not None:
+        config['metrics'] = dict(metrics_config, port=int(metrics_config['port']) + 1 + worker_id)
+
+    return config
+
+
+class RingRecord:
+    """
+    A record read from a SharedRing. The payload is a view into shared memory, valid until
+    the record is released.
+
+    Attributes:
+        sequence (int): The sequence number assigned by the reader.
+        data_start (int): The LSN of the replication message.
+        commit_lsn (int): The commit LSN of the enclosing transaction.
+        xid (int): The transaction ID of the enclosing transaction.
+        commit_time (Optional[float]): The commit time of the enclosing transaction.
+        captured_at (float): When the reader received the message.
+        payload (memoryview): The raw message.
+    """
+
+    __slots__ = ('sequence', 'data_start', 'commit_lsn', 'xid', 'commit_time', 'captured_at', 'payload')
+
+    def __init__(
+        self,
+        sequence: int,
+        data_start: int,
+        commit_lsn: int,
+        xid: int,
+        commit_time: Optional[float],
+        captured_at: float,
+        payload: memoryview
+    ) -> None:
+        """
+        Initialize the RingRecord.
+
+        Args:
+            sequence (int): The sequence number assigned by the reader.
+            data_start (int): The LSN of the replication message.
+            commit_lsn (int): The commit LSN of the enclosing transaction.
+            xid (int): The transaction ID of the enclosing transaction.
+            commit_time (Optional[float]): The commit time of the enclosing transaction.
+            captured_at (float): When the reader received the message.
+            payload (memoryview): The raw message.
+        """
+        self.sequence = sequence
+        self.data_start = data_start
+        self.commit_lsn = commit_lsn
+        self.xid = xid
+        self.commit_time = commit_time
+        self.captured_at = captured_at
+        self.payload = payload
+
+    def to_message(self) -> RecordedMessage:
+        """
+        Wrap the record as a replication message. Its payload is the view into shared memory,
+        valid until ``payload.release()`` is called.
+        """
+        return RecordedMessage(self.payload, self.data_start, 0, 0.0, self.captured_at)
+
+
+class SharedRing:
+    """
+    A single-producer, single-consumer ring buffer in shared memory.
+
+    The reader appends records with ``put`` and one worker takes them in order with ``get``
+    and ``release``, then reports them processed with ``complete``. Records are a fixed
+    header followed by the payload, padded to 8 bytes; a record that does not fit before
+    the end of the buffer starts over at its beginning. Head and tail are byte counters
+    that only grow, each written by one side, so no lock is shared between processes.
+
+    Waiting sides poll with a short sleep, which keeps the ring portable at the cost of up
+    to a millisecond of latency when it is empty or full.
+
+    Attributes:
+        name (str): The shared memory name, to attach from another process.
+        capacity (int): The size of the data area.
+    """
+
+    def __init__(self, capacity: int = 16 * 1024 * 1024, name: Optional[str] = None) -> None:
+        """
+        Create a ring, or attach to an existing one.
+
+        Args:
+            capacity (int): The size of the data area, rounded up to 8 bytes. Ignored when attaching.
+            name (Optional[str]): The name of an existing ring to attach to.
+        """
+        if name is None:
+            capacity = (capacity + 7) & ~7
+            self.__memory = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + capacity)
+            self.__memory.buf[:HEADER_SIZE] = bytes(HEADER_SIZE)
+            COUNTER.pack_into(self.__memory.buf, CAPACITY_OFFSET, capacity)
+            self.__owner = True
+        else:
+            self.__memory = shared_memory.SharedMemory(name=name)
+            self.__owner = False
+
+        self.name = self.__memory.name
+        self.capacity = COUNTER.unpack_from(self.__memory.buf, CAPACITY_OFFSET)[0]
+        self.__buffer = self.__memory.buf
+        self.__head = COUNTER.unpack_from(self.__buffer, HEAD_OFFSET)[0]
+        self.__tail = COUNTER.unpack_from(self.__buffer, TAIL_OFFSET)[0]
+        self.__next_tail = self.__tail
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedRing':
+        """
+        Attach to a ring created by another process.
+
+        Args:
+            name (str): The ring name.
+        """
+        return cls(name=name)
+
+    @property
+    def closed(self) -> bool:
+        """Whether the reader closed the ring."""
+        return bool(COUNTER.unpack_from(self.__buffer, CLOSED_OFFSET)[0])
+
+    @property
+    def used_bytes(self) -> int:
+        """Bytes written and not yet released."""
+        return COUNTER.unpack_from(self.__buffer, HEAD_OFFSET)[0] - COUNTER.unpack_from(self.__buffer, TAIL_OFFSET)[0]
+
+    @property
+    def completed(self) -> tuple:
+        """
+        The sequence following the last record the worker completed, and that record's LSN.
+        (0, 0) before the first record is completed.
+        """
+        return COMPLETED.unpack_from(self.__buffer, COMPLETED_OFFSET)
+
+    def put(
+        self,
+        sequence: int,
+        data_start: int,
+        payload: bytes,
+        commit_lsn: int = 0,
+        xid: int = 0,
+        commit_time: Optional[float] = None,
+        captured_at: Optional[float] = None,
+        timeout: Optional[float] = None
+    ) -> bool:
+        """
+        Append a record, waiting while the ring is full. Called by the reader only.
+
+        Args:
+            sequence (int): The sequence number of the record.
+            data_start (int): The LSN of the replication message.
+            payload (bytes): The raw message.
+            commit_lsn (int): The commit LSN of the enclosing transaction.
+            xid (int): The transaction ID of the enclosing transaction.
+            commit_time (Optional[float]): The commit time of the enclosing transaction.
+            captured_at (Optional[float]): When the message was received, now by default.
+            timeout (Optional[float]): Seconds to wait for space, None to wait indefinitely.
+
+        Returns:
+            bool: False if the ring stayed full for timeout seconds.
+        """
+        size = (RECORD_HEADER.size + len(payload) + 7) & ~7
+
+        if size > self.capacity:
+            raise ValueError(f'A record of {size} bytes does not fit in a ring of {self.capacity} bytes.')
+
+        head = self.__head
+        offset = head % self.capacity
+        contiguous = self.capacity - offset
+        needed = size if size <= contiguous else contiguous + size
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 0.00001
+
+        while self.capacity - (head - COUNTER.unpack_from(self.__buffer, TAIL_OFFSET)[0]) < needed:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+            time.sleep(delay)
+            delay = min(delay * 2, 0.001)
+
+        if size > contiguous:
+            # Not enough room before the end, the record starts over at the beginning
+            struct.pack_into('<I', self.__buffer, HEADER_SIZE + offset, WRAP_MARKER)
+            head += contiguous
+            offset = 0
+
+        position = HEADER_SIZE + offset
+        RECORD_HEADER.pack_into(
+            self.__buffer,
+            position,
+            len(payload),
+            xid,
+            sequence,
+            data_start,
+            commit_lsn,
+            math.nan if commit_time is None else commit_time,
+            time.time() if captured_at is None else captured_at
+        )
+        self.__buffer[position + RECORD_HEADER.size:position + RECORD_HEADER.size + len(payload)] = payload
+
+        # Publish the record only once it is fully written
+        self.__head = head + size
+        COUNTER.pack_into(self.__buffer, HEAD_OFFSET, self.__head)
+        return True
+
+    def get(self) -> Optional[RingRecord]:
+        """
+        Read the next record without copying it, None if the ring is empty. Called by the worker only.
+
+        The previous record must have been released.
+        """
+        tail = self.__tail
+
+        if COUNTER.unpack_from(self.__buffer, HEAD_OFFSET)[0] == tail:
+            return None
+
+        offset = tail % self.capacity
+
+        if struct.unpack_from('<I', self.__buffer, HEADER_SIZE + offset)[0] == WRAP_MARKER:
+            tail += self.capacity - offset
+            offset = 0
+
+        position = HEADER_SIZE + offset
+        length, xid, sequence, data_start, commit_lsn, commit_time, captured_at = RECORD_HEADER.unpack_from(
+            self.__buffer, position
+        )
+        start = position + RECORD_HEADER.size
+        self.__next_tail = tail + ((RECORD_HEADER.size + length + 7) & ~7)
+
+        return RingRecord(
+            sequence,
+            data_start,
+            commit_lsn,
+            xid,
+            None if math.isnan(commit_time) else commit_time,
+            captured_at,
+            self.__buffer[start:start + length]
+        )
+
+    def release(self) -> None:
+        """
+        Free the space of the record returned by the last ``get``. Called by the worker only.
+        """
+        self.__tail = self.__next_tail
+        COUNTER.pack_into(self.__buffer, TAIL_OFFSET, self.__tail)
+
+    def complete(self, sequence: int, data_start: int) -> None:
+        """
+        Report a record processed, in ring order. Called by the worker only.
+
+        Args:
+            sequence (int): The sequence number of the record.
+            data_start (int): The LSN of the record.
+        """
+        COMPLETED.pack_into(self.__buffer, COMPLETED_OFFSET, sequence + 1, data_start)
+
+    def close(self) -> None:
+        """
+        Mark the ring closed, so the worker stops once it has drained it. Called by the reader only.
+        """
+        COUNTER.pack_into(self.__buffer, CLOSED_OFFSET, 1)
+
+    def release_memory(self) -> None:
+        """
+        Detach from the shared memory, and remove it if this process created it.
+        """
+        self.__buffer = None
+        self.__memory.close()
+
+        if self.__owner:
+            self.__memory.unlink()
+
+
+def run_worker(producer_class: type, config_path: Optional[str], worker_id: int, ring_name: str) -> None:
+    """
+    Entry point of worker processes: create the producer and process the records of its ring.
+
+    Args:
+        producer_class (type): The Producer subclass, importable by the worker process.
+        config_path (Optional[str]): The configuration file of the reader.
+        worker_id (int): The worker index.
+        ring_name (str): The name of the worker's ring.
+    """
+    global _worker_id
+    _worker_id = worker_id
+
+    ring = SharedRing.attach(ring_name)
+
+    try:
+        producer = producer_class(config_path=config_path)
+        producer.consume_ring(ring)
+    finally:
+        ring.release_memory()
+
+
+class WorkerPool:
+    """
+    Worker processes that decode and publish changes on behalf of the reader.
+
+    Each worker has its own SharedRing. Changes are routed by relation ID, so the changes of
+    a table are processed in order by a single worker. The reader assigns every message a
+    sequence number in an LsnTracker; workers report the last record they completed in their
+    ring header, and ``poll`` turns those reports into the LSN that can be confirmed.
+
+    Attributes:
+        producer_class (type): The Producer subclass created by each worker.
+        config_path (Optional[str]): The configuration file passed to workers.
+        processes (int): The number of worker processes.
+        ring_bytes (int): The size of each ring.
+        lsn_tracker (LsnTracker): Tracks which messages have been processed.
+    """
+
+    def __init__(
+        self,
+        producer_class: type,
+        config_path: Optional[str],
+        processes: int = 2,
+        ring_bytes: int = 16 * 1024 * 1024,
+        start_method: Optional[str] = None
+    ) -> None:
+        """
+        Initialize the WorkerPool.
+
+        Args:
+            producer_class (type): The Producer subclass created by each worker.
+            config_path (Optional[str]): The configuration file passed to workers.
+            processes (int): The number of worker processes.
+            ring_bytes (int): The size of each ring.
+            start_method (Optional[str]): The multiprocessing start method, the platform default when None.
+        """
+        if processes < 1:
+            raise ValueError('processes must be at least 1.')
+
+        self.producer_class = producer_class
+        self.config_path = config_path
+        self.processes = processes
+        self.ring_bytes = ring_bytes
+        self.lsn_tracker = LsnTracker()
+
+        self.__context = multiprocessing.get_context(start_method)
+        self.__rings: List[SharedRing] = []
+        self.__workers: List[Any] = []
+        self.__pending: List[Deque[int]] = []
+        self.__stopped = threading.Event()
+        self.__failure: Optional[str] = None
+
+    @property
+    def started(self) -> bool:
+        """Whether the worker processes were started."""
+        return bool(self.__workers)
+
+    @property
+    def failure(self) -> Optional[str]:
+        """Why a worker stopped before the pool was closed, None while they all run."""
+        return self.__failure
+
+    def start(self) -> None:
+        """
+        Create the rings and start the worker processes.
+        """
+        for worker_id in range(self.processes):
+            ring = SharedRing(self.ring_bytes)
+            worker = self.__context.Process(
+                target=run_worker,
+                args=(self.producer_class, self.config_path, worker_id, ring.name),
+                name=f'pg-streamline-worker-{worker_id}',
+                daemon=True
+            )
+            worker.start()
+
+            self.__rings.append(ring)
+            self.__workers.append(worker)
+            self.__pending.append(collections.deque())
+
+        logger.info(f'Started {self.processes} worker processes with {self.ring_bytes} byte rings')
+
+    def dispatch(
+        self,
+        relation_id: int,
+        data: Any,
+        commit_lsn: int = 0,
+        xid: int = 0,
+        commit_time: Optional[float] = None
+    ) -> None:
+        """
+        Hand a change to the worker of its relation, waiting while its ring is full.
+
+        Args:
+            relation_id (int): The relation ID of the change.
+            data (Any): The replication message.
+            commit_lsn (int): The commit LSN of the enclosing transaction.
+            xid (int): The transaction ID of the enclosing transaction.
+            commit_time (Optional[float]): The commit time of the enclosing transaction.
+
+        Raises:
+            RuntimeError: If a worker stopped, e.g. on a change it could not process.
+        """
+        if self.__failure is not None:
+            raise RuntimeError(self.__failure)
+
+        worker_id = relation_id % self.processes
+        sequence = self.lsn_tracker.track(data.data_start)
+        self.__pending[worker_id].append(sequence)
+
+        while not self.__rings[worker_id].put(
+            sequence,
+            data.data_start,
+            data.payload,
+            commit_lsn=commit_lsn,
+            xid=xid,
+            commit_time=commit_time,
+            captured_at=getattr(data, 'captured_at', None),
+            timeout=1.0
+        ):
+            if not self.__workers[worker_id].is_alive():
+                raise RuntimeError(f'Worker {worker_id} exited with code {self.__workers[worker_id].exitcode}.')
+
+    def observe(self, lsn: int) -> None:
+        """
+        Record a message handled by the reader, e.g. Begin or Commit.
+
+        Args:
+            lsn (int): The LSN of the message.
+        """
+        self.lsn_tracker.observe(lsn)
+
+    def poll(self) -> int:
+        """
+        Collect the records completed by the workers, and notice workers that stopped.
+
+        Returns:
+            int: The highest LSN up to which every message has been processed.
+        """
+        for worker, ring, pending in zip(self.__workers, self.__rings, self.__pending):
+            next_sequence, _ = ring.completed
+
+            while pending and pending[0] < next_sequence:
+                self.lsn_tracker.complete(pending.popleft())
+
+            if self.__failure is None and not self.__stopped.is_set() and worker.exitcode is not None:
+                # The changes left in its ring stay pending, so their LSNs are never confirmed
+                self.__failure = f'Worker {worker.name} exited with code {worker.exitcode}.'
+                logger.error(f'{self.__failure} {len(pending)} changes were not processed')
+
+        return self.lsn_tracker.flushable_lsn
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Sleep between polls.
+
+        Args:
+            timeout (float): Seconds to sleep.
+
+        Returns:
+            bool: False once the pool is closed.
+        """
+        return not self.__stopped.wait(timeout)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """
+        Close the rings, wait for the workers to drain them and release the shared memory.
+
+        Args:
+            timeout (float): Seconds to wait for each worker before terminating it.
+        """
+        self.__stopped.set()
+
+        for ring in self.__rings:
+            ring.close()
+
+        for worker in self.__workers:
+            worker.join(timeout)
+
+            if worker.is_alive():
+                logger.warning(f'Terminating {worker.name}, it did not stop within {timeout}s')
+                worker.terminate()
+
+        self.poll()
+
+        for ring in self.__rings:
+            ring.release_memory()
+
+        self.__rings, self.__workers, self.__pending = [], [], []
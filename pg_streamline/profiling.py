@@ -0,0 +1,304 @@
+import collections
+import cProfile
+import logging
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Points of the pipeline reported to profiling hooks
+HOOK_POINTS = ('read', 'parse', 'catalog_lookup', 'perform_action', 'publish', 'feedback')
+
+PROFILE_MODES = ('sampling', 'cprofile')
+
+
+class ProfilingHooks:
+    """
+    Timing callbacks for the hot path.
+
+    Callbacks are called with the hook point, the duration in seconds and the table
+    name (None when not applicable) every time the point is passed:
+
+    - read: waiting for and reading the next replication message (producer).
+    - parse: decoding a change, excluding catalog lookups.
+    - catalog_lookup: resolving a relation ID to a table name or schema.
+    - perform_action: the consumer's perform_action.
+    - publish: the producer's perform_action.
+    - feedback: send_feedback (producer) or acknowledging a message (consumer).
+
+    Attributes:
+        enabled (bool): Whether any callback is registered; timing is skipped otherwise.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the ProfilingHooks.
+        """
+        self.enabled = False
+        self.__callbacks: Dict[str, List[Callable[[str, float, Optional[str]], None]]] = {
+            point: [] for point in HOOK_POINTS
+        }
+
+    def add_hook(self, point: str, callback: Callable[[str, float, Optional[str]], None]) -> None:
+        """
+        Register a timing callback.
+
+        Args:
+            point (str): One of HOOK_POINTS, or '*' for all of them.
+            callback (Callable[[str, float, Optional[str]], None]): Called with (point, seconds, table_name).
+        """
+        points = HOOK_POINTS if point == '*' else (point,)
+
+        for name in points:
+            if name not in self.__callbacks:
+                raise ValueError(f'Hook point {name} does not exist.')
+
+            self.__callbacks[name].append(callback)
+
+        self.enabled = True
+
+    def remove_hook(self, point: str, callback: Callable[[str, float, Optional[str]], None]) -> None:
+        """
+        Unregister a timing callback.
+
+        Args:
+            point (str): The point it was registered for, or '*'.
+            callback (Callable[[str, float, Optional[str]], None]): The callback.
+        """
+        points = HOOK_POINTS if point == '*' else (point,)
+
+        for name in points:
+            if callback in self.__callbacks.get(name, []):
+                self.__callbacks[name].remove(callback)
+
+        self.enabled = any(self.__callbacks.values())
+
+    def emit(self, point: str, seconds: float, table_name: Optional[str] = None) -> None:
+        """
+        Call the callbacks of a hook point. Errors are logged and do not reach the pipeline.
+
+        Args:
+            point (str): The hook point.
+            seconds (float): The measured duration.
+            table_name (Optional[str]): The table the measurement belongs to.
+        """
+        for callback in self.__callbacks[point]:
+            try:
+                callback(point, seconds, table_name)
+            except Exception:
+                logger.exception(f'Profiling hook for {point} failed')
+
+
+class Profiler:
+    """
+    Profile live traffic for a window of time, on demand.
+
+    The 'sampling' mode samples the stacks of every thread with sys._current_frames and
+    writes them in the folded format used by flame graph tools. The 'cprofile' mode
+    profiles the work passed to ``run`` with cProfile and writes a pstats file.
+
+    Attributes:
+        directory (str): Where profiles are written.
+        seconds (float): Default window length.
+        mode (str): Default mode, 'sampling' or 'cprofile'.
+        interval (float): Seconds between stack samples.
+        last_profile (Optional[str]): Path of the last profile written.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        seconds: float = 30.0,
+        mode: str = 'sampling',
+        interval: float = 0.005
+    ) -> None:
+        """
+        Initialize the Profiler.
+
+        Args:
+            directory (Optional[str]): Where profiles are written, the temporary directory by default.
+            seconds (float): Default window length.
+            mode (str): Default mode, 'sampling' or 'cprofile'.
+            interval (float): Seconds between stack samples.
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f'mode must be one of {", ".join(PROFILE_MODES)}.')
+
+        self.directory = directory or tempfile.gettempdir()
+        self.seconds = seconds
+        self.mode = mode
+        self.interval = interval
+        self.last_profile: Optional[str] = None
+
+        self.__lock = threading.Lock()
+        self.__run_lock = threading.Lock()
+        self.__window: Optional[threading.Thread] = None
+        self.__profile: Optional[cProfile.Profile] = None
+
+    @property
+    def active(self) -> bool:
+        """Whether a profiling window is open."""
+        return self.__window is not None
+
+    def run(self, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Call a function, profiling it while a cProfile window is open.
+
+        Args:
+            function (Callable[..., Any]): The function to call.
+            *args (Any): Positional arguments.
+            **kwargs (Any): Keyword arguments.
+        """
+        profile = self.__profile
+
+        # Only one thread is profiled at a time, the others run unprofiled
+        if profile is None or not self.__run_lock.acquire(blocking=False):
+            return function(*args, **kwargs)
+
+        try:
+            profile.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.disable()
+        finally:
+            self.__run_lock.release()
+
+    def start_window(self, seconds: Optional[float] = None, mode: Optional[str] = None) -> Optional[threading.Thread]:
+        """
+        Open a profiling window in a background thread.
+
+        Args:
+            seconds (Optional[float]): Window length, the default when None.
+            mode (Optional[str]): 'sampling' or 'cprofile', the default when None.
+
+        Returns:
+            Optional[threading.Thread]: The thread writing the profile, None if a window is already open.
+        """
+        with self.__lock:
+            if self.__window is not None:
+                logger.warning('A profiling window is already open')
+                return None
+
+            window = self.__window = threading.Thread(
+                target=self.profile_window,
+                args=(seconds, mode),
+                name='pg-streamline-profiler',
+                daemon=True
+            )
+            window.start()
+            return window
+
+    def profile_window(self, seconds: Optional[float] = None, mode: Optional[str] = None) -> str:
+        """
+        Profile for a window of time and write the profile.
+
+        Args:
+            seconds (Optional[float]): Window length, the default when None.
+            mode (Optional[str]): 'sampling' or 'cprofile', the default when None.
+
+        Returns:
+            str: The path of the profile.
+        """
+        seconds = self.seconds if seconds is None else seconds
+        mode = mode or self.mode
+
+        if mode not in PROFILE_MODES:
+            raise ValueError(f'mode must be one of {", ".join(PROFILE_MODES)}.')
+
+        os.makedirs(self.directory, exist_ok=True)
+        name = f'pg-streamline-{os.getpid()}-{time.strftime("%Y%m%d-%H%M%S")}'
+        logger.info(f'Profiling for {seconds}s ({mode})')
+
+        try:
+            if mode == 'cprofile':
+                path = os.path.join(self.directory, f'{name}.prof')
+                self.__profile = cProfile.Profile()
+                time.sleep(seconds)
+                profile, self.__profile = self.__profile, None
+                profile.dump_stats(path)
+            else:
+                path = os.path.join(self.directory, f'{name}.folded')
+                self.__sample(seconds, path)
+        finally:
+            self.__profile = None
+            self.__window = None
+
+        self.last_profile = path
+        logger.info(f'Profile written to {path}')
+        return path
+
+    def __sample(self, seconds: float, path: str) -> None:
+        """
+        Sample the stacks of all other threads and write them in the folded format.
+
+        Args:
+            seconds (float): Window length.
+            path (str): The output path.
+        """
+        stacks = collections.Counter()
+        leaves = collections.Counter()
+        own_thread = threading.get_ident()
+        deadline = time.monotonic() + seconds
+
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+
+                stack = []
+
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+
+                stacks[';'.join(reversed(stack))] += 1
+                leaves[stack[0]] += 1
+
+            time.sleep(self.interval)
+
+        with open(path, 'w') as file:
+            for stack, count in stacks.most_common():
+                file.write(f'{stack} {count}\n')
+
+        total = sum(leaves.values()) or 1
+        summary = ', '.join(f'{function} {count * 100 / total:.1f}%' for function, count in leaves.most_common(10))
+        logger.info(f'Top functions by samples: {summary}')
+
+    def install_signal_handler(self, signal_name: str = 'SIGUSR1') -> None:
+        """
+        Open a profiling window when the process receives a signal.
+
+        Args:
+            signal_name (str): The signal name, e.g. 'SIGUSR1'.
+        """
+        signal.signal(getattr(signal, signal_name), lambda *args: self.start_window())
+        logger.info(f'Send {signal_name} to profile for {self.seconds}s')
+
+
+def create_profiler(config: Optional[dict]) -> Profiler:
+    """
+    Create the profiler described by the 'profiling' section of the configuration file,
+    installing its signal handler when the section is present.
+
+    Args:
+        config (Optional[dict]): The 'profiling' section, e.g. {'seconds': 30, 'mode': 'sampling'}.
+    """
+    profiler = Profiler(
+        directory=(config or {}).get('directory'),
+        seconds=float((config or {}).get('seconds', 30)),
+        mode=(config or {}).get('mode', 'sampling'),
+        interval=float((config or {}).get('interval', 0.005))
+    )
+
+    if config:
+        profiler.install_signal_handler(config.get('signal', 'SIGUSR1'))
+
+    return profiler
@@ -0,0 +1,2 @@
+from .segment import RecordedMessage, SegmentReader, SegmentWriter, read_recording  # Importing the segment format from the segment module
+from .driver import RecordedCatalog, ReplayDriver  # Importing the replay driver from the driver module
@@ -0,0 +1,297 @@
+import logging
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pg_streamline.parser.relation import RelationMessage
+from pg_streamline.parser.wal2json import Wal2JsonMessage
+from pg_streamline.utils import Utils
+
+from .segment import RecordedMessage, read_recording
+
+
+logger = logging.getLogger(__name__)
+
+PACES = ('max', 'recorded')
+
+ATTRELID_PATTERN = re.compile(r'attrelid\s*=\s*(-?\d+)')
+
+
+class RecordedCatalog:
+    """
+    The relations described by the Relation messages of a recording, updated as the
+    recording is replayed so schema changes take effect at the right position.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the RecordedCatalog.
+        """
+        self.relations: Dict[int, Dict[str, Any]] = {}
+
+    def observe(self, payload: bytes) -> None:
+        """
+        Record the relation described by a Relation message; other messages are ignored.
+
+        Args:
+            payload (bytes): The raw message payload.
+        """
+        if payload[:1] == b'R':
+            relation = RelationMessage(payload).decode_relation_message()
+            self.relations[relation['relation_id']] = relation
+
+    def get_relation(self, relation_id: int) -> Dict[str, Any]:
+        """
+        Return a decoded Relation message.
+
+        Args:
+            relation_id (int): The relation ID.
+        """
+        if relation_id not in self.relations:
+            raise LookupError(f'Relation {relation_id} has not been seen in the recording.')
+
+        return self.relations[relation_id]
+
+    def table_name(self, relation_id: int) -> str:
+        """
+        Return the fully qualified name of a relation.
+
+        Args:
+            relation_id (int): The relation ID.
+        """
+        return self.get_relation(relation_id)['table_name']
+
+
+class ReplayCursor:
+    """
+    Stand-in for psycopg2's replication cursor during replay.
+
+    Answers the catalog queries issued by the producer and the parsers from the recorded
+    Relation messages, and replays the recording from consume_stream.
+    """
+
+    def __init__(self, driver: 'ReplayDriver') -> None:
+        """
+        Initialize the ReplayCursor.
+
+        Args:
+            driver (ReplayDriver): The driver replaying the recording.
+        """
+        self.driver = driver
+        self.closed = False
+        self.options: Optional[Dict[str, str]] = None
+        self.__rows: List[Tuple[Any, ...]] = []
+
+    def execute(self, query: str, params: Optional[Tuple[Any, ...]] = None) -> None:
+        """
+        Run a catalog query against the recorded relations. Other queries return no rows.
+
+        Args:
+            query (str): The SQL query.
+            params (Optional[Tuple[Any, ...]]): The query parameters.
+        """
+        catalog = self.driver.catalog
+        attrelid = ATTRELID_PATTERN.search(query)
+        self.__rows = []
+
+        if 'pg_stat_user_tables' in query:
+            relation = catalog.get_relation(params[0])
+            self.__rows = [tuple(relation['table_name'].split('.', 1))]
+        elif 'pg_attribute' in query and attrelid is not None:
+            # Schema lookups of a single relation, joins such as primary key lookups return no rows
+            relation = catalog.get_relation(int(attrelid.group(1)))
+            self.__rows = [(column['name'], column['type']) for column in relation['columns']]
+
+    def fetchone(self) -> Optional[Tuple[Any, ...]]:
+        return self.__rows[0] if self.__rows else None
+
+    def fetchall(self) -> List[Tuple[Any, ...]]:
+        return list(self.__rows)
+
+    def start_replication(self, slot_name: str = None, decode: bool = False, options: dict = None, **kwargs) -> None:
+        """
+        Record the replication options; the recording is replayed by consume_stream.
+        """
+        self.options = options
+
+    def consume_stream(self, consume: Callable[[RecordedMessage], None], keepalive_interval: float = None) -> None:
+        """
+        Replay the recording into a callback, returning when it is exhausted.
+
+        Args:
+            consume (Callable[[RecordedMessage], None]): Called with every recorded message.
+        """
+        self.driver.replay(consume)
+
+    def send_feedback(self, write_lsn: int = 0, flush_lsn: int = 0, apply_lsn: int = 0, reply: bool = False, force: bool = False) -> None:
+        """
+        Keep the highest flush LSN reported, so replays can check feedback.
+        """
+        self.driver.feedback_lsn = max(self.driver.feedback_lsn, flush_lsn)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class ReplayConnectionPool:
+    """
+    Connection pool handed to producers and consumers during replay. Every connection
+    is the pool itself, and every cursor a ReplayCursor.
+    """
+
+    def __init__(self, driver: 'ReplayDriver') -> None:
+        """
+        Initialize the ReplayConnectionPool.
+
+        Args:
+            driver (ReplayDriver): The driver replaying the recording.
+        """
+        self.driver = driver
+
+    def getconn(self) -> 'ReplayConnectionPool':
+        return self
+
+    def putconn(self, connection: Any) -> None:
+        pass
+
+    def cursor(self) -> ReplayCursor:
+        return ReplayCursor(self.driver)
+
+    def closeall(self) -> None:
+        pass
+
+
+class ReplayDriver:
+    """
+    Replay a recording into Producer and Consumer hooks without PostgreSQL.
+
+    Attributes:
+        directory (str): The recording directory.
+        pace (str): 'max' replays as fast as possible, 'recorded' keeps the recorded gaps.
+        speed (float): Speed-up applied to the recorded pace.
+        catalog (RecordedCatalog): The relations seen so far.
+        feedback_lsn (int): The highest flush LSN reported by a replayed producer.
+        messages_replayed (int): The number of messages replayed.
+        errors (int): The number of changes a replayed consumer failed to process.
+    """
+
+    def __init__(self, directory: str, pace: str = 'max', speed: float = 1.0) -> None:
+        """
+        Initialize the ReplayDriver.
+
+        Args:
+            directory (str): The recording directory.
+            pace (str): 'max' or 'recorded'.
+            speed (float): Speed-up applied to the recorded pace, e.g. 2.0 replays twice as fast.
+        """
+        if pace not in PACES:
+            raise ValueError(f'pace must be one of {", ".join(PACES)}.')
+
+        if speed <= 0:
+            raise ValueError('speed must be positive.')
+
+        self.directory = directory
+        self.pace = pace
+        self.speed = speed
+        self.catalog = RecordedCatalog()
+        self.feedback_lsn = 0
+        self.messages_replayed = 0
+        self.errors = 0
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'ReplayDriver':
+        """
+        Create a driver from the 'replay' section of the configuration file.
+
+        Args:
+            config (dict): The 'replay' section, e.g. {'directory': '/var/lib/recording', 'pace': 'recorded'}.
+        """
+        if 'directory' not in config:
+            raise ConnectionError('directory is missing from the replay configuration.')
+
+        return cls(config['directory'], pace=config.get('pace', 'max'), speed=float(config.get('speed', 1.0)))
+
+    def connection_pool(self) -> ReplayConnectionPool:
+        """
+        Return a connection pool serving the recorded catalog and stream.
+        """
+        return ReplayConnectionPool(self)
+
+    def messages(self):
+        """
+        Iterate over the recorded messages, updating the catalog and keeping the pace.
+        """
+        first_captured, started = None, time.monotonic()
+
+        for message in read_recording(self.directory):
+            if self.pace == 'recorded':
+                if first_captured is None:
+                    first_captured = message.captured_at
+
+                delay = (message.captured_at - first_captured) / self.speed - (time.monotonic() - started)
+
+                if delay > 0:
+                    time.sleep(delay)
+
+            self.catalog.observe(message.payload)
+            self.messages_replayed += 1
+            yield message
+
+    def replay(self, callback: Callable[[RecordedMessage], None]) -> int:
+        """
+        Feed every recorded message to a callback, e.g. a producer's stream consumer.
+
+        Args:
+            callback (Callable[[RecordedMessage], None]): Called with every recorded message.
+
+        Returns:
+            int: The number of messages replayed.
+        """
+        count = 0
+
+        for message in self.messages():
+            callback(message)
+            count += 1
+
+        logger.info(f'Replayed {count} messages from {self.directory}')
+        return count
+
+    def replay_consumer(self, consumer: Any) -> int:
+        """
+        Feed the recorded changes to a consumer's process_incoming_message, as a broker would.
+
+        pgoutput changes are routed with the recorded Relation messages and wal2json
+        format-version 2 changes with their own schema and table fields.
+
+        Args:
+            consumer (Consumer): The consumer to feed; its connection pool is replaced by the replay pool.
+
+        Returns:
+            int: The number of changes delivered.
+        """
+        consumer.conn_pool = self.connection_pool()
+        count = 0
+
+        for message in self.messages():
+            payload = message.payload
+            message_type = payload[:1]
+
+            if message_type in (b'I', b'U', b'D'):
+                table_name = self.catalog.table_name(Utils.convert_bytes_to_int(payload[1:5]))
+            elif message_type == b'{':
+                # Only format-version 2 changes carry an action, format-version 1 transactions are skipped
+                change = Wal2JsonMessage(payload, lazy=True)
+                table_name = change.table_name if change.action in ('I', 'U', 'D') else None
+            else:
+                continue
+
+            if table_name:
+                try:
+                    consumer.process_incoming_message(table_name, payload)
+                    count += 1
+                except Exception:
+                    # Already logged by the consumer, keep replaying like a broker would after dead-lettering
+                    self.errors += 1
+
+        logger.info(f'Replayed {count} changes from {self.directory} into {type(consumer).__name__}')
+        return count
@@ -0,0 +1,236 @@
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Any, Iterator, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MAGIC = b'PGSREC1\n'
+SEGMENT_SUFFIX = '.pgrec'
+
+# Payload length, data_start, wal_end, server send time and capture time (epoch seconds)
+RECORD_HEADER = struct.Struct('>IQQdd')
+
+FSYNC_POLICIES = ('none', 'segment', 'always')
+
+
+class RecordedMessage:
+    """
+    A replication message read back from a recording.
+
+    Exposes the attributes of psycopg2's ReplicationMessage that pg-streamline uses, so
+    recorded messages can be passed wherever live ones are expected.
+
+    Attributes:
+        payload (bytes): The raw message payload.
+        data_start (int): The LSN of the message.
+        wal_end (int): The server's WAL end when the message was sent.
+        send_time (float): The server send time, in epoch seconds (0 if unknown).
+        captured_at (float): When the message was recorded, in epoch seconds.
+        data_size (int): The payload length.
+    """
+
+    __slots__ = ('payload', 'data_start', 'wal_end', 'send_time', 'captured_at', 'data_size')
+
+    def __init__(self, payload: bytes, data_start: int, wal_end: int, send_time: float, captured_at: float) -> None:
+        self.payload = payload
+        self.data_start = data_start
+        self.wal_end = wal_end
+        self.send_time = send_time
+        self.captured_at = captured_at
+        self.data_size = len(payload)
+
+
+def list_segments(directory: str) -> List[str]:
+    """
+    List the segment files of a recording in replay order.
+
+    Args:
+        directory (str): The recording directory.
+
+    Returns:
+        List[str]: The segment paths.
+    """
+    if not os.path.isdir(directory):
+        return []
+
+    names = sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+    return [os.path.join(directory, name) for name in names]
+
+
+def _epoch(value: Any) -> float:
+    """
+    Convert psycopg2's send_time (a datetime) or a number to epoch seconds.
+    """
+    if value is None:
+        return 0.0
+
+    if hasattr(value, 'timestamp'):
+        return value.timestamp()
+
+    return float(value)
+
+
+def pack_record(message: Any, captured_at: Optional[float] = None) -> bytes:
+    """
+    Encode a replication message as a segment record.
+
+    Args:
+        message (Any): A psycopg2 ReplicationMessage or any object with payload and data_start.
+        captured_at (Optional[float]): The capture time, defaults to now.
+    """
+    payload = bytes(message.payload)
+    header = RECORD_HEADER.pack(
+        len(payload),
+        message.data_start,
+        getattr(message, 'wal_end', message.data_start),
+        _epoch(getattr(message, 'send_time', None)),
+        time.time() if captured_at is None else captured_at
+    )
+    return header + payload
+
+
+class SegmentWriter:
+    """
+    Append replication messages to length-prefixed segment files.
+
+    Each segment starts with SEGMENT_MAGIC followed by records made of RECORD_HEADER and
+    the payload. Segments are named with an increasing sequence number and rotated once
+    they reach max_segment_bytes. Opening an existing recording starts a new segment
+    after the last one, so earlier segments are never modified.
+
+    Attributes:
+        directory (str): The recording directory.
+        max_segment_bytes (int): Size at which a new segment is started.
+        fsync (str): 'none', 'segment' (when a segment is closed) or 'always' (every record).
+        messages (int): The number of messages recorded by this writer.
+    """
+
+    def __init__(self, directory: str, max_segment_bytes: int = 64 * 1024 * 1024, fsync: str = 'segment') -> None:
+        """
+        Initialize the SegmentWriter.
+
+        Args:
+            directory (str): The recording directory, created if missing.
+            max_segment_bytes (int): Size at which a new segment is started.
+            fsync (str): The fsync policy, one of FSYNC_POLICIES.
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f'fsync must be one of {", ".join(FSYNC_POLICIES)}.')
+
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync = fsync
+        self.messages = 0
+
+        os.makedirs(directory, exist_ok=True)
+        segments = list_segments(directory)
+        self.__sequence = int(os.path.basename(segments[-1])[:-len(SEGMENT_SUFFIX)]) if segments else 0
+        self.__file = None
+        self.__size = 0
+
+    def __open_segment(self) -> None:
+        """
+        Start the next segment.
+        """
+        self.__sequence += 1
+        path = os.path.join(self.directory, f'{self.__sequence:08d}{SEGMENT_SUFFIX}')
+        self.__file = open(path, 'xb')
+        self.__file.write(SEGMENT_MAGIC)
+        self.__size = len(SEGMENT_MAGIC)
+        logger.debug(f'Recording to segment {path}')
+
+    def __close_segment(self) -> None:
+        """
+        Flush and close the current segment.
+        """
+        self.__file.flush()
+
+        if self.fsync != 'none':
+            os.fsync(self.__file.fileno())
+
+        self.__file.close()
+        self.__file = None
+
+    def record(self, message: Any, captured_at: Optional[float] = None) -> None:
+        """
+        Append a replication message.
+
+        Args:
+            message (Any): A psycopg2 ReplicationMessage or any object with payload and data_start.
+            captured_at (Optional[float]): The capture time, defaults to now.
+        """
+        if self.__file is None:
+            self.__open_segment()
+
+        record = pack_record(message, captured_at)
+        self.__file.write(record)
+        self.__size += len(record)
+        self.messages += 1
+
+        if self.fsync == 'always':
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+
+        if self.__size >= self.max_segment_bytes:
+            self.__close_segment()
+
+    def close(self) -> None:
+        """
+        Close the current segment.
+        """
+        if self.__file is not None:
+            self.__close_segment()
+
+
+class SegmentReader:
+    """
+    Read the messages of one segment file through a memory map.
+
+    A record cut short at the end of the file (e.g. by a crash while recording) ends the segment.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Initialize the SegmentReader.
+
+        Args:
+            path (str): The segment path.
+        """
+        self.path = path
+
+    def __iter__(self) -> Iterator[RecordedMessage]:
+        with open(self.path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size <= len(SEGMENT_MAGIC):
+                return
+
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+                    raise ValueError(f'{self.path} is not a recording segment.')
+
+                offset, size = len(SEGMENT_MAGIC), len(data)
+
+                while offset + RECORD_HEADER.size <= size:
+                    length, data_start, wal_end, send_time, captured_at = RECORD_HEADER.unpack_from(data, offset)
+                    start = offset + RECORD_HEADER.size
+
+                    if start + length > size:
+                        logger.warning(f'Ignoring truncated record at offset {offset} of {self.path}')
+                        return
+
+                    yield RecordedMessage(data[start:start + length], data_start, wal_end, send_time, captured_at)
+                    offset = start + length
+
+
+def read_recording(directory: str) -> Iterator[RecordedMessage]:
+    """
+    Read every message of a recording, in order.
+
+    Args:
+        directory (str): The recording directory.
+    """
+    for path in list_segments(directory):
+        yield from SegmentReader(path)
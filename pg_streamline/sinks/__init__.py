@@ -0,0 +1,3 @@
+from .base import BaseSink, SinkRecord  # Importing the sink interface from the base module
+from .batcher import LsnTracker, SinkBatcher  # Importing batching and LSN accounting from the batcher module
+from .registry import create_sink, get_sink_class, register_sink  # Importing sink discovery from the registry module
@@ -0,0 +1,127 @@
+import logging
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from pg_streamline.tracing import Trace
+
+
+logger = logging.getLogger(__name__)
+
+
+class SinkRecord(NamedTuple):
+    """
+    A single change handed to a sink.
+
+    Attributes:
+        table_name (str): The fully qualified table name (used for routing).
+        payload (bytes): The raw replication message.
+        lsn (int): The LSN of the replication message.
+        sequence (int): Arrival sequence number assigned by the LSN tracker.
+        commit_lsn (int): The commit LSN of the enclosing transaction.
+        change (Optional[dict]): The decoded change, for sinks with ``decode_changes`` set.
+        schema (Optional[dict]): The relation schema, for sinks with ``decode_changes`` set.
+        xid (int): The transaction ID, 0 if unknown.
+        trace (Optional[Trace]): Commit and capture times, for changes sampled for tracing.
+        schema_version (int): The version of the relation schema, 0 unless the 'schema_registry' section is configured.
+        source (Optional[str]): The database the change was read from, when one process reads several.
+    """
+    table_name: str
+    payload: bytes
+    lsn: int
+    sequence: int = 0
+    commit_lsn: int = 0
+    change: Optional[dict] = None
+    schema: Optional[dict] = None
+    xid: int = 0
+    trace: Optional[Trace] = None
+    schema_version: int = 0
+    source: Optional[str] = None
+
+
+class BaseSink:
+    """
+    Base class for delivery targets.
+
+    A sink receives batches of records from the core batcher through ``write_batch``
+    and makes them durable in ``flush``. Records only count as delivered once they
+    are acknowledged, which is what lets the replication feedback LSN advance.
+
+    Sinks with ``auto_acknowledge`` set (the default) are acknowledged by the batcher
+    as soon as ``flush`` returns. Sinks that become durable later, for example on
+    file rotation or broker confirms, set it to False and call ``acknowledge``
+    themselves.
+
+    Sinks with ``decode_changes`` set receive pgoutput changes decoded by the producer
+    in ``SinkRecord.change`` along with the relation schema.
+
+    Attributes:
+        name (str): The name the sink is registered under.
+        options (Dict[str, Any]): Sink specific options from the configuration file.
+    """
+
+    name: str = None
+    auto_acknowledge: bool = True
+    decode_changes: bool = False
+
+    def __init__(self, options: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Initialize the sink.
+
+        Args:
+            options (Optional[Dict[str, Any]]): Sink specific options.
+        """
+        self.options = options or {}
+        self.__ack_callbacks: List[Callable[[List[SinkRecord]], None]] = []
+
+    def add_ack_callback(self, callback: Callable[[List[SinkRecord]], None]) -> None:
+        """
+        Register a callback that is invoked with records once they are durable.
+
+        Args:
+            callback (Callable[[List[SinkRecord]], None]): The callback to register.
+        """
+        self.__ack_callbacks.append(callback)
+
+    def acknowledge(self, records: List[SinkRecord]) -> None:
+        """
+        Report records as durably delivered.
+
+        Args:
+            records (List[SinkRecord]): The delivered records.
+        """
+        if not records:
+            return
+
+        for callback in self.__ack_callbacks:
+            callback(records)
+
+    def open(self) -> None:
+        """
+        Open connections or files needed by the sink.
+        """
+
+    def write_batch(self, records: List[SinkRecord]) -> None:
+        """
+        Write a batch of records to the target.
+
+        Args:
+            records (List[SinkRecord]): The records to write.
+
+        Raises:
+            NotImplementedError: This method should be overridden by subclass.
+        """
+        raise NotImplementedError('You must implement the write_batch method in your sink class.')
+
+    def flush(self) -> None:
+        """
+        Make all written records durable.
+        """
+
+    def poll(self) -> None:
+        """
+        Perform periodic work such as time based rotation. Called from the batcher thread.
+        """
+
+    def close(self) -> None:
+        """
+        Release connections or files held by the sink.
+        """
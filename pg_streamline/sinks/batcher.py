@@ -0,0 +1,231 @@
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from .base import BaseSink, SinkRecord
+
+
+logger = logging.getLogger(__name__)
+
+
+class LsnTracker:
+    """
+    Track which replication messages have been delivered.
+
+    Messages are tracked in arrival order rather than by LSN, because pgoutput
+    change LSNs are not monotonic across transactions. The flushable LSN is the
+    highest LSN of the contiguous prefix of delivered messages, which is the
+    position that can safely be confirmed to the server.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the LsnTracker.
+        """
+        self.__lock = threading.Lock()
+        self.__next_sequence = 0
+        self.__head = 0
+        self.__lsns = {}
+        self.__done = set()
+        self.__flushable_lsn = 0
+
+    def track(self, lsn: int) -> int:
+        """
+        Start tracking an in-flight message.
+
+        Args:
+            lsn (int): The LSN of the message.
+
+        Returns:
+            int: The sequence number to pass to ``complete``.
+        """
+        with self.__lock:
+            sequence = self.__next_sequence
+            self.__next_sequence += 1
+            self.__lsns[sequence] = lsn
+            return sequence
+
+    def observe(self, lsn: int) -> None:
+        """
+        Record a message that needs no delivery (e.g. Begin or Commit).
+
+        Args:
+            lsn (int): The LSN of the message.
+        """
+        self.complete(self.track(lsn))
+
+    def complete(self, sequence: int) -> None:
+        """
+        Mark a tracked message as delivered.
+
+        Args:
+            sequence (int): The sequence number returned by ``track``.
+        """
+        with self.__lock:
+            self.__done.add(sequence)
+
+            while self.__head in self.__done:
+                self.__done.discard(self.__head)
+                self.__flushable_lsn = max(self.__flushable_lsn, self.__lsns.pop(self.__head))
+                self.__head += 1
+
+    @property
+    def flushable_lsn(self) -> int:
+        """
+        The highest LSN up to which every tracked message has been delivered.
+        """
+        return self.__flushable_lsn
+
+    @property
+    def pending_count(self) -> int:
+        """
+        The number of tracked messages that have not been delivered yet.
+        """
+        return len(self.__lsns) - len(self.__done)
+
+
+class SinkBatcher:
+    """
+    Buffer records and deliver them to a sink in batches.
+
+    A batch is delivered when it reaches ``batch_size`` records or when it is older
+    than ``flush_interval`` seconds. Failed deliveries are retried with exponential
+    backoff; records stay buffered until they have been written, so a failing sink
+    never loses data.
+
+    Attributes:
+        sink (BaseSink): The sink batches are delivered to.
+        batch_size (int): The maximum number of records per batch.
+        flush_interval (float): The maximum age of a buffered record, in seconds.
+        max_retries (int): Retries per delivery before the error is raised.
+        retry_backoff (float): Initial backoff between retries, in seconds.
+    """
+
+    def __init__(
+        self,
+        sink: BaseSink,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_retries: int = 5,
+        retry_backoff: float = 0.5
+    ) -> None:
+        """
+        Initialize the SinkBatcher.
+
+        Args:
+            sink (BaseSink): The sink batches are delivered to.
+            batch_size (int): The maximum number of records per batch.
+            flush_interval (float): The maximum age of a buffered record, in seconds.
+            max_retries (int): Retries per delivery before the error is raised.
+            retry_backoff (float): Initial backoff between retries, in seconds.
+        """
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self.__lock = threading.RLock()
+        self.__buffer: List[SinkRecord] = []
+        self.__oldest: Optional[float] = None
+        self.__stopped = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Open the sink and start the background thread that flushes on interval.
+        """
+        self.sink.open()
+
+        if self.flush_interval:
+            self.__thread = threading.Thread(target=self.__run, name='pg-streamline-batcher', daemon=True)
+            self.__thread.start()
+
+    def __run(self) -> None:
+        """
+        Flush batches that are older than the flush interval until stopped.
+        """
+        while not self.__stopped.wait(self.flush_interval):
+            try:
+                with self.__lock:
+                    self.flush(only_if_due=True)
+                    self.sink.poll()
+            except Exception:
+                logger.exception('Failed to flush batch on interval.')
+
+    def add(self, record: SinkRecord) -> None:
+        """
+        Add a record, delivering the batch if it is full.
+
+        Args:
+            record (SinkRecord): The record to add.
+        """
+        with self.__lock:
+            if self.__oldest is None:
+                self.__oldest = time.monotonic()
+
+            self.__buffer.append(record)
+
+            if len(self.__buffer) >= self.batch_size:
+                self.flush()
+
+    def flush(self, only_if_due: bool = False) -> None:
+        """
+        Deliver the buffered records.
+
+        Args:
+            only_if_due (bool): Only deliver when the oldest record is older than the flush interval.
+        """
+        with self.__lock:
+            if not self.__buffer:
+                return
+
+            if only_if_due and time.monotonic() - self.__oldest < self.flush_interval:
+                return
+
+            records = self.__buffer
+            self.__deliver(records)
+            self.__buffer = []
+            self.__oldest = None
+
+    def __deliver(self, records: List[SinkRecord]) -> None:
+        """
+        Write and flush a batch, retrying with exponential backoff.
+
+        Args:
+            records (List[SinkRecord]): The records to deliver.
+        """
+        attempt = 0
+
+        while True:
+            try:
+                self.sink.write_batch(records)
+                self.sink.flush()
+                break
+            except Exception:
+                if attempt >= self.max_retries:
+                    logger.exception(f'Failed to deliver batch of {len(records)} records to sink {self.sink.name}.')
+                    raise
+
+                delay = self.retry_backoff * (2 ** attempt)
+                attempt += 1
+                logger.warning(f'Delivery to sink {self.sink.name} failed, retry {attempt} in {delay}s')
+                time.sleep(delay)
+
+        if self.sink.auto_acknowledge:
+            self.sink.acknowledge(records)
+
+    def close(self) -> None:
+        """
+        Stop the background thread, deliver what is buffered and close the sink.
+        """
+        self.__stopped.set()
+
+        if self.__thread is not None:
+            self.__thread.join()
+
+        try:
+            self.flush()
+        finally:
+            self.sink.close()
@@ -0,0 +1,343 @@
+import json
+import logging
+import os
+import re
+import struct
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from pg_streamline.columnar import ColumnarBuffer
+
+from .base import BaseSink, SinkRecord
+
+
+logger = logging.getLogger(__name__)
+
+COMPACT_MAGIC = b'PGCOL1\n'
+
+# <first commit lsn>_<first lsn>-<last commit lsn>_<last lsn>.<extension>, in hex
+SEGMENT_NAME_PATTERN = re.compile(r'^([0-9A-F]{16})_([0-9A-F]{16})-([0-9A-F]{16})_([0-9A-F]{16})\.(parquet|pgcol)$')
+
+METADATA_COLUMNS = [('_op', 'string'), ('_commit_lsn', 'int'), ('_lsn', 'int')]
+
+
+def read_segment(path: str) -> Tuple[dict, Dict[str, List[Any]]]:
+    """
+    Read a segment written by the ColumnarFileSink.
+
+    Args:
+        path (str): The segment file.
+
+    Returns:
+        Tuple[dict, Dict[str, List[Any]]]: The segment metadata and its columns.
+    """
+    if path.endswith('.parquet'):
+        table = pyarrow.parquet.read_table(path)
+        return json.loads(table.schema.metadata[b'pg_streamline']), table.to_pydict()
+
+    with open(path, 'rb') as f:
+        if f.read(len(COMPACT_MAGIC)) != COMPACT_MAGIC:
+            raise ValueError(f'{path} is not a pg-streamline segment.')
+
+        header_length, = struct.unpack('>I', f.read(4))
+        metadata = json.loads(f.read(header_length))
+        columns = json.loads(zlib.decompress(f.read()))
+
+    return metadata, columns
+
+
+class Segment:
+    """
+    The open, not yet durable, segment of one table.
+
+    Attributes:
+        table_name (str): The table the segment belongs to.
+        schema_key (tuple): The (name, type) pairs of the relation schema.
+        buffer (ColumnarBuffer): The buffered rows.
+        records (List[SinkRecord]): The records to acknowledge once the segment is durable.
+        first (Tuple[int, int]): The (commit_lsn, lsn) position of the first row.
+        last (Tuple[int, int]): The (commit_lsn, lsn) position of the last row.
+        created_at (float): Monotonic creation time.
+    """
+
+    def __init__(self, table_name: str, schema: dict) -> None:
+        """
+        Initialize the Segment.
+
+        Args:
+            table_name (str): The table the segment belongs to.
+            schema (dict): The relation schema.
+        """
+        self.table_name = table_name
+        self.schema_key = Segment.key(schema)
+        self.buffer = ColumnarBuffer.from_schema(schema, METADATA_COLUMNS)
+        self.records: List[SinkRecord] = []
+        self.first: Optional[Tuple[int, int]] = None
+        self.last: Optional[Tuple[int, int]] = None
+        self.created_at = time.monotonic()
+
+    @staticmethod
+    def key(schema: dict) -> tuple:
+        """
+        Return a hashable key identifying a relation schema.
+
+        Args:
+            schema (dict): The relation schema.
+        """
+        return tuple((column['name'], column['type']) for column in schema['columns'])
+
+    def append(self, record: SinkRecord) -> None:
+        """
+        Append a decoded change to the segment.
+
+        Args:
+            record (SinkRecord): The record, with ``change`` set.
+        """
+        change = record.change
+        row = dict(change['new'] if 'new' in change else change['old'])
+        row['_op'] = change['message_type']
+        row['_commit_lsn'] = record.commit_lsn
+        row['_lsn'] = record.lsn
+
+        self.buffer.append(row)
+
+        position = (record.commit_lsn, record.lsn)
+        if self.first is None:
+            self.first = position
+        self.last = position
+
+        # The payload is not needed after the row is buffered
+        self.records.append(record._replace(payload=b'', change=None, schema=None))
+
+
+class ColumnarFileSink(BaseSink):
+    """
+    Sink that writes decoded changes per table into rotated, columnar segment files.
+
+    Segments are written as Parquet when pyarrow is installed, and in a compact
+    zlib-compressed column-oriented format (see ``read_segment``) otherwise. Column
+    types come from the relation schema. A segment is rotated once it is larger than
+    ``max_segment_bytes`` or older than ``max_segment_age`` seconds.
+
+    Each segment file is named after the (commit LSN, LSN) range it covers and is
+    made visible with an atomic rename, so records are only acknowledged once they
+    are durable. On startup, the latest committed position of each table is read
+    back from the file names and changes at or before it are skipped, which makes
+    resuming after a crash exactly-once.
+
+    Options:
+        directory (str): The directory segments are written to, one sub-directory per table.
+        format (str): 'auto' (default), 'parquet' or 'compact'.
+        max_segment_bytes (int): Rotate segments larger than this (default 64 MiB).
+        max_segment_age (float): Rotate segments older than this, in seconds (default 300).
+    """
+
+    name = 'columnar'
+    auto_acknowledge = False
+    decode_changes = True
+
+    def open(self) -> None:
+        """
+        Resolve the output format and load the committed position of every table.
+        """
+        if 'directory' not in self.options:
+            raise ConnectionError('directory is missing from the columnar sink options.')
+
+        self.directory = self.options['directory']
+        self.max_segment_bytes = self.options.get('max_segment_bytes', 64 * 1024 * 1024)
+        self.max_segment_age = self.options.get('max_segment_age', 300)
+
+        self.format = self.options.get('format', 'auto')
+        if self.format == 'auto':
+            self.format = 'parquet' if pyarrow is not None else 'compact'
+
+        if self.format == 'parquet' and pyarrow is None:
+            raise ImportError('pyarrow is required for the parquet format.')
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.__segments: Dict[str, Segment] = {}
+        self.positions = self.__load_positions()
+
+        logger.info(f'Columnar sink writing {self.format} segments to {self.directory}')
+
+    def __load_positions(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Read the last committed (commit LSN, LSN) position of each table from segment names.
+        """
+        positions = {}
+
+        for table_name in os.listdir(self.directory):
+            table_directory = os.path.join(self.directory, table_name)
+
+            if not os.path.isdir(table_directory):
+                continue
+
+            for file_name in os.listdir(table_directory):
+                match = SEGMENT_NAME_PATTERN.match(file_name)
+
+                if match:
+                    position = (int(match.group(3), 16), int(match.group(4), 16))
+                    positions[table_name] = max(positions.get(table_name, position), position)
+
+        return positions
+
+    def write_batch(self, records: List[SinkRecord]) -> None:
+        """
+        Buffer decoded changes into the open segment of their table. Records already in an
+        open segment are skipped, so a batch retried after a failed commit is not appended twice.
+
+        Args:
+            records (List[SinkRecord]): The records to write.
+        """
+        skipped = []
+
+        for record in records:
+            committed = self.positions.get(record.table_name)
+            position = (record.commit_lsn, record.lsn)
+
+            if record.change is None or (committed and position <= committed):
+                skipped.append(record)
+                continue
+
+            segment = self.__segments.get(record.table_name)
+
+            if segment is not None and segment.last is not None and position <= segment.last:
+                # Acknowledged with the segment once it is committed
+                continue
+
+            if segment is not None and segment.schema_key != Segment.key(record.schema):
+                self.__commit(segment)
+                segment = None
+
+            if segment is None:
+                segment = self.__segments[record.table_name] = Segment(record.table_name, record.schema)
+
+            segment.append(record)
+
+            if segment.buffer.estimated_bytes >= self.max_segment_bytes:
+                self.__commit(segment)
+
+        # Nothing to write for these, they are delivered as far as the stream is concerned
+        self.acknowledge(skipped)
+
+    def poll(self) -> None:
+        """
+        Rotate segments that are older than the maximum segment age.
+        """
+        now = time.monotonic()
+
+        for segment in list(self.__segments.values()):
+            if now - segment.created_at >= self.max_segment_age:
+                self.__commit(segment)
+
+    def flush(self) -> None:
+        """
+        Rotate segments that are due. Open segments are acknowledged when they are rotated.
+        """
+        self.poll()
+
+    def close(self) -> None:
+        """
+        Commit every open segment.
+        """
+        for segment in list(self.__segments.values()):
+            self.__commit(segment)
+
+    def __commit(self, segment: Segment) -> None:
+        """
+        Write a segment atomically and acknowledge its records. The segment stays open until
+        its file is durable, so a failed write is retried with its rows.
+
+        Args:
+            segment (Segment): The segment to commit.
+        """
+        extension = 'parquet' if self.format == 'parquet' else 'pgcol'
+        file_name = '{:016X}_{:016X}-{:016X}_{:016X}.{}'.format(*segment.first, *segment.last, extension)
+        table_directory = os.path.join(self.directory, segment.table_name)
+        path = os.path.join(table_directory, file_name)
+        temp_path = f'{path}.tmp'
+
+        metadata = {
+            'table_name': segment.table_name,
+            'first_commit_lsn': segment.first[0],
+            'first_lsn': segment.first[1],
+            'last_commit_lsn': segment.last[0],
+            'last_lsn': segment.last[1],
+            'row_count': segment.buffer.row_count,
+            'columns': segment.buffer.columns
+        }
+
+        os.makedirs(table_directory, exist_ok=True)
+
+        if self.format == 'parquet':
+            self.__write_parquet(temp_path, segment.buffer, metadata)
+        else:
+            self.__write_compact(temp_path, segment.buffer, metadata)
+
+        with open(temp_path, 'rb') as f:
+            os.fsync(f.fileno())
+
+        os.replace(temp_path, path)
+
+        directory_fd = os.open(table_directory, os.O_RDONLY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+
+        del self.__segments[segment.table_name]
+        self.positions[segment.table_name] = segment.last
+
+        logger.info(f'Committed segment {path} with {segment.buffer.row_count} rows')
+
+        self.acknowledge(segment.records)
+
+    @staticmethod
+    def __write_parquet(path: str, buffer: ColumnarBuffer, metadata: dict) -> None:
+        """
+        Write a segment as a Parquet file.
+
+        Args:
+            path (str): The file to write.
+            buffer (ColumnarBuffer): The buffered rows.
+            metadata (dict): The segment metadata.
+        """
+        arrow_types = {
+            'bool': pyarrow.bool_(),
+            'int': pyarrow.int64(),
+            'float': pyarrow.float64(),
+            'string': pyarrow.string()
+        }
+        schema = pyarrow.schema(
+            [(name, arrow_types[kind]) for name, kind in buffer.columns],
+            metadata={'pg_streamline': json.dumps(metadata)}
+        )
+        pyarrow.parquet.write_table(pyarrow.table(buffer.to_pydict(), schema=schema), path)
+
+    @staticmethod
+    def __write_compact(path: str, buffer: ColumnarBuffer, metadata: dict) -> None:
+        """
+        Write a segment in the compact fallback format: a magic line, a length-prefixed
+        JSON header and the zlib-compressed JSON columns.
+
+        Args:
+            path (str): The file to write.
+            buffer (ColumnarBuffer): The buffered rows.
+            metadata (dict): The segment metadata.
+        """
+        header = json.dumps(metadata).encode('utf-8')
+        columns = zlib.compress(json.dumps(buffer.to_pydict(), separators=(',', ':')).encode('utf-8'))
+
+        with open(path, 'wb') as f:
+            f.write(COMPACT_MAGIC)
+            f.write(struct.pack('>I', len(header)))
+            f.write(header)
+            f.write(columns)
@@ -0,0 +1,38 @@
+import threading
+from typing import Any, Dict, List, Optional
+
+from .base import BaseSink, SinkRecord
+
+
+class MemorySink(BaseSink):
+    """
+    Sink that keeps every delivered record in memory.
+
+    Useful for tests and for embedding pg-streamline in another process.
+
+    Attributes:
+        records (List[SinkRecord]): The records written so far.
+    """
+
+    name = 'memory'
+
+    def __init__(self, options: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Initialize the MemorySink.
+
+        Args:
+            options (Optional[Dict[str, Any]]): Sink specific options (unused).
+        """
+        super().__init__(options=options)
+        self.__lock = threading.Lock()
+        self.records: List[SinkRecord] = []
+
+    def write_batch(self, records: List[SinkRecord]) -> None:
+        """
+        Store a batch of records.
+
+        Args:
+            records (List[SinkRecord]): The records to store.
+        """
+        with self.__lock:
+            self.records.extend(records)
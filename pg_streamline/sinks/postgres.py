@@ -0,0 +1,185 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+from psycopg2 import sql
+
+from .base import BaseSink, SinkRecord
+
+
+logger = logging.getLogger(__name__)
+
+# Replication origin the sink's changes are tagged with when none is configured
+DEFAULT_ORIGIN = 'pg_streamline'
+
+
+class PostgresSink(BaseSink):
+    """
+    Sink that applies decoded changes to a PostgreSQL database.
+
+    The sink's session is bound to a replication origin, so every transaction it commits
+    carries that origin in the target's WAL. A producer replicating the target database
+    back drops those transactions with its 'origin' section, which is what keeps
+    bidirectional replication from sending changes back and forth forever.
+
+    Each batch is applied in one transaction, committed in ``flush``. Inserts ignore rows
+    that already exist, so changes redelivered after a restart apply cleanly.
+
+    Options:
+        dsn (str): The libpq connection string or URL of the target database.
+        origin (str): The replication origin name, 'pg_streamline' by default. Created if missing.
+    """
+
+    name = 'postgres'
+    decode_changes = True
+
+    def __init__(self, options: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Initialize the PostgresSink.
+
+        Args:
+            options (Optional[Dict[str, Any]]): Sink specific options.
+        """
+        super().__init__(options=options)
+        self.origin = self.options.get('origin', DEFAULT_ORIGIN)
+        self.connection = None
+        self.__key_columns: Dict[str, List[str]] = {}
+
+    def open(self) -> None:
+        """
+        Connect to the target database and set up the session replication origin.
+        """
+        if 'dsn' not in self.options:
+            raise ConnectionError('dsn is missing from the postgres sink options.')
+
+        self.connection = psycopg2.connect(self.options['dsn'])
+
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT pg_replication_origin_oid(%s);', (self.origin,))
+
+            if cursor.fetchone()[0] is None:
+                cursor.execute('SELECT pg_replication_origin_create(%s);', (self.origin,))
+
+            cursor.execute('SELECT pg_replication_origin_session_setup(%s);', (self.origin,))
+
+        self.connection.commit()
+        logger.info(f'Applying changes with replication origin: {self.origin}')
+
+    def __get_key_columns(self, cursor, table_name: str) -> List[str]:
+        """
+        Return the primary key columns of a target table, cached per table.
+
+        Args:
+            cursor (psycopg2.extensions.cursor): Cursor on the target database.
+            table_name (str): The fully qualified table name.
+        """
+        if table_name not in self.__key_columns:
+            cursor.execute(
+                'SELECT a.attname FROM pg_index i '
+                'JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey) '
+                'WHERE i.indrelid = %s::regclass AND i.indisprimary '
+                'ORDER BY array_position(i.indkey::int2[], a.attnum);',
+                (table_name,)
+            )
+            self.__key_columns[table_name] = [row[0] for row in cursor.fetchall()]
+
+        return self.__key_columns[table_name]
+
+    @staticmethod
+    def __table(table_name: str) -> sql.Identifier:
+        """
+        Quote a 'schema.table' name.
+
+        Args:
+            table_name (str): The fully qualified table name.
+        """
+        return sql.Identifier(*table_name.split('.', 1))
+
+    def __where(self, cursor, table_name: str, row: Dict[str, Any]) -> sql.Composed:
+        """
+        Build the condition matching a row, on its primary key or on every column of
+        the old row image for tables without one.
+
+        Args:
+            cursor (psycopg2.extensions.cursor): Cursor on the target database.
+            table_name (str): The fully qualified table name.
+            row (Dict[str, Any]): The row image identifying the row.
+        """
+        columns = self.__get_key_columns(cursor, table_name) or list(row)
+
+        if not columns:
+            raise ValueError(f'Table {table_name} has no primary key and the change has no old row.')
+
+        return sql.SQL(' AND ').join(
+            sql.SQL('{} = {}').format(sql.Identifier(column), sql.Literal(row.get(column)))
+            if row.get(column) is not None else sql.SQL('{} IS NULL').format(sql.Identifier(column))
+            for column in columns
+        )
+
+    def __apply(self, cursor, record: SinkRecord) -> None:
+        """
+        Apply one decoded change.
+
+        Args:
+            cursor (psycopg2.extensions.cursor): Cursor on the target database.
+            record (SinkRecord): The record to apply.
+        """
+        table = self.__table(record.table_name)
+        change = record.change
+        message_type = change['message_type']
+
+        if message_type == 'I':
+            row = change['new']
+            cursor.execute(sql.SQL('INSERT INTO {} ({}) VALUES ({}) ON CONFLICT DO NOTHING;').format(
+                table,
+                sql.SQL(', ').join(sql.Identifier(column) for column in row),
+                sql.SQL(', ').join(sql.Literal(value) for value in row.values())
+            ))
+        elif message_type == 'U':
+            # Unchanged TOAST values are not sent, the target keeps its own
+            unchanged = change.get('unchanged_toast', ())
+            row = {column: value for column, value in change['new'].items() if column not in unchanged}
+            cursor.execute(sql.SQL('UPDATE {} SET {} WHERE {};').format(
+                table,
+                sql.SQL(', ').join(
+                    sql.SQL('{} = {}').format(sql.Identifier(column), sql.Literal(value)) for column, value in row.items()
+                ),
+                self.__where(cursor, record.table_name, change.get('old') or change['new'])
+            ))
+        elif message_type == 'D':
+            cursor.execute(sql.SQL('DELETE FROM {} WHERE {};').format(
+                table, self.__where(cursor, record.table_name, change['old'])
+            ))
+
+    def write_batch(self, records: List[SinkRecord]) -> None:
+        """
+        Apply a batch of records in one transaction. Truncates are applied per table,
+        logical decoding messages are skipped.
+
+        Args:
+            records (List[SinkRecord]): The records to apply.
+        """
+        try:
+            with self.connection.cursor() as cursor:
+                for record in records:
+                    if record.change is not None:
+                        self.__apply(cursor, record)
+                    elif bytes(record.payload[:1]) == b'T':
+                        cursor.execute(sql.SQL('TRUNCATE {};').format(self.__table(record.table_name)))
+        except Exception:
+            # The batcher retries the whole batch
+            self.connection.rollback()
+            raise
+
+    def flush(self) -> None:
+        """
+        Commit the changes applied so far.
+        """
+        self.connection.commit()
+
+    def close(self) -> None:
+        """
+        Close the connection to the target database.
+        """
+        if self.connection is not None:
+            self.connection.close()
@@ -0,0 +1,66 @@
+import time
+from typing import List
+
+import pika
+
+from pg_streamline.plugins.rabbitmq.headers import change_headers, trace_headers
+
+from .base import BaseSink, SinkRecord
+
+
+class RabbitMQSink(BaseSink):
+    """
+    Sink that publishes records to a RabbitMQ topic exchange.
+
+    The channel is put in confirm mode, so ``basic_publish`` only returns once the
+    broker has taken responsibility for the message.
+
+    Options:
+        url (str): The URL for the RabbitMQ broker.
+        exchange (str): The name of the exchange to publish to.
+    """
+
+    name = 'rabbitmq'
+
+    def open(self) -> None:
+        """
+        Connect to RabbitMQ and declare the exchange.
+        """
+        for key in ['url', 'exchange']:
+            if key not in self.options:
+                raise ConnectionError(f'{key} is missing from the rabbitmq sink options.')
+
+        self.connection = pika.BlockingConnection(pika.URLParameters(self.options['url']))
+        self.channel = self.connection.channel()
+        self.exchange = self.options['exchange']
+
+        self.channel.exchange_declare(exchange=self.exchange, exchange_type='topic', durable=True)
+        self.channel.confirm_delivery()
+
+    def write_batch(self, records: List[SinkRecord]) -> None:
+        """
+        Publish a batch of records, using the table name as routing key and
+        stamping each message with its LSN, commit LSN and transaction ID.
+
+        Args:
+            records (List[SinkRecord]): The records to publish.
+        """
+        for record in records:
+            headers = change_headers(record.lsn, record.commit_lsn, record.xid, record.schema_version)
+
+            if record.trace is not None:
+                headers.update(trace_headers(record.trace._replace(publish_time=time.time())))
+
+            self.channel.basic_publish(
+                exchange=self.exchange,
+                routing_key=record.table_name,
+                body=bytes(record.payload),
+                properties=pika.BasicProperties(delivery_mode=2, headers=headers)
+            )
+
+    def close(self) -> None:
+        """
+        Close the RabbitMQ channel and connection.
+        """
+        self.channel.close()
+        self.connection.close()
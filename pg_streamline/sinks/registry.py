@@ -0,0 +1,108 @@
+import importlib
+import logging
+from importlib import metadata
+from typing import Any, Dict, Optional, Type
+
+from .base import BaseSink
+
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = 'pg_streamline.sinks'
+
+# Sinks shipped with pg-streamline, used when the package metadata is not installed
+BUILTIN_SINKS = {
+    'memory': 'pg_streamline.sinks.memory:MemorySink',
+    'stdout': 'pg_streamline.sinks.stream:StdoutSink',
+    'file': 'pg_streamline.sinks.stream:FileSink',
+    'rabbitmq': 'pg_streamline.sinks.rabbitmq:RabbitMQSink',
+    'columnar': 'pg_streamline.sinks.columnar:ColumnarFileSink',
+    'postgres': 'pg_streamline.sinks.postgres:PostgresSink',
+}
+
+_registered_sinks: Dict[str, Type[BaseSink]] = {}
+
+
+def register_sink(name: str, sink_class: Type[BaseSink]) -> None:
+    """
+    Register a sink class under a name, taking precedence over entry points.
+
+    Args:
+        name (str): The name used to select the sink in the configuration file.
+        sink_class (Type[BaseSink]): The sink class.
+    """
+    _registered_sinks[name] = sink_class
+
+
+def _load_object(path: str) -> Any:
+    """
+    Import an object from a 'module:attribute' path.
+
+    Args:
+        path (str): The object path.
+    """
+    module_name, _, attribute = path.partition(':')
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def _find_entry_point(name: str) -> Optional[metadata.EntryPoint]:
+    """
+    Find the sink entry point with the given name.
+
+    Args:
+        name (str): The sink name.
+    """
+    entry_points = metadata.entry_points()
+
+    if hasattr(entry_points, 'select'):
+        candidates = entry_points.select(group=ENTRY_POINT_GROUP)
+    else:
+        candidates = entry_points.get(ENTRY_POINT_GROUP, [])
+
+    for entry_point in candidates:
+        if entry_point.name == name:
+            return entry_point
+
+    return None
+
+
+def get_sink_class(name: str) -> Type[BaseSink]:
+    """
+    Look up a sink class by name.
+
+    Explicitly registered sinks are checked first, then the 'pg_streamline.sinks'
+    entry point group, then the built-in sinks.
+
+    Args:
+        name (str): The sink name.
+
+    Returns:
+        Type[BaseSink]: The sink class.
+    """
+    if name in _registered_sinks:
+        return _registered_sinks[name]
+
+    entry_point = _find_entry_point(name)
+
+    if entry_point is not None:
+        logger.debug(f'Loading sink {name} from entry point {entry_point.value}')
+        return entry_point.load()
+
+    if name in BUILTIN_SINKS:
+        return _load_object(BUILTIN_SINKS[name])
+
+    raise ValueError(f'Sink {name} is not registered.')
+
+
+def create_sink(name: str, options: Optional[Dict[str, Any]] = None) -> BaseSink:
+    """
+    Instantiate a sink by name.
+
+    Args:
+        name (str): The sink name.
+        options (Optional[Dict[str, Any]]): Sink specific options.
+
+    Returns:
+        BaseSink: The sink instance (not opened yet).
+    """
+    return get_sink_class(name)(options=options)
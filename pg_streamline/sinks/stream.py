@@ -0,0 +1,116 @@
+import json
+import os
+import sys
+from typing import List, TextIO
+
+from .base import BaseSink, SinkRecord
+
+
+class StreamSink(BaseSink):
+    """
+    Sink that writes one JSON line per record to a text stream.
+
+    Options:
+        encoding (str): How payloads are written, 'hex' (default) or 'utf-8'.
+            Use 'utf-8' for text based plugins such as wal2json.
+    """
+
+    def open(self) -> None:
+        """
+        Open the underlying stream.
+        """
+        self.encoding = self.options.get('encoding', 'hex')
+        self.stream = self.open_stream()
+
+    def open_stream(self) -> TextIO:
+        """
+        Return the stream records are written to.
+
+        Raises:
+            NotImplementedError: This method should be overridden by subclass.
+        """
+        raise NotImplementedError('You must implement the open_stream method in your sink class.')
+
+    def format_record(self, record: SinkRecord) -> str:
+        """
+        Format a record as a single JSON line.
+
+        Args:
+            record (SinkRecord): The record to format.
+
+        Returns:
+            str: The formatted line, including the trailing newline.
+        """
+        payload = bytes(record.payload)
+
+        if self.encoding == 'hex':
+            payload = payload.hex()
+        else:
+            payload = payload.decode(self.encoding)
+
+        return json.dumps({'table_name': record.table_name, 'lsn': record.lsn, 'payload': payload}) + '\n'
+
+    def write_batch(self, records: List[SinkRecord]) -> None:
+        """
+        Write a batch of records to the stream.
+
+        Args:
+            records (List[SinkRecord]): The records to write.
+        """
+        self.stream.write(''.join(self.format_record(record) for record in records))
+
+    def flush(self) -> None:
+        """
+        Flush the stream.
+        """
+        self.stream.flush()
+
+
+class StdoutSink(StreamSink):
+    """
+    Sink that writes records to standard output.
+    """
+
+    name = 'stdout'
+
+    def open_stream(self) -> TextIO:
+        """
+        Return standard output.
+        """
+        return sys.stdout
+
+
+class FileSink(StreamSink):
+    """
+    Sink that appends records to a local file.
+
+    Options:
+        path (str): The file to append to.
+        fsync (bool): Whether to fsync the file on every flush (default True).
+    """
+
+    name = 'file'
+
+    def open_stream(self) -> TextIO:
+        """
+        Open the configured file in append mode.
+        """
+        if 'path' not in self.options:
+            raise ConnectionError('path is missing from the file sink options.')
+
+        return open(self.options['path'], 'a', encoding='utf-8')
+
+    def flush(self) -> None:
+        """
+        Flush the file and, unless disabled, fsync it to disk.
+        """
+        self.stream.flush()
+
+        if self.options.get('fsync', True):
+            os.fsync(self.stream.fileno())
+
+    def close(self) -> None:
+        """
+        Close the file.
+        """
+        self.stream.close()
@@ -0,0 +1,56 @@
+from typing import NamedTuple, Optional
+
+
+# Latency buckets in seconds for commit-to-apply tracing, from 5ms to 5 minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Trace(NamedTuple):
+    """
+    Timestamps (epoch seconds) following a change from commit to publish.
+
+    Attributes:
+        commit_time (Optional[float]): When the transaction committed, None if unknown (wal2json).
+        capture_time (float): When the producer received the change.
+        publish_time (Optional[float]): When the change was published, set by the publisher.
+    """
+    commit_time: Optional[float]
+    capture_time: float
+    publish_time: Optional[float] = None
+
+
+class TraceSampler:
+    """
+    Decide which changes are traced, spreading samples evenly at a fixed rate.
+
+    Attributes:
+        sample_rate (float): Fraction of changes traced, from 0 (none) to 1 (all).
+    """
+
+    def __init__(self, sample_rate: float = 0.0) -> None:
+        """
+        Initialize the TraceSampler.
+
+        Args:
+            sample_rate (float): Fraction of changes traced, from 0 (none) to 1 (all).
+        """
+        if not 0 <= sample_rate <= 1:
+            raise ValueError('sample_rate must be between 0 and 1.')
+
+        self.sample_rate = sample_rate
+        self.__credit = 0.0
+
+    def sample(self) -> bool:
+        """
+        Return whether the next change is traced.
+        """
+        if not self.sample_rate:
+            return False
+
+        self.__credit += self.sample_rate
+
+        if self.__credit >= 1:
+            self.__credit -= 1
+            return True
+
+        return False
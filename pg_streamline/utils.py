@@ -15,6 +15,16 @@ class Utils:
     def convert_bytes_to_utf8(in_bytes: Union[bytes, bytearray]) -> str:
         return in_bytes.decode('utf-8')
 
+    @staticmethod
+    def convert_lsn_to_int(lsn: str) -> int:
+        high, low = lsn.split('/')
+        return (int(high, 16) << 32) + int(low, 16)
+
+    @staticmethod
+    def convert_pg_timestamp_to_epoch(timestamp: int) -> float:
+        # PostgreSQL timestamps are microseconds since 2000-01-01 00:00:00 UTC
+        return timestamp / 1000000 + 946684800
+
 
 def setup_custom_logging():
     """
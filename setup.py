@@ -16,6 +16,17 @@ setuptools.setup(
     url='https://github.com/shwetabhk/pg-streamline-py',
     packages=setuptools.find_packages(),
     install_requires=['pika>=1.3.2', 'psycopg2-binary>=2.9.9', 'pyyaml>=6.0.1'],
+    entry_points={
+        'pg_streamline.sinks': [
+            'memory = pg_streamline.sinks.memory:MemorySink',
+            'stdout = pg_streamline.sinks.stream:StdoutSink',
+            'file = pg_streamline.sinks.stream:FileSink',
+            'rabbitmq = pg_streamline.sinks.rabbitmq:RabbitMQSink',
+            'columnar = pg_streamline.sinks.columnar:ColumnarFileSink',
+            'postgres = pg_streamline.sinks.postgres:PostgresSink',
+        ]
+    },
+    extras_require={'parquet': ['pyarrow'], 'fast-json': ['orjson'], 'batches': ['numpy', 'pyarrow']},
     classifiers=[
         'Topic :: Internet :: WWW/HTTP',
         'Intended Audience :: Developers',
@@ -91,6 +91,27 @@ class OutputData:
     payload = None
     data_start = 124122
 
+# Encode a Relation message, the first column is the key
+def relation_message(relation_id, table_name, columns):
+    namespace, name = table_name.split('.')
+    message = b'R' + relation_id.to_bytes(4, 'big') + namespace.encode() + b'\x00' + name.encode() + b'\x00d'
+    message += len(columns).to_bytes(2, 'big')
+
+    for index, (column, type_oid) in enumerate(columns):
+        message += (0 if index else 1).to_bytes(1, 'big') + column.encode() + b'\x00'
+        message += type_oid.to_bytes(4, 'big') + (-1).to_bytes(4, 'big', signed=True)
+
+    return message
+
+# Fixture for the Relation message sent before the insert, update and delete payloads
+@pytest.fixture
+def relation_payload(mocked_schema):
+    data = OutputData()
+    type_oids = {'uuid': 2950, 'text': 25, 'boolean': 16, 'timestamp': 1114}
+    data.payload = relation_message(16441, 'public.users', [(name, type_oids[type_name]) for name, type_name in mocked_schema])
+    data.data_start = 124121
+    return data
+
 # Fixture for insert payload
 @pytest.fixture
 def insert_payload():
@@ -178,3 +199,11 @@ def delete_response():
             'updated_at': '2023-10-09 13:13:47.929773'
         }
     }
+
+# Fixture for wal2json format-version 2 insert payload
+@pytest.fixture
+def wal2json_v2_payload():
+    data = OutputData()
+    data.payload = b'{"action":"I","schema":"public","table":"users","columns":[{"name":"id","type":"integer","value":1},{"name":"note","type":"text","value":"\\"schema\\":\\"fake\\""}]}'
+    data.data_start = 124122
+    return data
@@ -0,0 +1,64 @@
+import logging
+from unittest import mock
+
+from pg_streamline.activity import ActivityLog, create_activity_log
+from .conftest import ExtendedConsumer
+
+
+# Test changes are aggregated into one summary per interval
+def test_activity_log_summary():
+    logger = mock.MagicMock()
+    logger.isEnabledFor.return_value = True
+
+    with mock.patch('pg_streamline.activity.time.monotonic', return_value=0):
+        activity_log = ActivityLog(logger, 'Producer', interval=60)
+
+    with mock.patch('pg_streamline.activity.time.monotonic', return_value=30):
+        activity_log.record('public.users', 'INSERT', 1)
+        activity_log.record('public.users', 'INSERT', 2)
+
+    logger.info.assert_not_called()
+
+    with mock.patch('pg_streamline.activity.time.monotonic', return_value=60):
+        activity_log.record('public.orders', 'DELETE', 3)
+
+    logger.info.assert_called_once_with(
+        'Producer processed 3 changes in 60s: public.orders DELETE=1, public.users INSERT=2'
+    )
+
+    # Nothing to summarize
+    logger.info.reset_mock()
+    activity_log.flush()
+    logger.info.assert_not_called()
+
+
+# Test sampled changes are logged individually at INFO, the others lazily at DEBUG
+def test_activity_log_sampling():
+    logger = mock.MagicMock()
+    activity_log = create_activity_log({'summary_interval': 0, 'sample_rate': 0.5}, logger, 'Consumer')
+
+    for lsn in range(4):
+        activity_log.record('public.users', 'U', lsn)
+
+    assert logger.info.call_count == 2
+    logger.info.assert_called_with('%s change: table=%s operation=%s lsn=%s', 'Consumer', 'public.users', 'U', 3)
+    assert logger.debug.call_count == 2
+
+    activity_log = create_activity_log(None, logging.getLogger('test'), 'Consumer')
+    assert (activity_log.interval, activity_log.sampler.sample_rate) == (60.0, 0.0)
+
+
+# Test the consumer counts applied changes instead of logging each one
+def test_consumer_activity_log(insert_payload, mocked_schema):
+    with mock.patch('psycopg2.connect'):
+        consumer = ExtendedConsumer()
+
+    consumer.conn_pool = mock.MagicMock()
+    consumer.conn_pool.getconn.return_value.cursor.return_value.fetchall.return_value = mocked_schema
+
+    with mock.patch.object(consumer.activity_log, 'record') as mock_record:
+        with mock.patch('logging.info') as mock_logging:
+            consumer.process_incoming_message('public.users', insert_payload.payload, position=(10, 5))
+
+    mock_record.assert_called_once_with('public.users', 'I', 5)
+    mock_logging.assert_not_called()
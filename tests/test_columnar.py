@@ -0,0 +1,235 @@
+import os
+from unittest import mock
+
+import pytest
+
+from pg_streamline.columnar import ColumnarBuffer, RecordBatchBuilder, convert_text_value, pack_bits, pg_type_kind
+from pg_streamline.sinks import SinkRecord, create_sink
+from pg_streamline.sinks.columnar import read_segment
+
+
+SCHEMA = {
+    'relation_id': 16441,
+    'columns': [
+        {'name': 'id', 'type': 23},
+        {'name': 'name', 'type': 25},
+        {'name': 'score', 'type': 701},
+        {'name': 'active', 'type': 16}
+    ]
+}
+
+
+def make_record(commit_lsn, lsn, message_type='I', schema=SCHEMA, **values):
+    row = {'id': str(lsn), 'name': 'user', 'score': '1.5', 'active': 't'}
+    row.update(values)
+    change = {'message_type': message_type, 'relation_id': 16441}
+    change['old' if message_type == 'D' else 'new'] = row
+    return SinkRecord('public.users', b'payload', lsn, lsn, commit_lsn=commit_lsn, change=change, schema=schema)
+
+
+@pytest.fixture
+def columnar_sink(tmp_path):
+    sink = create_sink('columnar', {'directory': str(tmp_path), 'format': 'compact'})
+    sink.acknowledged = []
+    sink.add_ack_callback(sink.acknowledged.extend)
+    sink.open()
+    return sink
+
+
+# Test type mapping and conversion of text values
+def test_convert_text_value():
+    assert pg_type_kind(20) == 'int'
+    assert pg_type_kind(1700) == 'string'
+    assert convert_text_value('42', 'int') == 42
+    assert convert_text_value('f', 'bool') is False
+    assert convert_text_value('NaN', 'float') != convert_text_value('NaN', 'float')
+    assert convert_text_value(None, 'int') is None
+
+    buffer = ColumnarBuffer.from_schema(SCHEMA)
+    buffer.append({'id': '1', 'name': 'a', 'score': None, 'active': 't'})
+    assert buffer.to_pydict() == {'id': [1], 'name': ['a'], 'score': [None], 'active': [True]}
+    assert buffer.row_count == 1 and buffer.estimated_bytes > 0
+
+    # Segments and record batches share the buffer and its type mapping
+    assert RecordBatchBuilder.from_schema('public.users', SCHEMA).columns == buffer.columns
+
+
+# Test records are only acknowledged once their segment is committed
+def test_columnar_sink_segments(columnar_sink, tmp_path):
+    columnar_sink.write_batch([make_record(100, 10), make_record(100, 20, 'U'), make_record(200, 15, 'D')])
+    columnar_sink.flush()
+
+    assert columnar_sink.acknowledged == []
+
+    columnar_sink.close()
+
+    assert [record.sequence for record in columnar_sink.acknowledged] == [10, 20, 15]
+
+    files = os.listdir(tmp_path / 'public.users')
+    assert files == ['{:016X}_{:016X}-{:016X}_{:016X}.pgcol'.format(100, 10, 200, 15)]
+
+    metadata, columns = read_segment(str(tmp_path / 'public.users' / files[0]))
+    assert metadata['row_count'] == 3
+    assert metadata['last_commit_lsn'] == 200
+    assert columns['_op'] == ['I', 'U', 'D']
+    assert columns['id'] == [10, 20, 15]
+    assert columns['active'] == [True, True, True]
+
+
+# Test resuming skips changes already committed to a segment
+def test_columnar_sink_resume(columnar_sink, tmp_path):
+    columnar_sink.write_batch([make_record(100, 10), make_record(200, 5)])
+    columnar_sink.close()
+
+    sink = create_sink('columnar', {'directory': str(tmp_path), 'format': 'compact'})
+    acknowledged = []
+    sink.add_ack_callback(acknowledged.extend)
+    sink.open()
+
+    assert sink.positions == {'public.users': (200, 5)}
+
+    sink.write_batch([make_record(200, 5), make_record(300, 1)])
+    assert [record.lsn for record in acknowledged] == [5]
+
+    sink.close()
+    assert len(os.listdir(tmp_path / 'public.users')) == 2
+
+
+# Test a failed commit keeps the buffered rows, and a retried batch is not appended twice
+def test_columnar_sink_failed_commit(tmp_path):
+    sink = create_sink('columnar', {'directory': str(tmp_path), 'format': 'compact'})
+    acknowledged = []
+    sink.add_ack_callback(acknowledged.extend)
+    sink.open()
+    sink.write_batch([make_record(100, 10)])
+
+    altered = {'relation_id': 16441, 'columns': SCHEMA['columns'][:2]}
+    batch = [make_record(200, 20), make_record(300, 30, schema=altered)]
+
+    # The schema change commits the segment holding 10 and 20, and its rename fails
+    with mock.patch('os.replace', side_effect=OSError('disk full')):
+        with pytest.raises(OSError):
+            sink.write_batch(batch)
+
+    assert acknowledged == [] and all(name.endswith('.tmp') for name in os.listdir(tmp_path / 'public.users'))
+
+    sink.write_batch(batch)
+    sink.close()
+
+    assert [record.lsn for record in acknowledged] == [10, 20, 30]
+    files = sorted(os.listdir(tmp_path / 'public.users'))
+    assert len(files) == 2
+    assert read_segment(str(tmp_path / 'public.users' / files[0]))[1]['_lsn'] == [10, 20]
+
+
+# Test size based, time based and schema change rotation
+def test_columnar_sink_rotation(tmp_path):
+    sink = create_sink('columnar', {'directory': str(tmp_path), 'format': 'compact', 'max_segment_bytes': 1})
+    sink.open()
+
+    sink.write_batch([make_record(100, 10), make_record(100, 20)])
+    assert len(os.listdir(tmp_path / 'public.users')) == 2
+
+    sink.max_segment_bytes = 1024
+    sink.write_batch([make_record(200, 30)])
+
+    with mock.patch('time.monotonic', return_value=float('inf')):
+        sink.poll()
+
+    assert len(os.listdir(tmp_path / 'public.users')) == 3
+
+    altered = {'relation_id': 16441, 'columns': SCHEMA['columns'][:2]}
+    sink.write_batch([make_record(300, 40), make_record(300, 50, schema=altered)])
+    assert len(os.listdir(tmp_path / 'public.users')) == 4
+
+    sink.close()
+    metadata, columns = read_segment(str(tmp_path / 'public.users' / sorted(os.listdir(tmp_path / 'public.users'))[-1]))
+    assert list(columns) == ['_op', '_commit_lsn', '_lsn', 'id', 'name']
+
+
+# Test Parquet output when pyarrow is installed
+def test_columnar_sink_parquet(tmp_path):
+    pytest.importorskip('pyarrow')
+
+    sink = create_sink('columnar', {'directory': str(tmp_path), 'format': 'parquet'})
+    sink.open()
+    sink.write_batch([make_record(100, 10)])
+    sink.close()
+
+    path = tmp_path / 'public.users' / os.listdir(tmp_path / 'public.users')[0]
+    metadata, columns = read_segment(str(path))
+
+    assert metadata['last_lsn'] == 10
+    assert columns['score'] == [1.5]
+
+
+# Test option validation and unreadable segments
+def test_columnar_sink_errors(tmp_path):
+    with pytest.raises(ConnectionError) as excinfo:
+        create_sink('columnar', {}).open()
+
+    assert 'directory is missing from the columnar sink options.' in str(excinfo.value)
+
+    with mock.patch('pg_streamline.sinks.columnar.pyarrow', None):
+        with pytest.raises(ImportError):
+            create_sink('columnar', {'directory': str(tmp_path), 'format': 'parquet'}).open()
+
+    path = tmp_path / 'broken.pgcol'
+    path.write_bytes(b'not a segment')
+
+    with pytest.raises(ValueError):
+        read_segment(str(path))
+
+
+# Test record batches keep typed buffers, offsets and validity
+def test_record_batch_builder():
+    builder = RecordBatchBuilder.from_schema('public.users', SCHEMA, [('_op', 'string')])
+    builder.append({'_op': 'I', 'id': '1', 'name': 'ä', 'score': '1.5', 'active': 't'})
+    builder.append({'_op': 'U', 'id': '2', 'name': None, 'score': None, 'active': 'f'})
+    builder.append({'_op': 'I', 'id': 3, 'name': 'c', 'score': 2.0, 'active': True})
+    assert builder.nbytes > 0
+
+    batch = builder.finish()
+    assert builder.num_rows == 0
+    assert batch.num_rows == 3
+    assert batch.column_names == ['_op', 'id', 'name', 'score', 'active']
+
+    ids = batch.column('id')
+    assert (ids.values.typecode, ids.values.tolist(), ids.null_count) == ('q', [1, 2, 3], 0)
+
+    names = batch.column('name')
+    assert names.offsets.tolist() == [0, 2, 2, 3]
+    assert names.data == bytearray('äc'.encode('utf-8'))
+    assert names.validity == bytearray([1, 0, 1])
+
+    assert batch.to_pydict() == {
+        '_op': ['I', 'U', 'I'],
+        'id': [1, 2, 3],
+        'name': ['ä', None, 'c'],
+        'score': [1.5, None, 2.0],
+        'active': [True, False, True]
+    }
+    assert pack_bits(bytearray([1, 0, 1, 1, 0, 0, 0, 0, 1])) == b'\x0d\x01'
+
+
+# Test NumPy and Arrow conversion, when installed
+def test_record_batch_numpy():
+    numpy = pytest.importorskip('numpy')
+    builder = RecordBatchBuilder.from_schema('public.users', SCHEMA)
+    builder.append({'id': '1', 'name': 'a', 'score': '1.5', 'active': 't'})
+    builder.append({'id': '2', 'name': 'b', 'score': None, 'active': 'f'})
+
+    arrays = builder.finish().to_numpy()
+    assert arrays['id'].dtype == numpy.int64 and arrays['id'].sum() == 3
+    assert arrays['active'].tolist() == [True, False]
+    assert arrays['score'].mask.tolist() == [False, True]
+
+
+def test_record_batch_arrow():
+    pytest.importorskip('pyarrow')
+    builder = RecordBatchBuilder.from_schema('public.users', SCHEMA)
+    builder.append({'id': '1', 'name': 'a', 'score': '1.5', 'active': 't'})
+    builder.append({'id': '2', 'name': None, 'score': None, 'active': 'f'})
+
+    batch = builder.finish().to_arrow()
+    assert batch.to_pydict() == {'id': [1, 2], 'name': ['a', None], 'score': [1.5, None], 'active': [True, False]}
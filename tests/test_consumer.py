@@ -1,9 +1,11 @@
+import time
 from unittest import mock
 import psycopg2
 
 import pytest
 
-from pg_streamline import Consumer
+from pg_streamline import BatchConsumer, Consumer
+from pg_streamline.utils import parse_yaml_config
 from tests.conftest import ExtendedConsumer
 
 
@@ -22,9 +24,11 @@ def test_insert_process_incoming_message(extended_consumer_instance: ExtendedCon
             with mock.patch('logging.exception') as mock_logger:
                 mock_decode_insert_message.side_effect = Exception('Error connecting to database.')
 
-                extended_consumer_instance.process_incoming_message('public.users', insert_payload.payload)
+                with pytest.raises(Exception, match='Error connecting to database.'):
+                    extended_consumer_instance.process_incoming_message('public.users', insert_payload.payload)
 
             mock_logger.assert_called_once()
+            extended_consumer_instance.conn_pool.putconn.assert_called()
 
 
 # Test process_incoming_message method for update payload
@@ -113,3 +117,256 @@ def test_validate_config(consumer_instance: Consumer):
         consumer_instance._Consumer__validate_config(config)
 
     assert 'Database name not found in config file.' in str(excinfo.value)
+
+
+# Test process_incoming_message method for wal2json format-version 2 payload
+def test_wal2json_process_incoming_message(extended_consumer_instance: ExtendedConsumer, wal2json_v2_payload):
+    extended_consumer_instance.conn_pool = mock.MagicMock()
+
+    with mock.patch.object(extended_consumer_instance, 'perform_action') as mock_perform_action:
+        extended_consumer_instance.process_incoming_message('public.users', wal2json_v2_payload.payload)
+
+    message_type, table_name, parsed_message = mock_perform_action.call_args.args
+    assert (message_type, table_name) == ('I', 'public.users')
+    assert parsed_message['columns'][0]['value'] == 1
+
+    # Format-version 1 transactions have no action and are rejected instead of passed on
+    with mock.patch.object(extended_consumer_instance, 'perform_action') as mock_perform_action:
+        with pytest.raises(ValueError) as excinfo:
+            extended_consumer_instance.process_incoming_message('wal2json', b'{"change": [{"kind": "insert"}]}')
+
+    assert 'only wal2json format-version 2 messages are supported' in str(excinfo.value)
+    assert not mock_perform_action.called
+
+
+# Test process_incoming_message method for Truncate and logical decoding messages
+def test_protocol_process_incoming_message(extended_consumer_instance: ExtendedConsumer):
+    extended_consumer_instance.conn_pool = mock.MagicMock()
+    truncate = b'T' + (1).to_bytes(4, 'big') + b'\x02' + (16384).to_bytes(4, 'big')
+    message = b'M\x01' + (0x3000).to_bytes(8, 'big') + b'audit\x00' + (2).to_bytes(4, 'big') + b'{}'
+
+    with mock.patch.object(extended_consumer_instance, 'perform_action') as mock_perform_action:
+        extended_consumer_instance.process_incoming_message('public.users', truncate)
+        extended_consumer_instance.process_incoming_message('audit', message)
+
+    assert mock_perform_action.call_args_list == [
+        mock.call('T', 'public.users', {
+            'message_type': 'T', 'relation_ids': [16384], 'cascade': False, 'restart_identity': True
+        }),
+        mock.call('M', 'audit', {
+            'message_type': 'M', 'transactional': True, 'lsn': 0x3000, 'prefix': 'audit', 'content': b'{}'
+        })
+    ]
+
+
+# Test array and composite values are decoded with the preloaded type catalog
+def test_type_decoding_process_incoming_message():
+    config = dict(parse_yaml_config('pg-streamline-config.yaml'), types={'enabled': True, 'publications': ['events']})
+
+    with mock.patch('pg_streamline.consumer.process.parse_yaml_config', return_value=config):
+        with mock.patch('psycopg2.connect') as mock_connect:
+            mock_connect.return_value.cursor.return_value.fetchall.return_value = [
+                (23, 'int4', 'b', 'N', 0, ',', 0, None, None, None, None)
+            ]
+            consumer = ExtendedConsumer()
+
+    assert 23 in consumer.type_catalog.types
+
+    consumer.conn_pool = mock.MagicMock()
+    cursor = consumer.conn_pool.getconn.return_value.cursor.return_value
+    cursor.fetchall.side_effect = [
+        [('id', 23), ('tags', 1009)],
+        [(25, 'text', 'b', 'S', 0, ',', 0, None, None, None, None), (1009, '_text', 'b', 'A', 25, ',', 0, None, None, None, None)]
+    ]
+
+    def value(text):
+        return b't' + len(text).to_bytes(4, 'big') + text
+
+    payload = b'I' + (16384).to_bytes(4, 'big') + b'N' + (2).to_bytes(2, 'big') + value(b'1') + value(b'{a,"b c"}')
+
+    with mock.patch.object(consumer, 'perform_action') as mock_perform_action:
+        consumer.process_incoming_message('public.users', payload)
+
+    assert mock_perform_action.call_args.args[2]['new'] == {'id': '1', 'tags': ['a', 'b c']}
+
+
+# Test wal2json changes are passed through when type decoding is enabled
+def test_type_decoding_wal2json_process_incoming_message(wal2json_v2_payload):
+    config = dict(parse_yaml_config('pg-streamline-config.yaml'), types={'enabled': True})
+
+    with mock.patch('pg_streamline.consumer.process.parse_yaml_config', return_value=config):
+        with mock.patch('psycopg2.connect'):
+            consumer = ExtendedConsumer()
+
+    assert consumer.type_catalog is not None
+    consumer.conn_pool = mock.MagicMock()
+
+    with mock.patch.object(consumer, 'perform_action') as mock_perform_action:
+        consumer.process_incoming_message('public.users', wal2json_v2_payload.payload)
+
+    message_type, table_name, parsed_message = mock_perform_action.call_args.args
+    assert (message_type, table_name) == ('I', 'public.users')
+    assert parsed_message['columns'][0]['value'] == 1
+
+
+# Test unchanged TOAST values are restored from the row cache without querying the row
+def test_row_cache_process_incoming_message():
+    config = dict(parse_yaml_config('pg-streamline-config.yaml'), row_cache={'max_bytes': 1048576})
+
+    with mock.patch('pg_streamline.consumer.process.parse_yaml_config', return_value=config):
+        with mock.patch('psycopg2.connect'):
+            consumer = ExtendedConsumer()
+
+    consumer.conn_pool = mock.MagicMock()
+    cursor = consumer.conn_pool.getconn.return_value.cursor.return_value
+    cursor.fetchall.return_value = [('id', 23), ('status', 25), ('document', 3802)]
+    cursor.fetchone.return_value = (['id'],)
+
+    def value(text):
+        return b't' + len(text).to_bytes(4, 'big') + text
+
+    relation = (16384).to_bytes(4, 'big')
+    insert = b'I' + relation + b'N' + (3).to_bytes(2, 'big') + value(b'1') + value(b'new') + value(b'{"a": 1}')
+    update = (
+        b'U' + relation + b'O' + (3).to_bytes(2, 'big') + value(b'1') + value(b'new') + b'u'
+        + b'N' + (3).to_bytes(2, 'big') + value(b'1') + value(b'paid') + b'u'
+    )
+
+    with mock.patch.object(consumer, 'perform_action') as mock_perform_action:
+        consumer.process_incoming_message('public.orders', insert)
+        consumer.process_incoming_message('public.orders', update)
+
+    parsed_message = mock_perform_action.call_args.args[2]
+    assert parsed_message['new'] == {'id': '1', 'status': 'paid', 'document': '{"a": 1}'}
+    assert parsed_message['old']['document'] == '{"a": 1}'
+    assert parsed_message['diff'] == {'status': {'old_value': 'new', 'new_value': 'paid'}}
+    assert parsed_message['unchanged_toast'] == ['document']
+    assert not any('document' in str(call) for call in cursor.execute.call_args_list)
+
+# Test BatchConsumer hands off columnar batches per table at max_rows and on flush
+def test_batch_consumer(insert_payload, mocked_schema):
+    class ExtendedBatchConsumer(BatchConsumer):
+        def perform_batch(self, table_name, batch):
+            self.batches.append((table_name, batch))
+
+    config = dict(parse_yaml_config('pg-streamline-config.yaml'), batch={'max_rows': 2, 'max_delay_ms': 60000})
+
+    with mock.patch('pg_streamline.consumer.process.parse_yaml_config', return_value=config):
+        with mock.patch('psycopg2.connect'):
+            consumer = ExtendedBatchConsumer()
+
+    consumer.batches = []
+    consumer.conn_pool = mock.MagicMock()
+    cursor = consumer.conn_pool.getconn.return_value.cursor.return_value
+    cursor.fetchall.return_value = [(name, 25) for name, _ in mocked_schema]
+
+    for _ in range(3):
+        consumer.process_incoming_message('public.users', insert_payload.payload)
+
+    consumer.perform_action('D', 'public.users', {'relation_id': 16441, 'old': {'id': '1'}})
+
+    assert len(consumer.batches) == 1
+    table_name, batch = consumer.batches[0]
+    assert table_name == 'public.users' and batch.num_rows == 2
+    assert batch.to_pylist('_op') == ['I', 'I']
+    assert batch.column_names[1:] == [name for name, _ in mocked_schema]
+
+    consumer.perform_termination()
+    assert [batch.num_rows for _, batch in consumer.batches] == [2, 1]
+
+    # One schema lookup per decoded message, the batch consumer reuses the schema that decoded it
+    assert sum('pg_attribute WHERE attrelid = 16441' in str(call) for call in cursor.execute.call_args_list) == 3
+
+
+# Test batch columns follow the decoding schema, and batches of idle tables are handed off by the flusher
+def test_batch_consumer_schema_and_idle_flush(insert_payload, mocked_schema):
+    class ExtendedBatchConsumer(BatchConsumer):
+        def perform_batch(self, table_name, batch):
+            self.batches.append((table_name, batch))
+
+    config = dict(parse_yaml_config('pg-streamline-config.yaml'), batch={'max_rows': 100, 'max_delay_ms': 50})
+
+    with mock.patch('pg_streamline.consumer.process.parse_yaml_config', return_value=config):
+        with mock.patch('psycopg2.connect'):
+            consumer = ExtendedBatchConsumer()
+
+    consumer.batches = []
+    consumer.conn_pool = mock.MagicMock()
+    cursor = consumer.conn_pool.getconn.return_value.cursor.return_value
+    cursor.fetchall.return_value = [(name, 25) for name, _ in mocked_schema]
+    consumer.process_incoming_message('public.users', insert_payload.payload)
+
+    # The table changed type: the batch built so far keeps the old columns
+    cursor.fetchall.return_value = [(name, 16 if name == 'is_verified' else 25) for name, _ in mocked_schema]
+    consumer.process_incoming_message('public.users', insert_payload.payload)
+
+    assert len(consumer.batches) == 1
+    assert consumer.batches[0][1].to_pylist('is_verified') == ['t']
+
+    # No more changes arrive, the last batch is handed off once it is max_delay_ms old
+    deadline = time.monotonic() + 5
+
+    while len(consumer.batches) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert consumer.batches[1][1].to_pylist('is_verified') == [True]
+    consumer.perform_termination()
+    assert len(consumer.batches) == 2
+
+
+# Test BatchConsumer batches typed wal2json rows, flushing batches older than max_delay_ms
+def test_batch_consumer_wal2json():
+    class ExtendedBatchConsumer(BatchConsumer):
+        def perform_batch(self, table_name, batch):
+            self.batches.append(batch)
+
+    with mock.patch('psycopg2.connect'):
+        consumer = ExtendedBatchConsumer()
+
+    consumer.batches = []
+    consumer.max_delay_ms = 0
+    change = {
+        'action': 'I',
+        'columns': [{'name': 'id', 'type': 'integer', 'value': 1}, {'name': 'name', 'type': 'text', 'value': 'a'}]
+    }
+    consumer.perform_action('I', 'public.users', change)
+
+    assert len(consumer.batches) == 1
+    assert consumer.batches[0].column('id').values.tolist() == [1]
+    assert consumer.batches[0].to_pydict() == {'_op': ['I'], 'id': [1], 'name': ['a']}
+
+
+# Test changes are decoded with the schema version they were published with
+def test_schema_registry_process_incoming_message(relation_payload, insert_payload, insert_response, mocked_schema):
+    config = dict(parse_yaml_config('pg-streamline-config.yaml'), schema_registry={'enabled': True})
+
+    with mock.patch('pg_streamline.consumer.process.parse_yaml_config', return_value=config):
+        with mock.patch('psycopg2.connect'):
+            consumer = ExtendedConsumer()
+
+    consumer.conn_pool = mock.MagicMock()
+    cursor = consumer.conn_pool.getconn.return_value.cursor.return_value
+    cursor.fetchall.return_value = mocked_schema
+
+    with mock.patch.object(consumer, 'perform_action') as mock_perform_action:
+        consumer.process_incoming_message('public.users', relation_payload.payload, schema_version=1)
+        consumer.process_incoming_message('public.users', insert_payload.payload, schema_version=1)
+
+        # Relation messages are not handed to perform_action, and the change needs no catalog lookup
+        mock_perform_action.assert_called_once_with('I', 'public.users', insert_response)
+        cursor.execute.assert_not_called()
+
+        # Unknown versions fall back to the catalog
+        consumer.process_incoming_message('public.users', insert_payload.payload, schema_version=2)
+        assert mock_perform_action.call_args.args[2] == insert_response
+        cursor.execute.assert_called_once()
+
+        # Relation IDs of 2^31 and above are registered and looked up as the same signed integer
+        relation_id = 2 ** 31 + 16441
+        large_relation = relation_payload.payload[:1] + relation_id.to_bytes(4, 'big') + relation_payload.payload[5:]
+        large_insert = insert_payload.payload[:1] + relation_id.to_bytes(4, 'big') + insert_payload.payload[5:]
+        consumer.process_incoming_message('public.users', large_relation, schema_version=3)
+        consumer.process_incoming_message('public.users', large_insert, schema_version=3)
+
+        assert mock_perform_action.call_args.args[2] == dict(insert_response, relation_id=relation_id - 2 ** 32)
+        cursor.execute.assert_called_once()
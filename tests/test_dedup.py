@@ -0,0 +1,76 @@
+from unittest import mock
+
+import pytest
+
+from pg_streamline.consumer.dedup import DedupStore, FileDedupStore, SQLiteDedupStore, create_dedup_store
+from tests.conftest import ExtendedConsumer
+
+
+# Test watermarks follow (commit_lsn, lsn) order per table
+def test_memory_dedup_store():
+    store = DedupStore()
+
+    assert not store.is_applied('public.users', (200, 150))
+    store.mark_applied('public.users', (200, 150))
+
+    assert store.is_applied('public.users', (200, 150))
+    assert store.is_applied('public.users', (100, 180))
+    assert not store.is_applied('public.users', (300, 120))
+    assert not store.is_applied('public.orders', (100, 100))
+
+    # Watermarks never move backwards
+    store.mark_applied('public.users', (100, 100))
+    assert store.watermarks['public.users'] == (200, 150)
+
+
+# Test SQLite and file stores reload their watermarks
+@pytest.mark.parametrize('store_class, file_name', [(SQLiteDedupStore, 'watermarks.db'), (FileDedupStore, 'watermarks.json')])
+def test_persistent_dedup_stores(tmp_path, store_class, file_name):
+    path = str(tmp_path / file_name)
+
+    store = store_class(path, sync_every=2)
+    store.mark_applied('public.users', (200, 150))
+    store.mark_applied('public.orders', (300, 250))
+    store.mark_applied('public.users', (400, 350))
+    store.close()
+
+    reloaded = store_class(path)
+    assert reloaded.watermarks == {'public.users': (400, 350), 'public.orders': (300, 250)}
+    assert reloaded.is_applied('public.users', (400, 350))
+    reloaded.close()
+
+
+# Test the deduplication section of the configuration file
+def test_create_dedup_store(tmp_path):
+    assert type(create_dedup_store(None)) is DedupStore
+    assert create_dedup_store({'enabled': False}) is None
+    assert isinstance(create_dedup_store({'store': 'file', 'path': str(tmp_path / 'w.json')}), FileDedupStore)
+
+    with pytest.raises(ConnectionError):
+        create_dedup_store({'store': 'sqlite'})
+
+    with pytest.raises(ValueError):
+        create_dedup_store({'store': 'redis'})
+
+
+# Test the consumer drops already applied changes before decoding
+def test_consumer_drops_duplicates(extended_consumer_instance: ExtendedConsumer, insert_payload, mocked_schema):
+    consumer = extended_consumer_instance
+    consumer.conn_pool = mock.MagicMock()
+    consumer.conn_pool.getconn.return_value.cursor.return_value.fetchall.return_value = mocked_schema
+
+    with mock.patch.object(consumer, 'perform_action') as mock_perform_action:
+        consumer.process_incoming_message('public.users', insert_payload.payload, position=(200, 150))
+        consumer.process_incoming_message('public.users', insert_payload.payload, position=(200, 150))
+        consumer.process_incoming_message('public.users', insert_payload.payload, position=(200, 150), check_duplicate=False)
+        consumer.process_incoming_message('public.users', insert_payload.payload)
+
+    assert mock_perform_action.call_count == 3
+    assert consumer.conn_pool.getconn.call_count == 3
+
+    # Failed changes are not marked as applied
+    with mock.patch.object(consumer, 'perform_action', side_effect=Exception('Handler failed')):
+        with pytest.raises(Exception):
+            consumer.process_incoming_message('public.users', insert_payload.payload, position=(300, 100))
+
+    assert not consumer.dedup_store.is_applied('public.users', (300, 100))
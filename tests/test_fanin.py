@@ -0,0 +1,92 @@
+from unittest import mock
+
+import pytest
+
+from pg_streamline.producer.fanin import FanInRunner, source_config
+from pg_streamline.utils import parse_yaml_config
+
+
+def create_runner(**fan_in):
+    config = dict(
+        parse_yaml_config('pg-streamline-config.yaml'),
+        fan_in=dict({'databases': [{'name': 'tenant_1', 'replication_slot': 'tenant_1'}, {'name': 'tenant_2', 'replication_slot': 'tenant_2'}]}, **fan_in),
+        sink={'name': 'memory', 'batch_size': 1, 'flush_interval': 0}
+    )
+
+    with mock.patch('pg_streamline.producer.fanin.parse_yaml_config', return_value=config), mock.patch('psycopg2.connect'):
+        runner = FanInRunner()
+
+    for source in runner.sources:
+        source.replication_cursor = mock.MagicMock(closed=False)
+        source.conn_pool = mock.MagicMock()
+        source.conn_pool.getconn.return_value.cursor.return_value.fetchone.return_value = ('public', 'users')
+
+    return runner
+
+
+def stream(insert_payload, *lsns):
+    return [mock.MagicMock(payload=insert_payload.payload, data_start=lsn) for lsn in lsns] + [None] * 10
+
+
+# Test one loop serves every database in turn, within the per-turn limits, with feedback per slot
+def test_fan_in_runner(insert_payload):
+    runner = create_runner(max_messages_per_turn=2)
+    busy, quiet = runner.sources
+    busy.replication_cursor.read_message.side_effect = stream(insert_payload, 100, 200, 300, 400, 500)
+    quiet.replication_cursor.read_message.side_effect = stream(insert_payload, 1000)
+
+    selector = runner._FanInRunner__selector = mock.MagicMock()
+    selector.select.return_value = [(mock.MagicMock(data=busy), 1), (mock.MagicMock(data=quiet), 1)]
+
+    # The busy database is stopped after two messages, the quiet one is served in the same turn
+    assert runner.poll() == 3
+    assert sorted(record.lsn for record in runner.sink.records) == [100, 200, 1000]
+    assert {record.table_name for record in runner.sink.records} == {'tenant_1.public.users', 'tenant_2.public.users'}
+
+    # Each slot confirms its own delivered changes
+    busy.replication_cursor.send_feedback.assert_called_with(flush_lsn=200)
+    quiet.replication_cursor.send_feedback.assert_called_with(flush_lsn=1000)
+
+    # Messages left in the connection's buffer are read without waiting for the selector
+    selector.select.return_value = []
+    assert runner.poll(timeout=5) == 2
+    selector.select.assert_called_with(0)
+    assert runner.poll(timeout=5) == 1
+    assert runner.poll(timeout=5) == 0
+    selector.select.assert_called_with(5)
+
+    assert runner.status() == {
+        'tenant_1': {'received_lsn': 500, 'feedback_lsn': 500, 'pending': 0},
+        'tenant_2': {'received_lsn': 1000, 'feedback_lsn': 1000, 'pending': 0}
+    }
+
+    runner.close()
+    assert busy.replication_cursor.close.called and quiet.replication_cursor.close.called
+
+
+# Test the fan_in section is validated and merged over the database section
+def test_fan_in_config():
+    config = dict(parse_yaml_config('pg-streamline-config.yaml'), metrics={'port': 9187})
+    merged = source_config(config, {'name': 'tenant_2', 'host': 'db2', 'alias': 'eu'}, 1)
+    assert merged['database']['name'] == 'tenant_2' and merged['database']['host'] == 'db2'
+    assert merged['database']['user'] == config['database']['user'] and 'alias' not in merged['database']
+    assert merged['metrics']['port'] == 9188
+
+    with pytest.raises(ConnectionError) as excinfo:
+        with mock.patch('pg_streamline.producer.fanin.parse_yaml_config', return_value=config):
+            FanInRunner()
+
+    assert 'fan_in databases are missing' in str(excinfo.value)
+
+    with pytest.raises(ValueError) as excinfo:
+        with mock.patch('pg_streamline.producer.fanin.parse_yaml_config', return_value=dict(
+            config, fan_in={'databases': [{'name': 'tenant_1'}]}, sink={'name': 'memory'}, workers={'processes': 2}
+        )):
+            FanInRunner()
+
+    assert 'The workers section is not supported by FanInRunner.' in str(excinfo.value)
+
+    with pytest.raises(ValueError) as excinfo:
+        create_runner(databases=[{'name': 'tenant_1'}, {'name': 'tenant_1', 'host': 'db2'}])
+
+    assert 'Duplicate fan_in source: tenant_1' in str(excinfo.value)
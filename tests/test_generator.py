@@ -0,0 +1,38 @@
+from benchmarks.generator import PgOutputGenerator
+from pg_streamline import DeleteMessage, InsertMessage, UpdateMessage
+
+
+# Test that generated changes decode through the parsers
+def test_generated_changes_decode():
+    generator = PgOutputGenerator(row_width=12, null_ratio=0.2, toast_ratio=0.5)
+    cursor = generator.catalog_cursor()
+
+    insert = InsertMessage(generator.insert(), cursor=cursor).decode_insert_message()
+    assert insert['relation_id'] == generator.relation_id
+    assert list(insert['new'].keys()) == [name for name, _ in generator.columns]
+    assert insert['new']['id'] is not None
+
+    update = UpdateMessage(generator.update(), cursor=cursor).decode_update_message()
+    assert set(update.keys()) >= {'old', 'new', 'diff'}
+
+    delete = DeleteMessage(generator.delete(), cursor=cursor).decode_delete_message()
+    assert delete['old']['id'] is not None
+
+
+# Test the structure of a generated stream and key-only deletes
+def test_generated_stream():
+    generator = PgOutputGenerator(replica_identity='default', seed=1)
+    messages = list(generator.stream(transactions=2, changes_per_transaction=3))
+
+    assert [message.payload[:1] for message in messages[:2]] == [b'R', b'B']
+    assert len(messages) == 1 + 2 * 5
+    assert messages[-1].payload[:1] == b'C'
+
+    cursor = generator.catalog_cursor()
+    delete = DeleteMessage(generator.delete(), cursor=cursor).decode_delete_message()
+    # Key-only old tuples are decoded against the key columns only
+    assert list(delete['old']) == ['id']
+
+    update = UpdateMessage(generator.update(), cursor=cursor).decode_update_message()
+    assert update['old'] == {} and update['diff'] == {}
+    assert len(update['new']) == 10
@@ -0,0 +1,175 @@
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from pg_streamline import InsertMessage
+from pg_streamline.consumer.handlers import Handler, HandlerDispatcher, HandlerRegistry
+from tests.conftest import ExtendedConsumer
+
+
+# Test decorators register handlers by table and operation
+def test_handler_registry():
+    registry = HandlerRegistry()
+
+    @registry.on_table('public.users', 'public.orders')
+    def invalidate(message_type, table_name, parsed_message):
+        pass
+
+    @registry.on_delete(required=False, timeout=5)
+    def audit(message_type, table_name, parsed_message):
+        pass
+
+    @registry.on_operation('I', 'U', tables=['public.users'], name='index')
+    def index_user(message_type, table_name, parsed_message):
+        pass
+
+    assert len(registry) == 3
+    assert [handler.name for handler in registry.matching('U', 'public.users')] == ['invalidate', 'index']
+    assert [handler.name for handler in registry.matching('D', 'public.events')] == ['audit']
+    assert registry.matching('D', 'public.events')[0].timeout == 5
+    assert registry.matching('T', 'public.events') == []
+
+    with pytest.raises(ValueError) as excinfo:
+        registry.register(invalidate, tables=['public.events'])
+
+    assert 'Duplicate handler: invalidate' in str(excinfo.value)
+
+    with pytest.raises(ValueError):
+        registry.register(audit, operations=['X'], name='other')
+
+
+# Test a handler registered while the handlers of a change are being looked up is not left out of the cache
+def test_handler_registry_concurrent_register():
+    registry = HandlerRegistry()
+    registry.register(mock.MagicMock(), tables=['public.users'], name='cache')
+    looking_up, proceed = threading.Event(), threading.Event()
+    matches = Handler.matches
+
+    def slow_matches(handler, message_type, table_name):
+        looking_up.set()
+        proceed.wait(5)
+        return matches(handler, message_type, table_name)
+
+    with mock.patch.object(Handler, 'matches', slow_matches):
+        lookup = threading.Thread(target=registry.matching, args=('I', 'public.users'))
+        lookup.start()
+        assert looking_up.wait(5)
+
+        register = threading.Thread(target=registry.register, args=(mock.MagicMock(),), kwargs={'name': 'search'})
+        register.start()
+        register.join(0.2)
+
+        # The registration waits for the lookup, so it resets the cache after the lookup filled it
+        assert register.is_alive()
+        proceed.set()
+        lookup.join(5)
+        register.join(5)
+
+    assert [handler.name for handler in registry.matching('I', 'public.users')] == ['cache', 'search']
+
+
+# Test handlers run concurrently on their own copy, and failures of one do not stop the others
+def test_handler_dispatcher():
+    registry = HandlerRegistry()
+    dispatcher = HandlerDispatcher(registry, max_workers=4)
+    barrier = threading.Barrier(2, timeout=5)
+    seen = {}
+
+    @registry.on_table('public.users')
+    def first(message_type, table_name, parsed_message):
+        barrier.wait()
+        parsed_message['new']['email'] = 'changed'
+
+    @registry.on_table('public.users')
+    def second(message_type, table_name, parsed_message):
+        barrier.wait()
+        seen['second'] = parsed_message['new']['email']
+
+    parsed_message = {'new': {'id': '1', 'email': 'a@x.com'}}
+
+    # Both handlers wait for each other, so they only finish if they run at the same time
+    assert dispatcher.dispatch('I', 'public.users', parsed_message) == 2
+    assert seen['second'] == 'a@x.com' and parsed_message['new']['email'] == 'a@x.com'
+    assert dispatcher.dispatch('I', 'public.events', parsed_message) == 0
+
+    failed = mock.MagicMock(side_effect=ValueError('index down'))
+    registry.register(failed, tables=['public.orders'], name='search')
+    other = registry.register(mock.MagicMock(), tables=['public.orders'], name='cache').function
+
+    with pytest.raises(RuntimeError) as excinfo:
+        dispatcher.dispatch('U', 'public.orders', {'new': {'id': '1'}})
+
+    assert 'search (ValueError: index down)' in str(excinfo.value)
+    other.assert_called_once()
+    dispatcher.close()
+
+
+# Test required handlers are waited for up to their timeout, optional ones are not waited for
+def test_handler_dispatcher_timeouts():
+    registry = HandlerRegistry()
+    dispatcher = HandlerDispatcher(registry, max_workers=4, timeout=5)
+    release = threading.Event()
+    optional_done = threading.Event()
+
+    @registry.on_insert('public.users', required=False)
+    def audit(message_type, table_name, parsed_message):
+        release.wait(5)
+        optional_done.set()
+        raise ValueError('audit failed')
+
+    started = time.monotonic()
+    assert dispatcher.dispatch('I', 'public.users', {'new': {}}) == 1
+    assert time.monotonic() - started < 1 and not optional_done.is_set()
+
+    release.set()
+    assert optional_done.wait(5)
+
+    @registry.on_update('public.users', timeout=0.05)
+    def slow(message_type, table_name, parsed_message):
+        time.sleep(0.5)
+
+    with pytest.raises(RuntimeError) as excinfo:
+        dispatcher.dispatch('U', 'public.users', {'new': {}})
+
+    assert 'slow (timed out)' in str(excinfo.value)
+    dispatcher.close()
+
+
+# Test the consumer decodes once and dispatches to handlers instead of perform_action
+def test_handlers_process_incoming_message(insert_payload, insert_response, mocked_schema):
+    with mock.patch('psycopg2.connect'):
+        consumer = ExtendedConsumer()
+
+    consumer.conn_pool = mock.MagicMock()
+    consumer.conn_pool.getconn.return_value.cursor.return_value.fetchall.return_value = mocked_schema
+    calls = []
+
+    @consumer.handlers.on_insert('public.users')
+    def cache(message_type, table_name, parsed_message):
+        calls.append(('cache', message_type, table_name, parsed_message))
+
+    @consumer.handlers.on_table('public.users')
+    def search(message_type, table_name, parsed_message):
+        calls.append(('search', message_type, table_name, parsed_message))
+
+    with mock.patch.object(consumer, 'perform_action') as mock_perform_action, \
+            mock.patch('pg_streamline.consumer.process.InsertMessage', wraps=InsertMessage) as parser:
+        consumer.process_incoming_message('public.users', insert_payload.payload)
+
+    assert parser.call_count == 1
+    assert not mock_perform_action.called
+    assert sorted(calls, key=lambda call: call[0]) == [
+        ('cache', 'I', 'public.users', insert_response), ('search', 'I', 'public.users', insert_response)
+    ]
+
+    @consumer.handlers.on_insert('public.users', name='failing')
+    def failing(message_type, table_name, parsed_message):
+        raise ValueError('failed')
+
+    # A failed required handler fails the message, so it is retried instead of acknowledged
+    with pytest.raises(RuntimeError):
+        consumer.process_incoming_message('public.users', insert_payload.payload)
+
+    consumer.dispatcher.close()
@@ -0,0 +1,118 @@
+from unittest import mock
+
+import pytest
+
+from pg_streamline.consumer.materialized import MaterializedTable
+from pg_streamline.utils import parse_yaml_config
+from tests.conftest import ExtendedConsumer
+
+
+def create_table():
+    return MaterializedTable.from_config({
+        'table': 'public.users',
+        'key': ['id'],
+        'indexes': [
+            {'name': 'by_email', 'columns': ['email']},
+            {'name': 'by_age', 'columns': ['age'], 'ordered': True, 'type': 'int'}
+        ]
+    })
+
+
+# Test changes keep the rows and their secondary indexes up to date
+def test_materialized_table():
+    table = create_table()
+    changes = []
+    table.subscribe(lambda operation, old, new: changes.append((operation, old, new)))
+
+    table.apply('I', {'new': {'id': '1', 'email': 'a@x.com', 'age': '30', 'bio': 'long'}})
+    table.apply('I', {'new': {'id': '2', 'email': 'b@x.com', 'age': '9'}})
+    table.apply('I', {'new': {'id': '3', 'email': 'b@x.com', 'age': None}})
+    assert len(table) == 3
+    assert table.get(1) == {'id': '1', 'email': 'a@x.com', 'age': '30', 'bio': 'long'}
+    assert [row['id'] for row in table.find('by_email', 'b@x.com')] == ['2', '3']
+
+    # Ages are compared as integers, NULL ages are left out of the ordered index
+    assert [row['id'] for row in table.range('by_age', 5, 40)] == ['2', '1']
+    assert [row['id'] for row in table.range('by_age', low=10)] == ['1']
+
+    # Unchanged TOAST values are kept, and the old values leave the indexes
+    table.apply('U', {'new': {'id': '1', 'email': 'c@x.com', 'age': '31', 'bio': None}, 'unchanged_toast': ['bio']})
+    assert table.get('1')['bio'] == 'long'
+    assert table.find('by_email', 'a@x.com') == []
+    assert changes[-1] == (
+        'U', {'id': '1', 'email': 'a@x.com', 'age': '30', 'bio': 'long'}, {'id': '1', 'email': 'c@x.com', 'age': '31', 'bio': 'long'}
+    )
+
+    # A key change moves the row
+    table.apply('U', {'old': {'id': '2'}, 'new': {'id': '4', 'email': 'b@x.com', 'age': '9'}})
+    assert table.get(2) is None and table.get(4)['age'] == '9'
+
+    table.apply('D', {'old': {'id': '3'}})
+    assert [row['id'] for row in table.find('by_email', 'b@x.com')] == ['4']
+
+    # wal2json changes are applied with text values
+    table.apply('I', {'columns': [{'name': 'id', 'value': 5}, {'name': 'email', 'value': 'e@x.com'}, {'name': 'age', 'value': 50}]})
+    table.apply('D', {'identity': [{'name': 'id', 'value': 4}]})
+    assert table.get(5) == {'id': '5', 'email': 'e@x.com', 'age': '50'}
+    assert [row['id'] for row in table.range('by_age')] == ['1', '5']
+
+    table.apply('T', {'relation_ids': [16441]})
+    assert len(table) == 0 and table.range('by_age') == [] and changes[-1] == ('T', None, None)
+    assert [change[0] for change in changes] == ['I', 'I', 'I', 'U', 'U', 'D', 'I', 'D', 'T']
+
+
+# Test a failing subscriber does not stop the others, and unsubscribed ones are not called
+def test_materialized_table_subscribers():
+    table = create_table()
+    failing = mock.MagicMock(side_effect=RuntimeError('failed'))
+    subscriber = mock.MagicMock()
+    table.subscribe(failing)
+    table.subscribe(subscriber)
+
+    assert table.apply('I', {'new': {'id': '1', 'email': 'a@x.com', 'age': '30'}})
+    subscriber.assert_called_once_with('I', None, {'id': '1', 'email': 'a@x.com', 'age': '30'})
+
+    table.unsubscribe(subscriber)
+    table.apply('D', {'old': {'id': '1'}})
+    assert subscriber.call_count == 1 and failing.call_count == 2
+
+    # Changes without a key value and other message types are ignored
+    assert not table.apply('D', {'old': {'email': 'a@x.com'}})
+    assert not table.apply('M', {'prefix': 'audit'})
+
+    with pytest.raises(ValueError):
+        table.range('by_email', 'a')
+
+    with pytest.raises(ValueError):
+        MaterializedTable.from_config({'table': 'public.users', 'indexes': [{'name': 'by_age', 'columns': ['age'], 'type': 'date'}]})
+
+    with pytest.raises(ConnectionError):
+        MaterializedTable.from_config({'key': ['id']})
+
+
+# Test the consumer seeds its materialized tables and applies changes before perform_action
+def test_materialized_tables_process_incoming_message(insert_payload, mocked_schema):
+    config = dict(parse_yaml_config('pg-streamline-config.yaml'), materialized_tables=[
+        {'table': 'public.users', 'indexes': [{'name': 'by_email', 'columns': ['email']}]}
+    ])
+
+    with mock.patch('pg_streamline.consumer.process.parse_yaml_config', return_value=config), \
+            mock.patch('psycopg2.connect') as connect:
+        cursor = connect.return_value.cursor.return_value
+        cursor.fetchone.return_value = (['id'],)
+        cursor.description = [('id',), ('email',)]
+        cursor.fetchall.return_value = [('1', 'a@x.com')]
+        consumer = ExtendedConsumer()
+
+    table = consumer.materialized_tables['public.users']
+    assert table.key_columns == ['id'] and table.get(1) == {'id': '1', 'email': 'a@x.com'}
+
+    consumer.conn_pool = mock.MagicMock()
+    consumer.conn_pool.getconn.return_value.cursor.return_value.fetchall.return_value = mocked_schema
+    seen = []
+
+    with mock.patch.object(consumer, 'perform_action', side_effect=lambda *args: seen.append(len(table))):
+        consumer.process_incoming_message('public.users', insert_payload.payload)
+
+    assert seen == [2]
+    assert table.find('by_email', 'johnboss2002@dummy.com')[0]['id'] == '2ea2efd6-f0f1-4091-bce2-40dcdb8d2c5e'
@@ -0,0 +1,129 @@
+import urllib.request
+from unittest import mock
+
+import pytest
+
+from pg_streamline.metrics import MetricsRegistry, NullRegistry, create_metrics_registry
+from pg_streamline.utils import parse_yaml_config
+from .conftest import ExtendedConsumer, PGOutputProducer
+
+
+METRICS_CONFIG = dict(parse_yaml_config('pg-streamline-config.yaml'), metrics={'enabled': True})
+
+
+# Test counters, gauges and histograms render in the Prometheus text format
+def test_registry_render():
+    registry = MetricsRegistry()
+
+    messages = registry.counter('messages_total', 'Messages', ['table', 'operation'])
+    messages.inc(1, 'public.users', 'INSERT')
+    messages.inc(2, 'public.users', 'INSERT')
+    assert registry.counter('messages_total', 'Messages', ['table', 'operation']) is messages
+
+    depth = registry.gauge('queue_depth', 'Depth')
+    depth.set(5)
+    depth.inc(-2)
+    registry.gauge('pending', 'Pending').set_function(lambda: 7)
+
+    latency = registry.histogram('latency_seconds', 'Latency', ['table'], buckets=(0.1, 1.0))
+    latency.observe(0.05, 'public "users"')
+    latency.observe(0.5, 'public "users"')
+    latency.observe(5, 'public "users"')
+
+    text = registry.render()
+
+    assert '# TYPE messages_total counter' in text
+    assert 'messages_total{table="public.users",operation="INSERT"} 3' in text
+    assert 'queue_depth 3' in text
+    assert 'pending 7' in text
+    assert 'latency_seconds_bucket{table="public \\"users\\"",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{table="public \\"users\\"",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{table="public \\"users\\""} 3' in text
+
+    snapshot = registry.snapshot()
+    assert snapshot['messages_total'] == {'public.users,INSERT': 3}
+    assert snapshot['latency_seconds']['public "users"']['sum'] == 5.55
+
+    with pytest.raises(ValueError):
+        registry.gauge('messages_total', 'Messages')
+
+
+# Test the built-in HTTP endpoint serves the registry
+def test_registry_http_server():
+    registry = create_metrics_registry({'enabled': True, 'port': 0, 'host': '127.0.0.1'})
+    registry.counter('requests_total', 'Requests').inc()
+
+    server = registry._MetricsRegistry__server
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    try:
+        with urllib.request.urlopen(f'{url}/metrics') as response:
+            assert 'requests_total 1' in response.read().decode('utf-8')
+
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f'{url}/other')
+    finally:
+        registry.stop_http_server()
+
+
+# Test disabled metrics use a shared no-op registry
+def test_null_registry():
+    registry = create_metrics_registry(None)
+    assert isinstance(registry, NullRegistry)
+    assert isinstance(create_metrics_registry({'enabled': False}), NullRegistry)
+
+    metric = registry.histogram('latency_seconds', 'Latency')
+    assert metric is registry.counter('messages_total', 'Messages')
+    metric.observe(1)
+    metric.inc()
+    metric.set(1)
+    metric.set_function(lambda: 1)
+    registry.stop_http_server()
+
+    assert registry.render() == ''
+    assert registry.snapshot() == {}
+
+
+# Test producer metrics for table lookups, publishing and feedback
+def test_producer_metrics(insert_payload):
+    with mock.patch('pg_streamline.producer.process.parse_yaml_config', return_value=METRICS_CONFIG):
+        with mock.patch('psycopg2.connect'):
+            producer = PGOutputProducer()
+
+    producer.conn_pool = mock.MagicMock()
+    producer.conn_pool.getconn.return_value.cursor.return_value.fetchone.return_value = ('public', 'users')
+    producer.replication_cursor = mock.MagicMock()
+
+    producer._Producer__process_pgoutput_change(insert_payload)
+
+    snapshot = producer.metrics.snapshot()
+    assert snapshot['pg_streamline_producer_messages_total'] == {'public.users,INSERT': 1}
+    assert snapshot['pg_streamline_producer_bytes_total'] == {'public.users,INSERT': len(insert_payload.payload)}
+    assert snapshot['pg_streamline_producer_catalog_lookup_seconds']['']['count'] == 1
+    assert snapshot['pg_streamline_producer_publish_seconds']['public.users']['count'] == 1
+    assert snapshot['pg_streamline_producer_feedback_lsn'] == {'': 124122}
+
+
+# Test consumer metrics for parsing, catalog lookups and errors
+def test_consumer_metrics(insert_payload, mocked_schema):
+    with mock.patch('pg_streamline.consumer.process.parse_yaml_config', return_value=METRICS_CONFIG):
+        with mock.patch('psycopg2.connect'):
+            consumer = ExtendedConsumer()
+
+    consumer.conn_pool = mock.MagicMock()
+    consumer.conn_pool.getconn.return_value.cursor.return_value.fetchall.return_value = mocked_schema
+
+    consumer.process_incoming_message('public.users', insert_payload.payload)
+
+    snapshot = consumer.metrics.snapshot()
+    assert snapshot['pg_streamline_consumer_messages_total'] == {'public.users,I': 1}
+    assert snapshot['pg_streamline_consumer_bytes_total'] == {'public.users,I': len(insert_payload.payload)}
+    assert snapshot['pg_streamline_consumer_parse_seconds']['public.users']['count'] == 1
+    assert snapshot['pg_streamline_consumer_catalog_lookup_seconds']['public.users']['count'] == 1
+    assert snapshot['pg_streamline_consumer_action_seconds']['public.users']['count'] == 1
+
+    with mock.patch.object(consumer, 'perform_action', side_effect=Exception('Handler failed')):
+        with pytest.raises(Exception, match='Handler failed'):
+            consumer.process_incoming_message('public.users', insert_payload.payload)
+
+    assert consumer.metrics.snapshot()['pg_streamline_consumer_errors_total'] == {'public.users': 1}
@@ -0,0 +1,123 @@
+import time
+from unittest import mock
+
+from pg_streamline.metrics import MetricsRegistry
+from pg_streamline.producer.monitor import SlotMonitor
+from pg_streamline.utils import Utils
+from .conftest import PGOutputProducer
+
+
+def mock_slot_row(connect, row):
+    cursor = connect.return_value.cursor.return_value.__enter__.return_value
+    cursor.fetchone.return_value = row
+    return cursor
+
+
+# Test LSN and timestamp conversions
+def test_utils_conversions():
+    assert Utils.convert_lsn_to_int('16/B374D848') == (0x16 << 32) + 0xB374D848
+    assert Utils.convert_pg_timestamp_to_epoch(0) == 946684800
+
+
+# Test a sample combines slot state with the producer's local positions
+def test_slot_monitor_sample(pgo_producer_instance: PGOutputProducer):
+    pgo_producer_instance.conn_pool = mock.MagicMock()
+    pgo_producer_instance.received_lsn = 600
+    pgo_producer_instance.feedback_lsn = 400
+    pgo_producer_instance.replay_delay = 2.5
+
+    monitor = SlotMonitor(pgo_producer_instance, thresholds={'retained_bytes': 512, 'replay_delay': 5})
+    alerts = []
+    monitor.add_callback(lambda name, value, threshold, metrics: alerts.append((name, value, threshold)))
+
+    with mock.patch('psycopg2.connect') as connect:
+        cursor = mock_slot_row(connect, (True, '0/200', '0/100', '0/500', 1024, 768))
+        metrics = monitor.sample()
+        monitor.sample()
+
+    # The monitor queries on its own connection, not the producer's pool shared with replication
+    connect.assert_called_once_with(**pgo_producer_instance.params)
+    assert not pgo_producer_instance.conn_pool.getconn.called
+    assert cursor.execute.call_args.args[1] == ('pgtest',)
+    assert metrics['confirmed_flush_lsn'] == 0x200
+    assert metrics['restart_lsn'] == 0x100
+    assert metrics['retained_bytes'] == 1024
+    assert metrics['feedback_lag_bytes'] == 200
+    assert metrics['replay_delay'] == 2.5
+    assert alerts == [('retained_bytes', 1024, 512)] * 2
+    assert monitor.get_metrics()['retained_bytes'] == 1024
+
+    monitor.stop()
+    connect.return_value.close.assert_called_once()
+
+
+# Test a missing slot yields only local metrics
+def test_slot_monitor_missing_slot(pgo_producer_instance: PGOutputProducer):
+    with mock.patch('psycopg2.connect') as connect:
+        mock_slot_row(connect, None)
+        metrics = SlotMonitor(pgo_producer_instance).sample()
+
+    assert 'retained_bytes' not in metrics
+    assert metrics['feedback_lag_bytes'] == 0
+
+
+# Test the background thread samples on interval and keeps running after errors
+def test_slot_monitor_thread(pgo_producer_instance: PGOutputProducer):
+    monitor = SlotMonitor(pgo_producer_instance, interval=0.01)
+
+    with mock.patch.object(monitor, 'sample', side_effect=[Exception('Database unavailable'), {}, {}, {}]) as mock_sample, \
+            mock.patch('psycopg2.connect') as connect:
+        monitor.start()
+        time.sleep(0.1)
+        monitor.stop()
+
+    assert mock_sample.call_count >= 2
+    connect.return_value.close.assert_called_once()
+
+
+# Test Begin and Commit messages update commit time and replay delay
+def test_producer_transaction_timing(pgo_producer_instance: PGOutputProducer):
+    pgo_producer_instance.conn_pool = mock.MagicMock()
+    pgo_producer_instance.replication_cursor = mock.MagicMock()
+    commit_time = int((time.time() - 946684800 - 3) * 1000000)
+
+    begin = mock.MagicMock()
+    begin.payload = b'B' + (900).to_bytes(8, 'big') + commit_time.to_bytes(8, 'big') + (7).to_bytes(4, 'big')
+    begin.data_start = 800
+    pgo_producer_instance._Producer__process_pgoutput_change(begin)
+
+    assert pgo_producer_instance.commit_lsn == 900
+    assert abs(pgo_producer_instance.commit_timestamp - (time.time() - 3)) < 1
+
+    commit = mock.MagicMock()
+    commit.payload = b'C\x00' + (900).to_bytes(8, 'big') + (950).to_bytes(8, 'big') + commit_time.to_bytes(8, 'big')
+    commit.data_start = 950
+    pgo_producer_instance._Producer__process_pgoutput_change(commit)
+
+    assert 2 < pgo_producer_instance.replay_delay < 5
+    assert pgo_producer_instance.received_lsn == 950
+    assert pgo_producer_instance.feedback_lsn == 950
+
+
+# Test the producer starts and stops the monitor when configured
+def test_producer_monitor_config(pgo_producer_instance: PGOutputProducer):
+    with mock.patch('pg_streamline.producer.process.parse_yaml_config') as mock_config:
+        mock_config.return_value = dict(pgo_producer_instance.config, monitor={'interval': 60, 'thresholds': {'retained_bytes': 1}})
+
+        with mock.patch('psycopg2.connect'):
+            producer = PGOutputProducer()
+
+    assert producer.slot_monitor.thresholds == {'retained_bytes': 1}
+
+    with mock.patch('sys.exit'):
+        producer._Producer__terminate()
+
+
+# Test samples are exported as gauges when metrics are enabled
+def test_slot_monitor_gauges(pgo_producer_instance: PGOutputProducer):
+    pgo_producer_instance.metrics = MetricsRegistry()
+    with mock.patch('psycopg2.connect') as connect:
+        mock_slot_row(connect, (True, '0/200', '0/100', '0/500', 1024, 768))
+        SlotMonitor(pgo_producer_instance).sample()
+
+    assert pgo_producer_instance.metrics.snapshot()['pg_streamline_slot_retained_bytes'] == {'pgtest': 1024}
@@ -6,7 +6,21 @@ from pg_streamline import (
     UpdateMessage,
     DeleteMessage
 )
+from pg_streamline.parser import protocol
 from pg_streamline.parser.base import BaseMessage
+from pg_streamline.parser.protocol import (
+    LogicalMessage,
+    TruncateMessage,
+    decode_message,
+    register_decoder,
+    relation_ids
+)
+from pg_streamline.parser.relation import RelationMessage
+from pg_streamline.parser.schema import SchemaRegistry
+from pg_streamline.parser.toast import KEY_COLUMNS_QUERY, RowStateCache
+from pg_streamline.parser.types import TypeCatalog, parse_array, parse_composite, parse_range
+from pg_streamline.parser.wal2json import Wal2JsonMessage
+from tests.conftest import relation_message
 
 
 # Test InsertMessage decoding
@@ -89,3 +103,345 @@ def test_decode_tuple_null_and_unchanged():
 
         # Assertions
         assert result == {'col1': None, 'col2': None}
+
+
+# Test Wal2JsonMessage full and lazy decoding
+def test_wal2json_message(wal2json_v2_payload):
+    message = Wal2JsonMessage(wal2json_v2_payload.payload)
+    assert message.action == 'I'
+    assert message.table_name == 'public.users'
+    assert message.decode()['columns'][1]['value'] == '"schema":"fake"'
+
+    lazy_message = Wal2JsonMessage(wal2json_v2_payload.payload, lazy=True)
+    assert lazy_message.table_name == 'public.users'
+    assert lazy_message.decode() == message.decode()
+
+    escaped = Wal2JsonMessage(b'{"action":"D","schema":"public","table":"odd\\"name","identity":[]}', lazy=True)
+    assert escaped.table_name == 'public.odd"name'
+
+    commit = Wal2JsonMessage(b'{"action":"C"}', lazy=True)
+    assert commit.action == 'C'
+    assert commit.table_name is None
+
+
+# Test decoding of the pgoutput messages that carry no tuple
+def test_protocol_messages():
+    begin = b'B' + (0x16B3748).to_bytes(8, 'big') + (0).to_bytes(8, 'big') + (750).to_bytes(4, 'big')
+    assert decode_message(begin) == {'message_type': 'B', 'final_lsn': 0x16B3748, 'commit_time': 946684800.0, 'xid': 750}
+
+    commit = b'C\x00' + (0x16B3748).to_bytes(8, 'big') + (0x16B3778).to_bytes(8, 'big') + (1000000).to_bytes(8, 'big')
+    assert decode_message(commit) == {
+        'message_type': 'C', 'flags': 0, 'commit_lsn': 0x16B3748, 'end_lsn': 0x16B3778, 'commit_time': 946684801.0
+    }
+
+    origin = b'O' + (0x2000).to_bytes(8, 'big') + b'node_b\x00'
+    assert decode_message(origin) == {'message_type': 'O', 'origin_lsn': 0x2000, 'origin_name': 'node_b'}
+
+    type_message = b'Y' + (16390).to_bytes(4, 'big') + b'public\x00mood\x00'
+    assert decode_message(type_message) == {
+        'message_type': 'Y', 'type_id': 16390, 'namespace': 'public', 'type_name': 'mood'
+    }
+
+    # Unknown message types are left to registered decoders
+    assert decode_message(b'S\x00') is None
+
+
+# Test Truncate messages with several relations and their options
+def test_truncate_message():
+    payload = b'T' + (2).to_bytes(4, 'big') + b'\x03' + (16384).to_bytes(4, 'big') + (16390).to_bytes(4, 'big')
+
+    assert TruncateMessage(payload).decode_truncate_message() == {
+        'message_type': 'T', 'relation_ids': [16384, 16390], 'cascade': True, 'restart_identity': True
+    }
+    assert relation_ids(payload) == [16384, 16390]
+    assert relation_ids(b'I' + (16384).to_bytes(4, 'big') + b'N') == [16384]
+    assert relation_ids(b'B') == []
+
+    plain = b'T' + (1).to_bytes(4, 'big') + b'\x00' + (16384).to_bytes(4, 'big')
+    assert decode_message(plain)['cascade'] is False
+
+
+# Test logical decoding messages and decoder registration
+def test_logical_message():
+    payload = b'M\x01' + (0x3000).to_bytes(8, 'big') + b'audit\x00' + (5).to_bytes(4, 'big') + b'hello'
+
+    assert LogicalMessage(payload).decode_logical_message() == {
+        'message_type': 'M', 'transactional': True, 'lsn': 0x3000, 'prefix': 'audit', 'content': b'hello'
+    }
+
+    with mock.patch.dict(protocol.DECODERS):
+        register_decoder('S', lambda message, cursor: {'message_type': 'S'})
+        assert decode_message(b'S\x00') == {'message_type': 'S'}
+
+    assert 'S' not in protocol.DECODERS
+
+
+# Test the array, composite and range literal parsers
+def test_type_parsers():
+    assert parse_array('{1,2,NULL}', int) == [1, 2, None]
+    assert parse_array('{{"a b",c},{"x\\"y",NULL}}') == [['a b', 'c'], ['x"y', None]]
+    assert parse_array('[0:1]={1,2}', int) == [1, 2]
+    assert parse_array('{}') == []
+    assert parse_array('{(0,0),(1,1);(2,2),(3,3)}', delimiter=';') == ['(0,0),(1,1)', '(2,2),(3,3)']
+
+    assert parse_composite('(1,"a b",,"x""y")', ['a', 'b', 'c', 'd'], [int, str, str, str]) == {
+        'a': 1, 'b': 'a b', 'c': None, 'd': 'x"y'
+    }
+
+    assert parse_range('[1,5)', int) == {'lower': 1, 'upper': 5, 'lower_inc': True, 'upper_inc': False, 'empty': False}
+    assert parse_range('(,"2024-01-01 00:00:00")')['lower'] is None
+    assert parse_range('empty')['empty'] is True
+
+
+# Test TypeCatalog loads types in bulk and decodes rows with parsers cached per type OID
+def test_type_catalog():
+    cursor = mock.MagicMock()
+    cursor.fetchall.return_value = [
+        (23, 'int4', 'b', 'N', 0, ',', 0, None, None, None, None),
+        (25, 'text', 'b', 'S', 0, ',', 0, None, None, None, None),
+        (1007, '_int4', 'b', 'A', 23, ',', 0, None, None, None, None),
+        (3904, 'int4range', 'r', 'R', 0, ',', 0, 23, None, None, None),
+        (16400, 'mood', 'e', 'E', 0, ',', 0, None, ['sad', 'happy'], None, None),
+        (16410, 'address', 'c', 'C', 0, ',', 0, None, None, ['street', 'number'], [25, 23]),
+        (16409, '_address', 'b', 'A', 16410, ',', 0, None, None, None, None)
+    ]
+
+    catalog = TypeCatalog()
+    assert catalog.preload(cursor, ['events']) == 7
+    assert cursor.execute.call_args.args[1] == (['events'],)
+    assert catalog.types[16400].labels == ['sad', 'happy']
+
+    columns = [
+        {'name': 'id', 'type': 23},
+        {'name': 'tags', 'type': 1007},
+        {'name': 'span', 'type': 3904},
+        {'name': 'mood', 'type': 16400},
+        {'name': 'addresses', 'type': 16409},
+        {'name': 'note', 'type': 25}
+    ]
+    row = {
+        'id': '1',
+        'tags': '{1,NULL,3}',
+        'span': '[1,10)',
+        'mood': 'happy',
+        'addresses': '{"(\\"Main St\\",1)","(,)"}',
+        'note': None
+    }
+
+    assert catalog.decode_row(columns, row) == {
+        'id': '1',
+        'tags': [1, None, 3],
+        'span': {'lower': 1, 'upper': 10, 'lower_inc': True, 'upper_inc': False, 'empty': False},
+        'mood': 'happy',
+        'addresses': [{'street': 'Main St', 'number': 1}, {'street': None, 'number': None}],
+        'note': None
+    }
+    assert catalog.parser(1007) is catalog.parser(1007)
+
+    # Types of relations published later are loaded on first use
+    cursor.fetchall.return_value = [(1009, '_text', 'b', 'A', 25, ',', 0, None, None, None, None)]
+    assert catalog.decode_row([{'name': 'names', 'type': 1009}], {'names': '{a,"b c"}'}, cursor) == {'names': ['a', 'b c']}
+    assert cursor.execute.call_args.args[1] == ([1009],)
+
+
+def tuple_data(*values):
+    """Encode pgoutput TupleData, None for NULL and ... for unchanged TOAST values."""
+    data = len(values).to_bytes(2, 'big')
+
+    for value in values:
+        if value is None:
+            data += b'n'
+        elif value is Ellipsis:
+            data += b'u'
+        else:
+            data += b't' + len(value).to_bytes(4, 'big') + value
+
+    return data
+
+
+# Test unchanged TOAST values are reported as unchanged instead of changed to None
+def test_update_unchanged_toast():
+    cursor = mock.MagicMock()
+    cursor.fetchall.return_value = [('id', 23), ('status', 25), ('document', 3802)]
+    payload = b'U' + (16384).to_bytes(4, 'big') + b'O' + tuple_data(b'1', b'new', b'{"a": 1}') + b'N' + tuple_data(b'1', b'paid', ...)
+
+    parsed_message = UpdateMessage(payload, cursor=cursor).decode_update_message()
+
+    assert parsed_message['new']['document'] is None
+    assert parsed_message['unchanged_toast'] == ['document']
+    assert parsed_message['diff'] == {'status': {'old_value': 'new', 'new_value': 'paid'}}
+
+
+# Test RowStateCache restores unchanged TOAST values from the last image of the row
+def test_row_state_cache():
+    cursor = mock.MagicMock()
+    cursor.fetchone.return_value = (['id'],)
+    columns = [{'name': 'id', 'type': 23}, {'name': 'status', 'type': 25}, {'name': 'document', 'type': 3802}]
+    cache = RowStateCache(max_bytes=4096)
+
+    cache.apply({'message_type': 'I', 'relation_id': 16384, 'new': {'id': '1', 'status': 'new', 'document': 'x' * 500}}, columns, cursor)
+
+    update = {
+        'message_type': 'U',
+        'relation_id': 16384,
+        'old': {},
+        'new': {'id': '1', 'status': 'paid', 'document': None},
+        'diff': {},
+        'unchanged_toast': ['document']
+    }
+    assert cache.apply(update, columns, cursor) == {'document'}
+    assert update['new']['document'] == 'x' * 500
+    assert (cache.hits, cache.misses) == (1, 0)
+
+    # The primary key is looked up once per relation
+    cursor.execute.assert_called_once_with(KEY_COLUMNS_QUERY, (16384,))
+
+    # Rows that were never seen are left as None
+    unseen = dict(update, old={}, new={'id': '2', 'status': 'paid', 'document': None})
+    assert cache.apply(unseen, columns, cursor) == set()
+    assert cache.misses == 1
+
+    cache.apply({'message_type': 'D', 'relation_id': 16384, 'old': {'id': '1', 'status': None, 'document': None}}, columns, cursor)
+    assert len(cache) == 1
+
+    # Least recently used rows are evicted beyond the byte budget
+    for key in range(3, 20):
+        cache.apply({'message_type': 'I', 'relation_id': 16384, 'new': {'id': str(key), 'status': 's', 'document': 'y' * 500}}, columns, cursor)
+
+    assert cache.size_bytes <= cache.max_bytes
+    assert 0 < len(cache) < 18
+
+    cache.forget_relation(16384)
+    assert (len(cache), cache.size_bytes) == (0, 0)
+
+    # Relations without a primary key are not cached
+    cursor.fetchone.return_value = None
+    assert cache.apply(dict(update, relation_id=16390), columns, cursor) == set()
+    assert len(cache) == 0
+
+    with pytest.raises(ValueError):
+        RowStateCache(max_bytes=0)
+
+
+# Test updates and deletes with each REPLICA IDENTITY: no old tuple, key-only ('K') and full ('O')
+def test_replica_identity_variants():
+    cursor = mock.MagicMock()
+    cursor.fetchall.return_value = [('id', 23), ('status', 25), ('total', 1700)]
+    relation = (16384).to_bytes(4, 'big')
+    new = b'N' + tuple_data(b'2', b'paid', b'10.00')
+
+    # DEFAULT, key unchanged: only the new tuple is sent
+    parsed_message = UpdateMessage(b'U' + relation + new, cursor=cursor).decode_update_message()
+    assert parsed_message['old'] == {}
+    assert parsed_message['new'] == {'id': '2', 'status': 'paid', 'total': '10.00'}
+    assert parsed_message['diff'] == {}
+
+    # DEFAULT, key changed: the old key is sent with the other columns as NULL
+    payload = b'U' + relation + b'K' + tuple_data(b'1', None, None) + new
+    parsed_message = UpdateMessage(payload, cursor=cursor).decode_update_message()
+    assert parsed_message['old'] == {'id': '1'}
+    assert parsed_message['diff'] == {'id': {'old_value': '1', 'new_value': '2'}}
+
+    # FULL: the whole old row
+    payload = b'U' + relation + b'O' + tuple_data(b'2', b'new', None) + new
+    parsed_message = UpdateMessage(payload, cursor=cursor).decode_update_message()
+    assert parsed_message['diff'] == {
+        'status': {'old_value': 'new', 'new_value': 'paid'},
+        'total': {'old_value': None, 'new_value': '10.00'}
+    }
+
+    payload = b'D' + relation + b'K' + tuple_data(b'2', None, None)
+    assert DeleteMessage(payload, cursor=cursor).decode_delete_message()['old'] == {'id': '2'}
+
+    payload = b'D' + relation + b'O' + tuple_data(b'2', b'paid', None)
+    assert DeleteMessage(payload, cursor=cursor).decode_delete_message()['old'] == {'id': '2', 'status': 'paid', 'total': None}
+
+
+# Test RowStateCache rebuilds old images and diffs of tables without REPLICA IDENTITY FULL
+def test_row_state_cache_old_image():
+    cursor = mock.MagicMock()
+    cursor.fetchall.return_value = [('id', 23), ('status', 25), ('total', 1700)]
+    cursor.fetchone.return_value = (['id'],)
+    relation = (16384).to_bytes(4, 'big')
+    cache = RowStateCache()
+
+    def apply(message):
+        cache.apply(message, [{'name': 'id'}, {'name': 'status'}, {'name': 'total'}], cursor)
+        return message
+
+    apply(InsertMessage(b'I' + relation + b'N' + tuple_data(b'1', b'new', b'10.00'), cursor=cursor).decode_insert_message())
+
+    update = apply(UpdateMessage(b'U' + relation + b'N' + tuple_data(b'1', b'paid', b'10.00'), cursor=cursor).decode_update_message())
+    assert update['old'] == {'id': '1', 'status': 'new', 'total': '10.00'}
+    assert update['diff'] == {'status': {'old_value': 'new', 'new_value': 'paid'}}
+
+    # The key changed, the row is found under its old key and moved
+    payload = b'U' + relation + b'K' + tuple_data(b'1', None, None) + b'N' + tuple_data(b'3', b'paid', b'12.00')
+    update = apply(UpdateMessage(payload, cursor=cursor).decode_update_message())
+    assert update['diff'] == {'id': {'old_value': '1', 'new_value': '3'}, 'total': {'old_value': '10.00', 'new_value': '12.00'}}
+
+    delete = apply(DeleteMessage(b'D' + relation + b'K' + tuple_data(b'3', None, None), cursor=cursor).decode_delete_message())
+    assert delete['old'] == {'id': '3', 'status': 'paid', 'total': '12.00'}
+    assert len(cache) == 0
+
+
+# Test SchemaRegistry versions Relation messages and parsers decode with a registered version
+def test_schema_registry(tmp_path, relation_payload, insert_payload, insert_response):
+    path = str(tmp_path / 'schemas.json')
+    registry = SchemaRegistry(path=path)
+    relation = RelationMessage(relation_payload.payload).decode_relation_message()
+
+    version = SchemaRegistry.version_of(SchemaRegistry.schema_of(relation))
+
+    assert registry.register(relation) == (version, True)
+    # The same schema sent again, e.g. after a reconnect, keeps its version
+    assert registry.register(relation) == (version, False)
+    assert (registry.latest(16441), registry.table_name(16441)) == (version, 'public.users')
+
+    cursor = mock.MagicMock()
+    parser = InsertMessage(insert_payload.payload, cursor=cursor, schema=registry.get(16441, version))
+    assert parser.decode_insert_message() == insert_response
+    assert parser.schema_lookup_time == 0.0
+    cursor.execute.assert_not_called()
+
+    # ALTER TABLE users DROP COLUMN password: a new version, while the old one stays available
+    altered = RelationMessage(relation_message(16441, 'public.users', [
+        (column['name'], column['type']) for column in relation['columns'] if column['name'] != 'password'
+    ])).decode_relation_message()
+    altered_version, added = registry.register(altered)
+    assert added and altered_version not in (0, version) and registry.latest(16441) == altered_version
+    assert len(registry.get(16441, version)['columns']) == 7 and len(registry.get(16441, altered_version)['columns']) == 6
+
+    # Consumers register the versions assigned by the producer
+    consumer_registry = SchemaRegistry()
+    assert consumer_registry.register(relation, version=5) == (5, True)
+    assert consumer_registry.get(16441, 5) == registry.get(16441, version)
+    assert consumer_registry.get(16441, version) is None
+
+    # A producer restarted without persistence gives schemas the same versions, in a new order
+    restarted = SchemaRegistry()
+    assert restarted.register(altered) == (altered_version, True)
+    assert restarted.register(relation) == (version, True)
+
+    # Schemas with the same hash get different versions
+    third = RelationMessage(relation_message(16441, 'public.users', [('id', 2950)])).decode_relation_message()
+
+    with mock.patch.object(SchemaRegistry, 'version_of', return_value=version):
+        assert restarted.register(third) == (version + 1, True)
+
+    # A persisted registry knows its schemas, and the last registered one, after a restart
+    restarted = SchemaRegistry(path=path)
+    assert len(restarted) == 2 and restarted.latest(16441) == altered_version
+    assert restarted.register(relation) == (version, False)
+
+
+# Test catalog schema lookups leave out dropped columns
+def test_get_schema_dropped_columns(insert_payload):
+    cursor = mock.MagicMock()
+    cursor.fetchall.return_value = [('id', 2950)]
+
+    InsertMessage(insert_payload.payload, cursor=cursor)
+
+    cursor.execute.assert_called_once_with(
+        'SELECT attname, atttypid FROM pg_attribute WHERE attrelid = 16441 AND attnum > 0 AND NOT attisdropped ORDER BY attnum;'
+    )
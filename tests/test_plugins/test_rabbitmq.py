@@ -1,7 +1,13 @@
+import logging
 from unittest import mock
 
+import pika
 import pytest
 from pg_streamline.plugins.rabbitmq import RabbitMQProducer, RabbitMQConsumer
+from pg_streamline.plugins.rabbitmq.lanes import LaneScheduler, TokenBucket, create_lanes
+from pg_streamline.producer.context import ChangeContext
+from pg_streamline.tracing import Trace
+from pg_streamline.utils import parse_yaml_config
 
 # Test Producer class
 def test_producer_perform_action(rabbitmq_producer_instance: RabbitMQProducer):
@@ -87,7 +93,9 @@ def test_consumer_callback(rabbitmq_consumer_instance):
     with mock.patch.object(rabbitmq_consumer_instance, 'process_incoming_message', autospec=True) as mock_process_incoming_message:
         rabbitmq_consumer_instance.callback(mock_channel, mock_method, None, mock_body)
 
-        mock_process_incoming_message.assert_called_once_with('test_routing_key', mock_body)
+        mock_process_incoming_message.assert_called_once_with(
+            'test_routing_key', mock_body, position=None, check_duplicate=True, trace=None, schema_version=None
+        )
 
         mock_channel.basic_ack.assert_called_once_with(delivery_tag='some_tag')
 
@@ -97,7 +105,13 @@ def test_consumer_callback(rabbitmq_consumer_instance):
 
         rabbitmq_consumer_instance.callback(mock_channel, mock_method, None, mock_body)
 
-        mock_channel.basic_reject.assert_called_once_with(delivery_tag='some_tag', requeue=True)
+        # Failed messages go to the retry queue instead of being requeued
+        mock_channel.basic_reject.assert_not_called()
+        assert mock_channel.basic_ack.call_count == 2
+        publish = mock_channel.basic_publish.call_args.kwargs
+        assert publish['routing_key'] == 'pgtest.retry'
+        assert publish['properties'].headers['x-pg-streamline-attempts'] == 1
+        assert publish['properties'].headers['x-pg-streamline-routing-key'] == 'test_routing_key'
 
 
 def test_consumer_validate_config(rabbitmq_consumer_instance):
@@ -114,3 +128,276 @@ def test_consumer_validate_config(rabbitmq_consumer_instance):
         rabbitmq_consumer_instance._RabbitMQConsumer__validate_config()
 
     assert 'url is missing from the configuration file.' in str(excinfo.value)
+
+
+def test_consumer_callback_metrics(rabbitmq_consumer_instance):
+    mock_method = mock.MagicMock()
+    mock_method.routing_key = 'public.users'
+
+    with mock.patch.object(rabbitmq_consumer_instance, 'process_incoming_message'):
+        with mock.patch.object(rabbitmq_consumer_instance, '_RabbitMQConsumer__ack_metric') as mock_ack_metric:
+            rabbitmq_consumer_instance.callback(mock.MagicMock(), mock_method, None, b'test_body')
+
+    assert mock_ack_metric.observe.call_args.args[1] == 'public.users'
+
+
+# Test retried messages keep their table and are dead-lettered after max_attempts
+def test_consumer_callback_dead_letter(rabbitmq_consumer_instance):
+    mock_channel = mock.MagicMock()
+    mock_method = mock.MagicMock()
+    mock_method.routing_key = 'pgtest'
+    properties = mock.MagicMock()
+    properties.headers = {'x-pg-streamline-attempts': 4, 'x-pg-streamline-routing-key': 'public.users'}
+
+    with mock.patch.object(rabbitmq_consumer_instance, 'process_incoming_message', side_effect=ValueError('bad row')) as mock_process:
+        rabbitmq_consumer_instance.callback(mock_channel, mock_method, properties, b'test_body')
+
+    mock_process.assert_called_once_with('public.users', b'test_body', position=None, check_duplicate=False, trace=None, schema_version=None)
+    publish = mock_channel.basic_publish.call_args.kwargs
+    assert publish['exchange'] == 'pg-exchange.dead-letter'
+    assert publish['routing_key'] == 'public.users'
+    assert publish['properties'].headers['x-pg-streamline-attempts'] == 5
+    assert publish['properties'].headers['x-pg-streamline-error'] == 'ValueError: bad row'
+    mock_channel.basic_ack.assert_called_once()
+
+    # The message is requeued if it cannot be routed
+    mock_channel.reset_mock()
+    mock_channel.basic_publish.side_effect = Exception('Channel closed')
+
+    with mock.patch.object(rabbitmq_consumer_instance, 'process_incoming_message', side_effect=ValueError('bad row')):
+        rabbitmq_consumer_instance.callback(mock_channel, mock_method, properties, b'test_body')
+
+    mock_channel.basic_reject.assert_called_once_with(delivery_tag=mock_method.delivery_tag, requeue=True)
+
+
+# Test logical decoding messages, whose content is bytes, are logged and acknowledged instead of retried
+def test_consumer_callback_logical_message(rabbitmq_consumer_instance, caplog):
+    rabbitmq_consumer_instance.conn_pool = mock.MagicMock()
+    mock_channel = mock.MagicMock()
+    mock_method = mock.MagicMock()
+    mock_method.routing_key = 'audit'
+    message = b'M\x01' + (0x3000).to_bytes(8, 'big') + b'audit\x00' + (2).to_bytes(4, 'big') + b'{}'
+
+    with caplog.at_level(logging.INFO, logger='pg_streamline.plugins.rabbitmq.consumer'):
+        rabbitmq_consumer_instance.callback(mock_channel, mock_method, None, message)
+
+    mock_channel.basic_ack.assert_called_once_with(delivery_tag=mock_method.delivery_tag)
+    mock_channel.basic_publish.assert_not_called()
+    assert '"content": "b\'{}\'"' in caplog.text
+
+
+# Test the retry queue expires back into the consumer queue
+def test_consumer_retry_topology(rabbitmq_consumer_instance):
+    mock_channel = rabbitmq_consumer_instance.channel
+
+    retry_declare = [
+        call for call in mock_channel.queue_declare.call_args_list if call.kwargs['queue'] == 'pgtest.retry'
+    ][0]
+    assert retry_declare.kwargs['arguments'] == {
+        'x-message-ttl': 5000,
+        'x-dead-letter-exchange': '',
+        'x-dead-letter-routing-key': 'pgtest'
+    }
+    mock_channel.queue_bind.assert_any_call(exchange='pg-exchange.dead-letter', queue='pgtest.dead-letter', routing_key='#')
+
+
+# Test the producer stamps messages with their LSN, commit LSN and xid
+def test_producer_change_headers(rabbitmq_producer_instance: RabbitMQProducer, insert_payload):
+    producer = rabbitmq_producer_instance
+    producer.conn_pool = mock.MagicMock()
+    producer.conn_pool.getconn.return_value.cursor.return_value.fetchone.return_value = ('public', 'users')
+    producer.replication_cursor = mock.MagicMock()
+
+    begin = mock.MagicMock()
+    begin.payload = b'B' + (500).to_bytes(8, 'big') + (0).to_bytes(8, 'big') + (742).to_bytes(4, 'big')
+    begin.data_start = 124000
+
+    producer._Producer__process_pgoutput_change(begin)
+    producer._Producer__process_pgoutput_change(insert_payload)
+
+    headers = producer.channel.basic_publish.call_args.kwargs['properties'].headers
+    assert headers == {'x-pg-streamline-lsn': 124122, 'x-pg-streamline-commit-lsn': 500, 'x-pg-streamline-xid': 742}
+
+
+# Test the consumer reads the stream position and schema version from the headers
+def test_consumer_callback_position(rabbitmq_consumer_instance):
+    properties = mock.MagicMock()
+    properties.headers = {
+        'x-pg-streamline-lsn': 124122, 'x-pg-streamline-commit-lsn': 500, 'x-pg-streamline-xid': 742,
+        'x-pg-streamline-schema-version': 3
+    }
+    mock_method = mock.MagicMock()
+    mock_method.routing_key = 'public.users'
+
+    with mock.patch.object(rabbitmq_consumer_instance, 'process_incoming_message') as mock_process:
+        rabbitmq_consumer_instance.callback(mock.MagicMock(), mock_method, properties, b'test_body')
+
+    mock_process.assert_called_once_with(
+        'public.users', b'test_body', position=(500, 124122), check_duplicate=True, trace=None, schema_version=3
+    )
+
+
+# Test sampled changes are published with their trace timestamps
+def test_producer_trace_headers(rabbitmq_producer_instance: RabbitMQProducer):
+    context = ChangeContext(124122, 'public.users', commit_lsn=500, trace=Trace(100.0, 101.0))
+
+    with mock.patch.object(RabbitMQProducer, 'change_context', new_callable=mock.PropertyMock, return_value=context):
+        rabbitmq_producer_instance.perform_action('public.users', b'test_data')
+
+    headers = rabbitmq_producer_instance.channel.basic_publish.call_args.kwargs['properties'].headers
+    assert headers['x-pg-streamline-commit-time'] == 100.0
+    assert headers['x-pg-streamline-capture-time'] == 101.0
+    assert headers['x-pg-streamline-publish-time'] > 101.0
+
+
+# Test the token bucket refills at its rate up to its burst
+def test_token_bucket():
+    now = [0.0]
+    bucket = TokenBucket(2, burst=2, clock=lambda: now[0])
+    assert bucket.take() == 0.0 and bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(0.5)
+
+    now[0] = 10.0
+    assert bucket.take() == 0.0 and bucket.take() == 0.0
+    assert bucket.take() > 0
+
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+
+# Test high priority tables overtake bulk ones, while every table keeps its order
+def test_lane_scheduler():
+    lanes = create_lanes([{'name': 'critical', 'tables': ['public.users']}, {'name': 'default'}, {'name': 'bulk', 'tables': ['public.logs', 'public.events']}])
+    scheduler = LaneScheduler(lanes)
+
+    for index in range(3):
+        scheduler.put('public.logs', f'log-{index}')
+        scheduler.put('public.events', f'event-{index}')
+
+    scheduler.put('public.orders', 'order-0')
+    scheduler.put('public.users', 'user-0')
+    scheduler.put('public.users', 'user-1')
+    assert scheduler.pending_count == 9
+    assert scheduler.lane_for('public.orders').name == 'default'
+
+    taken = [scheduler.get()[2] for _ in range(9)]
+    assert taken == ['user-0', 'user-1', 'order-0', 'log-0', 'event-0', 'log-1', 'event-1', 'log-2', 'event-2']
+
+    scheduler.close()
+    assert scheduler.get() is None
+
+    with pytest.raises(ValueError):
+        create_lanes([{'name': 'critical', 'tables': ['public.users']}, {'name': 'bulk', 'tables': ['public.users']}, {'name': 'default'}])
+
+    with pytest.raises(ValueError):
+        create_lanes([{'name': 'critical', 'tables': ['public.users']}])
+
+    with pytest.raises(ConnectionError):
+        create_lanes([{'tables': ['public.users']}, {'name': 'default'}])
+
+
+# Test rate limited tables wait for tokens without holding back other tables
+def test_lane_scheduler_rate_limit():
+    now = [0.0]
+    lanes = create_lanes([{'name': 'default'}, {'name': 'bulk', 'tables': ['public.logs'], 'rate': 1, 'burst': 1}])
+    lanes[1].buckets['public.logs'] = TokenBucket(1, burst=1, clock=lambda: now[0])
+    scheduler = LaneScheduler(lanes)
+
+    scheduler.put('public.logs', 'log-0')
+    scheduler.put('public.logs', 'log-1')
+    assert scheduler.get()[2] == 'log-0'
+
+    # The next log waits for a token, an unlimited table is published meanwhile
+    scheduler.put('public.orders', 'order-0')
+    assert scheduler.get()[2] == 'order-0'
+
+    now[0] = 1.0
+    assert scheduler.get()[2] == 'log-1'
+
+
+def create_lanes_producer(config, connection):
+    connection.return_value.channel.side_effect = lambda: mock.MagicMock()
+
+    with mock.patch('pg_streamline.producer.process.parse_yaml_config', return_value=config), mock.patch('psycopg2.connect'):
+        producer = RabbitMQProducer()
+
+    producer.replication_cursor = mock.MagicMock()
+    return producer
+
+
+def lanes_config(**options):
+    config = dict(parse_yaml_config('pg-streamline-config.yaml'))
+    config['rabbitmq'] = dict(config['rabbitmq'], lanes=[{'name': 'critical', 'tables': ['public.users']}, {'name': 'bulk'}], **options)
+    return config
+
+
+def publish_change(producer, lsn, table_name):
+    with mock.patch.object(RabbitMQProducer, 'change_context', new_callable=mock.PropertyMock, return_value=ChangeContext(lsn, table_name)):
+        producer.perform_action(table_name, b'test_data')
+        producer.send_feedback(lsn)
+
+
+# Test lanes publish on their own channels, from the publisher's own connection, and feedback only covers published changes
+def test_producer_lanes():
+    with mock.patch('pika.BlockingConnection') as connection:
+        producer = create_lanes_producer(lanes_config(), connection)
+
+        for lsn, table_name in ((100, 'public.logs'), (200, 'public.users')):
+            publish_change(producer, lsn, table_name)
+
+        producer.perform_termination()
+
+    critical, bulk = producer.scheduler.lanes
+    assert critical.channel is not bulk.channel and critical.channel is not producer.channel
+    assert connection.call_count == 2
+    assert critical.channel.basic_publish.call_args.kwargs['routing_key'] == 'public.users'
+    assert bulk.channel.basic_publish.call_args.kwargs['routing_key'] == 'public.logs'
+    assert critical.channel.basic_publish.call_args.kwargs['properties'].headers['x-pg-streamline-lsn'] == 200
+    assert not producer.channel.basic_publish.called
+    assert producer.lsn_tracker.pending_count == 0
+    producer.replication_cursor.send_feedback.assert_called_with(flush_lsn=200)
+
+    config = lanes_config()
+    config['workers'] = {'processes': 2}
+
+    with pytest.raises(ValueError) as excinfo:
+        with mock.patch('pg_streamline.producer.process.parse_yaml_config', return_value=config), \
+                mock.patch('pika.BlockingConnection'), mock.patch('psycopg2.connect'):
+            RabbitMQProducer()
+
+    assert 'The workers section is not supported with rabbitmq lanes.' in str(excinfo.value)
+
+
+# Test a failed publish is retried on a new connection, and the producer stops once retries are exhausted
+def test_producer_lanes_publish_failures():
+    published = []
+
+    def basic_publish(**kwargs):
+        published.append(kwargs['routing_key'])
+
+        if len(published) == 1:
+            raise pika.exceptions.AMQPConnectionError('connection lost')
+
+    with mock.patch('pika.BlockingConnection') as connection:
+        producer = create_lanes_producer(lanes_config(publish_retry_backoff=0), connection)
+        connection.return_value.channel.side_effect = lambda: mock.MagicMock(**{'basic_publish.side_effect': basic_publish})
+        publish_change(producer, 100, 'public.users')
+        producer.perform_termination()
+
+    assert published == ['public.users', 'public.users']
+    assert connection.call_count == 3
+    producer.replication_cursor.send_feedback.assert_called_with(flush_lsn=100)
+
+    with mock.patch('pika.BlockingConnection') as connection:
+        producer = create_lanes_producer(lanes_config(publish_max_retries=1, publish_retry_backoff=0), connection)
+        connection.return_value.channel.side_effect = lambda: mock.MagicMock(**{'basic_publish.side_effect': ValueError('broken')})
+        publish_change(producer, 100, 'public.users')
+        producer._RabbitMQProducer__publisher.join(timeout=5)
+
+        # The change is never confirmed, and the next one fails the replication loop
+        with pytest.raises(ConnectionError) as excinfo:
+            publish_change(producer, 200, 'public.users')
+
+    assert 'The lane publisher stopped: broken' in str(excinfo.value)
+    assert producer.lsn_tracker.pending_count == 1
+    assert all(call.kwargs['flush_lsn'] == 0 for call in producer.replication_cursor.send_feedback.call_args_list)
@@ -2,8 +2,11 @@ import psycopg2
 import pytest
 from unittest import mock
 
-from .conftest import PGOutputProducer, Wal2jsonProducer
+from .conftest import PGOutputProducer, Wal2jsonProducer, relation_message
 from pg_streamline import Producer
+from pg_streamline.parser.relation import RelationMessage
+from pg_streamline.parser.schema import SchemaRegistry
+from pg_streamline.utils import parse_yaml_config
 
 
 # Test initialization of Producer
@@ -61,10 +64,12 @@ def test_process_pgoutput_change(pgo_producer_instance: PGOutputProducer, insert
         mock_cursor.fetchone.return_value = ('public', 'users')
 
         with mock.patch('pg_streamline.producer.process.logger.info') as mock_logging:
-            pgo_producer_instance._Producer__process_pgoutput_change(insert_payload)
+            with mock.patch.object(pgo_producer_instance.activity_log, 'record') as mock_record:
+                pgo_producer_instance._Producer__process_pgoutput_change(insert_payload)
 
-        # assert that mocker is called
-        mock_logging.assert_called()
+        # Changes are counted for the periodic summary instead of logged one by one
+        mock_record.assert_called_once_with('public.users', 'INSERT', insert_payload.data_start)
+        mock_logging.assert_not_called()
 
         # Test raise Exception
         mock_cursor.fetchone.return_value = None
@@ -75,12 +80,12 @@ def test_process_pgoutput_change(pgo_producer_instance: PGOutputProducer, insert
 
 
 def test_process_wal2json_change(wal2json_producer_instance: Wal2jsonProducer, insert_payload):
-    with mock.patch('pg_streamline.producer.process.logger.info') as mock_logging:
+    with mock.patch.object(wal2json_producer_instance.activity_log, 'record') as mock_record:
         wal2json_producer_instance._Producer__process_wal2json_change(insert_payload)
 
-        assert mock_logging.call_count == 2
+        mock_record.assert_called_once_with('wal2json', 'TRANSACTION', insert_payload.data_start)
 
-        mock_logging.side_effect = Exception('Failed to process change.')
+        mock_record.side_effect = Exception('Failed to process change.')
 
         with pytest.raises(Exception) as excinfo:
             wal2json_producer_instance._Producer__process_wal2json_change(insert_payload)
@@ -170,3 +175,154 @@ def test_validate_config(producer_instance: Producer):
         producer_instance._Producer__validate_config(config)
 
     assert 'Database name not found in config file.' in str(excinfo.value)
+
+
+# Test wal2json format-version 2 changes are routed by table
+def test_process_wal2json_v2_change(wal2json_producer_instance: Wal2jsonProducer, wal2json_v2_payload):
+    wal2json_producer_instance.wal2json_format_version = 2
+    wal2json_producer_instance.wal2json_lazy = True
+    wal2json_producer_instance.replication_cursor = mock.MagicMock()
+
+    with mock.patch.object(wal2json_producer_instance, 'perform_action') as mock_perform_action:
+        wal2json_producer_instance._Producer__process_wal2json_change(wal2json_v2_payload)
+
+        mock_perform_action.assert_called_once_with('public.users', wal2json_v2_payload.payload)
+
+        wal2json_v2_payload.payload = b'{"action":"B"}'
+        wal2json_producer_instance._Producer__process_wal2json_change(wal2json_v2_payload)
+
+        mock_perform_action.assert_called_once()
+
+    wal2json_producer_instance.wal2json_options = {'include-lsn': True}
+    wal2json_producer_instance.start_replication(publication_names=[], protocol_version='1')
+
+    wal2json_producer_instance.replication_cursor.start_replication.assert_called_once_with(
+        slot_name='pgtest', decode=False, options={'format-version': '2', 'include-lsn': 'True'}
+    )
+
+
+# Test Truncate, logical decoding and metadata messages of pgoutput
+def test_process_pgoutput_protocol_messages(pgo_producer_instance: PGOutputProducer, insert_payload):
+    mock_cursor = mock.MagicMock()
+    mock_cursor.fetchone.side_effect = [('public', 'users'), ('public', 'orders')]
+    pgo_producer_instance.conn_pool = mock.MagicMock()
+    pgo_producer_instance.conn_pool.getconn.return_value.cursor.return_value = mock_cursor
+
+    truncate = mock.MagicMock(
+        payload=b'T' + (2).to_bytes(4, 'big') + b'\x01' + (16384).to_bytes(4, 'big') + (16390).to_bytes(4, 'big'),
+        data_start=insert_payload.data_start
+    )
+    message = mock.MagicMock(
+        payload=b'M\x00' + (0).to_bytes(8, 'big') + b'audit\x00' + (2).to_bytes(4, 'big') + b'{}',
+        data_start=insert_payload.data_start
+    )
+    origin = mock.MagicMock(payload=b'O' + (0).to_bytes(8, 'big') + b'node_b\x00', data_start=insert_payload.data_start)
+
+    with mock.patch.object(pgo_producer_instance, 'perform_action') as mock_action, \
+            mock.patch.object(pgo_producer_instance, 'handle_origin') as mock_origin, \
+            mock.patch.object(pgo_producer_instance, 'send_feedback'):
+        # Hooks are bound when the producer is created
+        pgo_producer_instance._Producer__metadata_handlers['O'] = mock_origin
+
+        pgo_producer_instance._Producer__process_pgoutput_change(truncate)
+        pgo_producer_instance._Producer__process_pgoutput_change(message)
+        pgo_producer_instance._Producer__process_pgoutput_change(origin)
+
+    # One publish per truncated table, then the message under its prefix
+    assert mock_action.call_args_list == [
+        mock.call('public.users', truncate.payload),
+        mock.call('public.orders', truncate.payload),
+        mock.call('audit', message.payload)
+    ]
+    mock_origin.assert_called_once_with({'message_type': 'O', 'origin_lsn': 0, 'origin_name': 'node_b'})
+
+
+# Test transactions from excluded origins are dropped before decoding and the origin option is sent
+def test_origin_filter(insert_payload):
+    config = dict(parse_yaml_config('pg-streamline-config.yaml'), origin={'filter': 'none', 'exclude': ['pg_streamline']})
+    config['database'] = dict(config['database'], replication_plugin='pgoutput')
+
+    with mock.patch('pg_streamline.producer.process.parse_yaml_config', return_value=config), mock.patch('psycopg2.connect'):
+        producer = PGOutputProducer()
+
+    producer.conn_pool = mock.MagicMock()
+    producer.start_replication(['events'], '1')
+    assert producer.replication_cursor.start_replication.call_args.kwargs['options']['origin'] == 'none'
+
+    def message(payload):
+        return mock.MagicMock(payload=payload, data_start=insert_payload.data_start)
+
+    begin = message(b'B' + bytes(20))
+    origin = message(b'O' + bytes(8) + b'pg_streamline\x00')
+    other_origin = message(b'O' + bytes(8) + b'node_b\x00')
+    commit = message(b'C' + bytes(25))
+
+    with mock.patch.object(producer, 'perform_action') as mock_action, \
+            mock.patch.object(producer, 'send_feedback') as mock_feedback:
+        cursor = producer.conn_pool.getconn.return_value.cursor.return_value
+
+        for data in (begin, origin, insert_payload, commit):
+            producer._Producer__process_pgoutput_change(data)
+
+        # Nothing is decoded or published, but feedback still moves past the transaction
+        mock_action.assert_not_called()
+        cursor.execute.assert_not_called()
+        assert mock_feedback.call_count == 4
+
+        cursor.fetchone.return_value = ('public', 'users')
+
+        for data in (begin, other_origin, insert_payload, commit):
+            producer._Producer__process_pgoutput_change(data)
+
+        mock_action.assert_called_once_with('public.users', insert_payload.payload)
+
+    with pytest.raises(ValueError) as excinfo:
+        with mock.patch('pg_streamline.producer.process.parse_yaml_config', return_value=dict(config, origin={'filter': 'local'})), \
+                mock.patch('psycopg2.connect'):
+            PGOutputProducer()
+
+    assert 'Invalid origin filter: local' in str(excinfo.value)
+
+
+# Test Relation messages are published once per schema version and changes carry their version
+def test_schema_registry(relation_payload, insert_payload):
+    config = dict(parse_yaml_config('pg-streamline-config.yaml'), schema_registry={'enabled': True})
+    config['database'] = dict(config['database'], replication_plugin='pgoutput')
+
+    with mock.patch('pg_streamline.producer.process.parse_yaml_config', return_value=config), mock.patch('psycopg2.connect'):
+        producer = PGOutputProducer()
+
+    producer.conn_pool = mock.MagicMock()
+    cursor = producer.conn_pool.getconn.return_value.cursor.return_value
+    versions = []
+
+    def perform_action(table_name, data):
+        versions.append((table_name, data[:1], producer.change_context.schema_version))
+
+    altered = mock.MagicMock(payload=relation_message(16441, 'public.users', [('id', 2950), ('email', 25)]), data_start=124123)
+
+    with mock.patch.object(producer, 'perform_action', side_effect=perform_action), \
+            mock.patch.object(producer, 'handle_relation') as mock_handle_relation:
+        for data in (relation_payload, insert_payload, relation_payload, insert_payload, altered):
+            producer._Producer__process_pgoutput_change(data)
+
+    version, altered_version = [
+        SchemaRegistry.version_of(SchemaRegistry.schema_of(RelationMessage(data.payload).decode_relation_message()))
+        for data in (relation_payload, altered)
+    ]
+    assert versions == [
+        ('public.users', b'R', version), ('public.users', b'I', version), ('public.users', b'I', version),
+        ('public.users', b'R', altered_version)
+    ]
+    assert mock_handle_relation.call_count == 3
+
+    # The table name comes from the Relation message
+    cursor.execute.assert_not_called()
+
+    config['database'] = dict(config['database'], replication_plugin='wal2json')
+
+    with pytest.raises(ValueError) as excinfo:
+        with mock.patch('pg_streamline.producer.process.parse_yaml_config', return_value=config), mock.patch('psycopg2.connect'):
+            Wal2jsonProducer()
+
+    assert 'schema_registry section requires the pgoutput plugin' in str(excinfo.value)
@@ -0,0 +1,114 @@
+import pstats
+import signal
+import time
+from unittest import mock
+
+import pytest
+
+from pg_streamline.profiling import Profiler, ProfilingHooks, create_profiler
+from .conftest import ExtendedConsumer, PGOutputProducer
+
+
+# Test hooks are called for their point, '*' registers all points and failing callbacks are isolated
+def test_profiling_hooks():
+    hooks = ProfilingHooks()
+    assert not hooks.enabled
+
+    calls = []
+    hooks.add_hook('publish', lambda *args: calls.append(args))
+    hooks.add_hook('*', mock.MagicMock(side_effect=Exception('Hook failed')))
+    assert hooks.enabled
+
+    hooks.emit('publish', 0.5, 'public.users')
+    hooks.emit('read', 0.1)
+    assert calls == [('publish', 0.5, 'public.users')]
+
+    with pytest.raises(ValueError):
+        hooks.add_hook('decode', print)
+
+    callback = mock.MagicMock()
+    hooks.add_hook('*', callback)
+    hooks.remove_hook('*', callback)
+    hooks.emit('feedback', 0.1)
+    callback.assert_not_called()
+
+
+# Test the producer and consumer report every hot path point they pass
+def test_pipeline_hooks(insert_payload, mocked_schema):
+    with mock.patch('psycopg2.connect'):
+        producer = PGOutputProducer()
+        consumer = ExtendedConsumer()
+
+    points = []
+    producer.hooks.add_hook('*', lambda point, seconds, table_name: points.append(point))
+    consumer.hooks.add_hook('*', lambda point, seconds, table_name: points.append(point))
+
+    producer.conn_pool = mock.MagicMock()
+    producer.conn_pool.getconn.return_value.cursor.return_value.fetchone.return_value = ('public', 'users')
+    producer.replication_cursor = mock.MagicMock()
+
+    producer._Producer__process_changes(insert_payload)
+    producer._Producer__process_changes(insert_payload)
+    assert points == ['catalog_lookup', 'publish', 'feedback', 'read', 'catalog_lookup', 'publish', 'feedback']
+
+    points.clear()
+    consumer.conn_pool = mock.MagicMock()
+    consumer.conn_pool.getconn.return_value.cursor.return_value.fetchall.return_value = mocked_schema
+
+    consumer.process_incoming_message('public.users', insert_payload.payload)
+    assert points == ['catalog_lookup', 'parse', 'perform_action']
+
+
+# Test a sampling window writes the stacks of busy threads in the folded format
+def test_sampling_window(tmp_path):
+    profiler = Profiler(directory=str(tmp_path), interval=0.001)
+
+    path = profiler.profile_window(0.05)
+
+    assert path.endswith('.folded') and profiler.last_profile == path
+    assert not profiler.active
+
+    with open(path) as file:
+        for line in file:
+            stack, count = line.rsplit(' ', 1)
+            assert stack and int(count) > 0
+
+
+# Test a cProfile window profiles the work passed to run
+def test_cprofile_window(tmp_path):
+    profiler = Profiler(directory=str(tmp_path), mode='cprofile')
+    assert profiler.run(sum, [1, 2]) == 3
+
+    window = profiler.start_window(0.2)
+    assert profiler.active
+    assert profiler.start_window() is None
+
+    while not profiler._Profiler__profile and window.is_alive():
+        time.sleep(0.001)
+
+    assert profiler.run(sorted, [3, 1, 2]) == [1, 2, 3]
+    window.join()
+
+    assert profiler.last_profile.endswith('.prof')
+    stats = pstats.Stats(profiler.last_profile)
+    assert any(function[2] == "<built-in method builtins.sorted>" for function in stats.stats)
+
+    with pytest.raises(ValueError):
+        Profiler(mode='perf')
+
+
+# Test the 'profiling' section installs the signal handler
+def test_create_profiler(tmp_path):
+    with mock.patch('pg_streamline.profiling.signal.signal') as mock_signal:
+        create_profiler(None)
+        mock_signal.assert_not_called()
+
+        profiler = create_profiler({'directory': str(tmp_path), 'seconds': 5, 'mode': 'cprofile', 'signal': 'SIGUSR2'})
+        assert (profiler.directory, profiler.seconds, profiler.mode) == (str(tmp_path), 5.0, 'cprofile')
+
+        signal_number, handler = mock_signal.call_args[0]
+        assert signal_number == signal.SIGUSR2
+
+    with mock.patch.object(profiler, 'start_window') as mock_start_window:
+        handler(signal_number, None)
+        mock_start_window.assert_called_once_with()
@@ -0,0 +1,138 @@
+from unittest import mock
+
+import pytest
+import yaml
+
+from benchmarks.generator import PgOutputGenerator, StaticConnectionPool
+from pg_streamline import Consumer, Producer
+from pg_streamline.replay import ReplayDriver, SegmentReader, SegmentWriter, read_recording
+from pg_streamline.replay.segment import list_segments
+
+
+class RecordingProducer(Producer):
+    def __init__(self, config_path=None):
+        self.actions = []
+        super().__init__(config_path=config_path)
+
+    def perform_action(self, table_name, bytes_message):
+        self.actions.append((table_name, bytes_message[:1], self.change_context.lsn))
+
+    def perform_termination(self):
+        pass
+
+
+class RecordingConsumer(Consumer):
+    def __init__(self, config_path=None):
+        self.actions = []
+        super().__init__(config_path=config_path)
+
+    def perform_action(self, message_type, table_name, parsed_message):
+        self.actions.append((message_type, table_name, parsed_message))
+
+    def perform_termination(self):
+        pass
+
+
+def write_config(tmp_path, **sections):
+    with open('pg-streamline-config.yaml') as f:
+        config = yaml.safe_load(f)
+
+    config.update(sections)
+    path = tmp_path / 'config.yaml'
+    path.write_text(yaml.safe_dump(config))
+    return str(path)
+
+
+@pytest.fixture
+def generator():
+    return PgOutputGenerator(row_width=4)
+
+
+# Test segments round trip, rotate and survive a truncated last record
+def test_segment_writer_and_reader(tmp_path, generator):
+    messages = list(generator.stream(transactions=3, changes_per_transaction=4))
+    writer = SegmentWriter(str(tmp_path), max_segment_bytes=512, fsync='always')
+
+    for message in messages:
+        writer.record(message, captured_at=1.5)
+    writer.close()
+
+    assert writer.messages == len(messages)
+    assert len(list_segments(str(tmp_path))) > 1
+
+    replayed = list(read_recording(str(tmp_path)))
+    assert [message.payload for message in replayed] == [message.payload for message in messages]
+    assert [message.data_start for message in replayed] == [message.data_start for message in messages]
+    assert replayed[0].captured_at == 1.5
+
+    last_segment = list_segments(str(tmp_path))[-1]
+    count = len(list(SegmentReader(last_segment)))
+    with open(last_segment, 'ab') as f:
+        f.write(b'\x00\x00\x01\x00partial')
+    assert len(list(SegmentReader(last_segment))) == count
+
+    # Reopening a recording appends new segments
+    segments = list_segments(str(tmp_path))
+    SegmentWriter(str(tmp_path)).record(messages[0])
+    assert len(list_segments(str(tmp_path))) == len(segments) + 1
+
+    with pytest.raises(ValueError):
+        SegmentWriter(str(tmp_path), fsync='sometimes')
+
+
+# Test a producer records its stream and a producer replays it without PostgreSQL
+def test_record_and_replay_producer(tmp_path, generator):
+    recording = str(tmp_path / 'recording')
+    messages = list(generator.stream(transactions=2, changes_per_transaction=3))
+
+    with mock.patch('psycopg2.connect'):
+        recorder = RecordingProducer(config_path=write_config(tmp_path, recording={'directory': recording}))
+    recorder.conn_pool = StaticConnectionPool(generator.catalog_cursor())
+    recorder.replication_cursor = mock.MagicMock()
+
+    for message in messages:
+        recorder._Producer__process_changes(message)
+    recorder.recorder.close()
+
+    with mock.patch('psycopg2.connect') as mock_connect:
+        producer = RecordingProducer(config_path=write_config(tmp_path, replay={'directory': recording}))
+        producer.start_replication(['pub'], '1')
+
+    mock_connect.assert_not_called()
+    changes = [message for message in messages if message.payload[:1] in (b'I', b'U', b'D')]
+    assert producer.actions == [('public.bench', message.payload[:1], message.data_start) for message in changes]
+    assert producer.replay_driver.feedback_lsn == messages[-1].data_start
+    assert producer.replay_driver.messages_replayed == len(messages)
+
+
+# Test a consumer decodes recorded changes with the recorded schema
+def test_replay_consumer(tmp_path, generator):
+    recording = str(tmp_path / 'recording')
+    writer = SegmentWriter(recording)
+    for message in generator.stream(transactions=1, changes_per_transaction=5, mix=(1, 0, 0)):
+        writer.record(message)
+    writer.close()
+
+    consumer = RecordingConsumer(config_path=write_config(tmp_path, replay={'directory': recording, 'pace': 'max'}))
+
+    assert consumer.replay() == 5
+    assert [action[:2] for action in consumer.actions] == [('I', 'public.bench')] * 5
+    assert list(consumer.actions[0][2]['new'].keys()) == ['id', 'col_1', 'col_2', 'col_3']
+
+
+# Test recorded pacing honours the speed-up
+def test_replay_recorded_pace(tmp_path, generator):
+    writer = SegmentWriter(str(tmp_path))
+    for index, message in enumerate(generator.stream(transactions=1, changes_per_transaction=1)):
+        writer.record(message, captured_at=index * 0.05)
+    writer.close()
+
+    driver = ReplayDriver(str(tmp_path), pace='recorded', speed=2.0)
+    with mock.patch('time.sleep') as mock_sleep:
+        assert driver.replay(lambda message: None) == 4
+
+    assert mock_sleep.call_count >= 1
+    assert max(call.args[0] for call in mock_sleep.call_args_list) <= 0.075
+
+    with pytest.raises(ValueError):
+        ReplayDriver(str(tmp_path), pace='slow')
@@ -0,0 +1,331 @@
+import json
+from unittest import mock
+
+import pytest
+import yaml
+from psycopg2 import sql
+
+from pg_streamline import SinkProducer
+from pg_streamline.sinks import (
+    BaseSink,
+    LsnTracker,
+    SinkBatcher,
+    SinkRecord,
+    create_sink,
+    get_sink_class,
+    register_sink
+)
+from pg_streamline.sinks.memory import MemorySink
+from pg_streamline.sinks.stream import FileSink, StdoutSink
+
+
+class FlakySink(MemorySink):
+    name = 'flaky'
+
+    def __init__(self, options=None):
+        super().__init__(options=options)
+        self.failures = self.options.get('failures', 1)
+
+    def write_batch(self, records):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('Sink unavailable')
+        super().write_batch(records)
+
+
+@pytest.fixture
+def sink_config_path(tmp_path):
+    with open('pg-streamline-config.yaml') as f:
+        config = yaml.safe_load(f)
+
+    config['sink'] = {'name': 'memory', 'batch_size': 2, 'flush_interval': 0}
+    path = tmp_path / 'config.yaml'
+    path.write_text(yaml.safe_dump(config))
+    return str(path)
+
+
+@pytest.fixture
+def sink_producer_instance(sink_config_path):
+    with mock.patch('psycopg2.connect'):
+        producer = SinkProducer(config_path=sink_config_path)
+    producer.replication_cursor = mock.MagicMock()
+    producer.replication_cursor.closed = False
+    return producer
+
+
+# Test the LSN tracker only advances over a contiguous delivered prefix
+def test_lsn_tracker():
+    tracker = LsnTracker()
+
+    first = tracker.track(100)
+    second = tracker.track(50)
+    tracker.observe(300)
+
+    assert tracker.flushable_lsn == 0
+    assert tracker.pending_count == 2
+
+    tracker.complete(second)
+    assert tracker.flushable_lsn == 0
+
+    tracker.complete(first)
+    assert tracker.flushable_lsn == 300
+    assert tracker.pending_count == 0
+
+
+# Test sink lookup through the registry, entry points and built-ins
+def test_registry():
+    assert get_sink_class('memory') is MemorySink
+    assert get_sink_class('stdout') is StdoutSink
+
+    register_sink('flaky', FlakySink)
+    assert isinstance(create_sink('flaky', {'failures': 0}), FlakySink)
+
+    entry_point = mock.MagicMock()
+    entry_point.name = 'custom'
+    entry_point.load.return_value = FlakySink
+    entry_points = mock.MagicMock()
+    entry_points.select.return_value = [entry_point]
+
+    with mock.patch('importlib.metadata.entry_points', return_value=entry_points):
+        assert get_sink_class('custom') is FlakySink
+
+    with pytest.raises(ValueError) as excinfo:
+        get_sink_class('unknown')
+
+    assert 'Sink unknown is not registered.' in str(excinfo.value)
+
+
+# Test BaseSink for NotImplementedError
+def test_base_sink_not_implemented():
+    with pytest.raises(NotImplementedError) as excinfo:
+        BaseSink().write_batch([])
+
+    assert 'You must implement the write_batch method in your sink class.' in str(excinfo.value)
+
+
+# Test batching by size and acknowledgement callbacks
+def test_batcher_delivers_full_batches():
+    sink = MemorySink()
+    acknowledged = []
+    sink.add_ack_callback(acknowledged.extend)
+
+    batcher = SinkBatcher(sink, batch_size=2, flush_interval=0)
+    batcher.start()
+
+    batcher.add(SinkRecord('public.users', b'I1', 10))
+    assert sink.records == []
+
+    batcher.add(SinkRecord('public.users', b'I2', 20))
+    assert [record.payload for record in sink.records] == [b'I1', b'I2']
+    assert acknowledged == sink.records
+
+    batcher.add(SinkRecord('public.users', b'I3', 30))
+    batcher.close()
+    assert len(acknowledged) == 3
+
+
+# Test retries with backoff and that records are kept after retries are exhausted
+def test_batcher_retries():
+    sink = FlakySink({'failures': 2})
+    batcher = SinkBatcher(sink, batch_size=1, flush_interval=0, max_retries=1, retry_backoff=0)
+    batcher.start()
+
+    with pytest.raises(ConnectionError):
+        batcher.add(SinkRecord('public.users', b'I1', 10))
+
+    assert sink.records == []
+
+    batcher.flush()
+    assert [record.payload for record in sink.records] == [b'I1']
+
+
+# Test the background thread flushes batches older than the interval
+def test_batcher_flush_interval():
+    sink = MemorySink()
+    batcher = SinkBatcher(sink, batch_size=100, flush_interval=0.01)
+    batcher.start()
+
+    batcher.add(SinkRecord('public.users', b'I1', 10))
+
+    with mock.patch('time.monotonic', return_value=float('inf')):
+        batcher.flush(only_if_due=True)
+
+    assert len(sink.records) == 1
+    batcher.close()
+
+
+# Test the file and stdout sinks write one JSON line per record
+def test_stream_sinks(tmp_path, capsys):
+    path = tmp_path / 'changes.jsonl'
+    sink = FileSink({'path': str(path)})
+    sink.open()
+    sink.write_batch([SinkRecord('public.users', b'\x01\x02', 10)])
+    sink.flush()
+    sink.close()
+
+    assert json.loads(path.read_text()) == {'table_name': 'public.users', 'lsn': 10, 'payload': '0102'}
+
+    sink = StdoutSink({'encoding': 'utf-8'})
+    sink.open()
+    sink.write_batch([SinkRecord('wal2json', b'{"action": "I"}', 20)])
+    sink.flush()
+
+    assert json.loads(capsys.readouterr().out)['payload'] == '{"action": "I"}'
+
+    with pytest.raises(ConnectionError) as excinfo:
+        FileSink().open()
+
+    assert 'path is missing from the file sink options.' in str(excinfo.value)
+
+
+# Test the RabbitMQ sink publishes with confirms enabled
+def test_rabbitmq_sink():
+    with mock.patch('pika.BlockingConnection') as mock_connection:
+        sink = create_sink('rabbitmq', {'url': 'amqp://localhost', 'exchange': 'pg-exchange'})
+        sink.open()
+
+    channel = mock_connection.return_value.channel.return_value
+    channel.confirm_delivery.assert_called_once()
+
+    sink.write_batch([SinkRecord('public.users', b'I1', 10), SinkRecord('public.accounts', b'I2', 20)])
+    assert channel.basic_publish.call_count == 2
+    assert channel.basic_publish.call_args.kwargs['routing_key'] == 'public.accounts'
+
+    sink.close()
+    channel.close.assert_called_once()
+
+    with pytest.raises(ConnectionError) as excinfo:
+        create_sink('rabbitmq', {}).open()
+
+    assert 'url is missing from the rabbitmq sink options.' in str(excinfo.value)
+
+
+# Test SinkProducer only confirms LSNs the sink has acknowledged
+def test_sink_producer(sink_producer_instance: SinkProducer, insert_payload):
+    producer = sink_producer_instance
+    cursor = mock.MagicMock()
+    cursor.fetchone.return_value = ('public', 'users')
+    producer.conn_pool = mock.MagicMock()
+    producer.conn_pool.getconn.return_value.cursor.return_value = cursor
+
+    producer._Producer__process_pgoutput_change(insert_payload)
+
+    assert producer.sink.records == []
+    producer.replication_cursor.send_feedback.assert_called_with(flush_lsn=0)
+
+    insert_payload.data_start = 124200
+    producer._Producer__process_pgoutput_change(insert_payload)
+
+    assert [record.lsn for record in producer.sink.records] == [124122, 124200]
+    assert producer.sink.records[0].table_name == 'public.users'
+    producer.replication_cursor.send_feedback.assert_called_with(flush_lsn=124200)
+
+    producer.perform_termination()
+
+
+# Test SinkProducer configuration validation
+def test_sink_producer_validate_config(sink_producer_instance: SinkProducer):
+    sink_producer_instance.config = {}
+
+    with pytest.raises(ConnectionError) as excinfo:
+        sink_producer_instance._SinkProducer__validate_config()
+
+    assert 'sink is missing from the configuration file.' in str(excinfo.value)
+
+    sink_producer_instance.config = {'sink': {}}
+
+    with pytest.raises(ConnectionError) as excinfo:
+        sink_producer_instance._SinkProducer__validate_config()
+
+    assert 'name is missing from the sink configuration.' in str(excinfo.value)
+
+
+# Test SinkProducer decodes changes for sinks that need rows and tracks the commit LSN
+def test_sink_producer_decode(sink_producer_instance: SinkProducer, insert_payload, mocked_schema):
+    producer = sink_producer_instance
+    producer.sink.decode_changes = True
+
+    cursor = mock.MagicMock()
+    cursor.fetchone.return_value = ('public', 'users')
+    cursor.fetchall.return_value = mocked_schema
+    producer.conn_pool = mock.MagicMock()
+    producer.conn_pool.getconn.return_value.cursor.return_value = cursor
+
+    begin = mock.MagicMock()
+    begin.payload = b'B' + (500).to_bytes(8, 'big') + bytes(12)
+    begin.data_start = 124000
+    producer._Producer__process_pgoutput_change(begin)
+
+    assert producer.commit_lsn == 500
+
+    producer._Producer__process_pgoutput_change(insert_payload)
+    producer.batcher.flush()
+
+    record = producer.sink.records[0]
+    assert record.commit_lsn == 500
+    assert record.change['new']['full_name'] == 'Zapzap'
+    assert record.schema['columns'][0] == {'name': 'id', 'type': 'uuid'}
+
+
+def render(query):
+    """Render a psycopg2.sql query without a connection, for assertions."""
+    if isinstance(query, sql.Composed):
+        return ''.join(render(part) for part in query.seq)
+    if isinstance(query, sql.Identifier):
+        return '.'.join(f'"{string}"' for string in query.strings)
+    if isinstance(query, sql.Literal):
+        return repr(query.wrapped)
+    return query.string
+
+
+# Test the Postgres sink applies changes under its session replication origin
+def test_postgres_sink():
+    with mock.patch('psycopg2.connect') as mock_connect:
+        sink = create_sink('postgres', {'dsn': 'postgresql://localhost/target'})
+        connection = mock_connect.return_value
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (None,)
+        sink.open()
+
+    assert [call.args for call in cursor.execute.call_args_list] == [
+        ('SELECT pg_replication_origin_oid(%s);', ('pg_streamline',)),
+        ('SELECT pg_replication_origin_create(%s);', ('pg_streamline',)),
+        ('SELECT pg_replication_origin_session_setup(%s);', ('pg_streamline',))
+    ]
+
+    cursor.execute.reset_mock()
+    cursor.fetchall.return_value = [('id',)]
+
+    sink.write_batch([
+        SinkRecord('public.users', b'I', 10, change={'message_type': 'I', 'new': {'id': '1', 'name': 'a'}}),
+        SinkRecord('public.users', b'U', 20, change={'message_type': 'U', 'old': {}, 'new': {'id': '1', 'name': 'b'}}),
+        SinkRecord('public.users', b'D', 30, change={'message_type': 'D', 'old': {'id': '1', 'name': None}}),
+        SinkRecord('public.users', b'T', 40),
+        SinkRecord('audit', b'M', 50)
+    ])
+    sink.flush()
+
+    queries = [render(call.args[0]) for call in cursor.execute.call_args_list if not isinstance(call.args[0], str)]
+    assert queries == [
+        'INSERT INTO "public"."users" ("id", "name") VALUES (\'1\', \'a\') ON CONFLICT DO NOTHING;',
+        'UPDATE "public"."users" SET "id" = \'1\', "name" = \'b\' WHERE "id" = \'1\';',
+        'DELETE FROM "public"."users" WHERE "id" = \'1\';',
+        'TRUNCATE "public"."users";'
+    ]
+    connection.commit.assert_called()
+
+    # A failed batch is rolled back so the batcher can retry it whole
+    cursor.execute.side_effect = RuntimeError('Connection lost')
+
+    with pytest.raises(RuntimeError):
+        sink.write_batch([SinkRecord('public.users', b'I', 60, change={'message_type': 'I', 'new': {'id': '2'}})])
+
+    connection.rollback.assert_called_once()
+
+    sink.close()
+    connection.close.assert_called_once()
+
+    with pytest.raises(ConnectionError) as excinfo:
+        create_sink('postgres', {}).open()
+
+    assert 'dsn is missing from the postgres sink options.' in str(excinfo.value)
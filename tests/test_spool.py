@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+from unittest import mock
+
+import pytest
+import yaml
+
+from benchmarks.generator import PgOutputGenerator
+from pg_streamline import Producer
+from pg_streamline.producer.spool import Spool
+from pg_streamline.replay import SegmentWriter
+
+
+class SlowProducer(Producer):
+    def __init__(self, config_path=None):
+        self.actions = []
+        self.feedback_at_action = []
+        super().__init__(config_path=config_path)
+
+    def perform_action(self, table_name, bytes_message):
+        time.sleep(0.001)
+        self.feedback_at_action.append((self.feedback_lsn, self.change_context.lsn))
+        self.actions.append(table_name)
+
+    def perform_termination(self):
+        pass
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+# Test messages come back in order across segments and read segments are deleted
+def test_spool_put_get(tmp_path):
+    directory = str(tmp_path / 'spool')
+    os.makedirs(directory)
+    (tmp_path / 'spool' / '00000001.pgrec').write_bytes(b'left over')
+    (tmp_path / 'spool' / 'notes.txt').write_bytes(b'kept')
+
+    # Only leftover segments are discarded, other files are not the spool's to delete
+    spool = Spool(directory, max_segment_bytes=256, fsync='segment')
+    assert os.listdir(directory) == ['notes.txt']
+
+    messages = list(PgOutputGenerator(row_width=3).stream(transactions=3, changes_per_transaction=3))
+    for message in messages:
+        spool.put(message)
+
+    assert spool.pending_count == len(messages)
+    assert len(os.listdir(directory)) > 2
+
+    received = [spool.get(timeout=1) for _ in messages]
+    assert [message.payload for message in received] == [message.payload for message in messages]
+    assert [message.data_start for message in received] == [message.data_start for message in messages]
+    assert spool.pending_bytes == 0
+    assert len(os.listdir(directory)) <= 3
+    assert spool.get(timeout=0.01) is None
+
+    spool.close()
+    assert spool.get() is None
+    assert os.listdir(directory) == ['notes.txt']
+
+
+# Test put blocks at the high watermark until the backlog drains below the low watermark
+def test_spool_watermarks(tmp_path):
+    generator = PgOutputGenerator(row_width=3)
+    message = generator.stream(transactions=1).__next__()
+    spool = Spool(str(tmp_path / 'spool'), high_watermark_bytes=1000, low_watermark_bytes=200)
+
+    while spool.pending_bytes < 1000:
+        spool.put(message)
+
+    blocked = threading.Thread(target=spool.put, args=(message,))
+    blocked.start()
+    assert wait_for(lambda: spool.throttled)
+
+    while spool.pending_bytes > 200:
+        spool.get()
+
+    blocked.join(timeout=5)
+    assert not blocked.is_alive()
+    assert not spool.throttled
+
+    # The spool created the directory, so it is removed with the segments
+    spool.close()
+    assert not os.path.exists(str(tmp_path / 'spool'))
+
+
+# Test the producer keeps reading while spooled changes are published, and feedback follows delivery
+def test_producer_spool(tmp_path):
+    recording = str(tmp_path / 'recording')
+    writer = SegmentWriter(recording)
+    messages = list(PgOutputGenerator(row_width=3).stream(transactions=5, changes_per_transaction=4))
+    for message in messages:
+        writer.record(message)
+    writer.close()
+
+    with open('pg-streamline-config.yaml') as f:
+        config = yaml.safe_load(f)
+    config['replay'] = {'directory': recording}
+    config['spool'] = {'directory': str(tmp_path / 'spool'), 'max_segment_bytes': 512}
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text(yaml.safe_dump(config))
+
+    with mock.patch('psycopg2.connect'):
+        producer = SlowProducer(config_path=str(config_path))
+
+    producer.start_replication(['pub'], '1')
+
+    # Reading returned before the slow publisher delivered everything
+    assert len(producer.actions) < 20
+    assert wait_for(lambda: producer.replay_driver.feedback_lsn == messages[-1].data_start)
+    assert producer.actions == ['public.bench'] * 20
+    assert all(feedback < lsn for feedback, lsn in producer.feedback_at_action)
+
+    producer.spool.close()
+
+
+# Test a change that fails is not confirmed, the publisher stops and the reader fails on its next message
+def test_producer_spool_failure(tmp_path):
+    recording = str(tmp_path / 'recording')
+    writer = SegmentWriter(recording)
+    messages = list(PgOutputGenerator(row_width=3).stream(transactions=2, changes_per_transaction=2))
+    for message in messages:
+        writer.record(message)
+    writer.close()
+
+    with open('pg-streamline-config.yaml') as f:
+        config = yaml.safe_load(f)
+    config['replay'] = {'directory': recording}
+    config['spool'] = {'directory': str(tmp_path / 'spool')}
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text(yaml.safe_dump(config))
+
+    with mock.patch('psycopg2.connect'):
+        producer = SlowProducer(config_path=str(config_path))
+
+    changes = [message for message in messages if message.payload[:1] in (b'I', b'U', b'D')]
+    failing = changes[2]
+
+    def perform_action(table_name, bytes_message):
+        if producer.change_context.lsn == failing.data_start:
+            raise ValueError('publish failed')
+
+    # Spooled as the reader would, which also records the relations for catalog lookups
+    for message in messages:
+        producer.replay_driver.catalog.observe(message.payload)
+        producer.spool.put(message)
+
+    with mock.patch.object(producer, 'perform_action', side_effect=perform_action):
+        producer._Producer__publish_spooled_changes()
+
+    # Feedback stops at the message before the failed change
+    assert producer.feedback_lsn == messages[messages.index(failing) - 1].data_start
+
+    with pytest.raises(RuntimeError) as excinfo:
+        producer._Producer__process_changes(messages[-1])
+
+    assert str(excinfo.value) == f'The spool publisher stopped, the change at LSN {failing.data_start} was not delivered.'
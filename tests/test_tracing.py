@@ -0,0 +1,81 @@
+import time
+from unittest import mock
+
+import pytest
+
+from pg_streamline.plugins.rabbitmq.headers import read_trace, trace_headers
+from pg_streamline.tracing import Trace, TraceSampler
+from pg_streamline.utils import parse_yaml_config
+from .conftest import ExtendedConsumer, PGOutputProducer
+
+
+# Test samples are spread evenly at the configured rate
+def test_trace_sampler():
+    assert not any(TraceSampler(0).sample() for _ in range(100))
+    assert all(TraceSampler(1).sample() for _ in range(100))
+
+    sampler = TraceSampler(0.25)
+    samples = [sampler.sample() for _ in range(100)]
+    assert sum(samples) == 25
+    assert samples[:4] == [False, False, False, True]
+
+    with pytest.raises(ValueError):
+        TraceSampler(2)
+
+
+# Test traces round trip through message headers
+def test_trace_headers():
+    trace = Trace(100.0, 101.5, 102.0)
+    assert read_trace(trace_headers(trace)) == trace
+    assert read_trace(trace_headers(Trace(None, 101.5))) == Trace(None, 101.5, None)
+    assert read_trace({'x-pg-streamline-lsn': 1}) is None
+    assert read_trace(None) is None
+
+
+# Test the producer attaches commit and capture times to sampled changes
+def test_producer_trace(insert_payload):
+    config = dict(parse_yaml_config('pg-streamline-config.yaml'), tracing={'sample_rate': 0.5})
+
+    with mock.patch('pg_streamline.producer.process.parse_yaml_config', return_value=config):
+        with mock.patch('psycopg2.connect'):
+            producer = PGOutputProducer()
+
+    producer.conn_pool = mock.MagicMock()
+    producer.conn_pool.getconn.return_value.cursor.return_value.fetchone.return_value = ('public', 'users')
+    producer.replication_cursor = mock.MagicMock()
+    producer.commit_timestamp = 1700000000.0
+
+    traces = []
+    with mock.patch.object(producer, 'perform_action', side_effect=lambda *args: traces.append(producer.change_context.trace)):
+        producer._Producer__process_pgoutput_change(insert_payload)
+        producer._Producer__process_pgoutput_change(insert_payload)
+
+    assert traces[0] is None
+    assert traces[1].commit_time == 1700000000.0
+    assert traces[1].capture_time == pytest.approx(time.time(), abs=5)
+
+
+# Test the consumer records end-to-end and stage latencies of applied changes
+def test_consumer_trace_metrics(insert_payload, mocked_schema):
+    config = dict(parse_yaml_config('pg-streamline-config.yaml'), metrics={'enabled': True})
+
+    with mock.patch('pg_streamline.consumer.process.parse_yaml_config', return_value=config):
+        with mock.patch('psycopg2.connect'):
+            consumer = ExtendedConsumer()
+
+    consumer.conn_pool = mock.MagicMock()
+    consumer.conn_pool.getconn.return_value.cursor.return_value.fetchall.return_value = mocked_schema
+
+    now = time.time()
+    consumer.process_incoming_message('public.users', insert_payload.payload, trace=Trace(now - 3, now - 2, now - 1))
+    consumer.process_incoming_message('public.users', insert_payload.payload)
+
+    snapshot = consumer.metrics.snapshot()
+    latency = snapshot['pg_streamline_consumer_commit_to_apply_seconds']['public.users']
+    assert latency['count'] == 1
+    assert latency['sum'] == pytest.approx(3, abs=0.5)
+
+    stages = snapshot['pg_streamline_consumer_trace_stage_seconds']
+    assert stages['public.users,capture']['sum'] == pytest.approx(1)
+    assert stages['public.users,publish']['sum'] == pytest.approx(1)
+    assert stages['public.users,deliver']['count'] == 1
@@ -0,0 +1,175 @@
+import multiprocessing
+import time
+from unittest import mock
+
+import pytest
+
+from benchmarks.generator import PgOutputGenerator, StaticConnectionPool
+from pg_streamline import Producer
+from pg_streamline.producer.workers import SharedRing, WorkerPool, worker_config
+from pg_streamline.utils import parse_yaml_config
+
+
+GENERATOR = PgOutputGenerator(row_width=4)
+
+
+# Producer publishing to a queue shared with the test process
+class QueueProducer(Producer):
+    results = None
+
+    def __init__(self, config_path=None):
+        super().__init__(config_path=config_path)
+        self.conn_pool = StaticConnectionPool(GENERATOR.catalog_cursor())
+
+    def perform_action(self, table_name, bytes_message):
+        context = self.change_context
+        QueueProducer.results.put((self.worker_id, table_name, context.lsn, context.commit_lsn, context.xid))
+
+    def perform_termination(self):
+        pass
+
+
+# Test records round trip through the ring in order, wrapping around its end
+def test_shared_ring():
+    ring = SharedRing(capacity=300)
+    worker_ring = SharedRing.attach(ring.name)
+
+    try:
+        assert ring.capacity == 304
+        assert worker_ring.get() is None
+
+        for sequence in range(50):
+            payload = bytes([sequence]) * (sequence % 7 * 10)
+            assert ring.put(sequence, 1000 + sequence, payload, commit_lsn=5, xid=7, commit_time=None if sequence else 1.5)
+
+            record = worker_ring.get()
+            assert (record.sequence, record.data_start, record.commit_lsn, record.xid) == (sequence, 1000 + sequence, 5, 7)
+            assert record.commit_time == (None if sequence else 1.5)
+
+            # Messages are views into the ring until released
+            message = record.to_message()
+            assert message.payload == payload and message.data_start == 1000 + sequence
+            record.payload.release()
+            worker_ring.release()
+            worker_ring.complete(sequence, 1000 + sequence)
+
+        assert ring.completed == (50, 1049)
+        assert ring.used_bytes == 0
+
+        # A full ring times out until the worker releases space
+        while ring.put(99, 0, b'x' * 100, timeout=0):
+            pass
+
+        assert ring.put(99, 0, b'x' * 100, timeout=0.01) is False
+        worker_ring.get().payload.release()
+        worker_ring.release()
+        assert ring.put(99, 0, b'x' * 100, timeout=0)
+
+        with pytest.raises(ValueError):
+            ring.put(100, 0, b'x' * 400)
+
+        assert not worker_ring.closed
+        ring.close()
+        assert worker_ring.closed
+    finally:
+        worker_ring.release_memory()
+        ring.release_memory()
+
+
+# Test reader-owned sections are removed from the configuration of workers
+def test_worker_config():
+    config = {'database': {}, 'spool': {}, 'workers': {}, 'metrics': {'enabled': True, 'port': 9187}}
+    assert worker_config(config, 1) == {'database': {}, 'metrics': {'enabled': True, 'port': 9189}}
+
+    with pytest.raises(ValueError):
+        WorkerPool(QueueProducer, None, processes=0)
+
+
+# Test worker processes publish changes routed from the reader and the reader confirms their LSNs
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='requires fork')
+def test_worker_pool():
+    config = dict(
+        parse_yaml_config('pg-streamline-config.yaml'),
+        workers={'processes': 2, 'ring_bytes': 4096, 'start_method': 'fork'}
+    )
+    stream = list(GENERATOR.stream(transactions=20, changes_per_transaction=5))
+    changes = [message for message in stream if message.payload[:1] in (b'I', b'U', b'D')]
+    QueueProducer.results = multiprocessing.get_context('fork').Queue()
+
+    with mock.patch('pg_streamline.producer.process.parse_yaml_config', return_value=config):
+        with mock.patch('psycopg2.connect'):
+            producer = QueueProducer()
+            producer.replication_cursor = mock.MagicMock()
+            producer.replication_cursor.consume_stream.side_effect = lambda callback: [callback(m) for m in stream]
+
+            producer.start_replication(['publication'], '1')
+
+    try:
+        results = [QueueProducer.results.get(timeout=10) for _ in changes]
+
+        # One relation, so a single worker processed every change, in stream order
+        assert {worker_id for worker_id, *_ in results} == {GENERATOR.relation_id % 2}
+        assert [lsn for _, _, lsn, _, _ in results] == [message.data_start for message in changes]
+        assert all(table_name == GENERATOR.table_name and xid for _, table_name, _, _, xid in results)
+
+        deadline = time.monotonic() + 10
+
+        while producer.feedback_lsn < max(message.data_start for message in stream) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert producer.feedback_lsn == max(message.data_start for message in stream)
+        producer.replication_cursor.send_feedback.assert_called_with(flush_lsn=producer.feedback_lsn)
+    finally:
+        producer.worker_pool.close()
+
+    assert producer.worker_pool.lsn_tracker.pending_count == 0
+
+
+# Producer failing to publish one change
+class FailingProducer(QueueProducer):
+    failing_lsn = None
+
+    def perform_action(self, table_name, bytes_message):
+        if self.change_context.lsn == FailingProducer.failing_lsn:
+            raise ValueError('publish failed')
+
+        super().perform_action(table_name, bytes(bytes_message))
+
+
+# Test a worker stops on a change it cannot publish, which is never confirmed, and the reader fails on the next change
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='requires fork')
+def test_worker_pool_failure():
+    config = dict(
+        parse_yaml_config('pg-streamline-config.yaml'),
+        workers={'processes': 1, 'ring_bytes': 65536, 'start_method': 'fork'}
+    )
+    stream = list(GENERATOR.stream(transactions=3, changes_per_transaction=3))
+    changes = [message for message in stream if message.payload[:1] in (b'I', b'U', b'D')]
+    failing = stream.index(changes[-1])
+    FailingProducer.failing_lsn = changes[-1].data_start
+    QueueProducer.results = multiprocessing.get_context('fork').Queue()
+
+    with mock.patch('pg_streamline.producer.process.parse_yaml_config', return_value=config):
+        with mock.patch('psycopg2.connect'):
+            producer = FailingProducer()
+            producer.replication_cursor = mock.MagicMock()
+            producer.replication_cursor.consume_stream.side_effect = lambda callback: [callback(m) for m in stream]
+
+            producer.start_replication(['publication'], '1')
+
+    try:
+        assert [QueueProducer.results.get(timeout=10)[2] for _ in changes[:-1]] == [m.data_start for m in changes[:-1]]
+        deadline = time.monotonic() + 10
+
+        while producer.worker_pool.failure is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert producer.worker_pool.failure == 'Worker pg-streamline-worker-0 exited with code 1.'
+        assert producer.feedback_lsn == max(message.data_start for message in stream[:failing])
+
+        with pytest.raises(RuntimeError):
+            producer.worker_pool.dispatch(GENERATOR.relation_id, changes[0])
+    finally:
+        producer.worker_pool.close()
+
+    assert producer.worker_pool.lsn_tracker.pending_count == 1